@@ -3,6 +3,8 @@ Endpoints administrativos para monitoramento do sistema.
 
 Acesso restrito a ADMIN ou SUPER_ADMIN.
 """
+from typing import Optional
+
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from sqlalchemy import func
@@ -10,9 +12,14 @@ from sqlalchemy import func
 from app.database import get_db
 from app.api.dependencies import require_admin
 from app.models.user import User
+from app.core.pagination import CursorPaginationParams, keyset_response
+from app.models.ai_cache import AICache
 from app.models.background_task import BackgroundTask, BackgroundTaskStatus
 from app.services.ai_cache_service import cache_stats, cleanup_old_cache
 from app.services.background_tasks import task_manager
+from app.core import metering
+from app.services.bncc_catalogo import invalidar_catalogo, obter_catalogo
+from app.services import ia_estruturada
 
 
 router = APIRouter(prefix="/admin", tags=["Admin - Monitoramento"])
@@ -31,6 +38,54 @@ def obter_stats_cache_ia(current_user: User = Depends(require_admin)):
     return cache_stats()
 
 
+@router.get("/ai-estruturada/stats")
+def obter_stats_ia_estruturada(current_user: User = Depends(require_admin)):
+    """
+    Contadores da geracao estruturada (tool use) por ferramenta, desde o
+    start deste worker:
+    - chamadas / falhas: quantas terminaram em RespostaIAInvalida
+    - reparos: chamadas extras para corrigir resposta fora do schema
+    - truncadas: respostas cortadas em max_tokens (pedido grande demais)
+    - tokens_desperdicados: tokens das tentativas descartadas
+    """
+    return ia_estruturada.estatisticas()
+
+
+@router.get("/ai-cache/entries")
+def listar_entradas_cache_ia(
+    cache_type: Optional[str] = None,
+    pagination: CursorPaginationParams = Depends(),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin),
+):
+    """
+    Lista entradas do cache de IA (mais recentes primeiro), sem a resposta.
+
+    Paginacao por cursor (meta.next_cursor): a tabela so cresce, OFFSET em
+    paginas profundas seria full scan. meta.total e estimado.
+    """
+    query = db.query(
+        AICache.id, AICache.cache_type, AICache.model,
+        AICache.hit_count, AICache.created_at, AICache.last_hit_at,
+    )
+    if cache_type:
+        query = query.filter(AICache.cache_type == cache_type)
+
+    return keyset_response(
+        query, pagination,
+        keys=[AICache.created_at.desc(), AICache.id.desc()],
+        serializer=lambda e: {
+            "id": e.id,
+            "cache_type": e.cache_type,
+            "model": e.model,
+            "hit_count": e.hit_count,
+            "created_at": e.created_at.isoformat() if e.created_at else None,
+            "last_hit_at": e.last_hit_at.isoformat() if e.last_hit_at else None,
+        },
+        estimate_total=True,
+    )
+
+
 @router.post("/ai-cache/cleanup")
 def limpar_cache_ia_antigo(
     ttl_hours: int = 672,
@@ -99,8 +154,75 @@ def obter_stats_background_tasks(
     }
 
 
+@router.get("/background-tasks")
+def listar_background_tasks(
+    status: Optional[BackgroundTaskStatus] = None,
+    task_type: Optional[str] = None,
+    pagination: CursorPaginationParams = Depends(),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin),
+):
+    """
+    Lista tasks em background (mais recentes primeiro), paginado por cursor.
+    meta.total e estimado (EXPLAIN) - nao ha COUNT(*) por pagina.
+    """
+    query = db.query(BackgroundTask)
+    if status:
+        query = query.filter(BackgroundTask.status == status)
+    if task_type:
+        query = query.filter(BackgroundTask.task_type == task_type)
+
+    return keyset_response(
+        query, pagination,
+        keys=[BackgroundTask.created_at.desc(), BackgroundTask.id.desc()],
+        serializer=lambda t: {
+            "task_id": t.task_id,
+            "task_type": t.task_type,
+            "status": t.status.value if t.status else None,
+            "progress": t.progress,
+            "error": (t.error or "")[:200] or None,
+            "created_at": t.created_at.isoformat() if t.created_at else None,
+            "completed_at": t.completed_at.isoformat() if t.completed_at else None,
+        },
+        estimate_total=True,
+    )
+
+
 @router.post("/background-tasks/cleanup")
 def limpar_background_tasks_antigas(current_user: User = Depends(require_admin)):
     """Remove tasks mais antigas que o TTL configurado (default 7 dias)."""
     removidos = task_manager.cleanup_old_tasks()
     return {"removidos": removidos or 0}
+
+
+@router.post("/metering/reconciliar")
+def reconciliar_metering(current_user: User = Depends(require_admin)):
+    """
+    Forca a reconciliacao dos contadores de uso mensal em Assinatura.*_mes_atual.
+    Normalmente roda sozinha a cada METERING_RECONCILE_SECONDS (default 300s).
+    """
+    atualizadas = metering.reconciliar_uso()
+    return {
+        "assinaturas_atualizadas": atualizadas,
+        "periodo": metering.periodo_atual(),
+        "backend": metering.get_active_backend_name(),
+    }
+
+
+@router.post("/bncc/recarregar")
+def recarregar_catalogo_bncc(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin),
+):
+    """
+    Recarrega o catalogo BNCC em memoria deste worker agora, sem esperar o
+    VERSAO_TTL (o carimbo de versao ja detecta insercoes, remocoes e
+    alteracoes in-place sozinho).
+    """
+    invalidar_catalogo()
+    catalogo = obter_catalogo(db)
+    return {
+        "versao": catalogo.versao,
+        "habilidades": catalogo.total_habilidades,
+        "prerequisitos": catalogo.total_prerequisitos,
+    }
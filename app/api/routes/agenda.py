@@ -7,7 +7,7 @@ Permite criar, editar, listar e gerenciar eventos.
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func
+from sqlalchemy import and_, or_, func, insert, select
 from typing import List, Optional
 from datetime import date, datetime, time, timedelta
 from pydantic import BaseModel, Field
@@ -385,17 +385,20 @@ async def criar_evento(
     )
     
     db.add(novo_evento)
-    db.commit()
-    db.refresh(novo_evento)
+    db.flush()
     
-    # Se for recorrente, criar eventos futuros
+    # Se for recorrente, criar eventos futuros (mesma transacao do pai)
+    ocorrencias = []
     if evento_data.recorrencia != Recorrencia.UNICO and evento_data.recorrencia_fim:
-        criar_eventos_recorrentes(db, novo_evento, evento_data)
+        ocorrencias = criar_eventos_recorrentes(db, novo_evento, evento_data)
+    
+    db.commit()
     
     return {
         "success": True,
         "message": "Evento criado com sucesso",
-        "evento_id": novo_evento.id
+        "evento_id": novo_evento.id,
+        "ocorrencias_criadas": len(ocorrencias)
     }
 
 
@@ -563,42 +566,65 @@ async def estatisticas_agenda(
 # FUNÇÕES AUXILIARES
 # ============================================
 
-def criar_eventos_recorrentes(db: Session, evento_pai: AgendaProfessor, evento_data: EventoCreate):
-    """Cria eventos recorrentes baseados no evento pai"""
-    
-    delta_dias = {
-        Recorrencia.DIARIO: 1,
-        Recorrencia.SEMANAL: 7,
-        Recorrencia.QUINZENAL: 14,
-        Recorrencia.MENSAL: 30  # Aproximado
-    }
-    
-    dias = delta_dias.get(evento_data.recorrencia, 7)
-    data_atual = evento_pai.data + timedelta(days=dias)
-    
-    while data_atual <= evento_data.recorrencia_fim:
-        evento_filho = AgendaProfessor(
-            professor_id=evento_pai.professor_id,
-            titulo=evento_pai.titulo,
-            descricao=evento_pai.descricao,
-            tipo=evento_pai.tipo,
-            student_id=evento_pai.student_id,
-            data=data_atual,
-            hora_inicio=evento_pai.hora_inicio,
-            hora_fim=evento_pai.hora_fim,
-            duracao_minutos=evento_pai.duracao_minutos,
-            local=evento_pai.local,
-            link_online=evento_pai.link_online,
-            cor=evento_pai.cor,
-            recorrencia=Recorrencia.UNICO,  # Filhos não são recorrentes
-            evento_pai_id=evento_pai.id,
-            notificar_aluno=evento_pai.notificar_aluno,
-            notificar_responsavel=evento_pai.notificar_responsavel,
-            lembrete_minutos=evento_pai.lembrete_minutos,
-            status=StatusEvento.AGENDADO
-        )
-        
-        db.add(evento_filho)
+DELTA_RECORRENCIA = {
+    Recorrencia.DIARIO: 1,
+    Recorrencia.SEMANAL: 7,
+    Recorrencia.QUINZENAL: 14,
+    Recorrencia.MENSAL: 30  # Aproximado
+}
+
+
+def datas_recorrencia(inicio: date, recorrencia: Recorrencia, fim: date) -> List[date]:
+    """Datas das ocorrencias depois de `inicio` ate `fim` (inclusive)."""
+    dias = DELTA_RECORRENCIA.get(recorrencia, 7)
+    datas = []
+    data_atual = inicio + timedelta(days=dias)
+    while data_atual <= fim:
+        datas.append(data_atual)
         data_atual += timedelta(days=dias)
+    return datas
+
+
+def criar_eventos_recorrentes(db: Session, evento_pai: AgendaProfessor, evento_data: EventoCreate) -> List[int]:
+    """
+    Cria os eventos recorrentes do evento pai e retorna os ids.
     
-    db.commit()
+    Um INSERT em lote (executemany) em vez de um objeto ORM por ocorrencia:
+    evento diario no ano letivo = ~200 linhas, antes ~200 flushes. Nao faz
+    commit - o chamador commita junto com o evento pai.
+    """
+    datas = datas_recorrencia(evento_pai.data, evento_data.recorrencia, evento_data.recorrencia_fim)
+    if not datas:
+        return []
+    
+    base = {
+        "professor_id": evento_pai.professor_id,
+        "titulo": evento_pai.titulo,
+        "descricao": evento_pai.descricao,
+        "tipo": evento_pai.tipo,
+        "student_id": evento_pai.student_id,
+        "hora_inicio": evento_pai.hora_inicio,
+        "hora_fim": evento_pai.hora_fim,
+        "duracao_minutos": evento_pai.duracao_minutos,
+        "local": evento_pai.local,
+        "link_online": evento_pai.link_online,
+        "cor": evento_pai.cor,
+        "recorrencia": Recorrencia.UNICO,  # Filhos não são recorrentes
+        "evento_pai_id": evento_pai.id,
+        "notificar_aluno": evento_pai.notificar_aluno,
+        "notificar_responsavel": evento_pai.notificar_responsavel,
+        "lembrete_minutos": evento_pai.lembrete_minutos,
+        "status": StatusEvento.AGENDADO
+    }
+    linhas = [{**base, "data": d} for d in datas]
+    
+    if db.get_bind().dialect.insert_executemany_returning:
+        return list(db.scalars(insert(AgendaProfessor).returning(AgendaProfessor.id), linhas))
+    
+    # MySQL nao tem INSERT ... RETURNING: executemany + uma query pelos ids
+    db.execute(insert(AgendaProfessor), linhas)
+    return list(db.scalars(
+        select(AgendaProfessor.id)
+        .where(AgendaProfessor.evento_pai_id == evento_pai.id)
+        .order_by(AgendaProfessor.data)
+    ))
@@ -1,7 +1,7 @@
 """
 Rotas de Análise Qualitativa
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
 from typing import List
 
@@ -15,15 +15,21 @@ from app.schemas.analise_qualitativa import (
 )
 from app.services.analise_qualitativa_service import analise_service
 from app.api.dependencies import get_current_active_user
+from app.core.rate_limit import check_rate_limit
 from app.models.user import User
 
 
 router = APIRouter(prefix="/analise-qualitativa", tags=["Análise Qualitativa"])
 
+# Orcamento de IA da escola (app/core/rate_limit.py): ate 2k de saida + prompt
+# com as questoes e respostas da prova.
+TOKENS_ANALISE_QUALITATIVA = 5_000
+
 
 @router.post("/prova-aluno/{prova_aluno_id}/gerar")
 async def gerar_analise_qualitativa(
     prova_aluno_id: int,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
@@ -55,6 +61,12 @@ async def gerar_analise_qualitativa(
             detail="Prova precisa estar corrigida para gerar análise"
         )
     
+    check_rate_limit(
+        request, key="analise_qualitativa", max_requests=60, window_seconds=3600,
+        error_message="Limite de análises qualitativas atingido. Aguarde 1 hora.",
+        user=current_user, max_per_escola=500, ai_tokens=TOKENS_ANALISE_QUALITATIVA,
+    )
+    
     # Verificar se já existe análise
     analise_existente = db.query(AnaliseQualitativa).filter(
         AnaliseQualitativa.prova_aluno_id == prova_aluno_id
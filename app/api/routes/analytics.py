@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from typing import List
 
@@ -219,24 +220,40 @@ def compare_students_performance(
             detail="Invalid student IDs format. Use comma-separated numbers."
         )
     
+    # Duas queries para qualquer quantidade de ids (antes: duas por id).
+    # Estudantes do usuario via IN; ultima analise de cada um via
+    # ROW_NUMBER() OVER (PARTITION BY student_id).
+    students = {
+        student.id: student for student in db.query(Student).filter(
+            Student.id.in_(ids),
+            Student.created_by_user_id == current_user.id
+        ).all()
+    }
+    
+    latest_by_student = {}
+    if students:
+        ranked = db.query(
+            PerformanceAnalysis.id.label("id"),
+            func.row_number().over(
+                partition_by=PerformanceAnalysis.student_id,
+                order_by=(PerformanceAnalysis.analyzed_at.desc(), PerformanceAnalysis.id.desc()),
+            ).label("ordem"),
+        ).filter(
+            PerformanceAnalysis.student_id.in_(list(students))
+        ).subquery()
+        latest = db.query(PerformanceAnalysis).join(
+            ranked, ranked.c.id == PerformanceAnalysis.id
+        ).filter(ranked.c.ordem == 1).all()
+        latest_by_student = {a.student_id: a for a in latest}
+    
     comparisons = []
     
+    # Mantem a ordem pedida em student_ids
     for student_id in ids:
-        # Verificar se o estudante pertence ao usuário
-        student = db.query(Student).filter(
-            Student.id == student_id,
-            Student.created_by_user_id == current_user.id
-        ).first()
-        
-        if not student:
-            continue
-        
-        # Buscar última análise
-        latest_analysis = db.query(PerformanceAnalysis).filter(
-            PerformanceAnalysis.student_id == student_id
-        ).order_by(PerformanceAnalysis.analyzed_at.desc()).first()
+        student = students.get(student_id)
+        latest_analysis = latest_by_student.get(student_id)
         
-        if latest_analysis:
+        if student and latest_analysis:
             comparisons.append({
                 "student_id": student.id,
                 "student_name": student.name,
@@ -12,6 +12,7 @@ from app.schemas.application import (
     StudentAnswerResponse, AnswerSubmitBatch, ApplicationWithAnswers
 )
 from app.api.dependencies import get_current_active_user
+from app.services.performance_rollup import registrar_aplicacao
 
 router = APIRouter(prefix="/applications", tags=["Applications"])
 
@@ -312,6 +313,8 @@ def complete_application(
     # Atualizar status
     application.status = ApplicationStatus.COMPLETED
     application.completed_at = datetime.now()
+    # Rollup de desempenho na mesma transacao do status
+    registrar_aplicacao(db, application)
     db.commit()
     
     # Gerar análise de desempenho
@@ -2,7 +2,9 @@
 # ROUTER - Calendário de Atividades PEI
 # ============================================
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 from typing import Optional, List
 from datetime import date, datetime, timedelta
@@ -10,15 +12,22 @@ from pydantic import BaseModel
 
 from app.database import get_db
 from app.api.dependencies import get_current_active_user
+from app.core.rate_limit import check_rate_limit
 from app.models.user import User
 from app.models.student import Student
 from app.models.pei import PEI
 from app.models.atividade_pei import AtividadePEI, TipoAtividade, StatusAtividade
 from app.services.calendario_atividades_service import CalendarioAtividadesService
+from app.services.background_tasks import get_task_manager
 
 
 router = APIRouter(prefix="/calendario", tags=["Calendário de Atividades"])
 
+# Orcamento de IA da escola (app/core/rate_limit.py): por objetivo, uma
+# chamada combinada de ate 8k de saida (ou material+exercicio+prova de 4k
+# cada no fallback) + prompt.
+TOKENS_POR_OBJETIVO = 12_000
+
 
 # ============================================
 # SCHEMAS
@@ -58,25 +67,14 @@ class AtividadeResponse(BaseModel):
 # ENDPOINTS - Geração de Calendário
 # ============================================
 
-@router.post("/gerar")
-async def gerar_calendario_pei(
-    request: GerarCalendarioRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
-):
-    """
-    Gera o calendário completo de atividades para um PEI.
-    Cria automaticamente materiais, exercícios e provas para cada objetivo.
-    """
-    
-    # Verificar se o PEI existe
-    pei = db.query(PEI).filter(PEI.id == request.pei_id).first()
+def _verificar_pei_sem_calendario(db: Session, pei_id: int) -> PEI:
+    """404 se o PEI não existe, 400 se já tem atividades no calendário."""
+    pei = db.query(PEI).filter(PEI.id == pei_id).first()
     if not pei:
         raise HTTPException(status_code=404, detail="PEI não encontrado")
     
-    # Verificar se já existe calendário
     atividades_existentes = db.query(AtividadePEI).filter(
-        AtividadePEI.pei_id == request.pei_id
+        AtividadePEI.pei_id == pei_id
     ).count()
     
     if atividades_existentes > 0:
@@ -84,6 +82,28 @@ async def gerar_calendario_pei(
             status_code=400, 
             detail=f"Este PEI já possui {atividades_existentes} atividades no calendário. Use o endpoint de regeneração se quiser substituir."
         )
+    return pei
+
+
+@router.post("/gerar")
+async def gerar_calendario_pei(
+    request: GerarCalendarioRequest,
+    http_request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Gera o calendário completo de atividades para um PEI.
+    Cria automaticamente materiais, exercícios e provas para cada objetivo.
+    Para PEIs grandes prefira /calendario/gerar/async (não prende a requisição).
+    """
+    pei = _verificar_pei_sem_calendario(db, request.pei_id)
+    check_rate_limit(
+        http_request, key="gerar_calendario", max_requests=10, window_seconds=3600,
+        error_message="Limite de geracoes de calendario atingido. Aguarde 1 hora.",
+        user=current_user, max_per_escola=50,
+        ai_tokens=len(pei.objetivos) * TOKENS_POR_OBJETIVO,
+    )
     
     service = CalendarioAtividadesService(db)
     
@@ -105,9 +125,79 @@ async def gerar_calendario_pei(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/gerar/async")
+async def iniciar_geracao_calendario(
+    request: GerarCalendarioRequest,
+    http_request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Inicia a geração do calendário em background.
+    Retorna imediatamente com um task_id; o progresso (objetivos já gerados)
+    fica em /calendario/task/{task_id}.
+    """
+    pei = _verificar_pei_sem_calendario(db, request.pei_id)
+    check_rate_limit(
+        http_request, key="gerar_calendario", max_requests=10, window_seconds=3600,
+        error_message="Limite de geracoes de calendario atingido. Aguarde 1 hora.",
+        user=current_user, max_per_escola=50,
+        ai_tokens=len(pei.objetivos) * TOKENS_POR_OBJETIVO,
+    )
+    
+    task_manager = get_task_manager()
+    task_id = task_manager.create_task(
+        task_type="gerar_calendario",
+        input_data={"pei_id": request.pei_id,
+                    "data_inicio": request.data_inicio.isoformat() if request.data_inicio else None},
+        user_id=current_user.id,
+    )
+    user_id = current_user.id
+    
+    async def executar_geracao(task_id: str, task_manager):
+        # Nova sessão: a da requisição fecha quando a resposta sai
+        from app.database import SessionLocal
+        db_bg = SessionLocal()
+        try:
+            service = CalendarioAtividadesService(db_bg)
+            return await service.gerar_calendario_completo(
+                pei_id=request.pei_id,
+                user_id=user_id,
+                data_inicio=request.data_inicio,
+                task_id=task_id,
+                task_manager=task_manager
+            )
+        except Exception:
+            db_bg.rollback()
+            raise
+        finally:
+            db_bg.close()
+    
+    asyncio.create_task(task_manager.run_task(task_id, executar_geracao))
+    
+    return {
+        "task_id": task_id,
+        "message": "Geração do calendário iniciada. Use /calendario/task/{task_id} para acompanhar.",
+        "status": "pending"
+    }
+
+
+@router.get("/task/{task_id}")
+async def verificar_status_geracao(
+    task_id: str,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Status/progresso de uma geração de calendário em background."""
+    task = get_task_manager().get_task(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Tarefa não encontrada")
+    return task.to_dict()
+
+
 @router.post("/regenerar/{pei_id}")
 async def regenerar_calendario_pei(
     pei_id: int,
+    http_request: Request,
     data_inicio: Optional[date] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
@@ -115,6 +205,15 @@ async def regenerar_calendario_pei(
     """
     Regenera o calendário de um PEI, excluindo as atividades anteriores.
     """
+    pei = db.query(PEI).filter(PEI.id == pei_id).first()
+    if not pei:
+        raise HTTPException(status_code=404, detail="PEI não encontrado")
+    check_rate_limit(
+        http_request, key="gerar_calendario", max_requests=10, window_seconds=3600,
+        error_message="Limite de geracoes de calendario atingido. Aguarde 1 hora.",
+        user=current_user, max_per_escola=50,
+        ai_tokens=len(pei.objetivos) * TOKENS_POR_OBJETIVO,
+    )
     
     # Excluir atividades existentes
     db.query(AtividadePEI).filter(AtividadePEI.pei_id == pei_id).delete()
@@ -6,7 +6,7 @@ Endpoints para buscar conteúdos estudados por aluno.
 Usado como insumo para materiais adaptados e provas.
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, contains_eager
 from sqlalchemy import func, distinct
 from typing import List, Optional
 from datetime import date, timedelta
@@ -47,7 +47,11 @@ async def conteudos_recentes_aluno(
     data_inicio = date.today() - timedelta(days=dias)
     
     # Buscar aulas do aluno
-    query = db.query(AulaRegistrada).join(RegistroDiario).filter(
+    # contains_eager: o JOIN ja traz o registro, sem lazy-load de
+    # aula.registro (uma query por aula) ao montar a resposta
+    query = db.query(AulaRegistrada).join(AulaRegistrada.registro).options(
+        contains_eager(AulaRegistrada.registro)
+    ).filter(
         RegistroDiario.student_id == student_id,
         RegistroDiario.data_aula >= data_inicio
     )
@@ -150,7 +154,9 @@ async def sugestoes_para_prova(
     
     data_inicio = date.today() - timedelta(days=dias)
     
-    aulas = db.query(AulaRegistrada).join(RegistroDiario).filter(
+    aulas = db.query(AulaRegistrada).join(AulaRegistrada.registro).options(
+        contains_eager(AulaRegistrada.registro)
+    ).filter(
         RegistroDiario.student_id == student_id,
         RegistroDiario.data_aula >= data_inicio,
         AulaRegistrada.disciplina.ilike(f"%{disciplina}%")
@@ -167,7 +173,7 @@ async def sugestoes_para_prova(
                 "conteudo": aula.conteudo,
                 "data": aula.registro.data_aula.isoformat(),
                 "paginas": aula.paginas,
-                "relevancia": "alta" if aula.tem_avaliacao else "normal"
+                "relevancia": "alta" if aula.tem_atividade_avaliativa else "normal"
             })
     
     # Gerar texto sugerido para o campo de conteúdo da prova
@@ -213,7 +219,9 @@ async def sugestoes_para_material(
     
     data_inicio = date.today() - timedelta(days=dias)
     
-    aulas = db.query(AulaRegistrada).join(RegistroDiario).filter(
+    aulas = db.query(AulaRegistrada).join(AulaRegistrada.registro).options(
+        contains_eager(AulaRegistrada.registro)
+    ).filter(
         RegistroDiario.student_id == student_id,
         RegistroDiario.data_aula >= data_inicio,
         AulaRegistrada.disciplina.ilike(f"%{disciplina}%")
@@ -250,7 +258,7 @@ async def sugestoes_para_material(
                 "data": a.registro.data_aula.isoformat(),
                 "tem_dever": a.tem_dever_casa,
                 "tem_avaliacao": a.tem_atividade_avaliativa,
-                "prioridade": "alta" if a.tem_avaliacao else ("media" if a.tem_dever_casa else "normal")
+                "prioridade": "alta" if a.tem_atividade_avaliativa else ("media" if a.tem_dever_casa else "normal")
             }
             for a in aulas
         ],
@@ -2,7 +2,7 @@
 📔 Rotas - Diário de Aprendizagem Inteligente
 CRUD + Análise com IA + Estatísticas + Timeline
 """
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Query
+from fastapi import APIRouter, Depends, HTTPException, Request, status, BackgroundTasks, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc
 from typing import List, Optional
@@ -10,6 +10,7 @@ from datetime import date, datetime, timedelta, timezone
 
 from app.database import get_db
 from app.api.dependencies import get_current_active_user
+from app.core.rate_limit import check_rate_limit
 from app.models.user import User
 from app.models.student import Student
 from app.models.diario_aprendizagem import (
@@ -34,10 +35,16 @@ from app.schemas.diario_aprendizagem import (
     TimelineItem
 )
 from app.services.diario_ai_service import diario_ai_service
+from app.services import diario_busca, diario_estatisticas
 
 
 router = APIRouter(prefix="/diario-aprendizagem", tags=["📔 Diário de Aprendizagem"])
 
+# Orcamento de IA da escola (app/core/rate_limit.py): tokens estimados de
+# cada operacao, debitados de RATE_LIMIT_AI_TOKENS_ESCOLA_HORA.
+TOKENS_ANALISE_REGISTRO = 5_000     # ate 3k de saida + prompt com o registro
+TOKENS_RESUMO_SEMANAL = 6_000       # ate 2.5k de saida + registros da semana
+
 
 # ============================================
 # CRUD - REGISTROS DO DIÁRIO
@@ -47,6 +54,7 @@ router = APIRouter(prefix="/diario-aprendizagem", tags=["📔 Diário de Aprendi
 async def criar_registro(
     dados: DiarioCreate,
     background_tasks: BackgroundTasks,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
@@ -103,15 +111,34 @@ async def criar_registro(
     db.refresh(diario)
     
     # Agendar análise com IA em background
-    background_tasks.add_task(
-        processar_diario_background,
-        diario.id,
-        student.id
-    )
+    _agendar_analise(request, background_tasks, current_user, diario.id, student.id)
     
     return diario
 
 
+def _agendar_analise(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    current_user: User,
+    diario_id: int,
+    student_id: int,
+):
+    """
+    Agenda a análise com IA do registro. Sem orçamento de IA da escola o
+    registro fica salvo sem análise (ia_processado=False) - dá para refazer
+    depois por POST /{diario_id}/analisar.
+    """
+    try:
+        check_rate_limit(
+            request, key="analisar_diario", max_requests=60, window_seconds=3600,
+            user=current_user, ai_tokens=TOKENS_ANALISE_REGISTRO,
+        )
+    except HTTPException:
+        print(f"[AVISO] Análise do diário {diario_id} não agendada: limite de IA atingido")
+        return
+    background_tasks.add_task(processar_diario_background, diario_id, student_id)
+
+
 async def processar_diario_background(diario_id: int, student_id: int):
     """Processa o diário com IA em background"""
     from app.database import SessionLocal
@@ -220,6 +247,7 @@ async def atualizar_registro(
     diario_id: int,
     dados: DiarioUpdate,
     background_tasks: BackgroundTasks,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
@@ -272,14 +300,11 @@ async def atualizar_registro(
     
     db.commit()
     db.refresh(diario)
+    diario_busca.invalidar(diario.student_id)
     
     # Re-analisar se texto foi alterado
     if texto_alterado:
-        background_tasks.add_task(
-            processar_diario_background,
-            diario.id,
-            student.id
-        )
+        _agendar_analise(request, background_tasks, current_user, diario.id, student.id)
     
     return diario
 
@@ -329,6 +354,7 @@ async def deletar_registro(
 @router.post("/{diario_id}/analisar", response_model=AnaliseRegistroResponse)
 async def analisar_registro(
     diario_id: int,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
@@ -359,6 +385,11 @@ async def analisar_registro(
             detail="Sem permissão"
         )
     
+    check_rate_limit(
+        request, key="analisar_diario", max_requests=60, window_seconds=3600,
+        error_message="Limite de análises do diário atingido. Aguarde 1 hora.",
+        user=current_user, ai_tokens=TOKENS_ANALISE_REGISTRO,
+    )
     resultado = await diario_ai_service.analisar_registro(db, diario, student)
     
     return AnaliseRegistroResponse(
@@ -376,6 +407,7 @@ async def analisar_registro(
 @router.post("/resumo-semanal/gerar")
 async def gerar_resumo_semanal(
     request: GerarResumoRequest,
+    http_request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
@@ -402,6 +434,11 @@ async def gerar_resumo_semanal(
             detail="Aluno não encontrado"
         )
     
+    check_rate_limit(
+        http_request, key="resumo_semanal_diario", max_requests=20, window_seconds=3600,
+        error_message="Limite de resumos semanais atingido. Aguarde 1 hora.",
+        user=current_user, max_per_escola=200, ai_tokens=TOKENS_RESUMO_SEMANAL,
+    )
     resultado = await diario_ai_service.gerar_resumo_semanal(
         db,
         request.student_id,
@@ -563,85 +600,14 @@ async def obter_estatisticas(
     
     data_inicio = date.today() - timedelta(days=periodo_dias)
     
-    # Buscar diários do período
-    diarios = db.query(DiarioAprendizagem).filter(
-        DiarioAprendizagem.student_id == student_id,
-        DiarioAprendizagem.data_estudo >= data_inicio
-    ).all()
-    
-    # Calcular estatísticas
-    total_registros = len(diarios)
-    total_minutos = sum(d.tempo_estudo_minutos or 0 for d in diarios)
-    media_minutos = total_minutos / total_registros if total_registros > 0 else 0
-    
-    # Por disciplina
-    por_disciplina = {}
-    for d in diarios:
-        if d.ia_disciplinas_detectadas:
-            for disc in d.ia_disciplinas_detectadas:
-                por_disciplina[disc] = por_disciplina.get(disc, 0) + 1
-    
-    # Por humor
-    por_humor = {}
-    for d in diarios:
-        if d.humor:
-            por_humor[d.humor.value] = por_humor.get(d.humor.value, 0) + 1
-    
-    # Por nível de compreensão
-    por_nivel = {}
-    for d in diarios:
-        if d.nivel_compreensao:
-            por_nivel[d.nivel_compreensao.value] = por_nivel.get(d.nivel_compreensao.value, 0) + 1
-    
-    # Tópicos mais estudados
-    conteudos = db.query(ConteudoExtraido).filter(
-        ConteudoExtraido.student_id == student_id
-    ).order_by(desc(ConteudoExtraido.vezes_mencionado)).limit(5).all()
-    
-    topicos_mais_estudados = [
-        {
-            "topico": c.topico,
-            "disciplina": c.disciplina,
-            "vezes": c.vezes_mencionado
-        }
-        for c in conteudos
-    ]
-    
-    # Tópicos com dificuldade
-    conteudos_dif = db.query(ConteudoExtraido).filter(
-        ConteudoExtraido.student_id == student_id,
-        ConteudoExtraido.nivel_dificuldade_percebido.in_(["dificil", "muito_dificil"])
-    ).order_by(desc(ConteudoExtraido.prioridade_revisao)).limit(5).all()
-    
-    topicos_com_dificuldade = [
-        {
-            "topico": c.topico,
-            "disciplina": c.disciplina,
-            "prioridade": c.prioridade_revisao
-        }
-        for c in conteudos_dif
-    ]
-    
-    # Por semana
-    registros_por_semana = {}
-    for d in diarios:
-        semana = d.data_estudo.isocalendar()[1]
-        chave = f"{d.data_estudo.year}-S{semana:02d}"
-        registros_por_semana[chave] = registros_por_semana.get(chave, 0) + 1
+    # Agregado no banco (GROUP BY / JSON_TABLE) - ver app/services/diario_estatisticas.py
+    estatisticas = diario_estatisticas.estatisticas_periodo(db, student_id, data_inicio)
     
     return EstatisticasDiarioResponse(
         student_id=student_id,
         student_name=student.name,
         periodo=f"Últimos {periodo_dias} dias",
-        total_registros=total_registros,
-        total_minutos_estudo=total_minutos,
-        media_minutos_por_dia=round(media_minutos, 1),
-        por_disciplina=por_disciplina,
-        por_humor=por_humor,
-        por_nivel_compreensao=por_nivel,
-        topicos_mais_estudados=topicos_mais_estudados,
-        topicos_com_dificuldade=topicos_com_dificuldade,
-        registros_por_semana=registros_por_semana
+        **estatisticas
     )
 
 
@@ -677,24 +643,11 @@ async def obter_timeline(
     data_inicio = date.today() - timedelta(days=dias)
     data_fim = date.today()
     
-    # Buscar diários
-    diarios = db.query(DiarioAprendizagem).filter(
-        DiarioAprendizagem.student_id == student_id,
-        DiarioAprendizagem.data_estudo >= data_inicio
-    ).order_by(desc(DiarioAprendizagem.data_estudo)).all()
-    
-    itens = []
-    
-    for d in diarios:
-        itens.append(TimelineItem(
-            data=d.data_estudo,
-            tipo="diario",
-            titulo=d.ia_resumo or f"Estudo - {d.data_estudo}",
-            descricao=d.registro_texto[:200] + "..." if len(d.registro_texto) > 200 else d.registro_texto,
-            disciplinas=d.ia_disciplinas_detectadas,
-            humor=d.humor.value if d.humor else None,
-            destaque=d.ia_sentimento_geral == "positivo"
-        ))
+    # So as colunas exibidas (texto truncado no banco)
+    itens = [
+        TimelineItem(**item)
+        for item in diario_estatisticas.itens_timeline(db, student_id, data_inicio)
+    ]
     
     return TimelineResponse(
         student_id=student_id,
@@ -721,7 +674,11 @@ async def buscar_nos_diarios(
     """
     🔍 Busca nos diários do aluno
     
-    Busca por texto, tags, conceitos ou tópicos.
+    Busca por texto, resumo, disciplinas, tags, conceitos e tópicos
+    extraídos pela IA - sem acento, com ranking por relevância e prefixo
+    (funciona enquanto digita). Cada resultado traz `trecho` e `destaques`
+    ([inicio, fim] dos termos encontrados dentro do trecho).
+    Ver app/services/diario_busca.py.
     """
     
     # Verificar permissão
@@ -736,30 +693,10 @@ async def buscar_nos_diarios(
             detail="Aluno não encontrado"
         )
     
-    query = db.query(DiarioAprendizagem).filter(
-        DiarioAprendizagem.student_id == student_id
-    )
-    
-    # Buscar no texto
-    query = query.filter(
-        DiarioAprendizagem.registro_texto.ilike(f"%{q}%")
-    )
-    
-    resultados = query.order_by(
-        desc(DiarioAprendizagem.data_estudo)
-    ).limit(limit).all()
+    resultados = diario_busca.buscar_diario(db, student_id, q, disciplina=disciplina, limite=limit)
     
     return {
         "query": q,
         "total": len(resultados),
-        "resultados": [
-            {
-                "id": r.id,
-                "data": r.data_estudo,
-                "resumo": r.ia_resumo,
-                "disciplinas": r.ia_disciplinas_detectadas,
-                "trecho": r.registro_texto[:200]
-            }
-            for r in resultados
-        ]
+        "resultados": resultados
     }
@@ -1,11 +1,11 @@
 """
 Rotas para Materiais de Estudo - COM STORAGE E AGENDA
 """
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Request, status, BackgroundTasks
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import OperationalError
-from typing import List
-from datetime import time as dt_time
+from typing import List, Optional
+from datetime import datetime, timezone, time as dt_time
 import time
 
 from app.database import get_db, SessionLocal
@@ -18,16 +18,42 @@ from app.schemas.material import (
     MaterialAlunoResponse, AnotacaoRequest, FavoritoRequest
 )
 from app.api.dependencies import get_current_active_user
+from app.core import metering
 from app.core.pagination import PaginationParams, build_page
+from app.core.rate_limit import check_rate_limit
+from app.core.tenant import TenantContext, consumir_limite_mensal, get_tenant_context
+from app.core.http_cache import (
+    CACHE_PRIVADO_REVALIDAR,
+    gerar_etag,
+    nao_modificado,
+    resposta_304,
+    resposta_condicional,
+)
 from app.services.material_service import material_service
 from app.services.storage_service import storage_service
 
 router = APIRouter(prefix="/materiais", tags=["Materiais de Estudo"])
 
+# Orcamento de IA da escola (app/core/rate_limit.py): ate 4k de saida + prompt
+TOKENS_POR_MATERIAL = 5_000
+
+
+def gerar_material_background(material_id: int, escola_id: Optional[int] = None):
+    """
+    Gera o conteúdo do material em background e salva no STORAGE.
+    Se a rota consumiu o limite mensal da escola (escola_id informado) e a
+    geração falhar, devolve o consumo.
+    """
+    if not _gerar_material(material_id) and escola_id:
+        try:
+            metering.estornar(escola_id, "materiais")
+        except Exception as e:
+            print(f"[AVISO] Falha ao estornar limite do material {material_id}: {e}")
+
 
-def gerar_material_background(material_id: int):
+def _gerar_material(material_id: int) -> bool:
     """
-    Gera o conteúdo do material em background e salva no STORAGE
+    Gera o conteúdo e retorna True se o material ficou DISPONIVEL.
     ESTRATÉGIA: Gera conteúdo, salva em arquivo, UPDATE rápido no banco
     """
     db_session = SessionLocal()
@@ -37,7 +63,7 @@ def gerar_material_background(material_id: int):
         material = db_session.query(Material).filter(Material.id == material_id).first()
         if not material:
             db_session.close()
-            return
+            return False
         
         # Guardar dados necessários
         material_titulo = material.titulo
@@ -108,7 +134,7 @@ def gerar_material_background(material_id: int):
                 
                 if not material:
                     db_session.close()
-                    return
+                    return False
                 
                 # UPDATE RÁPIDO - só campos pequenos!
                 if arquivo_path:
@@ -123,7 +149,7 @@ def gerar_material_background(material_id: int):
                 db_session.close()
                 
                 print(f"✅ Material {material_id} salvo com sucesso!")
-                return
+                return arquivo_path is not None
             
             except OperationalError as e:
                 retry_count += 1
@@ -152,7 +178,7 @@ def gerar_material_background(material_id: int):
                         db_session.close()
                     except:
                         pass
-                    return
+                    return False
     
     except Exception as e:
         print(f"❌ Erro ao gerar material {material_id}: {str(e)}")
@@ -166,13 +192,16 @@ def gerar_material_background(material_id: int):
             db_session.close()
         except:
             pass
+        return False
 
 
 @router.post("/", response_model=MaterialResponse, status_code=status.HTTP_201_CREATED)
 async def criar_material(
     material_data: MaterialCreate,
     background_tasks: BackgroundTasks,
+    request: Request,
     current_user: User = Depends(get_current_active_user),
+    tenant: TenantContext = Depends(get_tenant_context),
     db: Session = Depends(get_db)
 ):
     """
@@ -194,33 +223,46 @@ async def criar_material(
             detail="Um ou mais alunos não encontrados ou não pertencem a você"
         )
     
-    # Criar material
-    novo_material = Material(
-        titulo=material_data.titulo,
-        descricao=material_data.descricao,
-        conteudo_prompt=material_data.conteudo_prompt,
-        tipo=material_data.tipo,
-        materia=material_data.materia,
-        serie_nivel=material_data.serie_nivel,
-        tags=material_data.tags or [],
-        status=StatusMaterial.GERANDO,
-        criado_por_id=current_user.id
+    check_rate_limit(
+        request, key="gerar_material", max_requests=30, window_seconds=3600,
+        error_message="Limite de geração de materiais atingido. Aguarde 1 hora.",
+        user=current_user, max_per_escola=200, ai_tokens=TOKENS_POR_MATERIAL,
     )
+    consumiu_limite = consumir_limite_mensal(tenant, "materiais")
     
-    db.add(novo_material)
-    db.commit()
-    db.refresh(novo_material)
-    
-    # Associar aos alunos
-    for aluno in alunos:
-        material_aluno = MaterialAluno(
-            material_id=novo_material.id,
-            aluno_id=aluno.id
+    # Criar material
+    try:
+        novo_material = Material(
+            titulo=material_data.titulo,
+            descricao=material_data.descricao,
+            conteudo_prompt=material_data.conteudo_prompt,
+            tipo=material_data.tipo,
+            materia=material_data.materia,
+            serie_nivel=material_data.serie_nivel,
+            tags=material_data.tags or [],
+            status=StatusMaterial.GERANDO,
+            criado_por_id=current_user.id
         )
-        db.add(material_aluno)
-    
-    db.commit()
-    db.refresh(novo_material)
+        
+        db.add(novo_material)
+        db.commit()
+        db.refresh(novo_material)
+        
+        # Associar aos alunos
+        for aluno in alunos:
+            material_aluno = MaterialAluno(
+                material_id=novo_material.id,
+                aluno_id=aluno.id
+            )
+            db.add(material_aluno)
+        
+        db.commit()
+        db.refresh(novo_material)
+    except Exception:
+        db.rollback()
+        if consumiu_limite:
+            tenant.estornar_limite("materiais")
+        raise
     
     # ============================================
     # NOVO: Criar evento na agenda se solicitado
@@ -254,7 +296,10 @@ async def criar_material(
             # Não falha a criação do material se erro na agenda
     
     # Agendar geração em background
-    background_tasks.add_task(gerar_material_background, novo_material.id)
+    # (com escola_id so se consumiu o limite, para estornar se a geracao falhar)
+    background_tasks.add_task(
+        gerar_material_background, novo_material.id, tenant.escola_id if consumiu_limite else None
+    )
     
     return novo_material
 
@@ -340,12 +385,16 @@ async def obter_material(
 @router.get("/{material_id}/conteudo")
 async def obter_conteudo_material(
     material_id: int,
+    request: Request,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
     Obter o conteúdo do material do storage
     Retorna HTML ou JSON dependendo do tipo
+    
+    ETag/Last-Modified vem do mtime/tamanho do arquivo: se o cliente ja tem
+    a versao, responde 304 sem ler nem serializar o conteudo.
     """
     material = db.query(Material).filter(
         Material.id == material_id,
@@ -364,24 +413,42 @@ async def obter_conteudo_material(
             detail=f"Material não está disponível. Status: {material.status}"
         )
     
-    # Ler do storage
     if material.tipo == TipoMaterial.VISUAL:
-        conteudo = storage_service.ler_html(material_id)
-        if not conteudo:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Conteúdo do material não encontrado no storage"
-            )
-        return {"tipo": "html", "conteudo": conteudo}
-    
+        tipo_arquivo = "html"
     elif material.tipo == TipoMaterial.MAPA_MENTAL:
+        tipo_arquivo = "json"
+    else:
+        return None
+    
+    arquivo = storage_service.stat(material_id, tipo_arquivo)
+    if arquivo is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Conteúdo do material não encontrado no storage"
+        )
+    etag = gerar_etag("material-conteudo", material_id, arquivo.st_mtime_ns, arquivo.st_size)
+    last_modified = datetime.fromtimestamp(arquivo.st_mtime, tz=timezone.utc)
+    if nao_modificado(request, etag, last_modified):
+        return resposta_304(etag, CACHE_PRIVADO_REVALIDAR, last_modified)
+    
+    # Ler do storage
+    if tipo_arquivo == "html":
+        conteudo = storage_service.ler_html(material_id)
+    else:
         conteudo = storage_service.ler_json(material_id)
-        if not conteudo:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Conteúdo do material não encontrado no storage"
-            )
-        return {"tipo": "json", "conteudo": conteudo}
+    if not conteudo:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Conteúdo do material não encontrado no storage"
+        )
+    
+    return resposta_condicional(
+        request,
+        {"tipo": tipo_arquivo, "conteudo": conteudo},
+        CACHE_PRIVADO_REVALIDAR,
+        etag=etag,
+        last_modified=last_modified,
+    )
 
 
 @router.delete("/{material_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -11,7 +11,9 @@ import time
 from app.database import get_db
 from app.api.dependencies import get_current_active_user, verificar_acesso_aluno
 from app.core.rate_limit import check_rate_limit
+from app.core.tenant import TenantContext, consumir_limite_mensal, get_tenant_context
 from app.core.pagination import PaginationParams, build_page
+from app.core.responses import FastJSONResponse
 from app.models.user import User
 from app.models.student import Student
 from app.models.material_adaptado_gerado import MaterialAdaptadoGerado
@@ -20,6 +22,10 @@ from app.services.ai_materiais_service import MaterialAdaptadoService
 
 router = APIRouter(prefix="/materiais-adaptados", tags=["Materiais Adaptados"])
 
+# Tokens de IA estimados por tipo de material (orcamento da escola,
+# app/core/rate_limit.py): uma chamada de ate 4k de saida + prompt.
+TOKENS_POR_MATERIAL = 5_000
+
 
 class MaterialRequest(BaseModel):
     student_id: int
@@ -91,20 +97,23 @@ async def gerar_materiais_adaptados(
     request_body: MaterialRequest,
     request: Request,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    tenant: TenantContext = Depends(get_tenant_context)
 ):
     """
     🎨 GERA MATERIAIS EDUCACIONAIS ADAPTADOS
     
     25+ tipos disponiveis! A serie e obtida automaticamente do aluno.
     
-    SEGURANCA: rate limited a 20 geracoes por hora por IP 
+    SEGURANCA: rate limited a 20 geracoes por hora por usuario
     (cada geracao pode fazer ate 25 chamadas caras a API Claude).
     """
-    # SEGURANCA: limitar gastos com IA por IP
+    # SEGURANCA: limitar gastos com IA por usuario (IP so com teto folgado - NAT de escola)
     check_rate_limit(
         request, key="gerar_material_adaptado", max_requests=20, window_seconds=3600,
-        error_message="Limite de geracoes de IA atingido. Aguarde 1 hora."
+        error_message="Limite de geracoes de IA atingido. Aguarde 1 hora.",
+        user=current_user, max_per_escola=200,
+        ai_tokens=TOKENS_POR_MATERIAL * max(len(request_body.tipos_material), 1),
     )
     
     inicio = time.time()
@@ -112,6 +121,11 @@ async def gerar_materiais_adaptados(
     # SEGURANCA: verificar acesso ao aluno (evita IDOR entre escolas)
     student = verificar_acesso_aluno(db, request_body.student_id, current_user)
     
+    # Limite mensal do plano: cada tipo valido conta como um material;
+    # os que falharem sao devolvidos no fim
+    tipos_validos = [tipo for tipo in request_body.tipos_material if tipo in TIPOS_MATERIAIS]
+    consumiu_limite = bool(tipos_validos) and consumir_limite_mensal(tenant, "materiais", len(tipos_validos))
+    
     # Serie: usar do aluno se nao informada
     serie = request_body.serie or student.grade_level or "Nao especificada"
     
@@ -178,6 +192,13 @@ async def gerar_materiais_adaptados(
     if erros:
         response["erros"] = erros
     
+    falhas = len(tipos_validos) - len(response["materiais_gerados"])
+    if consumiu_limite and falhas > 0:
+        try:
+            tenant.estornar_limite("materiais", falhas)
+        except Exception as e:
+            print(f"[AVISO] Falha ao estornar limite de materiais: {e}")
+    
     tempo_total = time.time() - inicio
     response["tempo_geracao"] = round(tempo_total, 2)
     
@@ -279,7 +300,7 @@ async def listar_historico_student(
     # Compat retroativa: manter 'total' e 'materiais' no nivel raiz
     page["total"] = total
     page["materiais"] = items
-    return page
+    return FastJSONResponse(page)
 
 
 @router.get("/historico/{material_id}")
@@ -299,7 +320,8 @@ async def buscar_material_por_id(
     # SEGURANCA: verificar acesso ao aluno dono do material (evita IDOR)
     verificar_acesso_aluno(db, material.student_id, current_user)
     
-    return {
+    # Resultado pode ter centenas de KB - serializa direto com orjson
+    return FastJSONResponse({
         "id": material.id,
         "student_id": material.student_id,
         "student_name": material.student.name if material.student else "Aluno",
@@ -310,7 +332,7 @@ async def buscar_material_por_id(
         "resultado": material.resultado_json,
         "tempo_geracao": material.tempo_geracao,
         "created_at": material.created_at.isoformat() if material.created_at else None
-    }
+    })
 
 
 @router.delete("/historico/{material_id}")
@@ -39,11 +39,12 @@ async def analisar_laudo(
     neurologistas, psiquiatras e outros profissionais de saúde.
     Aceita PDF ou imagens (JPG, PNG).
     
-    SEGURANCA: rate limited (10/hora) - cada analise custa tokens de visao (caro).
+    SEGURANCA: rate limited (10/hora por usuario) - cada analise custa tokens de visao (caro).
     """
     check_rate_limit(
         request, key="analisar_laudo", max_requests=10, window_seconds=3600,
-        error_message="Limite de analises de laudo atingido. Aguarde 1 hora."
+        error_message="Limite de analises de laudo atingido. Aguarde 1 hora.",
+        user=current_user, max_per_escola=100, ai_tokens=4096,
     )
     
     client = get_anthropic_client()
@@ -247,11 +248,12 @@ async def gerar_pei_completo(
     """
     Gera um PEI completo baseado nos dados extraídos dos relatórios de terapias e acompanhamento usando IA.
     
-    SEGURANCA: rate limited (20/hora).
+    SEGURANCA: rate limited (20/hora por usuario).
     """
     check_rate_limit(
         request, key="gerar_pei_completo", max_requests=20, window_seconds=3600,
-        error_message="Limite de geracoes de PEI atingido. Aguarde 1 hora."
+        error_message="Limite de geracoes de PEI atingido. Aguarde 1 hora.",
+        user=current_user, max_per_escola=200, ai_tokens=4096,
     )
     
     client = get_anthropic_client()
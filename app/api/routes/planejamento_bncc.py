@@ -18,20 +18,35 @@ from app.api.dependencies import (
     verificar_acesso_objetivo_pei,
 )
 from app.core.rate_limit import check_rate_limit
+from app.core.tenant import TenantContext, consumir_limite_mensal, get_tenant_context
 from app.core.logging_config import get_logger
+from app.core.pagination import CursorPaginationParams, keyset_response
+from app.core.responses import FastJSONResponse
+from app.core.http_cache import (
+    CACHE_CATALOGO,
+    gerar_etag,
+    nao_modificado,
+    resposta_304,
+    resposta_condicional,
+)
 from app.models.user import User
 from app.models.student import Student
 
 logger = get_logger(__name__)
-from app.models.curriculo import CurriculoNacional, MapeamentoPrerequisitos
+from app.models.curriculo import CurriculoNacional
 from app.models.pei import PEI, PEIObjetivo, PEIProgressLog, PEIAjuste
 from app.services.planejamento_bncc_service import PlanejamentoBNNCService
 from app.services.planejamento_bncc_completo_service import PlanejamentoBNNCCompletoService
 from app.services.background_tasks import get_task_manager, TaskStatus
+from app.services.bncc_catalogo import invalidar_catalogo, obter_catalogo
+from app.services.bncc_grafo import obter_grafo
+from app.services.bncc_busca import obter_indice_busca
 from app.schemas.curriculo import (
     CurriculoNacionalCreate,
     CurriculoNacionalResponse,
     CurriculoNacionalListResponse,
+    BuscaHabilidadesResponse,
+    HabilidadeBuscaResponse,
     MapeamentoPrerequisitosCreate,
     MapeamentoPrerequisitosResponse
 )
@@ -53,6 +68,12 @@ from app.schemas.pei import (
 
 router = APIRouter(prefix="/planejamento", tags=["Planejamento BNCC e PEI"])
 
+# Orcamento de IA da escola (app/core/rate_limit.py): tokens estimados de
+# cada operacao, debitados de RATE_LIMIT_AI_TOKENS_ESCOLA_HORA.
+TOKENS_PLANEJAMENTO_ANUAL = 24_000        # uma geracao de ate 16k de saida + prompt
+TOKENS_OBJETIVOS_TRIMESTRE = 8_000
+TOKENS_PLANEJAMENTO_COMPLETO = 250_000    # ~200 habilidades em lotes de ~5k de saida
+
 # Helpers de ownership sao importados de app.api.dependencies:
 # - verificar_acesso_aluno(db, student_id, current_user)
 # - verificar_acesso_pei(db, pei_id, current_user)
@@ -79,7 +100,8 @@ async def iniciar_geracao_planejamento(
     """
     check_rate_limit(
         http_request, key="gerar_planejamento_anual", max_requests=5, window_seconds=3600,
-        error_message="Limite de geracoes de planejamento atingido. Aguarde 1 hora."
+        error_message="Limite de geracoes de planejamento atingido. Aguarde 1 hora.",
+        user=current_user, max_per_escola=50, ai_tokens=TOKENS_PLANEJAMENTO_ANUAL,
     )
     
     # IDOR: verifica se user pode acessar este aluno
@@ -249,7 +271,7 @@ async def obter_pei_completo(
             "prazo": obj.prazo.isoformat() if obj.prazo else None
         })
     
-    return {
+    return FastJSONResponse({
         "pei": {
             "id": pei.id,
             "ano_letivo": pei.ano_letivo,
@@ -266,41 +288,57 @@ async def obter_pei_completo(
         },
         "objetivos_por_trimestre": objetivos_por_trimestre,
         "total_objetivos": len(pei.objetivos)
-    }
+    })
 
 
 # ============================================
 # ENDPOINTS - Currículo BNCC
 # ============================================
 
+# Catalogo em memoria (app/services/bncc_catalogo.py): estas rotas nao
+# consultam curriculo_nacional/mapeamento_prerequisitos - so o carimbo de
+# versao, no maximo a cada VERSAO_TTL. A versao do catalogo entra no ETag,
+# entao 304 sai sem montar payload nenhum.
+
 @router.get("/bncc/componentes", response_model=List[str])
 async def listar_componentes(
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Lista todos os componentes curriculares disponíveis"""
-    result = db.query(CurriculoNacional.componente).distinct().all()
-    componentes = [r[0] for r in result if r[0]]
+    catalogo = obter_catalogo(db)
+    etag = gerar_etag("bncc-componentes", catalogo.versao)
+    if nao_modificado(request, etag):
+        return resposta_304(etag, CACHE_CATALOGO)
+
+    componentes = list(catalogo.componentes())
     
     # Se não houver componentes no banco, retornar padrão
     if not componentes:
-        return ["Matemática", "Língua Portuguesa", "Ciências", "História", "Geografia"]
+        componentes = ["Matemática", "Língua Portuguesa", "Ciências", "História", "Geografia"]
     
-    return componentes
+    return resposta_condicional(request, componentes, CACHE_CATALOGO, etag=etag)
 
 
 @router.get("/bncc/anos", response_model=List[str])
 async def listar_anos_escolares(
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Lista todos os anos escolares disponíveis"""
-    result = db.query(CurriculoNacional.ano_escolar).distinct().all()
-    return [r[0] for r in result if r[0]]
+    catalogo = obter_catalogo(db)
+    etag = gerar_etag("bncc-anos", catalogo.versao)
+    if nao_modificado(request, etag):
+        return resposta_304(etag, CACHE_CATALOGO)
+
+    return resposta_condicional(request, list(catalogo.anos()), CACHE_CATALOGO, etag=etag)
 
 
 @router.get("/bncc/habilidades", response_model=CurriculoNacionalListResponse)
 async def listar_habilidades_bncc(
+    request: Request,
     ano_escolar: str = Query(..., description="Ano escolar (ex: 5º ano)"),
     componente: Optional[str] = Query(None, description="Componente curricular"),
     trimestre: Optional[int] = Query(None, ge=1, le=4, description="Trimestre"),
@@ -308,53 +346,175 @@ async def listar_habilidades_bncc(
     current_user: User = Depends(get_current_active_user)
 ):
     """Lista habilidades da BNCC com filtros"""
-    query = db.query(CurriculoNacional).filter(
-        CurriculoNacional.ano_escolar == ano_escolar
+    catalogo = obter_catalogo(db)
+    etag = gerar_etag("bncc-habilidades", catalogo.versao, ano_escolar, componente, trimestre)
+    if nao_modificado(request, etag):
+        return resposta_304(etag, CACHE_CATALOGO)
+
+    def montar():
+        habilidades = catalogo.habilidades(ano_escolar, componente, trimestre)
+        return CurriculoNacionalListResponse(
+            total=len(habilidades),
+            curriculos=[CurriculoNacionalResponse.model_validate(h) for h in habilidades]
+        ).model_dump(mode="json")
+
+    # Payload validado uma vez por versao do catalogo e filtro; so filtros que
+    # existem no catalogo (query string livre nao entra no memo)
+    conhecido = ano_escolar in catalogo.anos() and (
+        componente is None or componente in catalogo.componentes()
     )
-    
-    if componente:
-        query = query.filter(CurriculoNacional.componente == componente)
-    
-    if trimestre:
-        query = query.filter(CurriculoNacional.trimestre_sugerido == trimestre)
-    
-    habilidades = query.all()
-    
-    return CurriculoNacionalListResponse(
-        total=len(habilidades),
-        curriculos=[CurriculoNacionalResponse.model_validate(h) for h in habilidades]
+    if conhecido and catalogo.habilidades(ano_escolar, componente, trimestre):
+        payload = catalogo.memo(("habilidades", ano_escolar, componente, trimestre), montar)
+    else:
+        payload = montar()
+    return resposta_condicional(request, payload, CACHE_CATALOGO, etag=etag)
+
+
+@router.get("/bncc/busca", response_model=BuscaHabilidadesResponse)
+async def buscar_habilidades_texto(
+    request: Request,
+    q: str = Query(..., min_length=2, max_length=200, description="Texto ou código parcial (ex: frações equivalentes, EF05MA1)"),
+    ano_escolar: Optional[str] = Query(None, description="Ano escolar (ex: 5º ano)"),
+    componente: Optional[str] = Query(None, description="Componente curricular"),
+    limite: int = Query(20, ge=1, le=100, description="Máximo de resultados"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Busca textual nas habilidades (codigo, descricao, objeto de conhecimento):
+    ignora acentos, aceita prefixo/erro de digitacao e ordena por relevancia.
+    Indice em memoria (app/services/bncc_busca.py) - sem consulta ao banco.
+    """
+    catalogo = obter_catalogo(db)
+    etag = gerar_etag("bncc-busca", catalogo.versao, q, ano_escolar, componente, limite)
+    if nao_modificado(request, etag):
+        return resposta_304(etag, CACHE_CATALOGO)
+
+    resultados = obter_indice_busca(db).buscar(q, ano_escolar, componente, limite)
+    payload = BuscaHabilidadesResponse(
+        total=len(resultados),
+        resultados=[
+            HabilidadeBuscaResponse(
+                **CurriculoNacionalResponse.model_validate(h).model_dump(), score=score
+            )
+            for h, score in resultados
+        ],
     )
+    return resposta_condicional(request, payload.model_dump(mode="json"), CACHE_CATALOGO, etag=etag)
 
 
 @router.get("/bncc/habilidade/{codigo_bncc}", response_model=CurriculoNacionalResponse)
 async def obter_habilidade_bncc(
     codigo_bncc: str,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Obtém detalhes de uma habilidade específica"""
-    habilidade = db.query(CurriculoNacional).filter(
-        CurriculoNacional.codigo_bncc == codigo_bncc
-    ).first()
+    catalogo = obter_catalogo(db)
+    habilidade = catalogo.habilidade(codigo_bncc)
     
     if not habilidade:
         raise HTTPException(status_code=404, detail="Habilidade não encontrada")
     
-    return habilidade
+    etag = gerar_etag("bncc-habilidade", catalogo.versao, codigo_bncc)
+    if nao_modificado(request, etag):
+        return resposta_304(etag, CACHE_CATALOGO)
+
+    return resposta_condicional(
+        request,
+        CurriculoNacionalResponse.model_validate(habilidade).model_dump(mode="json"),
+        CACHE_CATALOGO,
+        etag=etag,
+    )
 
 
 @router.get("/bncc/prerequisitos/{codigo_bncc}", response_model=List[MapeamentoPrerequisitosResponse])
 async def obter_prerequisitos(
     codigo_bncc: str,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Lista os pré-requisitos de uma habilidade"""
-    prerequisitos = db.query(MapeamentoPrerequisitos).filter(
-        MapeamentoPrerequisitos.habilidade_codigo == codigo_bncc
-    ).all()
-    
-    return prerequisitos
+    catalogo = obter_catalogo(db)
+    etag = gerar_etag("bncc-prerequisitos", catalogo.versao, codigo_bncc)
+    if nao_modificado(request, etag):
+        return resposta_304(etag, CACHE_CATALOGO)
+
+    payload = [
+        MapeamentoPrerequisitosResponse.model_validate(p).model_dump(mode="json")
+        for p in catalogo.prerequisitos(codigo_bncc)
+    ]
+    return resposta_condicional(request, payload, CACHE_CATALOGO, etag=etag)
+
+
+@router.get("/bncc/grafo/ordem")
+async def obter_ordem_ensino(
+    request: Request,
+    componente: Optional[str] = Query(None, description="Componente curricular"),
+    ano_escolar: Optional[str] = Query(None, description="Ano escolar (ex: 5º ano)"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Ordem de ensino (topologica: pre-requisitos antes) das habilidades,
+    opcionalmente filtrada por componente e ano. Lookup no grafo
+    pre-computado (app/services/bncc_grafo.py).
+    """
+    catalogo = obter_catalogo(db)
+    etag = gerar_etag("bncc-grafo-ordem", catalogo.versao, componente, ano_escolar)
+    if nao_modificado(request, etag):
+        return resposta_304(etag, CACHE_CATALOGO)
+
+    grafo = obter_grafo(db)
+    ordem = grafo.ordem_topologica(componente, ano_escolar)
+    return resposta_condicional(
+        request,
+        {
+            "total": len(ordem),
+            "ordem": [
+                {"codigo_bncc": c, "profundidade": grafo.profundidade(c)} for c in ordem
+            ],
+        },
+        CACHE_CATALOGO,
+        etag=etag,
+    )
+
+
+@router.get("/bncc/grafo/{codigo_bncc}")
+async def obter_grafo_habilidade(
+    codigo_bncc: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Pre-requisitos de uma habilidade em todos os niveis (fecho transitivo,
+    em ordem de ensino), profundidade e quem depende dela.
+    """
+    catalogo = obter_catalogo(db)
+    grafo = obter_grafo(db)
+    if codigo_bncc not in grafo:
+        raise HTTPException(status_code=404, detail="Habilidade não encontrada no grafo de pré-requisitos")
+
+    etag = gerar_etag("bncc-grafo", catalogo.versao, codigo_bncc)
+    if nao_modificado(request, etag):
+        return resposta_304(etag, CACHE_CATALOGO)
+
+    return resposta_condicional(
+        request,
+        {
+            "codigo_bncc": codigo_bncc,
+            "profundidade": grafo.profundidade(codigo_bncc),
+            "prerequisitos_diretos": list(grafo.prerequisitos_diretos(codigo_bncc)),
+            "todos_prerequisitos": list(grafo.todos_prerequisitos(codigo_bncc)),
+            "dependentes_diretos": list(grafo.dependentes_diretos(codigo_bncc)),
+            "todos_dependentes": list(grafo.todos_dependentes(codigo_bncc)),
+        },
+        CACHE_CATALOGO,
+        etag=etag,
+    )
 
 
 @router.post("/bncc/importar")
@@ -388,6 +548,7 @@ async def importar_habilidades_bncc(
             erros.append({"codigo": item.codigo_bncc, "erro": str(e)})
     
     db.commit()
+    invalidar_catalogo()
     
     return {
         "importados": importados,
@@ -418,7 +579,8 @@ async def gerar_planejamento_anual(
     """
     check_rate_limit(
         http_request, key="gerar_planejamento_anual", max_requests=5, window_seconds=3600,
-        error_message="Limite de geracoes de planejamento atingido. Aguarde 1 hora."
+        error_message="Limite de geracoes de planejamento atingido. Aguarde 1 hora.",
+        user=current_user, max_per_escola=50, ai_tokens=TOKENS_PLANEJAMENTO_ANUAL,
     )
     
     verificar_acesso_aluno(db, request.student_id, current_user)
@@ -457,7 +619,8 @@ async def gerar_objetivos_trimestre(
     """
     check_rate_limit(
         http_request, key="gerar_objetivos_trimestre", max_requests=20, window_seconds=3600,
-        error_message="Limite de geracoes atingido. Aguarde 1 hora."
+        error_message="Limite de geracoes atingido. Aguarde 1 hora.",
+        user=current_user, max_per_escola=200, ai_tokens=TOKENS_OBJETIVOS_TRIMESTRE,
     )
     
     verificar_acesso_aluno(db, request.student_id, current_user)
@@ -485,7 +648,8 @@ async def gerar_objetivos_trimestre(
 async def salvar_planejamento_como_pei(
     request: SalvarPlanejamentoRequest,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    tenant: TenantContext = Depends(get_tenant_context)
 ):
     """
     Salva o planejamento gerado como um PEI no banco de dados.
@@ -496,6 +660,8 @@ async def salvar_planejamento_como_pei(
     verificar_acesso_aluno(db, request.student_id, current_user)
     
     service = PlanejamentoBNNCService(db)
+    # Limite mensal do plano (devolvido se o salvamento falhar)
+    consumiu_limite = consumir_limite_mensal(tenant, "peis")
     
     try:
         pei = service.salvar_planejamento_como_pei(
@@ -508,9 +674,13 @@ async def salvar_planejamento_como_pei(
         return pei
         
     except HTTPException:
+        if consumiu_limite:
+            tenant.estornar_limite("peis")
         raise
     except Exception:
         db.rollback()
+        if consumiu_limite:
+            tenant.estornar_limite("peis")
         logger.exception("Erro ao salvar planejamento", extra={"student_id": request.student_id})
         raise HTTPException(status_code=500, detail="Erro ao salvar planejamento. Tente novamente mais tarde.")
 
@@ -599,6 +769,45 @@ async def obter_job_detalhado(
     }
 
 
+@router.get("/planejamento-completo/job/{task_id}/logs")
+async def listar_logs_job(
+    task_id: str,
+    pagination: CursorPaginationParams = Depends(),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Logs completos de um job (mais recentes primeiro), paginados por cursor.
+    O detalhe do job (/job/{task_id}) traz so os 50 ultimos.
+
+    SEGURANCA: IDOR check via student_id do job.
+    """
+    from app.models.planejamento_job import PlanejamentoJob, PlanejamentoJobLog
+
+    job = db.query(PlanejamentoJob).filter(
+        PlanejamentoJob.task_id == task_id
+    ).first()
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+
+    verificar_acesso_aluno(db, job.student_id, current_user)
+
+    return keyset_response(
+        db.query(PlanejamentoJobLog).filter(PlanejamentoJobLog.job_id == job.id),
+        pagination,
+        keys=[PlanejamentoJobLog.created_at.desc(), PlanejamentoJobLog.id.desc()],
+        serializer=lambda log: {
+            "evento": log.evento,
+            "componente": log.componente,
+            "lote": log.lote,
+            "mensagem": log.mensagem,
+            "dados": log.dados,
+            "created_at": log.created_at.isoformat() if log.created_at else None
+        },
+    )
+
+
 @router.post("/planejamento-completo/retomar/{task_id}")
 async def retomar_job(
     task_id: str,
@@ -617,7 +826,8 @@ async def retomar_job(
     
     check_rate_limit(
         http_request, key="retomar_planejamento", max_requests=3, window_seconds=3600,
-        error_message="Limite de retomadas atingido. Aguarde 1 hora."
+        error_message="Limite de retomadas atingido. Aguarde 1 hora.",
+        user=current_user, max_per_escola=30, ai_tokens=TOKENS_PLANEJAMENTO_COMPLETO,
     )
     
     job = db.query(PlanejamentoJob).filter(
@@ -1194,7 +1404,8 @@ async def iniciar_geracao_planejamento_completo(
     """
     check_rate_limit(
         http_request, key="gerar_planejamento_completo", max_requests=2, window_seconds=3600,
-        error_message="Limite de planejamentos completos atingido (2/hora). Este processo gera centenas de objetivos e e muito caro. Aguarde 1 hora."
+        error_message="Limite de planejamentos completos atingido (2/hora). Este processo gera centenas de objetivos e e muito caro. Aguarde 1 hora.",
+        user=current_user, max_per_escola=20, ai_tokens=TOKENS_PLANEJAMENTO_COMPLETO,
     )
     
     verificar_acesso_aluno(db, request.student_id, current_user)
@@ -1214,7 +1425,8 @@ async def iniciar_geracao_planejamento_completo(
                 ano_letivo=request.ano_letivo,
                 componentes=request.componentes,
                 task_id=task_id,
-                task_manager=task_manager
+                task_manager=task_manager,
+                personalizar=request.personalizar
             )
             return resultado
         finally:
@@ -1251,7 +1463,8 @@ async def gerar_planejamento_completo_sincrono(
     """
     check_rate_limit(
         http_request, key="gerar_planejamento_completo", max_requests=2, window_seconds=3600,
-        error_message="Limite de planejamentos completos atingido (2/hora). Aguarde 1 hora."
+        error_message="Limite de planejamentos completos atingido (2/hora). Aguarde 1 hora.",
+        user=current_user, max_per_escola=20, ai_tokens=TOKENS_PLANEJAMENTO_COMPLETO,
     )
     
     verificar_acesso_aluno(db, request.student_id, current_user)
@@ -1262,7 +1475,8 @@ async def gerar_planejamento_completo_sincrono(
         resultado = await service.gerar_planejamento_completo(
             student_id=request.student_id,
             ano_letivo=request.ano_letivo,
-            componentes=request.componentes
+            componentes=request.componentes,
+            personalizar=request.personalizar
         )
         
         return resultado
@@ -1278,7 +1492,8 @@ async def gerar_planejamento_completo_sincrono(
 async def salvar_planejamento_completo(
     request: SalvarPlanejamentoRequest,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    tenant: TenantContext = Depends(get_tenant_context)
 ):
     """
     Salva o planejamento COMPLETO como PEI no banco de dados.
@@ -1289,6 +1504,8 @@ async def salvar_planejamento_completo(
     verificar_acesso_aluno(db, request.student_id, current_user)
     
     service = PlanejamentoBNNCCompletoService(db)
+    # Limite mensal do plano (devolvido se o salvamento falhar)
+    consumiu_limite = consumir_limite_mensal(tenant, "peis")
     
     try:
         pei = service.salvar_planejamento_completo(
@@ -1302,12 +1519,16 @@ async def salvar_planejamento_completo(
             "success": True,
             "pei_id": pei.id,
             "message": "Planejamento completo salvo com sucesso",
-            "total_objetivos": len(pei.objetivos)
+            "total_objetivos": db.query(PEIObjetivo).filter(PEIObjetivo.pei_id == pei.id).count()
         }
         
     except HTTPException:
+        if consumiu_limite:
+            tenant.estornar_limite("peis")
         raise
     except Exception:
         db.rollback()
+        if consumiu_limite:
+            tenant.estornar_limite("peis")
         logger.exception("Erro ao salvar planejamento completo", extra={"student_id": request.student_id})
         raise HTTPException(status_code=500, detail="Erro ao salvar planejamento. Tente novamente mais tarde.")
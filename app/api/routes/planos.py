@@ -1,7 +1,7 @@
 # ============================================
 # ROTAS DE PLANOS E ASSINATURAS - Multi-tenant
 # ============================================
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from typing import List, Optional
@@ -15,6 +15,7 @@ from app.models.plano import Plano
 from app.models.escola import Escola, ConfiguracaoEscola
 from app.models.assinatura import Assinatura, Fatura, StatusAssinatura, StatusFatura
 from app.core.tenant import get_tenant_context, TenantContext
+from app.core.http_cache import CACHE_PUBLICO, resposta_condicional
 
 router = APIRouter(prefix="/planos", tags=["💳 Planos e Assinaturas"])
 
@@ -309,20 +310,23 @@ def seed_planos(db: Session = Depends(get_db)):
 # ============================================
 
 @router.get("/publicos", response_model=List[PlanoResponse])
-def listar_planos_publicos(db: Session = Depends(get_db)):
+def listar_planos_publicos(request: Request, db: Session = Depends(get_db)):
     """
     📋 Lista todos os planos disponíveis (público).
     Usado na página de preços do site.
+
+    Cacheavel por CDN/navegador (ETag do corpo + Cache-Control publico).
     """
     planos = db.query(Plano).filter(
         Plano.ativo == True
     ).order_by(Plano.ordem).all()
     
-    return planos
+    payload = [PlanoResponse.model_validate(p).model_dump(mode="json") for p in planos]
+    return resposta_condicional(request, payload, CACHE_PUBLICO)
 
 
 @router.get("/publicos/{slug}", response_model=PlanoResponse)
-def obter_plano_por_slug(slug: str, db: Session = Depends(get_db)):
+def obter_plano_por_slug(slug: str, request: Request, db: Session = Depends(get_db)):
     """
     📦 Obtém detalhes de um plano pelo slug.
     """
@@ -337,7 +341,9 @@ def obter_plano_por_slug(slug: str, db: Session = Depends(get_db)):
             detail="Plano não encontrado"
         )
     
-    return plano
+    return resposta_condicional(
+        request, PlanoResponse.model_validate(plano).model_dump(mode="json"), CACHE_PUBLICO
+    )
 
 
 # ============================================
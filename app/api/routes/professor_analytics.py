@@ -4,15 +4,17 @@ Endpoints para professores visualizarem o rendimento dos alunos nas provas
 """
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy import case, func, and_, select
 from typing import List, Dict, Any
-from datetime import datetime
 
 from app.database import get_db
 from app.models.user import User
 from app.models.student import Student
 from app.models.prova import Prova, ProvaAluno, QuestaoGerada, RespostaAluno, StatusProvaAluno
 from app.api.dependencies import get_current_active_user
+from app.core.pagination import PaginationParams, build_page
+from app.core.responses import FastJSONResponse
+from app.services.performance_rollup import resumo_aluno, totais_por_aluno
 
 router = APIRouter(prefix="/professor/analytics", tags=["Professor - Analytics"])
 
@@ -25,69 +27,44 @@ def dashboard_professor(
     """
     Dashboard geral do professor com estatísticas de todas as provas
     """
-    # Total de provas criadas
-    total_provas = db.query(func.count(Prova.id)).filter(
+    # Todos os contadores em UMA query: agregados condicionais sobre
+    # ProvaAluno JOIN Prova + subqueries escalares para provas/alunos.
+    # Antes eram 9 COUNT/AVG separados sobre o mesmo join (9 round-trips).
+    # Cobertura: idx_provas_criado_por + idx_provas_alunos_prova_status_nota.
+    concluida = ProvaAluno.status.in_([StatusProvaAluno.CONCLUIDA, StatusProvaAluno.CORRIGIDA])
+    total_provas_sq = select(func.count(Prova.id)).where(
         Prova.criado_por_id == current_user.id
-    ).scalar()
-    
-    # Total de alunos
-    total_alunos = db.query(func.count(Student.id)).filter(
+    ).scalar_subquery()
+    total_alunos_sq = select(func.count(Student.id)).where(
         Student.created_by_user_id == current_user.id
-    ).scalar()
-    
-    # Total de provas atribuídas
-    total_provas_atribuidas = db.query(func.count(ProvaAluno.id)).join(
-        Prova
+    ).scalar_subquery()
+    
+    stats = db.query(
+        total_provas_sq.label("total_provas"),
+        total_alunos_sq.label("total_alunos"),
+        func.count(ProvaAluno.id).label("atribuidas"),
+        func.sum(case((concluida, 1), else_=0)).label("concluidas"),
+        func.sum(case((ProvaAluno.status == StatusProvaAluno.EM_ANDAMENTO, 1), else_=0)).label("andamento"),
+        func.sum(case((ProvaAluno.status == StatusProvaAluno.PENDENTE, 1), else_=0)).label("pendentes"),
+        # AVG/COUNT de coluna ignoram NULL = "com nota"
+        func.avg(ProvaAluno.nota_final).label("media"),
+        func.count(ProvaAluno.nota_final).label("com_nota"),
+        func.sum(case((ProvaAluno.aprovado == True, 1), else_=0)).label("aprovados"),
+    ).select_from(ProvaAluno).join(
+        Prova, ProvaAluno.prova_id == Prova.id
     ).filter(
         Prova.criado_por_id == current_user.id
-    ).scalar()
-    
-    # Provas concluídas
-    provas_concluidas = db.query(func.count(ProvaAluno.id)).join(
-        Prova
-    ).filter(
-        Prova.criado_por_id == current_user.id,
-        ProvaAluno.status.in_([StatusProvaAluno.CONCLUIDA, StatusProvaAluno.CORRIGIDA])
-    ).scalar()
-    
-    # Provas em andamento
-    provas_andamento = db.query(func.count(ProvaAluno.id)).join(
-        Prova
-    ).filter(
-        Prova.criado_por_id == current_user.id,
-        ProvaAluno.status == StatusProvaAluno.EM_ANDAMENTO
-    ).scalar()
-    
-    # Provas pendentes
-    provas_pendentes = db.query(func.count(ProvaAluno.id)).join(
-        Prova
-    ).filter(
-        Prova.criado_por_id == current_user.id,
-        ProvaAluno.status == StatusProvaAluno.PENDENTE
-    ).scalar()
-    
-    # Média geral de notas
-    media_geral = db.query(func.avg(ProvaAluno.nota_final)).join(
-        Prova
-    ).filter(
-        Prova.criado_por_id == current_user.id,
-        ProvaAluno.nota_final.isnot(None)
-    ).scalar()
-    
-    # Taxa de aprovação
-    total_com_nota = db.query(func.count(ProvaAluno.id)).join(
-        Prova
-    ).filter(
-        Prova.criado_por_id == current_user.id,
-        ProvaAluno.nota_final.isnot(None)
-    ).scalar()
-    
-    aprovados = db.query(func.count(ProvaAluno.id)).join(
-        Prova
-    ).filter(
-        Prova.criado_por_id == current_user.id,
-        ProvaAluno.aprovado == True
-    ).scalar()
+    ).one()
+    
+    total_provas = stats.total_provas or 0
+    total_alunos = stats.total_alunos or 0
+    total_provas_atribuidas = stats.atribuidas or 0
+    provas_concluidas = int(stats.concluidas or 0)
+    provas_andamento = int(stats.andamento or 0)
+    provas_pendentes = int(stats.pendentes or 0)
+    media_geral = stats.media
+    total_com_nota = stats.com_nota or 0
+    aprovados = int(stats.aprovados or 0)
     
     taxa_aprovacao = (aprovados / total_com_nota * 100) if total_com_nota > 0 else 0
     
@@ -129,62 +106,121 @@ def dashboard_professor(
 
 @router.get("/alunos/lista")
 def listar_alunos_com_rendimento(
+    pagination: PaginationParams = Depends(),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
-    Lista todos os alunos do professor com estatísticas de rendimento
+    Lista os alunos do professor com estatísticas de rendimento, paginado.
+    
+    Retorna:
+    {
+        "items": [...alunos com total_provas, media_geral, ultima_prova...],
+        "meta": {"page": 1, "size": 20, "total": 120, "total_pages": 6, ...}
+    }
+    
+    IMPORTANTE: Endpoint mudou para formato paginado. Frontend antigo que espera
+    array puro precisa acessar response.items ao inves de response direto.
     """
-    alunos = db.query(Student).filter(
-        Student.created_by_user_id == current_user.id
+    # Uma query por pagina (antes: 1 + 2 por aluno - ProvaAluno do aluno e
+    # lazy-load de prova.titulo da ultima). Agregados por aluno via GROUP BY,
+    # ultima prova concluida via ROW_NUMBER() e total de alunos via
+    # COUNT(*) OVER () na mesma ida ao banco.
+    concluida = ProvaAluno.status.in_([StatusProvaAluno.CONCLUIDA, StatusProvaAluno.CORRIGIDA])
+    
+    agregados = select(
+        ProvaAluno.aluno_id.label("aluno_id"),
+        func.count(ProvaAluno.id).label("total"),
+        func.sum(case((concluida, 1), else_=0)).label("concluidas"),
+        func.sum(case((ProvaAluno.status == StatusProvaAluno.PENDENTE, 1), else_=0)).label("pendentes"),
+        func.sum(case((ProvaAluno.status == StatusProvaAluno.EM_ANDAMENTO, 1), else_=0)).label("andamento"),
+        # AVG ignora NULL = media so das provas com nota
+        func.avg(ProvaAluno.nota_final).label("media"),
+    ).join(
+        Prova, ProvaAluno.prova_id == Prova.id
+    ).where(
+        Prova.criado_por_id == current_user.id
+    ).group_by(ProvaAluno.aluno_id).subquery()
+    
+    # data_conclusao NULL fica por ultimo no DESC (MySQL e SQLite), como o
+    # antigo max(..., key=data_conclusao or datetime.min)
+    ultimas = select(
+        ProvaAluno.aluno_id.label("aluno_id"),
+        ProvaAluno.id.label("id"),
+        Prova.titulo.label("titulo"),
+        ProvaAluno.nota_final.label("nota"),
+        ProvaAluno.data_conclusao.label("data"),
+        func.row_number().over(
+            partition_by=ProvaAluno.aluno_id,
+            order_by=(ProvaAluno.data_conclusao.desc(), ProvaAluno.id.desc()),
+        ).label("ordem"),
+    ).join(
+        Prova, ProvaAluno.prova_id == Prova.id
+    ).where(
+        Prova.criado_por_id == current_user.id,
+        concluida,
+    ).subquery()
+    
+    linhas = db.execute(
+        select(
+            Student.id,
+            Student.name,
+            Student.email,
+            Student.grade_level,
+            agregados.c.total,
+            agregados.c.concluidas,
+            agregados.c.pendentes,
+            agregados.c.andamento,
+            agregados.c.media,
+            ultimas.c.id.label("ultima_id"),
+            ultimas.c.titulo.label("ultima_titulo"),
+            ultimas.c.nota.label("ultima_nota"),
+            ultimas.c.data.label("ultima_data"),
+            func.count().over().label("total_alunos"),
+        ).outerjoin(
+            agregados, agregados.c.aluno_id == Student.id
+        ).outerjoin(
+            ultimas, and_(ultimas.c.aluno_id == Student.id, ultimas.c.ordem == 1)
+        ).where(
+            Student.created_by_user_id == current_user.id
+        ).order_by(
+            Student.name, Student.id
+        ).offset(pagination.offset).limit(pagination.limit)
     ).all()
     
-    resultado = []
+    if linhas:
+        total = linhas[0].total_alunos
+    else:
+        # Pagina alem do fim: o total nao veio na janela, conta a parte
+        total = db.query(func.count(Student.id)).filter(
+            Student.created_by_user_id == current_user.id
+        ).scalar() or 0
     
-    for aluno in alunos:
-        # Buscar todas as provas do aluno
-        provas_aluno = db.query(ProvaAluno).join(
-            Prova
-        ).filter(
-            ProvaAluno.aluno_id == aluno.id,
-            Prova.criado_por_id == current_user.id
-        ).all()
-        
-        total_provas = len(provas_aluno)
-        provas_concluidas = len([p for p in provas_aluno if p.status in [StatusProvaAluno.CONCLUIDA, StatusProvaAluno.CORRIGIDA]])
-        provas_pendentes = len([p for p in provas_aluno if p.status == StatusProvaAluno.PENDENTE])
-        provas_andamento = len([p for p in provas_aluno if p.status == StatusProvaAluno.EM_ANDAMENTO])
-        
-        # Calcular média de notas
-        notas = [p.nota_final for p in provas_aluno if p.nota_final is not None]
-        media_notas = sum(notas) / len(notas) if notas else 0
-        
-        # Última prova realizada
+    items = []
+    for linha in linhas:
         ultima_prova = None
-        if provas_concluidas > 0:
-            ultima = max([p for p in provas_aluno if p.status in [StatusProvaAluno.CONCLUIDA, StatusProvaAluno.CORRIGIDA]], 
-                        key=lambda x: x.data_conclusao if x.data_conclusao else datetime.min)
+        if linha.ultima_id is not None:
             ultima_prova = {
-                "id": ultima.id,
-                "prova_titulo": ultima.prova.titulo,
-                "nota": round(ultima.nota_final, 2) if ultima.nota_final else 0,
-                "data": ultima.data_conclusao.isoformat() if ultima.data_conclusao else None
+                "id": linha.ultima_id,
+                "prova_titulo": linha.ultima_titulo,
+                "nota": round(linha.ultima_nota, 2) if linha.ultima_nota else 0,
+                "data": linha.ultima_data.isoformat() if linha.ultima_data else None
             }
         
-        resultado.append({
-            "aluno_id": aluno.id,
-            "aluno_nome": aluno.name,
-            "aluno_email": aluno.email,
-            "serie_nivel": aluno.grade_level,
-            "total_provas": total_provas,
-            "provas_concluidas": provas_concluidas,
-            "provas_pendentes": provas_pendentes,
-            "provas_em_andamento": provas_andamento,
-            "media_geral": round(media_notas, 2),
+        items.append({
+            "aluno_id": linha.id,
+            "aluno_nome": linha.name,
+            "aluno_email": linha.email,
+            "serie_nivel": linha.grade_level,
+            "total_provas": linha.total or 0,
+            "provas_concluidas": int(linha.concluidas or 0),
+            "provas_pendentes": int(linha.pendentes or 0),
+            "provas_em_andamento": int(linha.andamento or 0),
+            "media_geral": round(linha.media, 2) if linha.media else 0,
             "ultima_prova": ultima_prova
         })
     
-    return resultado
+    return build_page(items=items, total=total, pagination=pagination)
 
 
 @router.get("/aluno/{aluno_id}/provas")
@@ -315,7 +351,7 @@ def rendimento_detalhado_aluno(
         "reprovacoes": len([p for p in provas_concluidas if not p.aprovado])
     }
     
-    return {
+    return FastJSONResponse({
         "aluno": {
             "id": aluno.id,
             "nome": aluno.name,
@@ -325,6 +361,34 @@ def rendimento_detalhado_aluno(
         },
         "estatisticas": estatisticas,
         "provas": provas_detalhes
+    })
+
+
+@router.get("/aluno/{aluno_id}/resumo")
+def resumo_desempenho_aluno(
+    aluno_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Desempenho do aluno nas avaliações do professor (provas e aplicações):
+    geral, por matéria e por habilidade, lido do rollup pré-calculado.
+    """
+    aluno = db.query(Student).filter(
+        Student.id == aluno_id,
+        Student.created_by_user_id == current_user.id
+    ).first()
+    
+    if not aluno:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Aluno não encontrado"
+        )
+    
+    return {
+        "aluno_id": aluno.id,
+        "aluno_nome": aluno.name,
+        **resumo_aluno(db, aluno.id, professor_id=current_user.id)
     }
 
 
@@ -393,7 +457,7 @@ def detalhes_prova_realizada(
     acertos = len([r for r in respostas if r.esta_correta])
     erros = len([r for r in respostas if not r.esta_correta])
     
-    return {
+    return FastJSONResponse({
         "prova_aluno_id": pa.id,
         "prova": {
             "id": prova.id,
@@ -428,7 +492,7 @@ def detalhes_prova_realizada(
         "questoes": questoes_detalhes,
         "analise_ia": pa.analise_ia,
         "feedback_ia": pa.feedback_ia
-    }
+    })
 
 
 @router.get("/prova/{prova_id}/estatisticas")
@@ -523,40 +587,33 @@ def comparar_alunos(
             detail="Formato de IDs inválido. Use IDs separados por vírgula."
         )
     
+    # Duas queries para qualquer quantidade de ids: alunos do professor via
+    # IN e totais pre-calculados do rollup (app/services/performance_rollup.py),
+    # em vez de carregar as provas concluidas de cada aluno.
+    alunos = {
+        aluno.id: aluno for aluno in db.query(Student).filter(
+            Student.id.in_(ids),
+            Student.created_by_user_id == current_user.id
+        ).all()
+    }
+    totais = totais_por_aluno(db, current_user.id, list(alunos))
+    
     comparacoes = []
     
     for aluno_id in ids:
-        # Verificar se o aluno pertence ao professor
-        aluno = db.query(Student).filter(
-            Student.id == aluno_id,
-            Student.created_by_user_id == current_user.id
-        ).first()
-        
-        if not aluno:
-            continue
-        
-        # Buscar provas concluídas
-        provas_concluidas = db.query(ProvaAluno).join(
-            Prova
-        ).filter(
-            ProvaAluno.aluno_id == aluno_id,
-            Prova.criado_por_id == current_user.id,
-            ProvaAluno.status.in_([StatusProvaAluno.CONCLUIDA, StatusProvaAluno.CORRIGIDA])
-        ).all()
+        aluno = alunos.get(aluno_id)
+        total = totais.get(aluno_id)
         
-        if provas_concluidas:
-            notas = [p.nota_final for p in provas_concluidas if p.nota_final is not None]
-            media = sum(notas) / len(notas) if notas else 0
-            
+        if aluno and total and total["avaliacoes"]:
             comparacoes.append({
                 "aluno_id": aluno.id,
                 "aluno_nome": aluno.name,
-                "total_provas": len(provas_concluidas),
-                "media_geral": round(media, 2),
-                "nota_maxima": round(max(notas), 2) if notas else 0,
-                "nota_minima": round(min(notas), 2) if notas else 0,
-                "aprovacoes": len([p for p in provas_concluidas if p.aprovado]),
-                "reprovacoes": len([p for p in provas_concluidas if not p.aprovado])
+                "total_provas": total["avaliacoes"],
+                "media_geral": round(total["media"], 2),
+                "nota_maxima": round(total["nota_maxima"], 2) if total["nota_maxima"] else 0,
+                "nota_minima": round(total["nota_minima"], 2) if total["nota_minima"] else 0,
+                "aprovacoes": total["aprovacoes"],
+                "reprovacoes": total["reprovacoes"]
             })
     
     return {
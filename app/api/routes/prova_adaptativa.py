@@ -2,7 +2,7 @@
 Rotas para Provas Adaptativas (Reforço)
 Sistema de geração automática de provas focadas em pontos fracos
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
 from typing import Dict
 
@@ -11,15 +11,22 @@ from app.models.user import User
 from app.models.prova import ProvaAluno
 from app.models.analise_qualitativa import AnaliseQualitativa
 from app.api.dependencies import get_current_active_user
+from app.core.rate_limit import check_rate_limit
+from app.core.tenant import TenantContext, consumir_limite_mensal, get_tenant_context
 from app.services.prova_adaptativa_service import prova_adaptativa_service
 
 router = APIRouter(prefix="/prova-adaptativa", tags=["🎯 Prova Adaptativa (Reforço)"])
 
+# Orcamento de IA da escola (app/core/rate_limit.py): ate 4k de saida + prompt
+TOKENS_PROVA_REFORCO = 6_000
+
 
 @router.post("/gerar-reforco/{prova_aluno_id}")
 def gerar_prova_reforco_manual(
     prova_aluno_id: int,
+    request: Request,
     current_user: User = Depends(get_current_active_user),
+    tenant: TenantContext = Depends(get_tenant_context),
     db: Session = Depends(get_db)
 ) -> Dict:
     """
@@ -69,6 +76,14 @@ def gerar_prova_reforco_manual(
             detail="Não há conteúdos identificados para reforço. O aluno teve ótimo desempenho!"
         )
     
+    check_rate_limit(
+        request, key="gerar_prova_reforco", max_requests=30, window_seconds=3600,
+        error_message="Limite de provas de reforço atingido. Aguarde 1 hora.",
+        user=current_user, max_per_escola=300, ai_tokens=TOKENS_PROVA_REFORCO,
+    )
+    # Prova de reforco conta no limite mensal de provas do plano
+    consumiu_limite = consumir_limite_mensal(tenant, "provas")
+    
     try:
         # Gerar prova de reforço
         prova_reforco = prova_adaptativa_service.gerar_prova_reforco(
@@ -102,6 +117,8 @@ def gerar_prova_reforco_manual(
         }
         
     except Exception as e:
+        if consumiu_limite:
+            tenant.estornar_limite("provas")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao gerar prova de reforço: {str(e)}"
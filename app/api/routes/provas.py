@@ -4,7 +4,7 @@ Endpoints para gerenciamento de provas com IA
 
 ATUALIZADO: Aceita aluno_ids e adaptacoes para criar provas contextualizadas
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session, joinedload
 from typing import List
 from datetime import datetime, timezone
@@ -38,16 +38,25 @@ from app.schemas.prova import (
     QuestaoParaAluno
 )
 from app.services.prova_ai_service import prova_ai_service
+from app.services.performance_rollup import recalcular_aluno, registrar_prova
 from app.api.dependencies import get_current_user, oauth2_scheme, get_user_from_token
+from app.core.rate_limit import check_rate_limit
+from app.core.tenant import consumir_limite_mensal, get_tenant_context
 
 router = APIRouter(prefix="/provas")
 
+# Orcamento de IA da escola (app/core/rate_limit.py): tokens estimados de
+# cada operacao, debitados de RATE_LIMIT_AI_TOKENS_ESCOLA_HORA.
+TOKENS_GERAR_QUESTOES = 6_000       # ate 4k de saida + prompt
+TOKENS_ANALISE_PROVA = 8_000        # analise (4k) + feedback (1.5k) + prompts
+
 
 # ============= ENDPOINTS ADMIN =============
 
 @router.post("/gerar", response_model=ProvaResponse, status_code=status.HTTP_201_CREATED)
 async def gerar_prova_com_ia(
     request: GerarProvaRequest,
+    http_request: Request,
     token: str = Depends(oauth2_scheme)
 ):
     """
@@ -69,6 +78,19 @@ async def gerar_prova_com_ia(
     # Valida usuario e fecha conexao ANTES de chamar IA
     current_user = get_user_from_token(token)
     user_id = current_user.id
+    check_rate_limit(
+        http_request, key="gerar_prova", max_requests=20, window_seconds=3600,
+        error_message="Limite de geracao de provas atingido. Aguarde 1 hora.",
+        user=current_user, max_per_escola=200, ai_tokens=TOKENS_GERAR_QUESTOES,
+    )
+    
+    # Limite mensal do plano: consome antes da IA e devolve se a geracao falhar
+    db = SessionLocal()
+    try:
+        tenant = await get_tenant_context(current_user=current_user, db=db)
+        consumiu_limite = consumir_limite_mensal(tenant, "provas")
+    finally:
+        db.close()
     
     try:
         # PASSO 1: Gera questoes com IA (SEM conexao com banco)
@@ -190,6 +212,8 @@ Por favor, adapte as questões considerando:
         
     except Exception as e:
         print(f"[ERRO] Erro ao gerar prova: {e}")
+        if consumiu_limite:
+            tenant.estornar_limite("provas")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao gerar prova: {str(e)}"
@@ -428,6 +452,7 @@ def iniciar_prova(
 @router.post("/aluno/finalizar", response_model=CorrigirProvaResponse)
 async def finalizar_prova(
     request: FinalizarProvaRequest,
+    http_request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -455,9 +480,18 @@ async def finalizar_prova(
             detail="Prova já foi finalizada"
         )
     
+    # CORRIGIDA passa pelo check acima: ja somada no rollup, recalcular
+    ja_contabilizada = prova_aluno.status == StatusProvaAluno.CORRIGIDA
+    
     prova = prova_aluno.prova
     questoes = {q.id: q for q in prova.questoes}
     
+    if ja_contabilizada:
+        # Respostas da finalizacao anterior saem; senao o recalculo soma as duas
+        db.query(RespostaAluno).filter(
+            RespostaAluno.prova_aluno_id == prova_aluno.id
+        ).delete(synchronize_session=False)
+    
     # Salva respostas e corrige
     respostas_salvas = []
     acertos = 0
@@ -510,10 +544,20 @@ async def finalizar_prova(
     prova_aluno.aprovado = aprovado
     prova_aluno.tempo_gasto_minutos = tempo_gasto
     
+    # Rollup de desempenho na mesma transacao da nota
+    if ja_contabilizada:
+        recalcular_aluno(db, prova_aluno.aluno_id)
+    else:
+        registrar_prova(db, prova_aluno, prova, respostas_salvas)
+    
     db.commit()
     
-    # Gera análise com IA
+    # Gera análise com IA (fora do orcamento da escola: prova fica só corrigida)
     try:
+        check_rate_limit(
+            http_request, key="analise_prova", max_requests=60, window_seconds=3600,
+            user=current_user, ai_tokens=TOKENS_ANALISE_PROVA,
+        )
         aluno = prova_aluno.aluno
         questoes_lista = [
             {
@@ -2,7 +2,7 @@
 📝 AdaptAI - Rotas de Redação ENEM
 Endpoints para gerenciamento de redações com correção por IA
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from typing import List
@@ -29,9 +29,15 @@ from app.schemas.redacao import (
 from app.services.redacao_ai_service import redacao_ai_service
 from app.api.dependencies import get_current_user, oauth2_scheme, get_user_from_token, verificar_acesso_aluno
 from app.core.pagination import PaginationParams, build_page
+from app.core.rate_limit import check_rate_limit
 
 router = APIRouter(prefix="/redacoes", tags=["Redações ENEM"])
 
+# Orcamento de IA da escola (app/core/rate_limit.py): tokens estimados de
+# cada operacao, debitados de RATE_LIMIT_AI_TOKENS_ESCOLA_HORA.
+TOKENS_GERAR_TEMA = 3_000           # ate 2k de saida + prompt
+TOKENS_CORRECAO_ENEM = 6_000        # ate 3k de saida + prompt com a redacao
+
 
 # ============================================
 # ENDPOINTS DO PROFESSOR/ADMIN
@@ -40,6 +46,7 @@ router = APIRouter(prefix="/redacoes", tags=["Redações ENEM"])
 @router.post("/gerar-tema", response_model=TemaRedacaoResponse, status_code=status.HTTP_201_CREATED)
 async def gerar_tema_com_ia(
     request: GerarTemaRequest,
+    http_request: Request,
     token: str = Depends(oauth2_scheme)
 ):
     """
@@ -49,6 +56,11 @@ async def gerar_tema_com_ia(
     cria textos motivadores e a proposta completa.
     """
     current_user = get_user_from_token(token)
+    check_rate_limit(
+        http_request, key="gerar_tema_redacao", max_requests=20, window_seconds=3600,
+        error_message="Limite de geracao de temas atingido. Aguarde 1 hora.",
+        user=current_user, max_per_escola=100, ai_tokens=TOKENS_GERAR_TEMA,
+    )
     
     try:
         print(f"[GERANDO] Tema de redação com IA...")
@@ -417,6 +429,7 @@ def salvar_rascunho(
 @router.post("/aluno/submeter", response_model=CorrecaoENEMResponse)
 async def submeter_redacao(
     request: SubmeterRedacaoRequest,
+    http_request: Request,
     token: str = Depends(oauth2_scheme)
 ):
     """
@@ -426,6 +439,11 @@ async def submeter_redacao(
     e retorna nota de 0 a 1000 com feedback detalhado.
     """
     current_user = get_user_from_token(token)
+    check_rate_limit(
+        http_request, key="corrigir_redacao", max_requests=10, window_seconds=3600,
+        error_message="Limite de correcoes atingido. Aguarde 1 hora.",
+        user=current_user, max_per_escola=500, ai_tokens=TOKENS_CORRECAO_ENEM,
+    )
     
     db = SessionLocal()
     try:
@@ -9,7 +9,7 @@ INTEGRAÇÃO:
 - Cria eventos na Agenda do Professor automaticamente
 - Fornece sugestões para Materiais e Provas
 """
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query
+from fastapi import APIRouter, Depends, HTTPException, Request, status, UploadFile, File, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from typing import List, Optional
@@ -20,6 +20,7 @@ import uuid
 
 from app.database import get_db
 from app.api.dependencies import get_current_active_user
+from app.core.rate_limit import check_rate_limit
 from app.models.user import User
 from app.models.student import Student
 from app.models.registro_diario import RegistroDiario, AulaRegistrada
@@ -33,6 +34,10 @@ router = APIRouter(prefix="/registro-diario", tags=["📋 Registro Diário de Au
 UPLOAD_DIR = Path(__file__).parent.parent.parent.parent / "storage" / "registros_diarios"
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
+# Orcamento de IA da escola (app/core/rate_limit.py): documento inteiro no
+# prompt + ate 4k de saida.
+TOKENS_EXTRACAO_REGISTRO = 20_000
+
 
 def criar_eventos_agenda(
     db: Session,
@@ -104,6 +109,7 @@ def criar_eventos_agenda(
 
 @router.post("/importar")
 async def importar_relatorio(
+    request: Request,
     arquivo: UploadFile = File(..., description="PDF do relatório diário"),
     student_id: Optional[int] = Query(None, description="ID do aluno (opcional)"),
     usar_visao: bool = Query(False, description="Usar análise de imagem (para PDFs escaneados)"),
@@ -149,6 +155,12 @@ async def importar_relatorio(
                 detail="Aluno não encontrado ou não pertence a você"
             )
     
+    check_rate_limit(
+        request, key="importar_registro_diario", max_requests=30, window_seconds=3600,
+        error_message="Limite de importações atingido. Aguarde 1 hora.",
+        user=current_user, max_per_escola=300, ai_tokens=TOKENS_EXTRACAO_REGISTRO,
+    )
+    
     # Salvar arquivo
     file_id = str(uuid.uuid4())
     file_path = UPLOAD_DIR / f"{file_id}.pdf"
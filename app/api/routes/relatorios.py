@@ -2,7 +2,7 @@
 Rotas de Relatórios de Terapias e Acompanhamento
 VERSÃO COM PROCESSAMENTO ASSÍNCRONO - OTIMIZADO!
 """
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File, Form, BackgroundTasks
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import OperationalError
@@ -21,6 +21,8 @@ from app.core.config import settings
 from app.core.anthropic_client import get_anthropic_client, get_default_model
 from app.api.dependencies import get_current_active_user, verificar_acesso_aluno
 from app.core.pagination import PaginationParams, build_page
+from app.core.rate_limit import check_rate_limit
+from app.core.responses import FastJSONResponse
 from app.models.user import User
 from app.models.student import Student
 from app.models.relatorio import Relatorio
@@ -38,6 +40,11 @@ router = APIRouter(prefix="/relatorios", tags=["Relatórios de Terapias"])
 # Modelo para visao (controlado via settings.CLAUDE_MODEL com fallback)
 MODELO_VISAO = get_default_model()
 
+# Orcamento de IA da escola (app/core/rate_limit.py): o documento inteiro vai
+# no prompt de cada chamada.
+TOKENS_ANALISE_RELATORIO = 20_000               # uma chamada: documento + 4k de saida
+TOKENS_ANALISE_RELATORIO_INCREMENTAL = 60_000   # 4 etapas, cada uma com o documento
+
 # Diretorio para salvar relatorios
 RELATORIOS_DIR = Path(__file__).parent.parent.parent.parent / "storage" / "relatorios"
 RELATORIOS_DIR.mkdir(parents=True, exist_ok=True)
@@ -362,7 +369,7 @@ async def listar_relatorios(
     # Compat retroativa: manter 'total' e 'relatorios' no nivel raiz
     page["total"] = total
     page["relatorios"] = items
-    return page
+    return FastJSONResponse(page)
 
 
 @router.get("/{relatorio_id}/arquivo")
@@ -481,6 +488,7 @@ async def excluir_relatorio(
 @router.post("/upload-analisar")
 async def upload_e_analisar_relatorio(
     background_tasks: BackgroundTasks,
+    request: Request,
     arquivo: UploadFile = File(...),
     student_id: int = Form(...),
     db: Session = Depends(get_db),
@@ -541,6 +549,13 @@ async def upload_e_analisar_relatorio(
                     }
                 }
     
+    # Duplicata já retornou acima: só agora o upload gasta orçamento de IA
+    check_rate_limit(
+        request, key="analisar_relatorio", max_requests=30, window_seconds=3600,
+        error_message="Limite de análises de relatório atingido. Aguarde 1 hora.",
+        user=current_user, max_per_escola=300, ai_tokens=TOKENS_ANALISE_RELATORIO,
+    )
+    
     # Gerar nomes únicos com hash COMPLETO
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     file_extension = Path(arquivo.filename).suffix
@@ -649,6 +664,7 @@ async def _processar_relatorio_incremental_bg(
 @router.post("/upload-analisar-rapido")
 async def upload_e_analisar_rapido(
     background_tasks: BackgroundTasks,
+    request: Request,
     arquivo: UploadFile = File(...),
     student_id: int = Form(...),
     db: Session = Depends(get_db),
@@ -693,6 +709,13 @@ async def upload_e_analisar_rapido(
                 "relatorio_existente": {"id": rel.id, "arquivo_nome": rel.arquivo_nome}
             }
 
+    # Duplicata já retornou acima: só agora o upload gasta orçamento de IA
+    check_rate_limit(
+        request, key="analisar_relatorio", max_requests=30, window_seconds=3600,
+        error_message="Limite de análises de relatório atingido. Aguarde 1 hora.",
+        user=current_user, max_per_escola=300, ai_tokens=TOKENS_ANALISE_RELATORIO_INCREMENTAL,
+    )
+    
     # Salvar arquivo
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     file_extension = Path(arquivo.filename).suffix
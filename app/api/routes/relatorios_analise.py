@@ -2,7 +2,7 @@
 Análise Consolidada de Relatórios com IA
 Gera relatório temporal visual sobre a evolução do aluno
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any
 import json
@@ -12,6 +12,7 @@ from pathlib import Path
 from app.database import get_db
 from app.core.config import settings
 from app.api.dependencies import get_current_active_user
+from app.core.rate_limit import check_rate_limit
 from app.models.user import User
 from app.models.student import Student
 from app.models.relatorio import Relatorio
@@ -21,6 +22,11 @@ router = APIRouter(prefix="/relatorios", tags=["Relatórios - Análise Consolida
 # Diretório para salvar relatórios
 RELATORIOS_DIR = Path(__file__).parent.parent.parent.parent / "storage" / "relatorios"
 
+# Orcamento de IA da escola (app/core/rate_limit.py): ate 8k de saida + os
+# dados extraidos de cada relatorio no prompt.
+TOKENS_ANALISE_CONSOLIDADA = 8_000
+TOKENS_POR_RELATORIO = 2_000
+
 def get_anthropic_client():
     """Obtém cliente Anthropic"""
     try:
@@ -34,6 +40,7 @@ def get_anthropic_client():
 @router.get("/student/{student_id}/analise-consolidada")
 async def gerar_analise_consolidada(
     student_id: int,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
@@ -100,6 +107,13 @@ async def gerar_analise_consolidada(
             "erro": "Cliente IA não disponível"
         }
     
+    check_rate_limit(
+        request, key="analise_consolidada", max_requests=20, window_seconds=3600,
+        error_message="Limite de análises consolidadas atingido. Aguarde 1 hora.",
+        user=current_user, max_per_escola=100,
+        ai_tokens=TOKENS_ANALISE_CONSOLIDADA + len(relatorios_completos) * TOKENS_POR_RELATORIO,
+    )
+    
     # Preparar dados para IA
     dados_para_ia = json.dumps(relatorios_completos, ensure_ascii=False, indent=2)
     
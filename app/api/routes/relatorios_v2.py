@@ -4,7 +4,7 @@ ROTAS DE RELATÓRIOS - VERSÃO ULTRA-RÁPIDA v2.0
 • WebSockets para tempo real
 • Progress bar no frontend
 """
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, BackgroundTasks, WebSocket, WebSocketDisconnect, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File, Form, BackgroundTasks, WebSocket, WebSocketDisconnect, Query, status
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import OperationalError
@@ -20,6 +20,7 @@ import asyncio
 
 from app.database import get_db, SessionLocal
 from app.core.config import settings
+from app.core.rate_limit import check_rate_limit
 from app.api.dependencies import get_current_active_user
 from app.models.user import User
 from app.models.student import Student
@@ -37,10 +38,15 @@ from app.schemas.relatorio import (
 from app.services.relatorio_processor import processar_relatorio_com_progresso
 from app.services.websocket_manager import ws_manager
 from app.core.security import decode_access_token
+from app.core.responses import FastJSONResponse
 from app.models.user import UserRole
 
 router = APIRouter(prefix="/relatorios", tags=["Relatórios de Terapias"])
 
+# Orcamento de IA da escola (app/core/rate_limit.py): 4 extracoes em
+# paralelo, cada uma com o documento inteiro no prompt.
+TOKENS_ANALISE_RELATORIO = 60_000
+
 # Diretório para salvar relatórios
 RELATORIOS_DIR = Path(__file__).parent.parent.parent.parent / "storage" / "relatorios"
 RELATORIOS_DIR.mkdir(parents=True, exist_ok=True)
@@ -296,7 +302,7 @@ async def listar_relatorios(
         }
         result.append(rel_dict)
     
-    return {"total": total, "relatorios": result}
+    return FastJSONResponse({"total": total, "relatorios": result})
 
 
 @router.get("/{relatorio_id}/arquivo")
@@ -411,6 +417,7 @@ async def excluir_relatorio(
 @router.post("/upload-analisar")
 async def upload_e_analisar_relatorio(
     background_tasks: BackgroundTasks,
+    request: Request,
     arquivo: UploadFile = File(...),
     student_id: int = Form(...),
     db: Session = Depends(get_db),
@@ -440,6 +447,13 @@ async def upload_e_analisar_relatorio(
     if len(file_content) > 10 * 1024 * 1024:
         raise HTTPException(status_code=400, detail="Arquivo muito grande. Máximo: 10MB")
     
+    # Arquivo validado: só agora o upload gasta orçamento de IA
+    check_rate_limit(
+        request, key="analisar_relatorio", max_requests=30, window_seconds=3600,
+        error_message="Limite de análises de relatório atingido. Aguarde 1 hora.",
+        user=current_user, max_per_escola=300, ai_tokens=TOKENS_ANALISE_RELATORIO,
+    )
+    
     # Gerar nomes únicos
     file_hash = hashlib.md5(file_content).hexdigest()[:12]
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -2,7 +2,7 @@
 Rotas para Estudantes - Provas
 Endpoints para estudantes verem e fazerem suas provas
 """
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Request, status, BackgroundTasks
 from sqlalchemy.orm import Session
 from datetime import datetime, timezone
 from pydantic import BaseModel, Field
@@ -12,11 +12,17 @@ from app.models.student import Student
 from app.models.prova import ProvaAluno, Prova, QuestaoGerada, RespostaAluno, StatusProvaAluno
 from app.api.dependencies import get_current_student
 from app.core.logging_config import get_logger
+from app.core.rate_limit import check_rate_limit
+from app.services.performance_rollup import registrar_prova
 
 logger = get_logger(__name__)
 
 router = APIRouter(prefix="/student/provas", tags=["Student - Provas"])
 
+# Orcamento de IA da escola (app/core/rate_limit.py): analise qualitativa
+# (2k de saida) + prova de reforco (4k) + prompts.
+TOKENS_POS_PROVA = 9_000
+
 
 # NOTA: get_current_student agora vem de app.api.dependencies (C4 - centralizado).
 # Antes estava duplicado aqui. Mesma assinatura e comportamento.
@@ -36,11 +42,13 @@ class ResponderRequest(BaseModel):
 @router.get("/")
 def listar_minhas_provas(current_student: Student = Depends(get_current_student), db: Session = Depends(get_db)):
     """Listar todas as provas atribuídas ao estudante"""
-    provas_aluno = db.query(ProvaAluno).filter(ProvaAluno.aluno_id == current_student.id).all()
+    # JOIN em vez de uma query de Prova por ProvaAluno (N+1)
+    provas_aluno = db.query(ProvaAluno, Prova).join(
+        Prova, ProvaAluno.prova_id == Prova.id
+    ).filter(ProvaAluno.aluno_id == current_student.id).all()
     
     resultado = []
-    for pa in provas_aluno:
-        prova = db.query(Prova).filter(Prova.id == pa.prova_id).first()
+    for pa, prova in provas_aluno:
         resultado.append({
             "prova_aluno_id": pa.id,
             "prova_id": prova.id,
@@ -196,6 +204,7 @@ async def responder(
 async def finalizar(
     prova_aluno_id: int,
     background_tasks: BackgroundTasks,
+    request: Request,
     current_student: Student = Depends(get_current_student),
     db: Session = Depends(get_db)
 ):
@@ -259,6 +268,8 @@ async def finalizar(
     prova_aluno.nota_final = nota_final
     prova_aluno.aprovado = aprovado
     prova_aluno.tempo_gasto_minutos = tempo_gasto
+    # Rollup de desempenho na mesma transacao da nota
+    registrar_prova(db, prova_aluno, prova, respostas)
     db.commit()
     db.refresh(prova_aluno)
 
@@ -270,16 +281,34 @@ async def finalizar(
     # (sem risco de garbage collection). A funcao agora e sincrona para
     # nao bloquear o event loop chamando SDK sincrono do Anthropic de
     # dentro de uma task async.
-    background_tasks.add_task(processar_pos_prova, prova_aluno_id)
+    # A nota ja esta salva: sem orcamento de IA da escola, so pula a automacao.
+    # Chave propria - o balde "user:{id}" aqui e do aluno, nao de um User.
+    try:
+        check_rate_limit(
+            request, key="pos_prova_aluno", max_requests=20, window_seconds=3600,
+            user=current_student, ai_tokens=TOKENS_POS_PROVA,
+        )
+    except HTTPException:
+        logger.warning(
+            "analise pos-prova nao agendada (limite de IA)",
+            extra={"prova_aluno_id": prova_aluno_id, "aluno_id": current_student.id},
+        )
+        processando_ia = False
+    else:
+        background_tasks.add_task(processar_pos_prova, prova_aluno_id)
+        processando_ia = True
 
     return {
-        "message": "Prova finalizada! Gerando analise e prova de reforco automaticamente...",
+        "message": (
+            "Prova finalizada! Gerando analise e prova de reforco automaticamente..."
+            if processando_ia else "Prova finalizada!"
+        ),
         "nota_final": round(nota_final, 2),
         "aprovado": aprovado,
         "acertos": acertos,
         "total_questoes": len(respostas),
         "percentual": percentual,
-        "processando_ia": True
+        "processando_ia": processando_ia
     }
 
 
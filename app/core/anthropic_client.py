@@ -35,12 +35,20 @@ Para tarefas rapidas/baratas (classificacao, extracao simples), use o modelo rap
     from app.core.anthropic_client import get_fast_model
     client.messages.create(model=get_fast_model(), ...)
 
+Para chamadas em paralelo a partir de codigo async (sem bloquear o event
+loop e respeitando o limite global settings.AI_MAX_CONCORRENCIA), use:
+
+    from app.core.anthropic_client import chamar_ia
+    response = await chamar_ia(client.messages.create, model=..., messages=[...])
+
 Para cache automatico (ECONOMIA DE CREDITOS), use:
 
     from app.services.ai_cache_service import cached_completion
     text = cached_completion(prompt="...", cache_type="mapa_mental")
 """
-from typing import Optional
+import asyncio
+import weakref
+from typing import Any, Callable, Optional
 from threading import Lock
 from app.core.config import settings
 
@@ -106,3 +114,33 @@ def get_fast_model() -> str:
     Nao e sobrescrito por config - sempre usa Haiku por ser o mais rapido.
     """
     return "claude-3-haiku-20240307"
+
+
+# ============================================
+# Governador de concorrencia
+# ============================================
+# O SDK e sincrono: cada chamada vai para uma thread (asyncio.to_thread) e
+# no maximo AI_MAX_CONCORRENCIA rodam ao mesmo tempo. O semaforo e por
+# event loop (asyncio.Semaphore nao pode ser compartilhado entre loops).
+_semaforos: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _semaforo_ia() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaforo = _semaforos.get(loop)
+    if semaforo is None:
+        semaforo = asyncio.Semaphore(max(1, settings.AI_MAX_CONCORRENCIA))
+        _semaforos[loop] = semaforo
+    return semaforo
+
+
+async def chamar_ia(funcao: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Executa uma chamada sincrona ao SDK (ex.: client.messages.create) numa
+    thread, sem bloquear o event loop. Chamadas alem do limite esperam a
+    vez - use com asyncio.gather para paralelizar com seguranca.
+    """
+    async with _semaforo_ia():
+        return await asyncio.to_thread(funcao, *args, **kwargs)
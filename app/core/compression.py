@@ -0,0 +1,343 @@
+"""
+Compressao de respostas HTTP (brotli/gzip).
+
+MOTIVACAO: materiais gerados, PEIs completos e listagens BNCC sao JSON/HTML
+de dezenas a centenas de KB, altamente repetitivos (chaves JSON, tags HTML),
+e iam sem compressao para navegadores em redes moveis de escola. gzip reduz
+esses payloads em 80-90%.
+
+Tres pecas:
+
+    1. CompressionMiddleware (ASGI puro, mesmo padrao de
+       app/core/security_headers.py): comprime respostas dinamicas acima de
+       `minimum_size` cujo Content-Type esta na allowlist. Prefere br quando
+       o modulo `brotli` esta instalado e o cliente aceita; senao gzip.
+       Nao mexe em WebSocket (scope != http), SSE (text/event-stream precisa
+       de flush por evento), HEAD, nem em respostas que ja tem
+       Content-Encoding.
+
+    2. PrecompressedStaticFiles: StaticFiles que serve o irmao `.gz` de um
+       arquivo (ex: 123.html.gz) quando o cliente aceita gzip, sem comprimir
+       nada por request.
+
+    3. gravar_gz_irmao / remover_gz_irmao: usados pelo storage de materiais
+       para criar/remover o `.gz` junto com o arquivo original.
+"""
+from __future__ import annotations
+
+import gzip
+import os
+import stat
+import zlib
+from mimetypes import guess_type
+from pathlib import Path
+from typing import Optional, Union
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.logging_config import get_logger
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependencia opcional
+    brotli = None
+
+logger = get_logger(__name__)
+
+
+# Tipos textuais que valem a pena comprimir. Imagens/PDF/zip ja sao
+# comprimidos - gastar CPU neles so aumenta latencia.
+TIPOS_COMPRIMIVEIS = frozenset({
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/css",
+    "text/csv",
+    "text/html",
+    "text/javascript",
+    "text/plain",
+    "text/xml",
+})
+
+# Abaixo disso o overhead de header gzip (~20 bytes) + CPU nao compensa
+MINIMUM_SIZE_PADRAO = 1024
+
+# Nivel 6 = default do zlib: ~95% da reducao do nivel 9 com metade da CPU.
+# Brotli 4 tem custo parecido com gzip 6 e comprime ~15% melhor.
+GZIP_LEVEL_PADRAO = 6
+BROTLI_QUALITY_PADRAO = 4
+
+
+def _media_type(content_type: str) -> str:
+    return content_type.split(";", 1)[0].strip().lower()
+
+
+def aceita_encoding(accept_encoding: str, encoding: str) -> bool:
+    """True se o header Accept-Encoding aceita `encoding` (q > 0 ou *)."""
+    for parte in accept_encoding.split(","):
+        token, _, params = parte.strip().partition(";")
+        token = token.strip().lower()
+        if token not in (encoding, "*"):
+            continue
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+# ============================================
+# Compressores incrementais (mesma interface para gzip e br)
+# ============================================
+
+class _GzipCompressor:
+    def __init__(self, level: int):
+        # wbits=31 -> formato gzip (header + crc), nao deflate cru
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def comprimir(self, data: bytes, flush: bool = False) -> bytes:
+        out = self._obj.compress(data)
+        if flush:
+            # Sync flush: o cliente consegue descomprimir o que ja chegou
+            out += self._obj.flush(zlib.Z_SYNC_FLUSH)
+        return out
+
+    def finalizar(self) -> bytes:
+        return self._obj.flush(zlib.Z_FINISH)
+
+
+class _BrotliCompressor:
+    def __init__(self, quality: int):
+        self._obj = brotli.Compressor(quality=quality)
+
+    def comprimir(self, data: bytes, flush: bool = False) -> bytes:
+        out = self._obj.process(data)
+        if flush:
+            out += self._obj.flush()
+        return out
+
+    def finalizar(self) -> bytes:
+        return self._obj.finish()
+
+
+# ============================================
+# Middleware
+# ============================================
+
+class CompressionMiddleware:
+    """
+    Comprime respostas textuais grandes conforme Accept-Encoding.
+
+    Resposta de corpo unico (caso comum: JSONResponse) e comprimida inteira
+    e ganha Content-Length correto. Resposta em streaming (FileResponse,
+    StreamingResponse) e comprimida chunk a chunk, sem Content-Length.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = MINIMUM_SIZE_PADRAO,
+        gzip_level: int = GZIP_LEVEL_PADRAO,
+        brotli_quality: int = BROTLI_QUALITY_PADRAO,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _negociar(self, scope: Scope) -> Optional[str]:
+        accept = Headers(scope=scope).get("accept-encoding", "")
+        if not accept:
+            return None
+        if brotli is not None and aceita_encoding(accept, "br"):
+            return "br"
+        if aceita_encoding(accept, "gzip"):
+            return "gzip"
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # WebSocket/lifespan passam direto; HEAD nao tem corpo para comprimir
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self._negociar(scope)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    """Estado de uma resposta: segura o http.response.start ate ver o corpo."""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self.start_message: Optional[Message] = None
+        self.compressor: Optional[Union[_GzipCompressor, _BrotliCompressor]] = None
+        self.passthrough = False
+
+    def _novo_compressor(self):
+        if self.encoding == "br":
+            return _BrotliCompressor(self.middleware.brotli_quality)
+        return _GzipCompressor(self.middleware.gzip_level)
+
+    def _comprimivel(self, headers: Headers) -> bool:
+        if "content-encoding" in headers:
+            return False
+        media_type = _media_type(headers.get("content-type", ""))
+        # text/event-stream fica de fora da allowlist de proposito (SSE)
+        return media_type in TIPOS_COMPRIMIVEIS
+
+    def _marcar_headers(self, headers: MutableHeaders) -> None:
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+
+    async def send(self, message: Message) -> None:
+        tipo = message["type"]
+
+        if tipo == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            self.passthrough = not self._comprimivel(headers)
+            if self.passthrough:
+                await self._send(message)
+            return
+
+        if tipo != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            # Primeiro chunk do corpo: decide entre corpo unico e streaming
+            headers = MutableHeaders(raw=self.start_message["headers"])
+
+            if not more_body:
+                if len(body) < self.middleware.minimum_size:
+                    self.passthrough = True
+                    await self._send(self.start_message)
+                    await self._send(message)
+                    return
+                compressor = self._novo_compressor()
+                comprimido = compressor.comprimir(body) + compressor.finalizar()
+                self._marcar_headers(headers)
+                headers["Content-Length"] = str(len(comprimido))
+                await self._send(self.start_message)
+                await self._send({"type": "http.response.body", "body": comprimido})
+                return
+
+            # Streaming: tamanho final desconhecido
+            self.compressor = self._novo_compressor()
+            self._marcar_headers(headers)
+            if "content-length" in headers:
+                del headers["Content-Length"]
+            await self._send(self.start_message)
+
+        if more_body:
+            data = self.compressor.comprimir(body, flush=True)
+        else:
+            data = self.compressor.comprimir(body) + self.compressor.finalizar()
+        await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+
+# ============================================
+# Estaticos pre-comprimidos
+# ============================================
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles que prefere o irmao `<arquivo>.gz` quando o cliente aceita
+    gzip. O .gz e servido com o Content-Type do original e
+    Content-Encoding: gzip; o CompressionMiddleware ve o Content-Encoding e
+    nao comprime de novo.
+
+    Se o .gz nao existe (arquivos antigos) ou esta mais velho que o
+    original, serve o original normalmente.
+    """
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if scope["method"] in ("GET", "HEAD") and not path.endswith(".gz"):
+            accept = Headers(scope=scope).get("accept-encoding", "")
+            if aceita_encoding(accept, "gzip"):
+                response = await self._resposta_gz(path, scope)
+                if response is not None:
+                    return response
+
+        response = await super().get_response(path, scope)
+        if isinstance(response, FileResponse) and (
+            _media_type(response.media_type or "") in TIPOS_COMPRIMIVEIS
+        ):
+            # Mesma URL pode vir comprimida ou nao - caches precisam saber
+            response.headers.add_vary_header("Accept-Encoding")
+        return response
+
+    async def _resposta_gz(self, path: str, scope: Scope) -> Optional[Response]:
+        try:
+            full_path, stat_original = await anyio.to_thread.run_sync(self.lookup_path, path)
+            if not stat_original or not stat.S_ISREG(stat_original.st_mode):
+                return None
+            gz_path, stat_gz = await anyio.to_thread.run_sync(self.lookup_path, path + ".gz")
+        except OSError:
+            return None
+        if not stat_gz or not stat.S_ISREG(stat_gz.st_mode):
+            return None
+        if stat_gz.st_mtime < stat_original.st_mtime:
+            # Original reescrito sem regravar o .gz - nao servir conteudo velho
+            return None
+
+        response = FileResponse(
+            gz_path,
+            stat_result=stat_gz,
+            method=scope["method"],
+            media_type=guess_type(full_path)[0] or "text/plain",
+        )
+        response.headers["Content-Encoding"] = "gzip"
+        response.headers.add_vary_header("Accept-Encoding")
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def gravar_gz_irmao(caminho: Union[str, Path], conteudo: bytes) -> None:
+    """
+    Grava `<caminho>.gz` com `conteudo` comprimido (nivel maximo - roda uma
+    vez por arquivo, fora do caminho quente). Escrita atomica via arquivo
+    temporario + rename para o StaticFiles nunca servir um .gz truncado.
+
+    Falha aqui nao deve quebrar o salvamento do material: o original ja foi
+    gravado e o middleware comprime sob demanda.
+    """
+    destino = Path(f"{caminho}.gz")
+    tmp = destino.with_name(destino.name + ".tmp")
+    try:
+        tmp.write_bytes(gzip.compress(conteudo, compresslevel=9, mtime=0))
+        os.replace(tmp, destino)
+    except OSError:
+        logger.warning("falha ao gravar .gz pre-comprimido", extra={"path": str(destino)}, exc_info=True)
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+
+
+def remover_gz_irmao(caminho: Union[str, Path]) -> None:
+    """Remove `<caminho>.gz` se existir."""
+    try:
+        Path(f"{caminho}.gz").unlink()
+    except FileNotFoundError:
+        pass
@@ -118,6 +118,16 @@ class Settings(BaseSettings):
     # Claude API (Anthropic)
     ANTHROPIC_API_KEY: str = ""
     CLAUDE_MODEL: str = "claude-3-haiku-20240307"
+    # Maximo de chamadas simultaneas a IA por processo (ver
+    # app/core/anthropic_client.py::chamar_ia)
+    AI_MAX_CONCORRENCIA: int = 4
+    # Planejamento BNCC completo: reutilizar adaptacoes de alunos com o
+    # mesmo perfil canonico (ver app/services/adaptacoes_bncc.py)
+    BNCC_REUSO_ADAPTACOES: bool = True
+
+    # Rate limit - orcamento horario de tokens de IA por escola (todas as
+    # rotas de IA somadas). Ver app/core/rate_limit.py::check_rate_limit.
+    RATE_LIMIT_AI_TOKENS_ESCOLA_HORA: int = 2_000_000
 
     # CORS - Origens permitidas (separadas por vírgula)
     BACKEND_CORS_ORIGINS: str = "http://localhost:3000,http://localhost:5173,https://*.vercel.app"
@@ -0,0 +1,154 @@
+"""
+Cache HTTP (ETag / Last-Modified / Cache-Control) para endpoints de leitura.
+
+MOTIVACAO: catalogo BNCC (/planejamento/bncc/*), /planos/publicos e o
+conteudo de materiais gerados sao buscados o tempo todo pelo frontend e
+quase nunca mudam. Sem validadores, o navegador (e qualquer CDN na frente)
+baixa o mesmo corpo de novo e o banco e consultado a cada request.
+
+Dois modos de uso:
+
+    1. ETag do corpo (simples): monta o payload normalmente e devolve via
+       resposta_condicional. Economiza banda (304 sem corpo), mas a query
+       continua rodando.
+
+           return resposta_condicional(request, payload, CACHE_PUBLICO)
+
+    2. ETag de versao (barato): quando existe um carimbo de versao
+       (mtime de arquivo, versao do catalogo...), calcula o ETag ANTES de
+       consultar o banco e sai cedo com 304:
+
+           etag = gerar_etag("bncc-anos", versao)
+           if nao_modificado(request, etag):
+               return resposta_304(etag, CACHE_CATALOGO)
+           ...consulta...
+           return resposta_condicional(request, payload, CACHE_CATALOGO, etag=etag)
+
+ETags sao fracos (W/"...") porque o CompressionMiddleware pode mudar os
+bytes em transito (gzip/br) sem mudar o conteudo semantico.
+"""
+from __future__ import annotations
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+from fastapi import Request, Response
+
+from app.core.responses import FastJSONResponse, dumps
+
+
+# ============================================
+# Politicas de Cache-Control
+# ============================================
+
+# Catalogo autenticado (BNCC): igual para todos os usuarios, mas atras de
+# login - so o navegador guarda. 5 min sem perguntar, depois revalida (304).
+CACHE_CATALOGO = "private, max-age=300, stale-while-revalidate=86400"
+
+# Dados publicos (pagina de precos): CDN pode guardar.
+CACHE_PUBLICO = "public, max-age=300, stale-while-revalidate=3600"
+
+# Conteudo privado que pode ser regerado: sempre revalida, mas o 304 e barato.
+CACHE_PRIVADO_REVALIDAR = "private, no-cache"
+
+
+def gerar_etag(*partes: Any) -> str:
+    """ETag fraco deterministico a partir de partes (versao, parametros...)."""
+    h = hashlib.blake2b(digest_size=12)
+    for parte in partes:
+        h.update(repr(parte).encode("utf-8"))
+        h.update(b"\x00")
+    return f'W/"{h.hexdigest()}"'
+
+
+def etag_do_corpo(body: bytes) -> str:
+    """ETag fraco a partir dos bytes serializados."""
+    return f'W/"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+
+
+def _sem_prefixo_fraco(etag: str) -> str:
+    etag = etag.strip()
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def _http_date(dt: datetime) -> str:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return format_datetime(dt.astimezone(timezone.utc), usegmt=True)
+
+
+def nao_modificado(
+    request: Request,
+    etag: str,
+    last_modified: Optional[datetime] = None,
+) -> bool:
+    """
+    True se o cliente ja tem esta versao (If-None-Match, ou
+    If-Modified-Since quando o cliente nao manda ETag - RFC 9110 13.2.2).
+    Comparacao fraca: W/"x" == "x".
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        alvo = _sem_prefixo_fraco(etag)
+        return any(_sem_prefixo_fraco(t) == alvo for t in if_none_match.split(","))
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            desde = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        # HTTP-date tem resolucao de segundo
+        return last_modified.replace(microsecond=0) <= desde
+    return False
+
+
+def _headers_cache(
+    etag: str,
+    cache_control: str,
+    last_modified: Optional[datetime],
+) -> Dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = _http_date(last_modified)
+    return headers
+
+
+def resposta_304(
+    etag: str,
+    cache_control: str,
+    last_modified: Optional[datetime] = None,
+) -> Response:
+    """304 Not Modified com os mesmos validadores da resposta 200."""
+    return Response(status_code=304, headers=_headers_cache(etag, cache_control, last_modified))
+
+
+def resposta_condicional(
+    request: Request,
+    content: Any,
+    cache_control: str,
+    etag: Optional[str] = None,
+    last_modified: Optional[datetime] = None,
+) -> Response:
+    """
+    Serializa `content` (mesmas regras do FastJSONResponse) e devolve 304 se
+    o cliente ja tem a versao, senao 200 com ETag/Cache-Control.
+
+    Sem `etag`, usa o hash do corpo serializado.
+    """
+    body = dumps(content)
+    if etag is None:
+        etag = etag_do_corpo(body)
+    if nao_modificado(request, etag, last_modified):
+        return resposta_304(etag, cache_control, last_modified)
+    return Response(
+        content=body,
+        media_type=FastJSONResponse.media_type,
+        headers=_headers_cache(etag, cache_control, last_modified),
+    )
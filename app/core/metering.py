@@ -0,0 +1,762 @@
+"""
+Metering de uso mensal por escola (limites do plano) com check-and-increment atomico.
+
+MOTIVACAO: TenantContext.verificar_limite_* lia as colunas *_mes_atual de
+Assinatura e o incremento (quando existisse) seria outro UPDATE na mesma
+linha. Duas geracoes simultaneas liam 99/100 e as duas passavam, e cada
+incremento disputava a linha de assinatura que toda request autenticada le.
+
+Arquitetura (mesmo desenho do rate_limit):
+    - Se REDIS_URL estiver configurada, usa Redis: uma chave por
+      (escola, recurso, mes) - uso:{escola_id}:{recurso}:{AAAAMM} - e um
+      script Lua que faz check + INCRBY atomicamente.
+    - Senao, usa a tabela uso_mensal com um unico
+      UPDATE ... SET usado = usado + n WHERE usado + n <= limite
+      (o lock de linha do InnoDB garante atomicidade, sem SELECT antes).
+    - Se Redis cair, degrade graceful para o backend de banco e loga WARNING.
+
+Reconciliacao:
+    reconciliar_uso() mescla os contadores do Redis com uso_mensal (quando o
+    backend ativo e Redis) e espelha em Assinatura.*_mes_atual, que continua
+    sendo a fonte das telas de uso/planos. Escolas sem uso no mes voltam a 0,
+    o que faz o "reset mensal" sem job separado. Roda periodicamente a partir
+    do lifespan (ver app/main.py), em um processo so: os workers disputam um
+    GET_LOCK do MySQL e so quem segura o lock reconcilia.
+
+    Mescla, nao sobrescreve: durante uma queda do Redis os consumos caem no
+    banco (usado sobe, sincronizado nao). Na volta, a diferenca
+    usado - sincronizado e somada na chave Redis e o banco recebe o valor
+    do Redis + essa diferenca. Sobrescrever o banco com o snapshot do Redis
+    apagaria tudo o que foi consumido durante a queda.
+
+Uso:
+
+    from app.core import metering
+
+    if not metering.consumir(escola_id, "provas", limite=plano.limite_provas_mes):
+        raise HTTPException(403, "Limite de provas mensais atingido")
+    try:
+        ...  # gera a prova
+    except Exception:
+        metering.estornar(escola_id, "provas")
+        raise
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from threading import Lock
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import bindparam, case, insert, select, text, update
+from sqlalchemy.exc import IntegrityError
+
+from app.models.uso_mensal import UsoMensal
+
+logger = logging.getLogger(__name__)
+
+
+# recurso -> (coluna de uso em Assinatura, coluna de limite em Plano)
+RECURSOS: Dict[str, Tuple[str, str]] = {
+    "provas": ("provas_mes_atual", "limite_provas_mes"),
+    "materiais": ("materiais_mes_atual", "limite_materiais_mes"),
+    "peis": ("peis_mes_atual", "limite_peis_mes"),
+    "relatorios": ("relatorios_mes_atual", "limite_relatorios_mes"),
+}
+
+# Chaves Redis expiram sozinhas depois do fim do mes (com folga para a
+# ultima reconciliacao do periodo).
+_TTL_CHAVE_SEGUNDOS = 40 * 24 * 3600
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+def periodo_atual(now: Optional[datetime] = None) -> str:
+    """Periodo de cobranca no formato AAAAMM (UTC)."""
+    return (now or _utcnow()).strftime("%Y%m")
+
+
+def _validar_recurso(recurso: str):
+    if recurso not in RECURSOS:
+        raise ValueError(f"Recurso de metering desconhecido: {recurso!r}")
+
+
+# ============================================================
+# BACKEND INTERFACE
+# ============================================================
+
+class _MeteringBackend(ABC):
+    """Interface comum para backends de metering."""
+
+    @abstractmethod
+    def consumir(self, escola_id: int, recurso: str, periodo: str, limite: int, quantidade: int) -> bool:
+        """Incrementa o uso se couber no limite. Retorna False se estouraria."""
+        ...
+
+    @abstractmethod
+    def estornar(self, escola_id: int, recurso: str, periodo: str, quantidade: int) -> None:
+        """Devolve `quantidade` ao contador (nunca fica negativo)."""
+        ...
+
+    @abstractmethod
+    def uso(self, escola_id: int, recurso: str, periodo: str) -> int:
+        ...
+
+    @abstractmethod
+    def snapshot(self, periodo: str) -> Dict[Tuple[int, str], int]:
+        """Todos os contadores do periodo: {(escola_id, recurso): usado}."""
+        ...
+
+    @property
+    @abstractmethod
+    def name(self) -> str:
+        ...
+
+
+# ============================================================
+# BACKEND BANCO (tabela uso_mensal, UPDATE condicional)
+# ============================================================
+
+class _DatabaseBackend(_MeteringBackend):
+    """
+    Contadores na tabela uso_mensal.
+
+    O consumo e um UPDATE condicional: se afetou 1 linha, coube no limite.
+    Se afetou 0, ou a linha do mes ainda nao existe (primeiro uso - INSERT)
+    ou o limite estourou. Corrida no INSERT entre workers cai em
+    IntegrityError pela unique e refaz o UPDATE.
+    """
+
+    name = "database"
+
+    def __init__(self, session_factory: Optional[Callable] = None):
+        self._session_factory = session_factory
+
+    def _session(self):
+        if self._session_factory is None:
+            from app.database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    @staticmethod
+    def _filtro(escola_id: int, recurso: str, periodo: str):
+        return (
+            UsoMensal.escola_id == escola_id,
+            UsoMensal.recurso == recurso,
+            UsoMensal.periodo == periodo,
+        )
+
+    def consumir(self, escola_id: int, recurso: str, periodo: str, limite: int, quantidade: int) -> bool:
+        filtro = self._filtro(escola_id, recurso, periodo)
+        db = self._session()
+        try:
+            # 2 tentativas: a segunda so acontece se outro worker criou a
+            # linha entre o nosso UPDATE e o nosso INSERT.
+            for _ in range(2):
+                result = db.execute(
+                    update(UsoMensal)
+                    .where(*filtro, UsoMensal.usado + quantidade <= limite)
+                    .values(usado=UsoMensal.usado + quantidade, updated_at=_utcnow())
+                )
+                if result.rowcount == 1:
+                    db.commit()
+                    return True
+
+                existe = db.execute(select(UsoMensal.id).where(*filtro)).first()
+                if existe is not None or quantidade > limite:
+                    db.rollback()
+                    return False
+
+                try:
+                    db.execute(
+                        insert(UsoMensal).values(
+                            escola_id=escola_id,
+                            recurso=recurso,
+                            periodo=periodo,
+                            usado=quantidade,
+                            updated_at=_utcnow(),
+                        )
+                    )
+                    db.commit()
+                    return True
+                except IntegrityError:
+                    db.rollback()
+            return False
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def estornar(self, escola_id: int, recurso: str, periodo: str, quantidade: int) -> None:
+        db = self._session()
+        try:
+            db.execute(
+                update(UsoMensal)
+                .where(*self._filtro(escola_id, recurso, periodo))
+                .values(
+                    usado=case((UsoMensal.usado >= quantidade, UsoMensal.usado - quantidade), else_=0),
+                    updated_at=_utcnow(),
+                )
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def uso(self, escola_id: int, recurso: str, periodo: str) -> int:
+        db = self._session()
+        try:
+            valor = db.execute(
+                select(UsoMensal.usado).where(*self._filtro(escola_id, recurso, periodo))
+            ).scalar()
+            return int(valor or 0)
+        finally:
+            db.close()
+
+    def snapshot(self, periodo: str) -> Dict[Tuple[int, str], int]:
+        db = self._session()
+        try:
+            rows = db.execute(
+                select(UsoMensal.escola_id, UsoMensal.recurso, UsoMensal.usado)
+                .where(UsoMensal.periodo == periodo)
+            ).all()
+            return {(escola_id, recurso): int(usado or 0) for escola_id, recurso, usado in rows}
+        finally:
+            db.close()
+
+    def semear(self, escola_id: int, recurso: str, periodo: str) -> int:
+        """
+        Valor inicial de uma chave Redis fria (primeiro uso do mes ou apos flush).
+
+        Marca sincronizado = usado na mesma transacao: a partir daqui o Redis
+        ja conhece esse consumo e a reconciliacao nao pode soma-lo de novo.
+        """
+        filtro = self._filtro(escola_id, recurso, periodo)
+        db = self._session()
+        try:
+            db.execute(update(UsoMensal).where(*filtro).values(sincronizado=UsoMensal.usado))
+            valor = db.execute(select(UsoMensal.usado).where(*filtro)).scalar()
+            db.commit()
+            return int(valor or 0)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def estado(self, periodo: str) -> Dict[Tuple[int, str], Tuple[int, int, int]]:
+        """{(escola_id, recurso): (id, usado, sincronizado)} do periodo."""
+        db = self._session()
+        try:
+            rows = db.execute(
+                select(UsoMensal.id, UsoMensal.escola_id, UsoMensal.recurso, UsoMensal.usado, UsoMensal.sincronizado)
+                .where(UsoMensal.periodo == periodo)
+            ).all()
+            return {
+                (escola_id, recurso): (row_id, int(usado or 0), int(sincronizado or 0))
+                for row_id, escola_id, recurso, usado, sincronizado in rows
+            }
+        finally:
+            db.close()
+
+    def gravar_mescla(
+        self,
+        periodo: str,
+        mesclados: Dict[int, Tuple[int, int]],
+        novos: Dict[Tuple[int, str], int],
+    ) -> None:
+        """
+        Persiste o resultado da mescla com o Redis (usado pela reconciliacao).
+
+        `mesclados` e {id: (usado lido, valor mesclado)}. O UPDATE e relativo
+        (usado = usado + mesclado - lido) para nao perder consumos que o
+        fallback fez entre a leitura e a gravacao; esses continuam como
+        usado - sincronizado e entram na proxima reconciliacao.
+        `novos` sao chaves que so existem no Redis.
+        """
+        if not mesclados and not novos:
+            return
+        db = self._session()
+        try:
+            agora = _utcnow()
+            if mesclados:
+                # Tabela (Core), nao o mapper: o bulk UPDATE do ORM so aceita
+                # WHERE pela PK com valores literais, e aqui o SET e relativo
+                tabela = UsoMensal.__table__
+                db.execute(
+                    update(tabela)
+                    .where(tabela.c.id == bindparam("b_id"))
+                    .values(
+                        usado=tabela.c.usado + bindparam("b_diferenca"),
+                        sincronizado=bindparam("b_mesclado"),
+                        updated_at=agora,
+                    ),
+                    [
+                        {"b_id": row_id, "b_diferenca": mesclado - lido, "b_mesclado": mesclado}
+                        for row_id, (lido, mesclado) in mesclados.items()
+                    ],
+                )
+                db.commit()
+            if novos:
+                try:
+                    db.execute(insert(UsoMensal), [
+                        {
+                            "escola_id": escola_id, "recurso": recurso, "periodo": periodo,
+                            "usado": usado, "sincronizado": usado, "updated_at": agora,
+                        }
+                        for (escola_id, recurso), usado in novos.items()
+                    ])
+                    db.commit()
+                except IntegrityError:
+                    # O fallback criou a linha no meio tempo: proxima rodada mescla
+                    db.rollback()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+# ============================================================
+# BACKEND REDIS (INCRBY condicional via Lua)
+# ============================================================
+
+# Script Lua de consumo: atomico, sem race entre check e incremento.
+#   KEYS[1] = uso:{escola_id}:{recurso}:{periodo}
+#   ARGV[1] = quantidade
+#   ARGV[2] = limite
+#   ARGV[3] = TTL da chave em segundos
+#   ARGV[4] = valor inicial se a chave nao existir ('' = nao sei ainda)
+# Retorna novo uso (>= 0), -1 se estouraria o limite, -2 se a chave nao
+# existe e nenhum valor inicial foi informado (o caller busca o snapshot
+# no banco e chama de novo - so acontece no primeiro uso do mes ou apos
+# flush do Redis).
+_LUA_CONSUMIR = """
+local atual = redis.call('GET', KEYS[1])
+if not atual then
+    if ARGV[4] == '' then
+        return -2
+    end
+    atual = ARGV[4]
+    redis.call('SET', KEYS[1], atual, 'EX', ARGV[3])
+end
+local n = tonumber(ARGV[1])
+if tonumber(atual) + n > tonumber(ARGV[2]) then
+    return -1
+end
+return redis.call('INCRBY', KEYS[1], n)
+"""
+
+# Estorno sem deixar o contador negativo e sem recriar chave expirada.
+_LUA_ESTORNAR = """
+local atual = redis.call('GET', KEYS[1])
+if not atual then
+    return 0
+end
+local novo = math.max(tonumber(atual) - tonumber(ARGV[1]), 0)
+redis.call('SET', KEYS[1], novo, 'KEEPTTL')
+return novo
+"""
+
+
+class _RedisUnavailable(Exception):
+    """Sinalizador interno: backend Redis indisponivel, usar fallback."""
+
+
+class _RedisBackend(_MeteringBackend):
+    """
+    Contadores mensais no Redis.
+
+    Conecta no primeiro uso (lazy). Em caso de erro, marca como offline
+    por OFFLINE_COOLDOWN segundos e o dispatcher usa o backend de banco.
+    """
+
+    name = "redis"
+    OFFLINE_COOLDOWN = 30
+
+    def __init__(self, redis_url: str, seed_backend: _DatabaseBackend):
+        self._url = redis_url
+        self._seed_backend = seed_backend
+        self._client = None
+        self._sha_consumir: Optional[str] = None
+        self._sha_estornar: Optional[str] = None
+        self._offline_until: float = 0.0
+        self._lock = Lock()
+        self._last_warn_logged: float = 0.0
+
+    @staticmethod
+    def _chave(escola_id: int, recurso: str, periodo: str) -> str:
+        return f"uso:{escola_id}:{recurso}:{periodo}"
+
+    def _ensure_client(self):
+        if self._client is not None:
+            return self._client
+
+        with self._lock:
+            if self._client is not None:
+                return self._client
+            try:
+                import redis  # noqa
+                client = redis.Redis.from_url(
+                    self._url,
+                    socket_connect_timeout=2,
+                    socket_timeout=2,
+                    decode_responses=True,
+                    health_check_interval=30,
+                )
+                client.ping()
+                self._sha_consumir = client.script_load(_LUA_CONSUMIR)
+                self._sha_estornar = client.script_load(_LUA_ESTORNAR)
+                self._client = client
+                logger.info("Metering: Redis conectado")
+            except Exception as e:
+                self._mark_offline(e)
+                raise
+        return self._client
+
+    def _mark_offline(self, err: Exception):
+        self._offline_until = time.time() + self.OFFLINE_COOLDOWN
+        self._client = None
+        now = time.time()
+        if now - self._last_warn_logged > self.OFFLINE_COOLDOWN:
+            logger.warning(
+                "Metering Redis offline, usando contadores no banco por %ds: %s",
+                self.OFFLINE_COOLDOWN, err,
+            )
+            self._last_warn_logged = now
+
+    def is_offline(self) -> bool:
+        return time.time() < self._offline_until
+
+    def _client_or_raise(self):
+        if self.is_offline():
+            raise _RedisUnavailable()
+        try:
+            return self._ensure_client()
+        except Exception as e:
+            raise _RedisUnavailable() from e
+
+    def consumir(self, escola_id: int, recurso: str, periodo: str, limite: int, quantidade: int) -> bool:
+        client = self._client_or_raise()
+        chave = self._chave(escola_id, recurso, periodo)
+        try:
+            args = (str(quantidade), str(limite), str(_TTL_CHAVE_SEGUNDOS))
+            result = int(client.evalsha(self._sha_consumir, 1, chave, *args, ""))
+            if result == -2:
+                # Chave fria: semeia com o contador do banco
+                seed = self._seed_backend.semear(escola_id, recurso, periodo)
+                result = int(client.evalsha(self._sha_consumir, 1, chave, *args, str(seed)))
+            return result >= 0
+        except Exception as e:
+            self._mark_offline(e)
+            raise _RedisUnavailable() from e
+
+    def estornar(self, escola_id: int, recurso: str, periodo: str, quantidade: int) -> None:
+        client = self._client_or_raise()
+        try:
+            client.evalsha(self._sha_estornar, 1, self._chave(escola_id, recurso, periodo), str(quantidade))
+        except Exception as e:
+            self._mark_offline(e)
+            raise _RedisUnavailable() from e
+
+    def ajustar(self, escola_id: int, recurso: str, periodo: str, delta: int) -> None:
+        """Soma `delta` (pode ser negativo) numa chave existente, sem recria-la."""
+        client = self._client_or_raise()
+        try:
+            client.evalsha(self._sha_estornar, 1, self._chave(escola_id, recurso, periodo), str(-delta))
+        except Exception as e:
+            self._mark_offline(e)
+            raise _RedisUnavailable() from e
+
+    def uso(self, escola_id: int, recurso: str, periodo: str) -> int:
+        client = self._client_or_raise()
+        try:
+            valor = client.get(self._chave(escola_id, recurso, periodo))
+        except Exception as e:
+            self._mark_offline(e)
+            raise _RedisUnavailable() from e
+        if valor is None:
+            return self._seed_backend.uso(escola_id, recurso, periodo)
+        return int(valor)
+
+    def snapshot(self, periodo: str) -> Dict[Tuple[int, str], int]:
+        client = self._client_or_raise()
+        try:
+            chaves = list(client.scan_iter(match=f"uso:*:*:{periodo}", count=500))
+            valores: Dict[Tuple[int, str], int] = {}
+            # MGET em blocos para nao montar um comando gigante
+            for i in range(0, len(chaves), 500):
+                bloco = chaves[i:i + 500]
+                for chave, valor in zip(bloco, client.mget(bloco), strict=True):
+                    if valor is None:
+                        continue
+                    _, escola_id, recurso, _ = chave.split(":", 3)
+                    valores[(int(escola_id), recurso)] = int(valor)
+            return valores
+        except Exception as e:
+            self._mark_offline(e)
+            raise _RedisUnavailable() from e
+
+
+# ============================================================
+# FACTORY + DISPATCHER
+# ============================================================
+
+_db_backend = _DatabaseBackend()
+_redis_backend: Optional[_RedisBackend] = None
+_initialized = False
+
+
+def _init_backends():
+    """Inicializa o backend Redis se REDIS_URL estiver setada."""
+    global _redis_backend, _initialized
+    if _initialized:
+        return
+    _initialized = True
+
+    redis_url = os.getenv("REDIS_URL") or os.getenv("RAILWAY_REDIS_URL")
+    if redis_url and redis_url.strip():
+        from app.core.rate_limit import _redacted_url
+        _redis_backend = _RedisBackend(redis_url.strip(), seed_backend=_db_backend)
+        logger.info("Metering configurado com Redis (%s)", _redacted_url(redis_url))
+    else:
+        logger.info("Metering usando contadores no banco (REDIS_URL nao definido)")
+
+
+def _redis_ativo() -> Optional[_RedisBackend]:
+    _init_backends()
+    if _redis_backend is not None and not _redis_backend.is_offline():
+        return _redis_backend
+    return None
+
+
+def consumir(escola_id: int, recurso: str, limite: int, quantidade: int = 1) -> bool:
+    """
+    Check-and-increment atomico do uso mensal da escola.
+
+    Retorna True e incrementa se `uso + quantidade <= limite`; retorna False
+    sem alterar nada caso contrario. Seguro sob requests concorrentes em
+    qualquer numero de workers.
+    """
+    _validar_recurso(recurso)
+    periodo = periodo_atual()
+    redis_backend = _redis_ativo()
+    if redis_backend is not None:
+        try:
+            return redis_backend.consumir(escola_id, recurso, periodo, limite, quantidade)
+        except _RedisUnavailable:
+            pass  # Fallback abaixo
+    return _db_backend.consumir(escola_id, recurso, periodo, limite, quantidade)
+
+
+def estornar(escola_id: int, recurso: str, quantidade: int = 1) -> None:
+    """Devolve uso consumido (ex: a geracao falhou depois do consumir)."""
+    _validar_recurso(recurso)
+    periodo = periodo_atual()
+    redis_backend = _redis_ativo()
+    if redis_backend is not None:
+        try:
+            redis_backend.estornar(escola_id, recurso, periodo, quantidade)
+            return
+        except _RedisUnavailable:
+            pass
+    _db_backend.estornar(escola_id, recurso, periodo, quantidade)
+
+
+def uso_atual(escola_id: int, recurso: str) -> int:
+    """Uso do recurso no mes corrente (leitura, sem incrementar)."""
+    _validar_recurso(recurso)
+    periodo = periodo_atual()
+    redis_backend = _redis_ativo()
+    if redis_backend is not None:
+        try:
+            return redis_backend.uso(escola_id, recurso, periodo)
+        except _RedisUnavailable:
+            pass
+    return _db_backend.uso(escola_id, recurso, periodo)
+
+
+def _mesclar_redis(redis_backend: _RedisBackend, periodo: str) -> None:
+    """
+    Junta os contadores do Redis com os de uso_mensal, por chave:
+
+        pendente = usado - sincronizado   (consumo no banco durante a queda)
+        Redis   += pendente               (se a chave existe)
+        usado    = Redis + pendente, sincronizado = esse valor
+
+    Chave so no banco (Redis perdeu): o banco vale. So no Redis: insere.
+    Se o Redis cair no meio, grava o que ja foi ajustado - o resto continua
+    pendente e entra na proxima rodada, sem somar duas vezes.
+    """
+    try:
+        valores_redis = redis_backend.snapshot(periodo)
+    except _RedisUnavailable:
+        return
+    estado = _db_backend.estado(periodo)
+
+    mesclados: Dict[int, Tuple[int, int]] = {}
+    for chave, (row_id, usado, sincronizado) in estado.items():
+        pendente = usado - sincronizado
+        if chave not in valores_redis:
+            if pendente:
+                mesclados[row_id] = (usado, usado)
+            continue
+        if pendente:
+            try:
+                redis_backend.ajustar(chave[0], chave[1], periodo, pendente)
+            except _RedisUnavailable:
+                break
+        mesclado = max(valores_redis[chave] + pendente, 0)
+        if mesclado != usado or mesclado != sincronizado:
+            mesclados[row_id] = (usado, mesclado)
+
+    novos = {chave: valor for chave, valor in valores_redis.items() if chave not in estado}
+    _db_backend.gravar_mescla(periodo, mesclados, novos)
+
+
+def reconciliar_uso(periodo: Optional[str] = None, session_factory: Optional[Callable] = None) -> int:
+    """
+    Espelha os contadores do periodo em Assinatura.*_mes_atual.
+
+    Com Redis ativo, antes mescla Redis e uso_mensal (ver _mesclar_redis).
+    Assinaturas sem uso no periodo vao para 0. So escreve as linhas de
+    assinatura que mudaram.
+
+    Retorna o numero de assinaturas atualizadas.
+    """
+    from app.models.assinatura import Assinatura
+
+    periodo = periodo or periodo_atual()
+    redis_backend = _redis_ativo()
+    if redis_backend is not None:
+        _mesclar_redis(redis_backend, periodo)
+    # Depois da mescla o banco tem Redis + consumos do fallback
+    valores = _db_backend.snapshot(periodo)
+
+    if session_factory is None:
+        from app.database import SessionLocal
+        session_factory = SessionLocal
+
+    colunas = {recurso: coluna for recurso, (coluna, _) in RECURSOS.items()}
+    db = session_factory()
+    try:
+        rows = db.execute(
+            select(Assinatura.id, Assinatura.escola_id, *[getattr(Assinatura, c) for c in colunas.values()])
+        ).all()
+        mudancas = []
+        for row in rows:
+            atual = row._mapping
+            novo = {
+                coluna: valores.get((atual["escola_id"], recurso), 0)
+                for recurso, coluna in colunas.items()
+            }
+            if any((atual[coluna] or 0) != valor for coluna, valor in novo.items()):
+                mudancas.append({"id": atual["id"], **novo})
+        if mudancas:
+            db.execute(update(Assinatura), mudancas)
+            db.commit()
+        return len(mudancas)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+# ============================================================
+# RECONCILIADOR UNICO (GET_LOCK do MySQL)
+# ============================================================
+
+_NOME_LOCK_RECONCILIACAO = "adaptai_metering_reconciliacao"
+
+
+class _LiderReconciliacao:
+    """
+    Elege um unico processo para reconciliar.
+
+    Cada worker do uvicorn/gunicorn sobe o proprio loop_reconciliacao; sem
+    eleicao, N workers fariam a mesma mescla ao mesmo tempo. O lider e quem
+    segura GET_LOCK(nome) numa conexao dedicada, mantida aberta pela vida do
+    processo. Se o processo morre ou a conexao cai, o MySQL solta o lock e
+    outro worker assume na rodada seguinte. Fora do MySQL (SQLite em dev e
+    testes) todo processo e lider.
+    """
+
+    def __init__(self, engine=None):
+        self._engine = engine
+        self._conn = None
+
+    def _get_engine(self):
+        if self._engine is None:
+            from app.database import engine
+            self._engine = engine
+        return self._engine
+
+    def sou_lider(self) -> bool:
+        engine = self._get_engine()
+        if engine.dialect.name != "mysql":
+            return True
+        try:
+            if self._conn is None:
+                self._conn = engine.connect()
+            dono = self._conn.execute(
+                text("SELECT IS_USED_LOCK(:nome) = CONNECTION_ID()"), {"nome": _NOME_LOCK_RECONCILIACAO}
+            ).scalar()
+            if not dono:
+                dono = self._conn.execute(
+                    text("SELECT GET_LOCK(:nome, 0)"), {"nome": _NOME_LOCK_RECONCILIACAO}
+                ).scalar() == 1
+            # Nao deixa transacao aberta na conexao que fica parada
+            self._conn.commit()
+            return bool(dono)
+        except Exception:
+            logger.warning("Erro na eleicao do reconciliador de metering", exc_info=True)
+            self.liberar()
+            return False
+
+    def liberar(self) -> None:
+        if self._conn is None:
+            return
+        try:
+            self._conn.execute(text("SELECT RELEASE_LOCK(:nome)"), {"nome": _NOME_LOCK_RECONCILIACAO})
+            self._conn.commit()
+        except Exception:
+            pass
+        finally:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+
+async def loop_reconciliacao(intervalo_segundos: int, lider: Optional[_LiderReconciliacao] = None):
+    """Task do lifespan: reconcilia a cada `intervalo_segundos` se este processo for o lider (erros so logam)."""
+    lider = lider or _LiderReconciliacao()
+    try:
+        while True:
+            await asyncio.sleep(intervalo_segundos)
+            try:
+                if not await asyncio.to_thread(lider.sou_lider):
+                    continue
+                atualizadas = await asyncio.to_thread(reconciliar_uso)
+                if atualizadas:
+                    logger.info("Metering reconciliado", extra={"assinaturas": atualizadas})
+            except Exception:
+                logger.warning("Erro na reconciliacao de metering", exc_info=True)
+    finally:
+        lider.liberar()
+
+
+def get_active_backend_name() -> str:
+    """Util para /health e testes: nome do backend em uso agora."""
+    return "redis" if _redis_ativo() is not None else "database"
@@ -20,9 +20,40 @@ Ou manual para queries mais customizadas:
     total = query.count()
     items = query.offset(pagination.offset).limit(pagination.limit).all()
     return build_page(items=items, total=total, pagination=pagination)
+
+Modo cursor (keyset) - tabelas grandes/append-only
+--------------------------------------------------
+OFFSET N obriga o banco a ler e descartar N linhas, e o `query.count()` de
+cada pagina e um full scan filtrado. Em background_tasks, ai_cache,
+diario_aprendizagem e planejamento_job_logs isso cresce sem limite. No
+modo cursor a pagina seguinte comeca em `WHERE (chaves) < (ultima linha)`,
+que o indice resolve direto, e o total e opcional (estimado pelo EXPLAIN):
+
+    @router.get("/background-tasks")
+    def listar(pagination: CursorPaginationParams = Depends()):
+        query = db.query(BackgroundTask).filter(...)
+        return keyset_response(
+            query, pagination,
+            keys=[BackgroundTask.created_at.desc(), BackgroundTask.id.desc()],
+            estimate_total=True,
+        )
+
+O envelope e o mesmo de build_page (items + meta); meta ganha
+`next_cursor` (None na ultima pagina) e, sem page/total exatos, `page`,
+`total` e `total_pages` podem vir None.
 """
-from typing import Any, Dict, List, Optional, Annotated
-from fastapi import Query
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Annotated, Sequence, Tuple
+
+from fastapi import HTTPException, Query
+from sqlalchemy import and_, or_, tuple_
+from sqlalchemy.sql import operators
+
+from app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
 
 
 class PaginationParams:
@@ -103,3 +134,181 @@ def paginated_response(
         items = [serializer(item) for item in items]
     
     return build_page(items=items, total=total, pagination=pagination)
+
+
+# ============================================================
+# MODO CURSOR (KEYSET)
+# ============================================================
+
+class CursorPaginationParams(PaginationParams):
+    """
+    PaginationParams + `cursor` opaco. Sem cursor = primeira pagina.
+
+    Rotas que aceitam este dependency continuam aceitando `page`/`size`
+    (page e ignorado quando a rota usa keyset_response).
+    """
+
+    def __init__(
+        self,
+        page: Annotated[int, Query(ge=1, description="Pagina (comecando em 1)")] = 1,
+        size: Annotated[int, Query(ge=1, le=100, description="Itens por pagina (max 100)")] = 20,
+        cursor: Annotated[Optional[str], Query(description="Cursor opaco (meta.next_cursor da pagina anterior)")] = None,
+    ):
+        super().__init__(page=page, size=size)
+        self.cursor = cursor
+
+
+def encode_cursor(valores: Sequence[Any]) -> str:
+    """Valores das chaves da ultima linha -> string opaca (base64url de JSON)."""
+    def _tag(v):
+        if isinstance(v, datetime):
+            return {"dt": v.isoformat()}
+        if isinstance(v, date):
+            return {"d": v.isoformat()}
+        return v
+
+    bruto = json.dumps([_tag(v) for v in valores], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(bruto).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, n_chaves: int) -> List[Any]:
+    """Inverso de encode_cursor. Cursor malformado -> 400."""
+    def _untag(v):
+        if isinstance(v, dict) and "dt" in v:
+            return datetime.fromisoformat(v["dt"])
+        if isinstance(v, dict) and "d" in v:
+            return date.fromisoformat(v["d"])
+        return v
+
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        valores = [_untag(v) for v in json.loads(bruto)]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor invalido")
+    if len(valores) != n_chaves:
+        raise HTTPException(status_code=400, detail="Cursor invalido")
+    return valores
+
+
+def _chaves(keys) -> List[Tuple[Any, bool]]:
+    """[Model.col.desc(), Model.id.desc()] -> [(coluna, descendente), ...]"""
+    resultado = []
+    for k in keys:
+        modificador = getattr(k, "modifier", None)
+        if modificador in (operators.desc_op, operators.asc_op):
+            resultado.append((k.element, modificador is operators.desc_op))
+        else:
+            resultado.append((k, False))
+    return resultado
+
+
+def _depois_de(chaves: List[Tuple[Any, bool]], valores: List[Any]):
+    """Predicado "linha vem depois do cursor" na ordenacao das chaves."""
+    colunas = [c for c, _ in chaves]
+    direcoes = {desc for _, desc in chaves}
+    if len(direcoes) == 1:
+        # Mesma direcao: comparacao de tupla, que vira range scan no indice
+        # composto. (a, b) < (x, y) == a < x OR (a = x AND b < y)
+        if direcoes.pop():
+            return tuple_(*colunas) < tuple_(*valores)
+        return tuple_(*colunas) > tuple_(*valores)
+
+    # Direcoes mistas: expansao explicita
+    condicoes = []
+    for i, (coluna, desc) in enumerate(chaves):
+        iguais = [c == v for (c, _), v in zip(chaves[:i], valores[:i])]
+        passo = coluna < valores[i] if desc else coluna > valores[i]
+        condicoes.append(and_(*iguais, passo))
+    return or_(*condicoes)
+
+
+def estimate_count(query) -> Optional[int]:
+    """
+    Total aproximado sem COUNT(*): le a estimativa de linhas do EXPLAIN
+    (MySQL: rows * filtered%). Em outros bancos (SQLite nos testes) faz o
+    count exato. None se o EXPLAIN falhar - total e opcional.
+    """
+    session = query.session
+    dialeto = session.get_bind().dialect
+    if dialeto.name != "mysql":
+        return query.count()
+
+    compilado = query.order_by(None).statement.compile(dialect=dialeto)
+    try:
+        resultado = session.connection().exec_driver_sql(
+            "EXPLAIN " + str(compilado), compilado.params
+        )
+        linha = resultado.mappings().first()
+    except Exception as e:
+        logger.warning("Falha ao estimar total via EXPLAIN", extra={"error": str(e)})
+        return None
+    if not linha or linha.get("rows") is None:
+        return None
+    return int(int(linha["rows"]) * float(linha.get("filtered") or 100) / 100)
+
+
+def build_cursor_page(
+    items: List[Any],
+    pagination: CursorPaginationParams,
+    next_cursor: Optional[str],
+    total: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Mesmo envelope de build_page, com next_cursor em meta."""
+    total_pages = None
+    if total is not None:
+        total_pages = (total + pagination.size - 1) // pagination.size if total > 0 else 0
+
+    return {
+        "items": items,
+        "meta": {
+            "page": None if pagination.cursor else 1,
+            "size": pagination.size,
+            "total": total,
+            "total_pages": total_pages,
+            "has_next": next_cursor is not None,
+            "has_prev": pagination.cursor is not None,
+            "next_cursor": next_cursor,
+        },
+    }
+
+
+def keyset_response(
+    query,
+    pagination: CursorPaginationParams,
+    keys: Sequence[Any],
+    serializer: Optional[callable] = None,
+    estimate_total: bool = False,
+) -> Dict[str, Any]:
+    """
+    Pagina por cursor sobre uma Query do SQLAlchemy (so filtros; a ordenacao
+    vem de `keys`).
+
+    Args:
+        query: Query com filtros aplicados (order_by existente e descartado)
+        pagination: CursorPaginationParams
+        keys: colunas do modelo que ordenam de forma unica, com .desc()/.asc()
+              - a ultima deve ser a PK (desempate). Devem ser NOT NULL e
+              idealmente cobertas por um indice composto na mesma ordem.
+        serializer: funcao opcional para converter cada item
+        estimate_total: inclui meta.total estimado (EXPLAIN, sem COUNT)
+    """
+    chaves = _chaves(keys)
+    total = estimate_count(query) if estimate_total else None
+
+    pagina = query.order_by(None).order_by(*keys)
+    if pagination.cursor:
+        valores = decode_cursor(pagination.cursor, len(chaves))
+        pagina = pagina.filter(_depois_de(chaves, valores))
+
+    # size + 1: a linha extra so indica se existe proxima pagina
+    items = pagina.limit(pagination.size + 1).all()
+    next_cursor = None
+    if len(items) > pagination.size:
+        items = items[:pagination.size]
+        ultimo = items[-1]
+        next_cursor = encode_cursor([getattr(ultimo, coluna.key) for coluna, _ in chaves])
+
+    if serializer:
+        items = [serializer(item) for item in items]
+
+    return build_cursor_page(items, pagination, next_cursor, total)
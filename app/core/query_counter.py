@@ -0,0 +1,78 @@
+"""
+Contador de statements SQL por request (deteccao de N+1).
+
+MOTIVACAO: varias listagens faziam uma query por linha do resultado
+(ProvaAluno -> Prova, estudante -> ultima analise, aula -> registro via
+lazy-load). Com 5 linhas no dev ninguem percebe; com 120 alunos em producao
+vira 240 round-trips. O contador torna isso visivel:
+
+    - Em producao: RequestTrackingMiddleware abre um contador por request,
+      loga `queries` junto com a duracao e da WARNING acima de
+      QUERIES_ALERTA (ver app/core/request_tracking.py).
+    - Em testes: a fixture `sem_n_mais_1` (tests/conftest.py) mede a mesma
+      chamada com volumes diferentes e falha se o numero de queries crescer
+      com o tamanho do resultado.
+
+Implementacao: um listener before_cursor_execute na classe Engine (vale para
+qualquer engine, inclusive os de teste) que incrementa o contador ativo no
+ContextVar. Sem contador ativo o custo e um ContextVar.get(). Rotas sync
+rodam no threadpool com uma copia do contexto, mas o contador e um objeto
+mutavel compartilhado, entao a contagem chega ao middleware.
+
+Uso:
+    from app.core.query_counter import contar_queries
+
+    with contar_queries() as contador:
+        listar(...)
+    contador.total
+"""
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Acima disso o request e logado como WARNING (provavel N+1)
+QUERIES_ALERTA = 50
+
+# Quantos statements guardar para a mensagem de erro dos testes
+MAX_STATEMENTS_GUARDADOS = 20
+
+
+class ContadorQueries:
+    __slots__ = ("total", "statements")
+
+    def __init__(self):
+        self.total = 0
+        self.statements: List[str] = []
+
+    def registrar(self, statement: str) -> None:
+        self.total += 1
+        if len(self.statements) < MAX_STATEMENTS_GUARDADOS:
+            self.statements.append(statement)
+
+
+_contador_atual: ContextVar[Optional[ContadorQueries]] = ContextVar(
+    "contador_queries", default=None
+)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _ao_executar(conn, cursor, statement, parameters, context, executemany):
+    contador = _contador_atual.get()
+    if contador is not None:
+        contador.registrar(statement)
+
+
+@contextmanager
+def contar_queries() -> Iterator[ContadorQueries]:
+    """Conta os statements executados dentro do bloco (aninhamento: o interno vence)."""
+    contador = ContadorQueries()
+    token = _contador_atual.set(contador)
+    try:
+        yield contador
+    finally:
+        _contador_atual.reset(token)
@@ -1,18 +1,39 @@
 """
 Rate limiting por IP com backend Redis e fallback em memoria.
 
+Algoritmo: GCRA (generic cell rate algorithm), equivalente a um token bucket
+com capacidade `max_requests` que reabastece 1 ficha a cada
+`window_seconds / max_requests`. O estado por (ip, key) e UM numero - o
+TAT (theoretical arrival time) - em vez de um timestamp por request. Um
+limite de 20/hora custa 1 entrada por IP, nao 20.
+
 Arquitetura:
-    - Se REDIS_URL estiver configurada, usa Redis (sliding window via ZSET + Lua).
-    - Senao, usa dict em memoria (como antes).
+    - Se REDIS_URL estiver configurada, usa Redis (GCRA via Lua, O(1): um
+      GET e um SET com PX por request).
+    - Senao, usa dict em memoria {(ip, key): tat}.
     - Se Redis estiver configurado mas ficar offline, degrade graceful para
       memoria e loga WARNING (uma vez por janela de 60s para nao poluir).
 
 Garantias:
     - Atomicidade em Redis via script Lua (sem TOCTOU entre check e add).
     - Thread-safe em memoria via Lock.
+    - Chaves ociosas somem sozinhas: no Redis pelo TTL (PX), em memoria pelo
+      loop_limpeza() agendado no lifespan (ver app/main.py).
     - Rate limiter nao pode derrubar o app: erros de Redis nunca propagam.
 
-Uso em rotas FastAPI (nao muda):
+Dimensoes (avaliadas juntas, em UMA chamada ao backend - um EVALSHA no
+Redis ou uma aquisicao do Lock em memoria):
+    - IP: sempre. Sem `user`, `max_requests` vale por IP (como antes).
+    - Usuario: com `user`, `max_requests` passa a valer por usuario e o IP
+      ganha um teto folgado (max_per_ip) - uma escola inteira atras de um
+      NAT nao divide mais o mesmo balde, e uma conta trocando de IP continua
+      limitada.
+    - Escola: `max_per_escola` opcional, agregado de todos os usuarios.
+    - Orcamento de tokens de IA da escola: `ai_tokens` debita do balde
+      settings.RATE_LIMIT_AI_TOKENS_ESCOLA_HORA.
+    Tudo ou nada: se qualquer dimensao estourar, nenhuma e consumida.
+
+Uso em rotas FastAPI:
 
     from app.core.rate_limit import check_rate_limit
 
@@ -20,17 +41,23 @@ Uso em rotas FastAPI (nao muda):
     async def endpoint(request: Request, ...):
         check_rate_limit(request, key="checkout", max_requests=3, window_seconds=3600)
         # ... resto
+
+    @router.post("/gerar-com-ia")
+    async def gerar(request: Request, current_user: User = Depends(get_current_active_user)):
+        check_rate_limit(
+            request, key="gerar_ia", max_requests=20, window_seconds=3600,
+            user=current_user, max_per_escola=200, ai_tokens=4096,
+        )
 """
 from __future__ import annotations
 
 import os
 import time
-import uuid
+import asyncio
 import logging
 from abc import ABC, abstractmethod
-from collections import defaultdict, deque
 from threading import Lock
-from typing import Optional
+from typing import Optional, Sequence
 
 from fastapi import Request, HTTPException, status
 
@@ -41,13 +68,52 @@ logger = logging.getLogger(__name__)
 # BACKEND INTERFACE
 # ============================================================
 
+# Folga para erro de ponto flutuante na soma de emission_interval
+# (ex: 7 x 3600/7 pode dar 3600.0000000000005).
+_EPSILON = 1e-6
+
+# Com `user`, o teto por IP vira max_requests * este fator (se max_per_ip
+# nao for informado): protege contra flood anonimo sem penalizar NAT escolar.
+_FATOR_IP_AUTENTICADO = 10
+
+
+class RateLimit:
+    """
+    Um limite a avaliar: `max_requests` unidades por `window_seconds` no
+    balde (ident, key). `cost` e quanto esta request consome - 1 para
+    contagem de requests, N para orcamento de tokens.
+    """
+
+    __slots__ = ("ident", "key", "max_requests", "window_seconds", "cost")
+
+    def __init__(self, ident: str, key: str, max_requests: int, window_seconds: int, cost: int = 1):
+        self.ident = ident
+        self.key = key
+        self.max_requests = max_requests
+        self.window_seconds = window_seconds
+        self.cost = cost
+
+    @property
+    def emission_interval(self) -> float:
+        """GCRA: tempo para reabastecer 1 unidade do balde."""
+        return self.window_seconds / self.max_requests
+
+
 class _RateLimitBackend(ABC):
     """Interface comum para backends de rate limiting."""
 
     @abstractmethod
+    def check_many(self, limits: Sequence[RateLimit]) -> Optional[int]:
+        """
+        Avalia todos os limites atomicamente.
+        Retorna None se todos passam (e consome todos), ou o indice do
+        primeiro limite estourado (e nada e consumido).
+        """
+        ...
+
     def check(self, ip: str, key: str, max_requests: int, window_seconds: int) -> bool:
         """Retorna True se a request esta dentro do limite."""
-        ...
+        return self.check_many([RateLimit(ip, key, max_requests, window_seconds)]) is None
 
     @property
     @abstractmethod
@@ -56,72 +122,97 @@ class _RateLimitBackend(ABC):
 
 
 # ============================================================
-# BACKEND EM MEMORIA (deque por (ip, key))
+# BACKEND EM MEMORIA (GCRA, um float por (ip, key))
 # ============================================================
 
 class _MemoryBackend(_RateLimitBackend):
     """
-    Sliding window em memoria usando deque.
+    GCRA em memoria: guarda apenas o TAT de cada (ip, key).
     Apropriado para dev (1 worker) ou fallback quando Redis cair.
     """
 
     name = "memory"
 
     def __init__(self):
-        self._buckets: dict[tuple[str, str], deque] = defaultdict(deque)
+        self._buckets: dict[tuple[str, str], float] = {}
         self._lock = Lock()
 
-    def check(self, ip: str, key: str, max_requests: int, window_seconds: int) -> bool:
+    def check_many(self, limits: Sequence[RateLimit]) -> Optional[int]:
+        """
+        GCRA: aceita se o novo TAT (tat + custo * emission_interval) nao
+        passar de `now + window`. Com custo 1 isso permite rajada de ate
+        max_requests seguidas e depois 1 a cada emission_interval.
+        """
         now = time.time()
-        cutoff = now - window_seconds
-        bucket_key = (ip, key)
-
         with self._lock:
-            bucket = self._buckets[bucket_key]
-            # Expira timestamps fora da janela (O(k) amortizado)
-            while bucket and bucket[0] < cutoff:
-                bucket.popleft()
-
-            if len(bucket) >= max_requests:
-                return False
-            bucket.append(now)
-            return True
-
-    def cleanup(self):
-        """Remove buckets vazios para nao crescer memoria indefinidamente."""
+            novos = []
+            for i, lim in enumerate(limits):
+                bucket_key = (lim.ident, lim.key)
+                tat = max(self._buckets.get(bucket_key, now), now)
+                novo = tat + lim.emission_interval * lim.cost
+                if novo - now > lim.window_seconds + _EPSILON:
+                    return i
+                novos.append((bucket_key, novo))
+            # Todos passaram: so agora consome (tudo ou nada)
+            for bucket_key, novo in novos:
+                if novo > now:
+                    self._buckets[bucket_key] = novo
+            return None
+
+    def cleanup(self) -> int:
+        """
+        Remove chaves ociosas: TAT no passado equivale a bucket cheio, entao
+        apagar a entrada nao muda nenhuma decisao futura. Retorna quantas removeu.
+        """
+        now = time.time()
         with self._lock:
-            empty = [k for k, v in self._buckets.items() if not v]
-            for k in empty:
+            ociosas = [k for k, tat in self._buckets.items() if tat <= now]
+            for k in ociosas:
                 del self._buckets[k]
+        return len(ociosas)
 
 
 # ============================================================
-# BACKEND REDIS (sliding window atomico via Lua)
+# BACKEND REDIS (GCRA atomico via Lua)
 # ============================================================
 
-# Script Lua: atomico, sem race entre check e add.
-#   KEYS[1] = bucket key
-#   ARGV[1] = now (epoch float como string)
-#   ARGV[2] = cutoff (now - window)
-#   ARGV[3] = max_requests
-#   ARGV[4] = window_seconds (para EXPIRE)
-#   ARGV[5] = member unico (ex: uuid+now) para nao colidir
-# Retorna 1 se aceito, 0 se excedeu.
-_LUA_SLIDING_WINDOW = """
-redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, ARGV[2])
-local count = redis.call('ZCARD', KEYS[1])
-if count >= tonumber(ARGV[3]) then
-    return 0
+# Script Lua: atomico, O(1) por limite - um GET e um SET por chave, todos
+# os limites da request em um unico EVALSHA.
+#   KEYS[i]          = bucket key do limite i
+#   ARGV[1]          = now (epoch em ms)
+#   ARGV[2 + 3(i-1)] = emission_interval do limite i (ms, pode ser fracionario)
+#   ARGV[3 + 3(i-1)] = janela do limite i (ms)
+#   ARGV[4 + 3(i-1)] = custo da request no limite i
+# A chave expira (PX) quando o TAT passa - bucket cheio nao ocupa memoria.
+# Retorna 0 se todos aceitos (e grava todos), ou i (1-based) do primeiro
+# limite estourado, sem gravar nenhum.
+_LUA_GCRA = """
+local now = tonumber(ARGV[1])
+local novos = {}
+for i = 1, #KEYS do
+    local base = 2 + (i - 1) * 3
+    local tat = tonumber(redis.call('GET', KEYS[i]) or ARGV[1])
+    if tat < now then
+        tat = now
+    end
+    local novo = tat + tonumber(ARGV[base]) * tonumber(ARGV[base + 2])
+    if novo - now > tonumber(ARGV[base + 1]) then
+        return i
+    end
+    novos[i] = novo
 end
-redis.call('ZADD', KEYS[1], ARGV[1], ARGV[5])
-redis.call('EXPIRE', KEYS[1], ARGV[4])
-return 1
+for i = 1, #KEYS do
+    if novos[i] > now then
+        redis.call('SET', KEYS[i], string.format('%.3f', novos[i]), 'PX', math.ceil(novos[i] - now))
+    end
+end
+return 0
 """
 
 
 class _RedisBackend(_RateLimitBackend):
     """
-    Sliding window via Redis ZSET + Lua script atomico.
+    GCRA via Redis (uma string com o TAT por chave) + Lua script atomico.
 
     Conecta no primeiro uso (lazy). Em caso de erro, marca como offline
     por OFFLINE_COOLDOWN segundos e delega para fallback externo.
@@ -157,7 +248,7 @@ class _RedisBackend(_RateLimitBackend):
                 # Testa conexao
                 client.ping()
                 # Pre-carrega script Lua
-                self._script_sha = client.script_load(_LUA_SLIDING_WINDOW)
+                self._script_sha = client.script_load(_LUA_GCRA)
                 self._client = client
                 logger.info("Rate limiter: Redis conectado")
             except Exception as e:
@@ -181,7 +272,7 @@ class _RedisBackend(_RateLimitBackend):
     def is_offline(self) -> bool:
         return time.time() < self._offline_until
 
-    def check(self, ip: str, key: str, max_requests: int, window_seconds: int) -> bool:
+    def check_many(self, limits: Sequence[RateLimit]) -> Optional[int]:
         if self.is_offline():
             raise _RedisUnavailable()
 
@@ -190,28 +281,18 @@ class _RedisBackend(_RateLimitBackend):
         except Exception:
             raise _RedisUnavailable()
 
-        now = time.time()
-        cutoff = now - window_seconds
-        bucket_key = f"rl:{ip}:{key}"
-        # Member unico para nao colidir quando dois requests chegam no mesmo microssegundo
-        member = f"{now}:{uuid.uuid4().hex[:8]}"
+        keys = [f"rl:{lim.ident}:{lim.key}" for lim in limits]
+        args = [str(int(time.time() * 1000))]
+        for lim in limits:
+            args += [repr(lim.emission_interval * 1000), str(lim.window_seconds * 1000), str(lim.cost)]
 
         try:
-            result = client.evalsha(
-                self._script_sha,
-                1,
-                bucket_key,
-                str(now),
-                str(cutoff),
-                str(max_requests),
-                str(window_seconds + 1),
-                member,
-            )
-            return bool(int(result))
+            result = int(client.evalsha(self._script_sha, len(keys), *keys, *args))
         except Exception as e:
             # Qualquer erro de Redis -> degrade graceful
             self._mark_offline(e)
             raise _RedisUnavailable()
+        return None if result == 0 else result - 1
 
 
 class _RedisUnavailable(Exception):
@@ -259,17 +340,22 @@ def _redacted_url(url: str) -> str:
         return "redis://***"
 
 
-def _check(ip: str, key: str, max_requests: int, window_seconds: int) -> bool:
+def _check_many(limits: Sequence[RateLimit]) -> Optional[int]:
     """Dispatcher: tenta Redis, cai para memoria se offline."""
     _init_backends()
 
     if _redis_backend is not None and not _redis_backend.is_offline():
         try:
-            return _redis_backend.check(ip, key, max_requests, window_seconds)
+            return _redis_backend.check_many(limits)
         except _RedisUnavailable:
             pass  # Fallback abaixo
 
-    return _memory_backend.check(ip, key, max_requests, window_seconds)
+    return _memory_backend.check_many(limits)
+
+
+def _check(ip: str, key: str, max_requests: int, window_seconds: int) -> bool:
+    """Compat: limite unico por IP."""
+    return _check_many([RateLimit(ip, key, max_requests, window_seconds)]) is None
 
 
 # ============================================================
@@ -296,37 +382,96 @@ def _get_client_ip(request: Request) -> str:
     return "unknown"
 
 
+# Chave do balde de orcamento de tokens de IA (compartilhado entre endpoints)
+_AI_TOKENS_KEY = "ai_tokens"
+
+
+def _build_limits(
+    request: Request,
+    key: str,
+    max_requests: int,
+    window_seconds: int,
+    user=None,
+    max_per_ip: Optional[int] = None,
+    max_per_escola: Optional[int] = None,
+    ai_tokens: int = 0,
+) -> list[RateLimit]:
+    """Monta a lista de limites (dimensoes) de uma request."""
+    ip = _get_client_ip(request)
+
+    if user is None:
+        return [RateLimit(ip, key, max_requests, window_seconds)]
+
+    limits = [
+        RateLimit(f"user:{user.id}", key, max_requests, window_seconds),
+        RateLimit(ip, key, max_per_ip or max_requests * _FATOR_IP_AUTENTICADO, window_seconds),
+    ]
+    escola_id = getattr(user, "escola_id", None)
+    if escola_id:
+        if max_per_escola:
+            limits.append(RateLimit(f"escola:{escola_id}", key, max_per_escola, window_seconds))
+        if ai_tokens > 0:
+            from app.core.config import settings
+            limits.append(RateLimit(
+                f"escola:{escola_id}", _AI_TOKENS_KEY,
+                settings.RATE_LIMIT_AI_TOKENS_ESCOLA_HORA, 3600, cost=ai_tokens,
+            ))
+    return limits
+
+
 def check_rate_limit(
     request: Request,
     key: str,
     max_requests: int,
     window_seconds: int,
     error_message: str = None,
+    user=None,
+    max_per_ip: Optional[int] = None,
+    max_per_escola: Optional[int] = None,
+    ai_tokens: int = 0,
 ):
     """
-    Verifica se o IP atingiu o limite de requests para a chave `key`.
+    Verifica se a request atingiu o limite para a chave `key`.
     Se sim, levanta HTTPException 429.
 
     Args:
         request: FastAPI Request (para extrair IP)
         key: identificador do endpoint (ex: "checkout", "login", "gerar_material")
-        max_requests: numero maximo de requests na janela
+        max_requests: numero maximo de requests na janela (por IP, ou por
+                      usuario quando `user` e informado)
         window_seconds: tamanho da janela em segundos
         error_message: mensagem customizada (opcional)
+        user: usuario autenticado (opcional) - ativa limites por usuario/escola
+        max_per_ip: teto por IP quando `user` e informado
+                    (default: max_requests * 10, folga para NAT de escola)
+        max_per_escola: teto agregado da escola do usuario na janela (opcional)
+        ai_tokens: tokens de IA estimados da operacao, debitados do orcamento
+                   horario da escola (settings.RATE_LIMIT_AI_TOKENS_ESCOLA_HORA)
 
     Exemplos:
         check_rate_limit(request, "checkout", 3, 3600)  # 3 por hora
         check_rate_limit(request, "login", 10, 60)      # 10 por minuto
-        check_rate_limit(request, "gerar_ia", 20, 3600) # 20 por hora
+        check_rate_limit(request, "gerar_ia", 20, 3600, user=current_user, ai_tokens=4096)
     """
-    ip = _get_client_ip(request)
+    limits = _build_limits(
+        request, key, max_requests, window_seconds,
+        user=user, max_per_ip=max_per_ip, max_per_escola=max_per_escola, ai_tokens=ai_tokens,
+    )
 
-    if not _check(ip, key, max_requests, window_seconds):
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail=error_message or "Muitas requisicoes. Tente novamente em alguns minutos.",
-            headers={"Retry-After": str(window_seconds)},
-        )
+    estourado = _check_many(limits)
+    if estourado is None:
+        return
+
+    limite = limits[estourado]
+    if limite.key == _AI_TOKENS_KEY:
+        detail = "Orcamento de uso de IA da escola esgotado nesta hora. Tente novamente mais tarde."
+    else:
+        detail = error_message or "Muitas requisicoes. Tente novamente em alguns minutos."
+    raise HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(limite.window_seconds)},
+    )
 
 
 def get_store():
@@ -336,6 +481,18 @@ def get_store():
     return _memory_backend
 
 
+async def loop_limpeza(intervalo_segundos: int):
+    """Task do lifespan: remove chaves ociosas do backend em memoria."""
+    while True:
+        await asyncio.sleep(intervalo_segundos)
+        try:
+            removidas = _memory_backend.cleanup()
+            if removidas:
+                logger.debug("Rate limiter: %d chaves ociosas removidas", removidas)
+        except Exception:
+            logger.warning("Erro na limpeza do rate limiter em memoria", exc_info=True)
+
+
 def get_active_backend_name() -> str:
     """Util para /health e testes: nome do backend em uso agora."""
     _init_backends()
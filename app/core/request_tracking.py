@@ -0,0 +1,94 @@
+"""
+Middleware de request tracking (observabilidade).
+
+Gera request_id unico por request e loga duracao/status.
+Util para debugar "o que aconteceu naquele request?" rastreando logs pelo X-Request-ID.
+
+Implementacao: middleware ASGI puro, pelo mesmo motivo do
+SecurityHeadersMiddleware (ver app/core/security_headers.py) - sem a task
+extra e o stream em memoria do BaseHTTPMiddleware. De quebra a duracao
+logada agora inclui o envio do corpo (antes parava no primeiro byte).
+
+Tambem conta os statements SQL do request (app/core/query_counter.py):
+`queries` vai no log e acima de QUERIES_ALERTA o request sobe para WARNING
+(sinal de N+1).
+"""
+from __future__ import annotations
+
+import time
+import uuid
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.logging_config import get_logger
+from app.core.query_counter import QUERIES_ALERTA, contar_queries
+
+logger = get_logger(__name__)
+
+
+def _is_noisy(path: str) -> bool:
+    """Rotas de health/static nao sao logadas (poluicao)."""
+    return path in ("/health", "/", "/favicon.ico") or path.startswith("/storage/")
+
+
+class RequestTrackingMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Aceita X-Request-ID do cliente (permite rastreio ponta-a-ponta) ou gera um
+        request_id = Headers(scope=scope).get("x-request-id") or str(uuid.uuid4())[:8]
+        # Equivalente a request.state.request_id para as rotas
+        scope.setdefault("state", {})["request_id"] = request_id
+
+        start = time.perf_counter()
+        path = scope["path"]
+        status_code = None
+
+        async def send_com_request_id(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message)["X-Request-ID"] = request_id
+            await send(message)
+
+        try:
+            with contar_queries() as queries:
+                await self.app(scope, receive, send_com_request_id)
+        except Exception:
+            duration_ms = round((time.perf_counter() - start) * 1000, 1)
+            logger.error(
+                "request failed with exception",
+                extra={
+                    "request_id": request_id,
+                    "method": scope["method"],
+                    "path": path,
+                    "duration_ms": duration_ms,
+                },
+                exc_info=True,
+            )
+            raise
+
+        # Log apenas requests interessantes (nao health checks)
+        if _is_noisy(path) or status_code is None:
+            return
+        duration_ms = round((time.perf_counter() - start) * 1000, 1)
+        log_level = logger.warning if (status_code >= 500 or queries.total > QUERIES_ALERTA) else (
+            logger.info if status_code >= 400 else logger.debug
+        )
+        log_level(
+            "request processed",
+            extra={
+                "request_id": request_id,
+                "method": scope["method"],
+                "path": path,
+                "status": status_code,
+                "duration_ms": duration_ms,
+                "queries": queries.total,
+            },
+        )
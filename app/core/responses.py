@@ -0,0 +1,102 @@
+"""
+Resposta JSON rapida (orjson) usada como default_response_class da app.
+
+MOTIVACAO: endpoints como /materiais-adaptados/historico/{id},
+/planejamento-bncc/pei/{id}/completo, listagens de relatorios e
+/professor/analytics/* devolvem dicts de centenas de KB. O caminho padrao
+do FastAPI e jsonable_encoder (percorre o payload inteiro em Python,
+recriando cada dict/list) + json.dumps da stdlib. orjson serializa em C e
+ja entende datetime/date/UUID/Enum/dataclass.
+
+Dois niveis de uso:
+
+    1. App inteira (automatico): main.py usa
+       FastAPI(default_response_class=FastJSONResponse). Troca so o
+       json.dumps - jsonable_encoder continua rodando.
+
+    2. Endpoints pesados: devolver a resposta pronta pula tambem o
+       jsonable_encoder (FastAPI nao re-serializa um Response):
+
+           from app.core.responses import FastJSONResponse
+
+           @router.get("/pesado")
+           def pesado(...):
+               return FastJSONResponse({"items": [...]})
+
+       So usar quando o payload e feito de tipos simples (dict/list/str/
+       numeros/datetime/Decimal/Enum) - sem objetos ORM - e a rota nao
+       declara response_model (que seria ignorado).
+
+Se orjson nao estiver instalado, cai para json da stdlib com o mesmo
+`default`, entao a saida e equivalente (so mais lenta).
+"""
+from __future__ import annotations
+
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from enum import Enum
+from typing import Any
+from uuid import UUID
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependencia opcional
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """
+    Tipos que orjson/json nao serializam sozinhos, convertidos como o
+    jsonable_encoder do FastAPI faria (saida identica para o frontend).
+    """
+    if isinstance(obj, Decimal):
+        # Mesmo criterio do FastAPI: inteiro se nao tem casas decimais
+        return int(obj) if obj.as_tuple().exponent >= 0 else float(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, timedelta):
+        return obj.total_seconds()
+    if isinstance(obj, UUID):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Tipo nao serializavel em JSON: {type(obj).__name__}")
+
+
+if orjson is not None:
+    # OPT_NON_STR_KEYS: dicts com chave int (ex: objetivos_por_trimestre)
+    # viram "1", "2"... como no jsonable_encoder.
+    _ORJSON_OPTS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(content: Any) -> bytes:
+        """Serializa para bytes JSON (UTF-8, sem espacos)."""
+        return orjson.dumps(content, default=_default, option=_ORJSON_OPTS)
+else:
+    def dumps(content: Any) -> bytes:
+        """Serializa para bytes JSON (UTF-8, sem espacos)."""
+        return json.dumps(
+            content,
+            default=_default,
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse serializada com orjson (ou stdlib como fallback)."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -25,15 +25,20 @@ Por que conservador?
     extra sem ganho proporcional enquanto o tamanho da superficie de ataque
     e moderado. Deixado para quando o produto estabilizar.
 
+Implementacao: middleware ASGI puro (nao BaseHTTPMiddleware). O
+BaseHTTPMiddleware roda a app em uma task separada e repassa o corpo por
+um stream em memoria em TODA request - overhead por request, respostas em
+streaming bufferizadas e BackgroundTasks "presas" ao ciclo do middleware.
+Aqui so interceptamos a mensagem http.response.start e mexemos nos headers.
+
 Referencias:
     - OWASP Secure Headers Project
     - https://developer.mozilla.org/en-US/docs/Web/HTTP/Headers#security
 """
 from __future__ import annotations
 
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.responses import Response
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 
 # Headers aplicados em TODA resposta - sao seguros universalmente.
@@ -67,7 +72,7 @@ _PATHS_SEM_FRAME_OPTIONS = (
 )
 
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
+class SecurityHeadersMiddleware:
     """
     Aplica security headers nas respostas.
 
@@ -78,29 +83,39 @@ class SecurityHeadersMiddleware(BaseHTTPMiddleware):
                        futura ao mesmo host se usar HTTP.
     """
 
-    def __init__(self, app, *, is_production: bool):
-        super().__init__(app)
+    def __init__(self, app: ASGIApp, *, is_production: bool):
+        self.app = app
         self.is_production = is_production
 
-    async def dispatch(self, request: Request, call_next) -> Response:
-        response = await call_next(request)
-
-        # Aplicar headers universais
-        for k, v in _HEADERS_SEMPRE.items():
-            # Nao sobrescrever se o endpoint ja setou (caso raro mas possivel)
-            response.headers.setdefault(k, v)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # WebSocket e lifespan passam direto
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
         # X-Frame-Options: DENY exceto em paths que precisam ser embutidos
-        path = request.url.path
-        if not any(path.startswith(p) for p in _PATHS_SEM_FRAME_OPTIONS):
-            response.headers.setdefault("X-Frame-Options", "DENY")
-
-        # HSTS so em producao. 1 ano de max-age, includeSubDomains,
-        # mas SEM "preload" - preload exige garantias operacionais.
-        if self.is_production:
-            response.headers.setdefault(
-                "Strict-Transport-Security",
-                "max-age=31536000; includeSubDomains",
-            )
-
-        return response
+        path = scope["path"]
+        com_frame_options = not any(path.startswith(p) for p in _PATHS_SEM_FRAME_OPTIONS)
+
+        async def send_com_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+
+                # Aplicar headers universais.
+                # Nao sobrescrever se o endpoint ja setou (caso raro mas possivel)
+                for k, v in _HEADERS_SEMPRE.items():
+                    headers.setdefault(k, v)
+
+                if com_frame_options:
+                    headers.setdefault("X-Frame-Options", "DENY")
+
+                # HSTS so em producao. 1 ano de max-age, includeSubDomains,
+                # mas SEM "preload" - preload exige garantias operacionais.
+                if self.is_production:
+                    headers.setdefault(
+                        "Strict-Transport-Security",
+                        "max-age=31536000; includeSubDomains",
+                    )
+            await send(message)
+
+        await self.app(scope, receive, send_com_headers)
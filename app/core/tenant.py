@@ -9,6 +9,14 @@ from app.models.user import User, UserRole
 from app.models.escola import Escola
 from app.models.assinatura import Assinatura, StatusAssinatura
 from app.api.dependencies import get_current_user
+from app.core import metering
+
+
+MENSAGENS_LIMITE_MENSAL = {
+    "provas": "Limite de provas mensais atingido. Aguarde o próximo mês ou faça upgrade.",
+    "materiais": "Limite de materiais mensais atingido. Aguarde o próximo mês ou faça upgrade.",
+    "peis": "Limite de PEIs mensais atingido. Aguarde o próximo mês ou faça upgrade.",
+}
 
 
 class TenantContext:
@@ -61,23 +69,49 @@ class TenantContext:
             return False
         return self.assinatura.professores_ativos < self.assinatura.plano.limite_professores
     
+    def _limite_mensal(self, recurso: str) -> Optional[int]:
+        """Limite mensal do plano para o recurso (None se sem assinatura/plano)."""
+        if not self.assinatura or not self.assinatura.plano or not self.escola_id:
+            return None
+        _, coluna_limite = metering.RECURSOS[recurso]
+        return getattr(self.assinatura.plano, coluna_limite)
+
+    def verificar_limite_mensal(self, recurso: str) -> bool:
+        """
+        Verifica (sem consumir) se ainda ha saldo no mes para o recurso.
+        Le o contador do metering, nao a coluna *_mes_atual (que e so espelho).
+        """
+        limite = self._limite_mensal(recurso)
+        if limite is None:
+            return False
+        return metering.uso_atual(self.escola_id, recurso) < limite
+
+    def consumir_limite(self, recurso: str, quantidade: int = 1) -> bool:
+        """
+        Check-and-increment atomico do uso mensal.
+        Retorna False (sem consumir) se estouraria o limite do plano.
+        """
+        limite = self._limite_mensal(recurso)
+        if limite is None:
+            return False
+        return metering.consumir(self.escola_id, recurso, limite, quantidade)
+
+    def estornar_limite(self, recurso: str, quantidade: int = 1):
+        """Devolve uso consumido quando a operacao falha depois do consumo."""
+        if self.escola_id:
+            metering.estornar(self.escola_id, recurso, quantidade)
+
     def verificar_limite_provas(self) -> bool:
         """Verifica se pode criar mais provas este mês"""
-        if not self.assinatura or not self.assinatura.plano:
-            return False
-        return self.assinatura.provas_mes_atual < self.assinatura.plano.limite_provas_mes
-    
+        return self.verificar_limite_mensal("provas")
+
     def verificar_limite_materiais(self) -> bool:
         """Verifica se pode criar mais materiais este mês"""
-        if not self.assinatura or not self.assinatura.plano:
-            return False
-        return self.assinatura.materiais_mes_atual < self.assinatura.plano.limite_materiais_mes
-    
+        return self.verificar_limite_mensal("materiais")
+
     def verificar_limite_peis(self) -> bool:
         """Verifica se pode gerar mais PEIs este mês"""
-        if not self.assinatura or not self.assinatura.plano:
-            return False
-        return self.assinatura.peis_mes_atual < self.assinatura.plano.limite_peis_mes
+        return self.verificar_limite_mensal("peis")
 
 
 async def get_tenant_context(
@@ -172,39 +206,74 @@ def check_limite_alunos(tenant: TenantContext = Depends(require_active_subscript
 
 
 def check_limite_provas(tenant: TenantContext = Depends(require_active_subscription)):
-    """Verifica limite de provas antes de criar nova"""
+    """
+    Verifica (sem consumir) se ainda ha saldo de provas no mes. Quem gera de
+    fato consome com tenant.consumir_limite("provas") e, se falhar depois,
+    devolve com tenant.estornar_limite("provas").
+    """
     if tenant.user and tenant.user.role == UserRole.SUPER_ADMIN:
         return tenant
     
     if not tenant.verificar_limite_provas():
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
-            detail="Limite de provas mensais atingido. Aguarde o próximo mês ou faça upgrade."
+            detail=MENSAGENS_LIMITE_MENSAL["provas"]
         )
     return tenant
 
 
 def check_limite_materiais(tenant: TenantContext = Depends(require_active_subscription)):
-    """Verifica limite de materiais antes de criar novo"""
+    """
+    Verifica (sem consumir) se ainda ha saldo de materiais no mes. Quem gera de
+    fato consome com tenant.consumir_limite("materiais") e, se falhar depois,
+    devolve com tenant.estornar_limite("materiais").
+    """
     if tenant.user and tenant.user.role == UserRole.SUPER_ADMIN:
         return tenant
     
     if not tenant.verificar_limite_materiais():
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
-            detail="Limite de materiais mensais atingido. Aguarde o próximo mês ou faça upgrade."
+            detail=MENSAGENS_LIMITE_MENSAL["materiais"]
         )
     return tenant
 
 
 def check_limite_peis(tenant: TenantContext = Depends(require_active_subscription)):
-    """Verifica limite de PEIs antes de gerar novo"""
+    """
+    Verifica (sem consumir) se ainda ha saldo de PEIs no mes. Quem gera de
+    fato consome com tenant.consumir_limite("peis") e, se falhar depois,
+    devolve com tenant.estornar_limite("peis").
+    """
     if tenant.user and tenant.user.role == UserRole.SUPER_ADMIN:
         return tenant
     
     if not tenant.verificar_limite_peis():
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
-            detail="Limite de PEIs mensais atingido. Aguarde o próximo mês ou faça upgrade."
+            detail=MENSAGENS_LIMITE_MENSAL["peis"]
         )
     return tenant
+
+
+def consumir_limite_mensal(tenant: TenantContext, recurso: str, quantidade: int = 1) -> bool:
+    """
+    Consome `quantidade` do limite mensal do plano ou levanta 403.
+
+    Chamado pelas rotas que de fato criam provas/materiais/PEIs, depois de
+    validar a entrada. Retorna True se consumiu - nesse caso a rota devolve
+    com tenant.estornar_limite(recurso, quantidade) se a criacao falhar.
+    Super admin e usuarios sem escola/plano (legado) nao sao medidos e
+    recebem False.
+    """
+    if tenant.user and tenant.user.role == UserRole.SUPER_ADMIN:
+        return False
+    if tenant._limite_mensal(recurso) is None:
+        return False
+
+    if not tenant.consumir_limite(recurso, quantidade):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=MENSAGENS_LIMITE_MENSAL[recurso]
+        )
+    return True
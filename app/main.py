@@ -1,12 +1,12 @@
 import os
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from fastapi.responses import JSONResponse
 from pathlib import Path
 from app.core.config import settings
 from app.core.logging_config import setup_logging, get_logger
+from app.core.responses import FastJSONResponse
 from app.database import engine, Base
 
 # Fonte unica da verdade para deteccao de producao. Ver comentario em
@@ -119,9 +119,27 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning("Erro no cleanup de background_tasks", exc_info=True)
     
+    import asyncio
+    
+    # Catalogo BNCC em memoria (app/services/bncc_catalogo.py). Em thread para
+    # nao travar o loop; se o banco estiver fora, carrega no primeiro uso.
+    from app.services.bncc_catalogo import carregar_catalogo
+    await asyncio.to_thread(carregar_catalogo)
+    
+    # Reconciliacao periodica do metering (contadores -> Assinatura.*_mes_atual)
+    from app.core.metering import loop_reconciliacao
+    intervalo_reconciliacao = int(os.getenv("METERING_RECONCILE_SECONDS", "300"))
+    tarefa_reconciliacao = asyncio.create_task(loop_reconciliacao(intervalo_reconciliacao))
+    
+    # Limpeza periodica das chaves ociosas do rate limiter em memoria
+    from app.core.rate_limit import loop_limpeza
+    tarefa_limpeza_rate_limit = asyncio.create_task(loop_limpeza(60))
+    
     yield
     
     # ========== SHUTDOWN ==========
+    tarefa_reconciliacao.cancel()
+    tarefa_limpeza_rate_limit.cancel()
     logger.info("AdaptAI backend shutting down")
 
 
@@ -141,6 +159,8 @@ app = FastAPI(
         "name": "MIT",
     },
     lifespan=lifespan,
+    # orjson em vez de json da stdlib em todas as respostas (ver app/core/responses.py)
+    default_response_class=FastJSONResponse,
 )
 
 # ============================================
@@ -202,59 +222,9 @@ app.add_middleware(
 # ============================================
 # Gera request_id unico por request e loga duracao/status.
 # Util para debugar "o que aconteceu naquele request?" rastreando logs pelo X-Request-ID.
+# ASGI puro (sem BaseHTTPMiddleware) - ver app/core/request_tracking.py.
 
-import uuid
-import time
-from starlette.middleware.base import BaseHTTPMiddleware
-
-
-class RequestTrackingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Aceita X-Request-ID do cliente (permite rastreio ponta-a-ponta) ou gera um
-        request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())[:8]
-        request.state.request_id = request_id
-        
-        start = time.perf_counter()
-        
-        # Evita logar rotas de health/static (poluicao)
-        path = request.url.path
-        is_noisy = path in ("/health", "/", "/favicon.ico") or path.startswith("/storage/")
-        
-        try:
-            response = await call_next(request)
-            duration_ms = round((time.perf_counter() - start) * 1000, 1)
-            response.headers["X-Request-ID"] = request_id
-            
-            # Log apenas requests interessantes (nao health checks)
-            if not is_noisy:
-                log_level = logger.warning if response.status_code >= 500 else (
-                    logger.info if response.status_code >= 400 else logger.debug
-                )
-                log_level(
-                    "request processed",
-                    extra={
-                        "request_id": request_id,
-                        "method": request.method,
-                        "path": path,
-                        "status": response.status_code,
-                        "duration_ms": duration_ms,
-                    },
-                )
-            return response
-        except Exception:
-            duration_ms = round((time.perf_counter() - start) * 1000, 1)
-            logger.error(
-                "request failed with exception",
-                extra={
-                    "request_id": request_id,
-                    "method": request.method,
-                    "path": path,
-                    "duration_ms": duration_ms,
-                },
-                exc_info=True,
-            )
-            raise
-
+from app.core.request_tracking import RequestTrackingMiddleware
 
 app.add_middleware(RequestTrackingMiddleware)
 
@@ -270,13 +240,24 @@ from app.core.security_headers import SecurityHeadersMiddleware
 app.add_middleware(SecurityHeadersMiddleware, is_production=IS_PRODUCTION)
 
 
+# ============================================
+# Compressao de respostas (brotli/gzip)
+# ============================================
+# JSON/HTML textuais acima de 1KB saem comprimidos conforme Accept-Encoding.
+# WebSocket e SSE passam direto. Ver app/core/compression.py.
+
+from app.core.compression import CompressionMiddleware, PrecompressedStaticFiles
+app.add_middleware(CompressionMiddleware)
+
+
 # ============================================
 # Storage para arquivos estáticos
 # ============================================
 
 storage_materiais_path = Path(__file__).parent.parent / "storage" / "materiais"
 storage_materiais_path.mkdir(parents=True, exist_ok=True)
-app.mount("/storage/materiais", StaticFiles(directory=str(storage_materiais_path)), name="materiais_storage")
+# Serve o irmao .gz gravado pelo storage quando o cliente aceita gzip
+app.mount("/storage/materiais", PrecompressedStaticFiles(directory=str(storage_materiais_path)), name="materiais_storage")
 
 # ATENÇÃO: /storage/relatorios NÃO é mais montado como estático.
 # Laudos médicos sao dados sensiveis de saude (LGPD art. 11).
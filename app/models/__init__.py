@@ -27,6 +27,7 @@ from app.models.prova import (
 
 # Análises e Relatórios
 from app.models.performance import PerformanceAnalysis
+from app.models.performance_rollup import StudentPerformanceRollup
 from app.models.relatorio import Relatorio
 from app.models.analise_qualitativa import AnaliseQualitativa
 
@@ -101,6 +102,9 @@ from app.models.planejamento_job import (
     JobStatus
 )
 
+# Adaptacoes BNCC reutilizaveis entre alunos (mesmo perfil diagnostico)
+from app.models.adaptacao_bncc import AdaptacaoBNCC
+
 # Background Tasks (E2 - persistidos no DB)
 from app.models.background_task import (
     BackgroundTask,
@@ -110,6 +114,9 @@ from app.models.background_task import (
 # Cache de respostas de IA (E3 - economia de creditos Anthropic)
 from app.models.ai_cache import AICache
 
+# Contadores de uso mensal por escola (metering dos limites do plano)
+from app.models.uso_mensal import UsoMensal
+
 
 __all__ = [
     # Multi-tenant
@@ -144,6 +151,7 @@ __all__ = [
     
     # Análises
     "PerformanceAnalysis",
+    "StudentPerformanceRollup",
     "Relatorio",
     "AnaliseQualitativa",
     
@@ -203,6 +211,7 @@ __all__ = [
     "PlanejamentoJob",
     "PlanejamentoJobLog",
     "JobStatus",
+    "AdaptacaoBNCC",
     
     # Background Tasks
     "BackgroundTask",
@@ -210,4 +219,7 @@ __all__ = [
     
     # Cache de IA
     "AICache",
+    
+    # Metering
+    "UsoMensal",
 ]
@@ -0,0 +1,53 @@
+"""
+Modelo SQLAlchemy das adaptacoes BNCC reutilizaveis entre alunos.
+
+MOTIVACAO: alunos do mesmo ano com perfil diagnostico equivalente (ex.:
+TEA nivel 1 + TDAH) recebem adaptacoes praticamente iguais para cada
+habilidade, mas todo planejamento completo chamava a IA de novo para as
+~200 habilidades. Esta tabela guarda o objetivo adaptado gerado a partir
+do perfil CANONICO (ano + condicoes, sem texto livre) e e consultada antes
+de chamar a IA (ver app/services/adaptacoes_bncc.py).
+
+Uma linha por (codigo_bncc, assinatura do perfil, modelo):
+    - assinatura: sha256 de perfil_canonico (ex.: "5_ano|tdah,tea:1")
+    - modelo: modelos diferentes geram textos diferentes - nao se misturam
+"""
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Index, UniqueConstraint
+from datetime import datetime, timezone
+
+from app.database import Base
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+class AdaptacaoBNCC(Base):
+    """
+    Objetivo adaptado de uma habilidade BNCC para um perfil canonico.
+    """
+    __tablename__ = "adaptacoes_bncc"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    codigo_bncc = Column(String(20), nullable=False)
+    assinatura = Column(String(64), nullable=False)
+    model = Column(String(100), nullable=False)
+
+    # Forma legivel da assinatura, para auditoria/limpeza
+    perfil_canonico = Column(String(255), nullable=False)
+
+    # Objetivo no formato de ObjetivoAdaptadoIA (sem marcadores "_...")
+    objetivo = Column(JSON, nullable=False)
+
+    # Quantos planejamentos reutilizaram a linha (monitorar eficacia)
+    hit_count = Column(Integer, default=0, nullable=False)
+
+    created_at = Column(DateTime, default=_utcnow, nullable=False)
+    last_hit_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("codigo_bncc", "assinatura", "model", name="uq_adaptacao_bncc_codigo_perfil_modelo"),
+        # Lookup de um componente inteiro: WHERE assinatura/model + codigo IN (...)
+        Index("idx_adaptacao_bncc_perfil", "assinatura", "model"),
+    )
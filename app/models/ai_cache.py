@@ -51,4 +51,6 @@ class AICache(Base):
     # Index composto para lookup rapido
     __table_args__ = (
         Index("idx_ai_cache_lookup", "prompt_hash", "model"),
+        # Paginacao por cursor (created_at, id) - migration 008
+        Index("idx_ai_cache_created_id", "created_at", "id"),
     )
@@ -11,7 +11,7 @@ em memoria. Isso tem tres problemas:
 
 Esta tabela resolve os tres.
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Enum, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Enum, ForeignKey, Index
 from datetime import datetime, timezone
 import enum
 
@@ -72,6 +72,11 @@ class BackgroundTask(Base):
     started_at = Column(DateTime, nullable=True)
     completed_at = Column(DateTime, nullable=True)
     
+    # Paginacao por cursor (created_at, id) - migration 008
+    __table_args__ = (
+        Index("idx_background_tasks_created_id", "created_at", "id"),
+    )
+    
     def to_dict(self):
         duration = None
         if self.completed_at and self.started_at:
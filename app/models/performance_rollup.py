@@ -0,0 +1,79 @@
+"""
+Modelo SQLAlchemy do rollup de desempenho por aluno (agregados pre-calculados).
+
+MOTIVACAO: as telas de analytics recalculavam medias, aprovacoes e acertos
+por habilidade a partir de todo o historico (ProvaAluno/RespostaAluno/
+StudentAnswer) em cada request. Esta tabela guarda os contadores ja
+somados e e atualizada na MESMA transacao que corrige a prova/aplicacao
+(ver app/services/performance_rollup.py).
+
+Uma linha por (aluno, professor, fonte, materia, habilidade):
+    - fonte: "prova" (ProvaAluno) ou "aplicacao" (Application)
+    - habilidade "" = total da materia; demais linhas = por habilidade
+      (tags da QuestaoGerada / Question.skill)
+    - professor = Prova.criado_por_id / Application.applied_by_user_id,
+      para as telas do professor filtrarem so o que e dele
+
+Strings vazias (e nao NULL) nas chaves para a unique funcionar no MySQL.
+So contadores aditivos (+ max/min/ultima data), entao o incremento e um
+UPDATE col = col + delta, sem ler a linha antes.
+"""
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index, UniqueConstraint
+from datetime import datetime, timezone
+
+from app.database import Base
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+class StudentPerformanceRollup(Base):
+    """
+    Contadores de desempenho de um aluno por fonte/materia/habilidade.
+    """
+    __tablename__ = "student_performance_rollup"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), nullable=False)
+    professor_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+
+    # "prova" | "aplicacao"
+    fonte = Column(String(20), nullable=False)
+    materia = Column(String(100), nullable=False, default="")
+    # "" = linha de total da materia
+    habilidade = Column(String(100), nullable=False, default="")
+
+    # Avaliacoes (provas/aplicacoes corrigidas) que contribuiram para a linha
+    avaliacoes = Column(Integer, default=0, nullable=False)
+    avaliacoes_com_nota = Column(Integer, default=0, nullable=False)
+    # Notas na escala 0-10 (aplicacao: % de acerto / 10)
+    soma_notas = Column(Float, default=0.0, nullable=False)
+    nota_maxima = Column(Float, nullable=True)
+    nota_minima = Column(Float, nullable=True)
+    aprovacoes = Column(Integer, default=0, nullable=False)
+    reprovacoes = Column(Integer, default=0, nullable=False)
+
+    questoes_total = Column(Integer, default=0, nullable=False)
+    questoes_corretas = Column(Integer, default=0, nullable=False)
+
+    ultima_avaliacao_em = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=_utcnow, onupdate=_utcnow, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint(
+            "student_id", "professor_id", "fonte", "materia", "habilidade",
+            name="uq_rollup_aluno_professor_fonte_materia_habilidade",
+        ),
+        # Telas do professor: todas as linhas dele (de varios alunos)
+        Index("idx_rollup_professor_aluno", "professor_id", "student_id"),
+    )
+
+    @property
+    def media(self) -> float:
+        return self.soma_notas / self.avaliacoes_com_nota if self.avaliacoes_com_nota else 0.0
+
+    @property
+    def percentual_acerto(self) -> float:
+        return self.questoes_corretas / self.questoes_total * 100 if self.questoes_total else 0.0
@@ -4,7 +4,7 @@
 # Armazena o estado de jobs de planejamento para
 # permitir retomada em caso de interrupção
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Enum, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Enum, ForeignKey, Float, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 import enum
@@ -128,3 +128,8 @@ class PlanejamentoJobLog(Base):
     
     # Relacionamento
     job = relationship("PlanejamentoJob", backref="logs")
+    
+    # Logs de um job paginados por cursor (created_at, id) - migration 008
+    __table_args__ = (
+        Index("idx_planejamento_job_logs_job_created_id", "job_id", "created_at", "id"),
+    )
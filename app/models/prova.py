@@ -2,7 +2,7 @@
 🎓 AdaptAI - Models de Prova
 Sistema de geração de provas com IA
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, Boolean, JSON, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, Boolean, JSON, Index, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 import enum
@@ -79,6 +79,11 @@ class Prova(Base):
     questoes = relationship("QuestaoGerada", back_populates="prova", cascade="all, delete-orphan")
     provas_alunos = relationship("ProvaAluno", back_populates="prova", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Analytics do professor sempre filtra por criador
+        Index("idx_provas_criado_por", "criado_por_id"),
+    )
+
 
 class QuestaoGerada(Base):
     """
@@ -152,6 +157,12 @@ class ProvaAluno(Base):
     respostas = relationship("RespostaAluno", back_populates="prova_aluno", cascade="all, delete-orphan")
     analise_qualitativa = relationship("AnaliseQualitativa", back_populates="prova_aluno", uselist=False, cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Cobre os agregados do dashboard do professor (contagem por status,
+        # media de nota, aprovados) sem ler a linha inteira
+        Index("idx_provas_alunos_prova_status_nota", "prova_id", "status", "nota_final", "aprovado"),
+    )
+
 
 class RespostaAluno(Base):
     """
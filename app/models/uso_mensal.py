@@ -0,0 +1,62 @@
+"""
+Modelo SQLAlchemy para contadores de uso mensal por escola (metering).
+
+MOTIVACAO: os limites do plano (provas/materiais/PEIs por mes) eram
+verificados lendo as colunas *_mes_atual de Assinatura. Isso tem dois
+problemas:
+1. Check e incremento separados = race: duas geracoes simultaneas leem
+   99/100 e as duas passam.
+2. Todo incremento escreve na linha de assinatura da escola, que e
+   lida em TODA request autenticada (hot row).
+
+Esta tabela guarda um contador por (escola, recurso, periodo). O incremento
+e um unico UPDATE ... WHERE usado + n <= limite (atomico no InnoDB), e as
+colunas de Assinatura passam a ser um espelho atualizado periodicamente
+pela reconciliacao (ver app/core/metering.py).
+
+Quando REDIS_URL esta configurada, os contadores vivem no Redis e esta
+tabela recebe os snapshots da reconciliacao e segura os consumos feitos
+enquanto o Redis estava fora (usado - sincronizado), que a reconciliacao
+soma de volta no Redis.
+"""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, UniqueConstraint
+from datetime import datetime, timezone
+
+from app.database import Base
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+class UsoMensal(Base):
+    """
+    Contador de uso de um recurso por escola em um periodo (AAAAMM).
+    """
+    __tablename__ = "uso_mensal"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    escola_id = Column(Integer, ForeignKey("escolas.id"), nullable=False)
+
+    # "provas", "materiais", "peis", "relatorios"
+    recurso = Column(String(30), nullable=False)
+
+    # Periodo no formato AAAAMM (ex: "202610") - chave mensal
+    periodo = Column(String(6), nullable=False)
+
+    usado = Column(Integer, default=0, nullable=False)
+
+    # Valor de `usado` na ultima reconciliacao com o Redis. usado - sincronizado
+    # = consumo feito no banco (fallback) que o Redis ainda nao conhece.
+    sincronizado = Column(Integer, default=0, nullable=False)
+
+    updated_at = Column(DateTime, default=_utcnow, onupdate=_utcnow, nullable=False)
+
+    # Unique garante uma linha por (escola, recurso, periodo) e serve de
+    # indice para o UPDATE atomico de consumo.
+    __table_args__ = (
+        UniqueConstraint("escola_id", "recurso", "periodo", name="uq_uso_mensal_escola_recurso_periodo"),
+        # Reconciliacao le o periodo inteiro
+        Index("idx_uso_mensal_periodo", "periodo"),
+    )
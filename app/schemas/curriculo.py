@@ -39,6 +39,15 @@ class CurriculoNacionalListResponse(BaseModel):
     curriculos: List[CurriculoNacionalResponse]
 
 
+class HabilidadeBuscaResponse(CurriculoNacionalResponse):
+    score: float
+
+
+class BuscaHabilidadesResponse(BaseModel):
+    total: int
+    resultados: List[HabilidadeBuscaResponse]
+
+
 class MapeamentoPrerequisitosBase(BaseModel):
     habilidade_codigo: str
     habilidade_titulo: str
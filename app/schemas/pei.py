@@ -157,6 +157,9 @@ class GerarPlanejamentoRequest(BaseModel):
     student_id: int
     ano_letivo: str
     componentes: List[str]
+    # Planejamento completo: ajusta as adaptacoes reaproveitadas ao aluno
+    # (uma chamada extra por lote)
+    personalizar: bool = False
 
 
 class GerarPlanejamentoTrimestreRequest(BaseModel):
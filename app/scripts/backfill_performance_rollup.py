@@ -0,0 +1,50 @@
+# ============================================
+# BACKFILL - Rollup de desempenho por aluno
+# ============================================
+# Execute: python -m app.scripts.backfill_performance_rollup
+#          python -m app.scripts.backfill_performance_rollup --alunos 12,15
+#
+# Recalcula student_performance_rollup a partir do historico (provas
+# corrigidas + aplicacoes completadas). Rodar depois da migration 007 e
+# sempre que o rollup divergir (prova apagada, nota editada direto no banco).
+# Idempotente: apaga e recria as linhas dos alunos processados.
+
+import argparse
+import sys
+import os
+
+# Adicionar path do projeto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.database import SessionLocal
+from app.services.performance_rollup import reconstruir
+
+
+def run_backfill(alunos=None):
+    """Executa o backfill (todos os alunos ou so os informados)"""
+
+    print("=" * 60)
+    print("BACKFILL: student_performance_rollup")
+    print("=" * 60)
+
+    db = SessionLocal()
+    try:
+        total = reconstruir(db, alunos)
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Erro no backfill: {e}")
+        return False
+    finally:
+        db.close()
+
+    print(f"✅ {total} avaliações processadas")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recalcula o rollup de desempenho por aluno")
+    parser.add_argument("--alunos", help="IDs separados por virgula (default: todos)")
+    args = parser.parse_args()
+
+    alunos = [int(i) for i in args.alunos.split(",")] if args.alunos else None
+    sys.exit(0 if run_backfill(alunos) else 1)
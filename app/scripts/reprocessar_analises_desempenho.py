@@ -0,0 +1,63 @@
+# ============================================
+# REPROCESSAMENTO - Analises de desempenho (noturno)
+# ============================================
+# Execute: python -m app.scripts.reprocessar_analises_desempenho
+#          python -m app.scripts.reprocessar_analises_desempenho --desde 2026-01-01 --com-ia
+#
+# Recalcula PerformanceAnalysis das aplicacoes completadas em lotes
+# (PerformanceAnalyzerService.analyze_applications: 2 queries + uma passada
+# vetorizada por lote). Atualiza a analise existente de cada aplicacao.
+# Sem --com-ia so os numeros sao recalculados (recomendacoes mantidas).
+
+import argparse
+import sys
+import os
+from datetime import datetime
+
+# Adicionar path do projeto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.database import SessionLocal
+from app.models.application import Application, ApplicationStatus
+from app.services.performance_analyzer import PerformanceAnalyzerService
+
+LOTE = 500
+
+
+def run_reprocessamento(desde=None, com_ia=False, lote=LOTE):
+    """Reprocessa as analises das aplicacoes completadas (desde `desde`)"""
+
+    print("=" * 60)
+    print("REPROCESSAMENTO: performance_analyses")
+    print("=" * 60)
+
+    db = SessionLocal()
+    try:
+        query = db.query(Application.id).filter(Application.status == ApplicationStatus.COMPLETED)
+        if desde:
+            query = query.filter(Application.completed_at >= desde)
+        ids = [row.id for row in query.order_by(Application.id)]
+
+        analyzer = PerformanceAnalyzerService(db)
+        for i in range(0, len(ids), lote):
+            analyzer.analyze_applications(ids[i:i + lote], com_ia=com_ia)
+            print(f"✓ {min(i + lote, len(ids))}/{len(ids)} aplicações")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Erro no reprocessamento: {e}")
+        return False
+    finally:
+        db.close()
+
+    print(f"✅ {len(ids)} análises reprocessadas")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reprocessa analises de desempenho em lote")
+    parser.add_argument("--desde", type=datetime.fromisoformat, help="Completadas a partir de (AAAA-MM-DD)")
+    parser.add_argument("--com-ia", action="store_true", help="Regerar recomendacoes com IA (lento, consome creditos)")
+    parser.add_argument("--lote", type=int, default=LOTE)
+    args = parser.parse_args()
+
+    sys.exit(0 if run_reprocessamento(args.desde, args.com_ia, args.lote) else 1)
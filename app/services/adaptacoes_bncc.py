@@ -0,0 +1,243 @@
+"""
+Reuso de adaptacoes BNCC entre alunos com o mesmo perfil diagnostico
+(tabela adaptacoes_bncc).
+
+MOTIVACAO: o planejamento completo chamava a IA para TODAS as habilidades
+do ano (~200) a cada aluno. O prompt levava o perfil_resumido em texto
+livre (notas, relatorios, pontos fortes), diferente a cada aluno, entao
+nada era reaproveitado - embora alunos do mesmo ano com TEA nivel 1 +
+TDAH recebam adaptacoes quase identicas por habilidade.
+
+Agora:
+    - perfil_canonico(perfil): ano escolar + condicoes normalizadas (sem
+      acento/caixa, apelidos como "autismo" -> tea, nivel "Nivel 1" /
+      {"nivel": 1} / "leve" -> 1), em ordem. Ex.: "5_ano|tdah,tea:1".
+      assinatura_perfil = sha256 disso.
+    - Objetivos NOVOS sao gerados a partir de descrever_perfil(perfil)
+      (so o que entra na assinatura), para valerem para qualquer aluno com
+      a mesma assinatura, e gravados com salvar().
+    - buscar(): um SELECT por componente -> {codigo: objetivo}; a IA so e
+      chamada para as habilidades que faltam.
+    - O texto livre do aluno entra, se pedido, numa passada de
+      personalizacao (PlanejamentoBNNCCompletoService._personalizar_lote)
+      que so devolve os campos que mudam.
+
+Escrita na transacao do chamador (quem chama faz o commit). Corrida com
+outro worker gravando a mesma linha: a unique barra e a linha existente
+fica (savepoint por linha so nesse caso).
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+import unicodedata
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.logging_config import get_logger
+from app.models.adaptacao_bncc import AdaptacaoBNCC
+
+logger = get_logger(__name__)
+
+A = AdaptacaoBNCC
+
+# Nomes equivalentes de uma mesma condicao (ja normalizados)
+_APELIDOS = {
+    "autismo": "tea",
+    "transtorno_do_espectro_autista": "tea",
+    "transtorno_do_espectro_do_autismo": "tea",
+    "deficit_de_atencao": "tdah",
+    "transtorno_do_deficit_de_atencao_e_hiperatividade": "tdah",
+}
+
+_NIVEIS_POR_PALAVRA = {"leve": "1", "moderado": "2", "severo": "3"}
+
+# Valores que significam "nao tem" a condicao
+_AUSENTE = {"", "nao", "false", "nenhum", "nenhuma", "0"}
+
+TAMANHO_PERFIL_CANONICO = 255
+
+_SEM_ORDINAL = str.maketrans("", "", "ºª°")
+
+
+def _normalizar(texto: Any) -> str:
+    # Ordinais fora antes do NFKD ("5º" viraria "5o"; "5°" some): "5_ano"
+    texto = str(texto).translate(_SEM_ORDINAL)
+    sem_acento = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", "_", sem_acento.lower()).strip("_")
+
+
+def _nivel(valor: Any) -> Optional[str]:
+    """Nivel/grau da condicao como digito ("1", "2"...), se houver."""
+    if isinstance(valor, dict):
+        for chave in ("nivel", "grau", "level"):
+            if valor.get(chave) not in (None, ""):
+                return _nivel(valor[chave])
+        return None
+    if valor is None or isinstance(valor, bool):
+        return None
+    texto = _normalizar(valor)
+    # "1", "nivel_1", "grau_2" - mas nao anos/datas soltos no texto
+    numero = re.search(r"(?:^|_)([1-3])(?:_|$)", texto)
+    if numero:
+        return numero.group(1)
+    for palavra, nivel in _NIVEIS_POR_PALAVRA.items():
+        if palavra in texto:
+            return nivel
+    return None
+
+
+def _presente(valor: Any) -> bool:
+    if isinstance(valor, (dict, list)):
+        return bool(valor) and not (isinstance(valor, dict) and valor.get("presente") is False)
+    if isinstance(valor, bool) or valor is None:
+        return bool(valor)
+    return _normalizar(valor) not in _AUSENTE
+
+
+def condicoes(diagnosticos: Any) -> List[str]:
+    """
+    Condicoes do aluno em forma canonica, ordenadas: "tdah", "tea:1"...
+    Aceita o JSON de Student.diagnosis + condicoes dos relatorios
+    ({"tea": {"nivel": 1}, "tdah": true}) ou uma lista de nomes.
+    """
+    itens: Dict[str, Optional[str]] = {}
+
+    def adicionar(nome: Any, valor: Any) -> None:
+        chave = _normalizar(nome)
+        if not chave or not _presente(valor):
+            return
+        chave = _APELIDOS.get(chave, chave)
+        itens[chave] = _nivel(valor) or itens.get(chave)
+
+    if isinstance(diagnosticos, dict):
+        for nome, valor in diagnosticos.items():
+            if isinstance(valor, list) and all(isinstance(v, str) for v in valor):
+                # {"condicoes": ["TEA", "TDAH"]}
+                for item in valor:
+                    adicionar(item, True)
+            else:
+                adicionar(nome, valor)
+    elif isinstance(diagnosticos, list):
+        for item in diagnosticos:
+            adicionar(item, True)
+
+    return sorted(f"{nome}:{nivel}" if nivel else nome for nome, nivel in itens.items())
+
+
+def perfil_canonico(perfil: Dict[str, Any]) -> str:
+    """Ano + condicoes, ex.: "5_ano|tdah,tea:1" (so o que define a adaptacao reutilizavel)."""
+    ano = _normalizar(perfil.get("ano_escolar") or "")
+    return f"{ano}|{','.join(condicoes(perfil.get('diagnosticos')))}"[:TAMANHO_PERFIL_CANONICO]
+
+
+def assinatura_perfil(perfil: Dict[str, Any]) -> str:
+    return hashlib.sha256(perfil_canonico(perfil).encode("utf-8")).hexdigest()
+
+
+def descrever_perfil(perfil: Dict[str, Any]) -> str:
+    """Perfil para o prompt de geracao reutilizavel (sem dados individuais)."""
+    itens = []
+    for condicao in condicoes(perfil.get("diagnosticos")):
+        nome, _, nivel = condicao.partition(":")
+        nome = nome.replace("_", " ").upper()
+        itens.append(f"- {nome} (nível {nivel})" if nivel else f"- {nome}")
+    return f"""
+ALUNO: estudante do {perfil.get('ano_escolar', 'N/A')}
+
+DIAGNÓSTICOS:
+{chr(10).join(itens) or '- Nenhum informado'}
+""".strip()
+
+
+def buscar(db: Session, codigos: Iterable[str], assinatura: str, modelo: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Objetivos ja gerados para a assinatura, por codigo_bncc. Conta o uso
+    (hit_count) num unico UPDATE.
+    """
+    codigos = list(set(codigos))
+    if not codigos:
+        return {}
+    linhas = db.execute(
+        select(A.id, A.codigo_bncc, A.objetivo).where(
+            A.assinatura == assinatura,
+            A.model == modelo,
+            A.codigo_bncc.in_(codigos),
+        )
+    ).all()
+    if linhas:
+        db.execute(
+            update(A).where(A.id.in_([linha.id for linha in linhas]))
+            .values(hit_count=A.hit_count + 1, last_hit_at=datetime.now(timezone.utc))
+            .execution_options(synchronize_session=False)
+        )
+    return {linha.codigo_bncc: dict(linha.objetivo) for linha in linhas}
+
+
+def _limpo(objetivo: Dict[str, Any]) -> Dict[str, Any]:
+    """Sem marcadores internos (_fallback, _reutilizado, _personalizado...)."""
+    return {k: v for k, v in objetivo.items() if not k.startswith("_")}
+
+
+def salvar(
+    db: Session,
+    objetivos: List[Dict[str, Any]],
+    assinatura: str,
+    perfil: str,
+    modelo: str,
+) -> int:
+    """
+    Grava os objetivos gerados pela IA que ainda nao existem para a
+    assinatura. Objetivos de fallback (sem IA) e personalizados (dados
+    individuais) nao entram. Retorna quantos foram gravados.
+    """
+    novos: Dict[str, Dict[str, Any]] = {}
+    for objetivo in objetivos:
+        codigo = objetivo.get("codigo_bncc")
+        if codigo and not objetivo.get("_fallback") and not objetivo.get("_personalizado"):
+            novos.setdefault(codigo, _limpo(objetivo))
+    if not novos:
+        return 0
+
+    existentes = set(db.execute(
+        select(A.codigo_bncc).where(
+            A.assinatura == assinatura, A.model == modelo, A.codigo_bncc.in_(list(novos))
+        )
+    ).scalars())
+    linhas = [
+        {
+            "codigo_bncc": codigo,
+            "assinatura": assinatura,
+            "model": modelo,
+            "perfil_canonico": perfil,
+            "objetivo": objetivo,
+            "hit_count": 0,
+            "created_at": datetime.now(timezone.utc),
+        }
+        for codigo, objetivo in novos.items()
+        if codigo not in existentes
+    ]
+    if not linhas:
+        return 0
+
+    try:
+        # Savepoint: a IntegrityError nao derruba a transacao do chamador
+        with db.begin_nested():
+            db.execute(insert(A), linhas)
+        return len(linhas)
+    except IntegrityError:
+        # Outro worker gravou parte das linhas entre o SELECT e o INSERT
+        gravadas = 0
+        for linha in linhas:
+            try:
+                with db.begin_nested():
+                    db.execute(insert(A).values(**linha))
+                gravadas += 1
+            except IntegrityError:
+                pass
+        logger.info("Adaptacoes BNCC gravadas com corrida", extra={"gravadas": gravadas, "total": len(linhas)})
+        return gravadas
@@ -0,0 +1,271 @@
+"""
+Busca textual nas habilidades BNCC (in-process, sobre o catalogo em memoria).
+
+MOTIVACAO: /planejamento/bncc/habilidades so filtra por campos exatos.
+Professor buscando "frações equivalentes" ou um codigo parcial ("EF05MA1")
+paginava centenas de linhas no cliente. Um LIKE '%...%' no MySQL faria
+table scan e nao ignora acento nem ordena por relevancia.
+
+Indice invertido construido uma vez por versao do catalogo (memo no
+snapshot, como o grafo de pre-requisitos):
+
+    - Normalizacao: minusculas, sem acento e plural simples ("frações",
+      "fracao" e "fracoes" viram o mesmo termo).
+    - Campos com peso (BM25F simplificado): codigo_bncc > objeto_conhecimento
+      > habilidade_descricao.
+    - Ranking BM25 (k1=1.2, b=0.75).
+    - Termo da consulta expande para: igual (peso 1), prefixo ("decim" ->
+      "decimal", peso 0.8) e, se nada casou, parecidos por trigramas (erro
+      de digitacao, "ortografya" ~ "ortografia", peso pela similaridade).
+    - Consulta com cara de codigo ("ef05ma1") casa por prefixo no codigo.
+
+Escolhido in-process em vez de FULLTEXT ngram do MySQL: o catalogo ja vive
+em memoria, o indice tem poucos MB e nao exige migration nem depende da
+versao do MySQL do provedor.
+
+Uso:
+    from app.services.bncc_busca import obter_indice_busca
+    resultados = obter_indice_busca(db).buscar("frações equivalentes", ano_escolar="5º ano")
+"""
+from __future__ import annotations
+
+import heapq
+import math
+import re
+import unicodedata
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.services.bncc_catalogo import CatalogoBNCC, HabilidadeBNCC, obter_catalogo
+
+
+# (atributo, peso do campo)
+CAMPOS = (
+    ("codigo_bncc", 3.0),
+    ("objeto_conhecimento", 1.5),
+    ("habilidade_descricao", 1.0),
+)
+
+K1 = 1.2
+B = 0.75
+
+PESO_PREFIXO = 0.8
+PESO_TRIGRAMA = 0.6
+SIMILARIDADE_MINIMA = 0.45
+MAX_EXPANSOES = 20
+
+# Score de casamento por prefixo de codigo (acima de qualquer BM25 tipico, entao
+# "EF05MA" + texto traz as EF05MA* no topo)
+BONUS_CODIGO = 10.0
+
+_STOPWORDS = frozenset({
+    "a", "o", "as", "os", "ao", "aos", "de", "da", "do", "das", "dos", "e",
+    "em", "no", "na", "nos", "nas", "um", "uma", "com", "por", "para", "que",
+    "se", "ou", "entre",
+})
+
+_NAO_ALFANUM = re.compile(r"[^a-z0-9]+")
+_CODIGO = re.compile(r"^[a-z]{2}\d{2}[a-z0-9]*$")
+
+
+def normalizar(texto: Optional[str]) -> str:
+    """Minusculas, sem acento, so [a-z0-9] separados por espaco."""
+    if not texto:
+        return ""
+    sem_acento = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    return _NAO_ALFANUM.sub(" ", sem_acento.lower()).strip()
+
+
+# Plural -> singular (ja sem acento). Aplicado no indice e na consulta,
+# entao "frações" e "fração" viram o mesmo termo ("fracao").
+_PLURAIS = (
+    ("coes", "cao"),
+    ("oes", "ao"),
+    ("ais", "al"),
+    ("eis", "el"),
+    ("ns", "m"),
+    ("res", "r"),
+    ("zes", "z"),
+    ("ses", "s"),
+    ("s", ""),
+)
+
+
+def _singular(termo: str) -> str:
+    # Palavras curtas ("mais", "tres") e codigos ficam como estao
+    if len(termo) <= 4 or termo[-1] != "s" or termo[0].isdigit():
+        return termo
+    for sufixo, troca in _PLURAIS:
+        if termo.endswith(sufixo):
+            return termo[: -len(sufixo)] + troca
+    return termo
+
+
+def tokenizar(texto: Optional[str]) -> List[str]:
+    return [
+        _singular(t) for t in normalizar(texto).split()
+        if len(t) > 1 and t not in _STOPWORDS
+    ]
+
+
+def _trigramas(termo: str) -> Set[str]:
+    t = f"  {termo} "
+    return {t[i:i + 3] for i in range(len(t) - 2)}
+
+
+class IndiceBuscaBNCC:
+    """Indice invertido imutavel sobre as habilidades de um snapshot do catalogo."""
+
+    def __init__(self, habilidades: Iterable[HabilidadeBNCC]):
+        self._docs: List[HabilidadeBNCC] = []
+        comprimentos: List[float] = []
+        postings: Dict[str, List[Tuple[int, float]]] = {}
+
+        for doc_id, h in enumerate(habilidades):
+            self._docs.append(h)
+            tf: Dict[str, float] = {}
+            comprimento = 0.0
+            for campo, peso in CAMPOS:
+                for termo in tokenizar(getattr(h, campo)):
+                    tf[termo] = tf.get(termo, 0.0) + peso
+                    comprimento += peso
+            comprimentos.append(comprimento)
+            for termo, freq in tf.items():
+                postings.setdefault(termo, []).append((doc_id, freq))
+
+        n = len(self._docs)
+        self._comprimentos = comprimentos
+        self._media_comprimento = (sum(comprimentos) / n) if n else 0.0
+        self._postings = {t: tuple(p) for t, p in postings.items()}
+        self._idf = {
+            t: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5))
+            for t, p in self._postings.items()
+        }
+        self._vocabulario: Tuple[str, ...] = tuple(sorted(self._postings))
+
+        trigramas: Dict[str, List[str]] = {}
+        for termo in self._vocabulario:
+            for tri in _trigramas(termo):
+                trigramas.setdefault(tri, []).append(termo)
+        self._trigramas = {k: tuple(v) for k, v in trigramas.items()}
+
+        # Codigos normalizados ordenados para busca por prefixo (bisect)
+        self._codigos: Tuple[Tuple[str, int], ...] = tuple(sorted(
+            (normalizar(h.codigo_bncc).replace(" ", ""), i)
+            for i, h in enumerate(self._docs) if h.codigo_bncc
+        ))
+
+    @classmethod
+    def de_catalogo(cls, catalogo: CatalogoBNCC) -> "IndiceBuscaBNCC":
+        return cls(h for ano in catalogo.anos() for h in catalogo.habilidades(ano))
+
+    # ---------- Expansao de termos ----------
+
+    def _prefixos(self, termo: str) -> List[str]:
+        i = bisect_left(self._vocabulario, termo)
+        encontrados = []
+        while i < len(self._vocabulario) and self._vocabulario[i].startswith(termo):
+            if self._vocabulario[i] != termo:
+                encontrados.append(self._vocabulario[i])
+                if len(encontrados) >= MAX_EXPANSOES:
+                    break
+            i += 1
+        return encontrados
+
+    def _parecidos(self, termo: str) -> List[Tuple[str, float]]:
+        tris = _trigramas(termo)
+        contagem: Dict[str, int] = {}
+        for tri in tris:
+            for candidato in self._trigramas.get(tri, ()):
+                contagem[candidato] = contagem.get(candidato, 0) + 1
+        parecidos = []
+        for candidato, comuns in contagem.items():
+            if candidato == termo:
+                continue
+            # Jaccard sobre trigramas
+            sim = comuns / (len(tris) + len(_trigramas(candidato)) - comuns)
+            if sim >= SIMILARIDADE_MINIMA:
+                parecidos.append((candidato, sim))
+        return heapq.nlargest(MAX_EXPANSOES, parecidos, key=lambda p: p[1])
+
+    def _expandir(self, termo: str) -> Dict[str, float]:
+        """termo da consulta -> {termo do indice: peso}"""
+        expansoes: Dict[str, float] = {}
+        if termo in self._postings:
+            expansoes[termo] = 1.0
+        if len(termo) >= 3:
+            for t in self._prefixos(termo):
+                expansoes.setdefault(t, PESO_PREFIXO)
+            # Trigramas so como plano B (erro de digitacao): se o termo ja
+            # casou exato/prefixo, expandir so adiciona ruido e custo
+            if not expansoes:
+                for t, sim in self._parecidos(termo):
+                    expansoes[t] = PESO_TRIGRAMA * sim
+        return expansoes
+
+    # ---------- Busca ----------
+
+    def _bm25(self, termo: str) -> Iterable[Tuple[int, float]]:
+        idf = self._idf[termo]
+        media = self._media_comprimento or 1.0
+        for doc_id, tf in self._postings[termo]:
+            norm = K1 * (1 - B + B * self._comprimentos[doc_id] / media)
+            yield doc_id, idf * tf * (K1 + 1) / (tf + norm)
+
+    def _casar_codigo(self, termo: str) -> List[int]:
+        i = bisect_left(self._codigos, (termo, -1))
+        docs = []
+        while i < len(self._codigos) and self._codigos[i][0].startswith(termo):
+            docs.append(self._codigos[i][1])
+            i += 1
+        return docs
+
+    def buscar(
+        self,
+        consulta: str,
+        ano_escolar: Optional[str] = None,
+        componente: Optional[str] = None,
+        limite: int = 20,
+    ) -> List[Tuple[HabilidadeBNCC, float]]:
+        """Top `limite` habilidades por relevancia, com score BM25."""
+        scores: Dict[int, float] = {}
+
+        for termo in dict.fromkeys(tokenizar(consulta)):
+            # Por termo da consulta vale a MELHOR expansao em cada documento
+            # (senao um prefixo curto com 20 expansoes dominaria o ranking)
+            melhor: Dict[int, float] = {}
+            if _CODIGO.match(termo):
+                # Codigo: so prefixo no codigo (trigramas de "ef05ma1" casariam
+                # todos os codigos parecidos)
+                for doc_id in self._casar_codigo(termo):
+                    melhor[doc_id] = BONUS_CODIGO
+            else:
+                for termo_indice, peso in self._expandir(termo).items():
+                    for doc_id, s in self._bm25(termo_indice):
+                        s *= peso
+                        if s > melhor.get(doc_id, 0.0):
+                            melhor[doc_id] = s
+            for doc_id, s in melhor.items():
+                scores[doc_id] = scores.get(doc_id, 0.0) + s
+
+        def aceita(h: HabilidadeBNCC) -> bool:
+            return (ano_escolar is None or h.ano_escolar == ano_escolar) and (
+                componente is None or h.componente == componente
+            )
+
+        candidatos = (
+            (s, doc_id) for doc_id, s in scores.items() if aceita(self._docs[doc_id])
+        )
+        # Empate: codigo BNCC (ordem estavel entre requests -> ETag estavel)
+        top = heapq.nsmallest(
+            limite, candidatos, key=lambda c: (-c[0], self._docs[c[1]].codigo_bncc or "")
+        )
+        return [(self._docs[doc_id], round(s, 4)) for s, doc_id in top]
+
+
+def obter_indice_busca(db: Optional[Session] = None) -> IndiceBuscaBNCC:
+    """Indice da versao atual do catalogo (construido uma vez por versao)."""
+    catalogo = obter_catalogo(db)
+    return catalogo.memo("indice_busca", lambda: IndiceBuscaBNCC.de_catalogo(catalogo))
@@ -0,0 +1,416 @@
+"""
+Catalogo BNCC em memoria (curriculo_nacional + mapeamento_prerequisitos).
+
+MOTIVACAO: as rotas /planejamento/bncc/*, buscar_todas_habilidades,
+listar_componentes_disponiveis e buscar_prerequisitos consultavam o MySQL a
+cada chamada - e os jobs de planejamento chamam isso por componente, por
+aluno. Sao poucos milhares de linhas estaticas que so mudam quando alguem
+roda importar_bncc*.py ou POST /planejamento/bncc/importar.
+
+O catalogo e carregado uma vez (startup ou primeiro uso) em estruturas
+imutaveis, com indices por codigo_bncc, (ano_escolar, componente) e o
+grafo de pre-requisitos. Leitores pegam a referencia atual e nunca veem um
+catalogo pela metade; a troca e atomica.
+
+Versao: `CatalogoBNCC.versao` e um digest (sha256) do CONTEUDO das duas
+tabelas, calculado em _construir - igual em todos os workers que leem os
+mesmos dados e estavel entre restarts, entao serve de base para os ETags
+das rotas /planejamento/bncc/*.
+
+Deteccao de mudanca: a cada VERSAO_TTL segundos (no maximo) o carimbo das
+tabelas e recalculado. No MySQL e um checksum por tabela feito no servidor
+(COUNT + soma de CRC32 de cada linha inteira - duas queries de agregado,
+sem trafegar as linhas); nos demais dialetos e o proprio digest do
+conteudo. Pega INSERT, DELETE e tambem UPDATE in-place (importar que so
+altera descricoes), venha da API ou de script. Se mudou, o catalogo e
+reconstruido. POST /bncc/importar invalida na hora neste processo; outros
+workers enxergam em ate VERSAO_TTL.
+
+Uso:
+
+    from app.services.bncc_catalogo import obter_catalogo
+
+    catalogo = obter_catalogo(db)
+    for h in catalogo.habilidades("5º ano", "Matemática"):
+        ...
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+from app.core.logging_config import get_logger
+from app.models.curriculo import CurriculoNacional, MapeamentoPrerequisitos
+
+logger = get_logger(__name__)
+
+
+VERSAO_TTL = 60.0
+# Valores derivados por snapshot (LRU): chaves vindas de query string nao crescem sem limite
+MAX_MEMO = 256
+
+
+# ============================================
+# Registros imutaveis (mesmos atributos dos modelos ORM)
+# ============================================
+
+@dataclass(frozen=True, slots=True)
+class HabilidadeBNCC:
+    """Linha de curriculo_nacional. Compativel com CurriculoNacionalResponse."""
+    id: int
+    codigo_bncc: str
+    ano_escolar: Optional[str]
+    componente: Optional[str]
+    campo_experiencia: Optional[str]
+    eixo_tematico: Optional[str]
+    habilidade_codigo: Optional[str]
+    habilidade_descricao: Optional[str]
+    objeto_conhecimento: Optional[str]
+    exemplos_atividades: Optional[Tuple[Any, ...]]
+    prerequisitos: Optional[Tuple[Any, ...]]
+    dificuldade: Optional[str]
+    trimestre_sugerido: Optional[int]
+    created_at: Optional[datetime]
+
+
+@dataclass(frozen=True, slots=True)
+class PrerequisitoBNCC:
+    """Linha de mapeamento_prerequisitos. Compativel com MapeamentoPrerequisitosResponse."""
+    id: int
+    habilidade_codigo: Optional[str]
+    habilidade_titulo: Optional[str]
+    ano_escolar: Optional[str]
+    prerequisito_codigo: Optional[str]
+    prerequisito_titulo: Optional[str]
+    ano_prerequisito: Optional[str]
+    essencial: Optional[bool]
+    peso: Optional[float]
+    created_at: Optional[datetime]
+
+
+def _congelar(valor: Any) -> Optional[Tuple[Any, ...]]:
+    """Colunas JSON (listas) viram tuplas para o registro ser imutavel."""
+    if valor is None:
+        return None
+    if isinstance(valor, (list, tuple)):
+        return tuple(valor)
+    return (valor,)
+
+
+def _ordem_habilidade(h: HabilidadeBNCC) -> tuple:
+    # Mesma ordem do ORDER BY componente, trimestre_sugerido, codigo_bncc
+    # do MySQL (NULL primeiro em ASC)
+    return (
+        h.componente or "",
+        h.trimestre_sugerido is not None,
+        h.trimestre_sugerido or 0,
+        h.codigo_bncc or "",
+    )
+
+
+# ============================================
+# Catalogo
+# ============================================
+
+class CatalogoBNCC:
+    """
+    Snapshot imutavel do catalogo. Construido uma vez; nunca alterado.
+
+    `memo` guarda valores derivados (ex: payload serializado de uma
+    listagem) - seguro porque o snapshot nao muda, e descartado junto com
+    ele quando a versao troca. E um LRU de MAX_MEMO entradas.
+    """
+
+    def __init__(
+        self,
+        habilidades: Iterable[HabilidadeBNCC],
+        prerequisitos: Iterable[PrerequisitoBNCC],
+        versao: str,
+        carimbo: Optional[str] = None,
+    ):
+        self.versao = versao
+        # Carimbo das tabelas quando o snapshot foi lido (deteccao de mudanca)
+        self.carimbo = carimbo if carimbo is not None else versao
+
+        ordenadas = sorted(habilidades, key=_ordem_habilidade)
+        self._por_codigo: Dict[str, HabilidadeBNCC] = {}
+        por_ano_componente: Dict[Tuple[str, str], List[HabilidadeBNCC]] = {}
+        por_ano: Dict[str, List[HabilidadeBNCC]] = {}
+        for h in ordenadas:
+            if h.codigo_bncc:
+                self._por_codigo[h.codigo_bncc] = h
+            por_ano.setdefault(h.ano_escolar, []).append(h)
+            por_ano_componente.setdefault((h.ano_escolar, h.componente), []).append(h)
+
+        self._por_ano = {k: tuple(v) for k, v in por_ano.items()}
+        self._por_ano_componente = {k: tuple(v) for k, v in por_ano_componente.items()}
+        self._componentes = tuple(sorted({h.componente for h in ordenadas if h.componente}))
+        self._anos = tuple(sorted({h.ano_escolar for h in ordenadas if h.ano_escolar}))
+
+        prereqs: Dict[str, List[PrerequisitoBNCC]] = {}
+        for p in sorted(prerequisitos, key=lambda p: p.id):
+            prereqs.setdefault(p.habilidade_codigo, []).append(p)
+        self._prerequisitos = {k: tuple(v) for k, v in prereqs.items()}
+
+        self._memo: "OrderedDict[Any, Any]" = OrderedDict()
+        self._memo_lock = threading.Lock()
+        self.total_habilidades = len(ordenadas)
+        self.total_prerequisitos = sum(len(v) for v in self._prerequisitos.values())
+
+    # ---------- Habilidades ----------
+
+    def habilidade(self, codigo_bncc: str) -> Optional[HabilidadeBNCC]:
+        return self._por_codigo.get(codigo_bncc)
+
+    def habilidades(
+        self,
+        ano_escolar: str,
+        componente: Optional[str] = None,
+        trimestre: Optional[int] = None,
+    ) -> Tuple[HabilidadeBNCC, ...]:
+        """Habilidades do ano (e componente/trimestre), ordenadas por componente, trimestre, codigo."""
+        if componente:
+            base = self._por_ano_componente.get((ano_escolar, componente), ())
+        else:
+            base = self._por_ano.get(ano_escolar, ())
+        if trimestre:
+            return tuple(h for h in base if h.trimestre_sugerido == trimestre)
+        return base
+
+    def componentes(self) -> Tuple[str, ...]:
+        return self._componentes
+
+    def anos(self) -> Tuple[str, ...]:
+        return self._anos
+
+    def componentes_do_ano(self, ano_escolar: str) -> List[Dict[str, Any]]:
+        """[{componente, total_habilidades}] - mesmo formato de listar_componentes_disponiveis."""
+        return [
+            {"componente": componente, "total_habilidades": len(habs)}
+            for (ano, componente), habs in self._por_ano_componente.items()
+            if ano == ano_escolar
+        ]
+
+    # ---------- Pre-requisitos ----------
+
+    def prerequisitos(self, codigo_bncc: str) -> Tuple[PrerequisitoBNCC, ...]:
+        """Pre-requisitos diretos (um salto) de uma habilidade."""
+        return self._prerequisitos.get(codigo_bncc, ())
+
+    def arestas_prerequisitos(self) -> Iterable[PrerequisitoBNCC]:
+        for lista in self._prerequisitos.values():
+            yield from lista
+
+    # ---------- Derivados ----------
+
+    def memo(self, chave: Any, construir: Callable[[], Any]) -> Any:
+        """Valor derivado do snapshot, calculado uma vez por versao (LRU de MAX_MEMO)."""
+        with self._memo_lock:
+            if chave in self._memo:
+                self._memo.move_to_end(chave)
+                return self._memo[chave]
+        # Fora do lock: corrida entre threads so recalcula o mesmo valor (idempotente)
+        valor = construir()
+        with self._memo_lock:
+            self._memo[chave] = valor
+            self._memo.move_to_end(chave)
+            while len(self._memo) > MAX_MEMO:
+                self._memo.popitem(last=False)
+        return valor
+
+
+# ============================================
+# Carga e versao
+# ============================================
+
+_catalogo: Optional[CatalogoBNCC] = None
+_verificado_em = 0.0
+_forcar_reconstrucao = False
+_lock = threading.Lock()
+
+
+_COLUNAS_HABILIDADE = (
+    "id", "codigo_bncc", "ano_escolar", "componente", "campo_experiencia",
+    "eixo_tematico", "habilidade_codigo", "habilidade_descricao",
+    "objeto_conhecimento", "exemplos_atividades", "prerequisitos",
+    "dificuldade", "trimestre_sugerido", "created_at",
+)
+_COLUNAS_PREREQUISITO = (
+    "id", "habilidade_codigo", "habilidade_titulo", "ano_escolar",
+    "prerequisito_codigo", "prerequisito_titulo", "ano_prerequisito",
+    "essencial", "peso", "created_at",
+)
+
+# Checksum no servidor: uma linha inteira -> CRC32, somado por tabela.
+# CONCAT_WS pula NULL, entao cada coluna vai com COALESCE (marcador '~').
+_JSON = {"exemplos_atividades", "prerequisitos"}
+
+
+def _sql_checksum_mysql(tabela: str, colunas: Tuple[str, ...]) -> str:
+    partes = ", ".join(
+        f"COALESCE(CAST({c} AS CHAR), '~')" if c in _JSON else f"COALESCE({c}, '~')"
+        for c in colunas
+    )
+    return f"SELECT COUNT(*), COALESCE(SUM(CRC32(CONCAT_WS('|', {partes}))), 0) FROM {tabela}"
+
+
+_SQL_CARIMBO = {
+    "mysql": (
+        _sql_checksum_mysql(CurriculoNacional.__tablename__, _COLUNAS_HABILIDADE),
+        _sql_checksum_mysql(MapeamentoPrerequisitos.__tablename__, _COLUNAS_PREREQUISITO),
+    ),
+}
+
+
+def _ler_linhas(db: Session) -> Tuple[list, list]:
+    """Linhas cruas das duas tabelas, em ordem de id (Core select, sem ORM)."""
+    cn = CurriculoNacional.__table__.c
+    mp = MapeamentoPrerequisitos.__table__.c
+    habilidades = db.execute(
+        select(*[cn[c] for c in _COLUNAS_HABILIDADE]).order_by(cn.id)
+    ).all()
+    prerequisitos = db.execute(
+        select(*[mp[c] for c in _COLUNAS_PREREQUISITO]).order_by(mp.id)
+    ).all()
+    return habilidades, prerequisitos
+
+
+def _digest(habilidades: list, prerequisitos: list) -> str:
+    """sha256 do conteudo das linhas: mesma versao para os mesmos dados."""
+    h = hashlib.sha256()
+    for linhas in (habilidades, prerequisitos):
+        for r in linhas:
+            h.update(json.dumps(list(r), default=str, ensure_ascii=False).encode("utf-8"))
+            h.update(b"\n")
+        h.update(b"\x00")
+    return h.hexdigest()[:32]
+
+
+def _carimbo_versao(db: Session) -> str:
+    """
+    Carimbo das duas tabelas que muda com qualquer INSERT/UPDATE/DELETE.
+    MySQL: checksum no servidor; outros dialetos: digest das linhas.
+    """
+    sqls = _SQL_CARIMBO.get(db.get_bind().dialect.name)
+    if sqls:
+        partes = []
+        for sql in sqls:
+            total, soma = db.execute(text(sql)).one()
+            partes.append(f"{total}.{int(soma)}")
+        return ".".join(partes)
+    return _digest(*_ler_linhas(db))
+
+
+def _construir(db: Session, carimbo: str) -> CatalogoBNCC:
+    inicio = time.perf_counter()
+
+    linhas_habilidades, linhas_prerequisitos = _ler_linhas(db)
+    versao = _digest(linhas_habilidades, linhas_prerequisitos)
+
+    habilidades = [
+        HabilidadeBNCC(
+            id=r.id,
+            codigo_bncc=r.codigo_bncc,
+            ano_escolar=r.ano_escolar,
+            componente=r.componente,
+            campo_experiencia=r.campo_experiencia,
+            eixo_tematico=r.eixo_tematico,
+            habilidade_codigo=r.habilidade_codigo,
+            habilidade_descricao=r.habilidade_descricao,
+            objeto_conhecimento=r.objeto_conhecimento,
+            exemplos_atividades=_congelar(r.exemplos_atividades),
+            prerequisitos=_congelar(r.prerequisitos),
+            dificuldade=r.dificuldade,
+            trimestre_sugerido=r.trimestre_sugerido,
+            created_at=r.created_at,
+        )
+        for r in linhas_habilidades
+    ]
+
+    prerequisitos = [
+        PrerequisitoBNCC(
+            id=r.id,
+            habilidade_codigo=r.habilidade_codigo,
+            habilidade_titulo=r.habilidade_titulo,
+            ano_escolar=r.ano_escolar,
+            prerequisito_codigo=r.prerequisito_codigo,
+            prerequisito_titulo=r.prerequisito_titulo,
+            ano_prerequisito=r.ano_prerequisito,
+            essencial=r.essencial,
+            peso=float(r.peso) if r.peso is not None else None,
+            created_at=r.created_at,
+        )
+        for r in linhas_prerequisitos
+    ]
+
+    catalogo = CatalogoBNCC(habilidades, prerequisitos, versao, carimbo)
+    logger.info(
+        "catalogo BNCC carregado",
+        extra={
+            "versao": versao,
+            "habilidades": catalogo.total_habilidades,
+            "prerequisitos": catalogo.total_prerequisitos,
+            "duration_ms": round((time.perf_counter() - inicio) * 1000, 1),
+        },
+    )
+    return catalogo
+
+
+def obter_catalogo(db: Optional[Session] = None) -> CatalogoBNCC:
+    """
+    Catalogo atual. So toca o banco na primeira carga, a cada VERSAO_TTL
+    (carimbo) e quando o carimbo mudou (reconstrucao).
+
+    `db` e opcional: sem ele abre uma SessionLocal so se precisar.
+    """
+    global _catalogo, _verificado_em, _forcar_reconstrucao
+
+    catalogo = _catalogo
+    if catalogo is not None and time.monotonic() - _verificado_em < VERSAO_TTL:
+        return catalogo
+
+    with _lock:
+        # Outra thread pode ter verificado enquanto esperavamos o lock
+        if _catalogo is not None and time.monotonic() - _verificado_em < VERSAO_TTL:
+            return _catalogo
+
+        sessao_propria = db is None
+        if sessao_propria:
+            from app.database import SessionLocal
+            db = SessionLocal()
+        try:
+            carimbo = _carimbo_versao(db)
+            if _catalogo is None or _forcar_reconstrucao or _catalogo.carimbo != carimbo:
+                _catalogo = _construir(db, carimbo)
+                _forcar_reconstrucao = False
+            _verificado_em = time.monotonic()
+            return _catalogo
+        finally:
+            if sessao_propria:
+                db.close()
+
+
+def invalidar_catalogo() -> None:
+    """Forca nova verificacao/reconstrucao no proximo obter_catalogo()."""
+    global _verificado_em, _forcar_reconstrucao
+    with _lock:
+        _forcar_reconstrucao = True
+        _verificado_em = 0.0
+
+
+def carregar_catalogo() -> Optional[CatalogoBNCC]:
+    """Carga no startup. Falha (banco fora) nao derruba a app: tenta no primeiro uso."""
+    try:
+        return obter_catalogo()
+    except Exception:
+        logger.warning("falha ao carregar catalogo BNCC no startup", exc_info=True)
+        return None
@@ -0,0 +1,242 @@
+"""
+Grafo de pre-requisitos BNCC pre-computado (fecho transitivo, profundidade
+e ordem topologica).
+
+MOTIVACAO: mapeamento_prerequisitos so responde um salto por vez
+(buscar_prerequisitos(codigo)). "Todos os pre-requisitos desta habilidade
+ate o 1º ano" ou "em que ordem ensinar as habilidades de Matematica"
+precisavam de N consultas encadeadas.
+
+O grafo e montado a partir do catalogo em memoria (app/services/bncc_catalogo.py)
+uma vez por versao do catalogo e guardado no proprio snapshot (memo), entao
+todas as consultas abaixo sao lookups em dicts/tuplas:
+
+    grafo = obter_grafo(db)
+    grafo.todos_prerequisitos("EF05MA03")   # fecho, em ordem de ensino
+    grafo.profundidade("EF05MA03")          # 0 = sem pre-requisitos
+    grafo.ordem_topologica("Matemática", "5º ano")
+
+Arestas: habilidade -> pre-requisito (u depende de v). Ciclos nao deveriam
+existir, mas dados importados a mao podem ter; os nos envolvidos vao para o
+fim da ordem (desempate por ano/codigo), sao logados e o fecho continua
+correto (BFS tolera ciclos).
+"""
+from __future__ import annotations
+
+import heapq
+import re
+from collections import deque
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.logging_config import get_logger
+from app.services.bncc_catalogo import CatalogoBNCC, obter_catalogo
+
+logger = get_logger(__name__)
+
+
+_DIGITOS = re.compile(r"\d+")
+
+
+def _ordem_ano(ano_escolar: Optional[str]) -> int:
+    """
+    "1º ano".."9º ano" -> 1..9; Ensino Medio ("1ª série") -> 10..12.
+    Desconhecido vai para o fim. Usado so como desempate deterministico.
+    """
+    if not ano_escolar:
+        return 99
+    m = _DIGITOS.search(ano_escolar)
+    if not m:
+        return 99
+    n = int(m.group())
+    texto = ano_escolar.lower()
+    return n + 9 if ("série" in texto or "serie" in texto) else n
+
+
+class GrafoPrerequisitos:
+    """Snapshot imutavel do grafo. Construir via de_catalogo()/obter_grafo()."""
+
+    def __init__(
+        self,
+        arestas: Iterable[Tuple[str, str]],
+        info: Dict[str, Tuple[Optional[str], Optional[str]]],
+    ):
+        """
+        arestas: pares (habilidade, pre_requisito).
+        info: codigo -> (componente, ano_escolar) das habilidades conhecidas.
+        """
+        diretos: Dict[str, List[str]] = {}
+        reversos: Dict[str, List[str]] = {}
+        nos = set(info)
+        for habilidade, prereq in arestas:
+            if not habilidade or not prereq or habilidade == prereq:
+                continue
+            nos.add(habilidade)
+            nos.add(prereq)
+            lista = diretos.setdefault(habilidade, [])
+            if prereq not in lista:
+                lista.append(prereq)
+                reversos.setdefault(prereq, []).append(habilidade)
+
+        self._info = info
+
+        def chave(codigo: str) -> tuple:
+            _, ano = info.get(codigo, (None, None))
+            return (_ordem_ano(ano), codigo)
+
+        self._diretos: Dict[str, Tuple[str, ...]] = {
+            k: tuple(sorted(v, key=chave)) for k, v in diretos.items()
+        }
+        self._dependentes: Dict[str, Tuple[str, ...]] = {
+            k: tuple(sorted(v, key=chave)) for k, v in reversos.items()
+        }
+
+        ordem, em_ciclo = self._kahn(nos, chave)
+        self._ordem: Tuple[str, ...] = ordem
+        self._posicao: Dict[str, int] = {c: i for i, c in enumerate(ordem)}
+        self.em_ciclo: FrozenSet[str] = em_ciclo
+        if em_ciclo:
+            logger.warning(
+                "ciclo no grafo de pre-requisitos BNCC",
+                extra={"codigos": sorted(em_ciclo)[:20], "total": len(em_ciclo)},
+            )
+
+        # Profundidade = maior cadeia ate uma habilidade sem pre-requisitos.
+        # Na ordem topologica todo pre-requisito ja foi calculado; em ciclo,
+        # arestas para nos posteriores sao ignoradas.
+        profundidade: Dict[str, int] = {}
+        for codigo in ordem:
+            pos = self._posicao[codigo]
+            profundidade[codigo] = max(
+                (profundidade[p] + 1 for p in self._diretos.get(codigo, ())
+                 if self._posicao[p] < pos),
+                default=0,
+            )
+        self._profundidade = profundidade
+
+        # Fecho transitivo (ancestrais), ja em ordem de ensino
+        self._fecho: Dict[str, Tuple[str, ...]] = {}
+        self._fecho_set: Dict[str, FrozenSet[str]] = {}
+        for codigo in ordem:
+            alcancados = self._bfs(codigo, self._diretos)
+            self._fecho_set[codigo] = alcancados
+            self._fecho[codigo] = tuple(sorted(alcancados, key=self._posicao.__getitem__))
+
+        self.total_nos = len(ordem)
+        self.total_arestas = sum(len(v) for v in self._diretos.values())
+
+    @classmethod
+    def de_catalogo(cls, catalogo: CatalogoBNCC) -> "GrafoPrerequisitos":
+        info = {
+            h.codigo_bncc: (h.componente, h.ano_escolar)
+            for ano in catalogo.anos()
+            for h in catalogo.habilidades(ano)
+            if h.codigo_bncc
+        }
+        arestas = [
+            (p.habilidade_codigo, p.prerequisito_codigo)
+            for p in catalogo.arestas_prerequisitos()
+        ]
+        # Coluna JSON curriculo_nacional.prerequisitos tambem lista codigos
+        for ano in catalogo.anos():
+            for h in catalogo.habilidades(ano):
+                for prereq in h.prerequisitos or ():
+                    if isinstance(prereq, str):
+                        arestas.append((h.codigo_bncc, prereq))
+        return cls(arestas, info)
+
+    # ---------- Construcao ----------
+
+    def _kahn(self, nos, chave) -> Tuple[Tuple[str, ...], FrozenSet[str]]:
+        """Ordem topologica (pre-requisitos primeiro), desempate por (ano, codigo)."""
+        pendentes = {n: len(self._diretos.get(n, ())) for n in nos}
+        fila = [(chave(n), n) for n, grau in pendentes.items() if grau == 0]
+        heapq.heapify(fila)
+        ordem: List[str] = []
+        while fila:
+            _, codigo = heapq.heappop(fila)
+            ordem.append(codigo)
+            for dependente in self._dependentes.get(codigo, ()):
+                pendentes[dependente] -= 1
+                if pendentes[dependente] == 0:
+                    heapq.heappush(fila, (chave(dependente), dependente))
+        emitidos = set(ordem)
+        restantes = sorted((n for n in nos if n not in emitidos), key=chave)
+        return tuple(ordem + restantes), frozenset(restantes)
+
+    @staticmethod
+    def _bfs(origem: str, adjacencia: Dict[str, Tuple[str, ...]]) -> FrozenSet[str]:
+        vistos = set()
+        fila = deque(adjacencia.get(origem, ()))
+        while fila:
+            codigo = fila.popleft()
+            if codigo in vistos or codigo == origem:
+                continue
+            vistos.add(codigo)
+            fila.extend(adjacencia.get(codigo, ()))
+        return frozenset(vistos)
+
+    # ---------- Consultas (O(1) / O(resultado)) ----------
+
+    def __contains__(self, codigo: str) -> bool:
+        return codigo in self._posicao
+
+    def prerequisitos_diretos(self, codigo: str) -> Tuple[str, ...]:
+        return self._diretos.get(codigo, ())
+
+    def dependentes_diretos(self, codigo: str) -> Tuple[str, ...]:
+        """Habilidades que tem `codigo` como pre-requisito direto."""
+        return self._dependentes.get(codigo, ())
+
+    def todos_prerequisitos(self, codigo: str) -> Tuple[str, ...]:
+        """Fecho transitivo, em ordem de ensino (mais basico primeiro)."""
+        return self._fecho.get(codigo, ())
+
+    def e_prerequisito(self, prerequisito: str, de: str) -> bool:
+        """True se `prerequisito` esta em qualquer cadeia abaixo de `de`."""
+        return prerequisito in self._fecho_set.get(de, frozenset())
+
+    def todos_dependentes(self, codigo: str) -> Tuple[str, ...]:
+        """Tudo que depende (direta ou indiretamente) de `codigo`, em ordem de ensino."""
+        alcancados = self._bfs(codigo, self._dependentes)
+        return tuple(sorted(alcancados, key=self._posicao.__getitem__))
+
+    def profundidade(self, codigo: str) -> int:
+        return self._profundidade.get(codigo, 0)
+
+    def posicao(self, codigo: str) -> Optional[int]:
+        """Posicao na ordem topologica global (None se desconhecido)."""
+        return self._posicao.get(codigo)
+
+    def ordenar(self, codigos: Sequence[str]) -> List[str]:
+        """Ordena codigos quaisquer pela ordem de ensino (desconhecidos no fim)."""
+        fim = len(self._ordem)
+        return sorted(codigos, key=lambda c: (self._posicao.get(c, fim), c))
+
+    def ordem_topologica(
+        self,
+        componente: Optional[str] = None,
+        ano_escolar: Optional[str] = None,
+    ) -> Tuple[str, ...]:
+        """
+        Ordem de ensino (pre-requisitos antes), filtrada por componente/ano.
+        Filtrar a ordem global preserva a restricao topologica mesmo quando
+        a cadeia passa por outro componente.
+        """
+        if componente is None and ano_escolar is None:
+            return self._ordem
+
+        def aceita(codigo: str) -> bool:
+            comp, ano = self._info.get(codigo, (None, None))
+            return (componente is None or comp == componente) and (
+                ano_escolar is None or ano == ano_escolar
+            )
+
+        return tuple(c for c in self._ordem if aceita(c))
+
+
+def obter_grafo(db: Optional[Session] = None) -> GrafoPrerequisitos:
+    """Grafo da versao atual do catalogo (construido uma vez por versao)."""
+    catalogo = obter_catalogo(db)
+    return catalogo.memo("grafo_prerequisitos", lambda: GrafoPrerequisitos.de_catalogo(catalogo))
@@ -2,11 +2,14 @@
 # SERVICE - Geração de Calendário e Atividades PEI
 # ============================================
 
-from sqlalchemy import text
+from sqlalchemy import insert, select, text
+import asyncio
 import json
-from typing import Optional, List, Dict, Any
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime, date, timedelta, timezone
 from sqlalchemy.orm import Session
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
 
 from app.core.config import settings
 from app.models.student import Student
@@ -14,6 +17,7 @@ from app.models.pei import PEI, PEIObjetivo
 from app.models.atividade_pei import AtividadePEI, SequenciaObjetivo, TipoAtividade, StatusAtividade
 from app.models.material import Material, MaterialAluno, StatusMaterial, TipoMaterial
 from app.models.prova import Prova, QuestaoGerada, ProvaAluno, StatusProva, StatusProvaAluno, TipoQuestao, DificuldadeQuestao
+from app.services.ia_estruturada import gerar_estruturado_async
 
 
 # Cliente Anthropic
@@ -21,6 +25,75 @@ _client = None
 MODELO_IA = "claude-3-5-sonnet-20241022"
 
 
+@dataclass
+class _PlanoObjetivo:
+    """Conteúdo gerado pela IA para um objetivo, ainda não gravado."""
+    objetivo: PEIObjetivo
+    data_inicio: date
+    semanas: int
+    materiais: List[Optional[Material]]
+    prova: Optional[Prova]
+    questoes: List[Dict[str, Any]]
+
+
+# Schemas da saída da IA (tool use - ver app/services/ia_estruturada.py)
+
+class SecaoMaterialIA(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    titulo: Optional[str] = None
+    conteudo: str = Field(min_length=1)
+    exemplo: Optional[str] = None
+
+
+class MaterialIA(BaseModel):
+    """Registra o material de estudo gerado."""
+    model_config = ConfigDict(extra="allow")
+    titulo: str = Field(min_length=1)
+    introducao: Optional[str] = None
+    secoes: List[SecaoMaterialIA] = Field(min_length=1)
+    resumo: Optional[str] = None
+    dicas: Optional[List[str]] = None
+
+
+class AlternativaIA(BaseModel):
+    letra: Optional[str] = None
+    texto: str
+
+
+class QuestaoObjetivoIA(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    numero: int = 1
+    enunciado: str = Field(min_length=1)
+    alternativas: List[AlternativaIA] = Field(min_length=1)
+    resposta_correta: str = "A"
+    habilidade_avaliada: Optional[str] = None
+
+
+class ProvaObjetivoIA(BaseModel):
+    """Registra a prova de avaliação gerada."""
+    model_config = ConfigDict(extra="allow")
+    titulo: Optional[str] = None
+    instrucoes: Optional[str] = None
+    questoes: List[QuestaoObjetivoIA] = Field(min_length=1)
+
+
+class ArtefatosObjetivoIA(BaseModel):
+    """Registra os três artefatos do objetivo: dois materiais e a prova."""
+    material_introducao: Optional[MaterialIA] = None
+    material_aprofundamento: Optional[MaterialIA] = None
+    prova: Optional[ProvaObjetivoIA] = None
+    
+    @field_validator("material_introducao", "material_aprofundamento", "prova", mode="wrap")
+    @classmethod
+    def _invalido_vira_none(cls, valor, handler):
+        # Parte inválida não derruba as outras: fica None e é gerada
+        # depois com a chamada individual
+        try:
+            return handler(valor)
+        except ValidationError:
+            return None
+
+
 def get_anthropic_client():
     global _client
     if _client is None:
@@ -38,9 +111,12 @@ class CalendarioAtividadesService:
     Para cada objetivo, gera materiais, exercícios e prova de avaliação.
     """
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, geracao_combinada: bool = True):
         self.db = db
         self.client = get_anthropic_client()
+        # True: 1 chamada à IA por objetivo para os 3 artefatos (ver
+        # _gerar_conteudo_objetivo); False: 1 chamada por artefato
+        self.geracao_combinada = geracao_combinada
     
     def _keep_alive(self):
         """Mantém a conexão viva após operações demoradas"""
@@ -54,12 +130,26 @@ class CalendarioAtividadesService:
         self,
         pei_id: int,
         user_id: int,
-        data_inicio: Optional[date] = None
+        data_inicio: Optional[date] = None,
+        task_id: str = None,
+        task_manager = None
     ) -> Dict[str, Any]:
         """
         Gera o calendário completo de atividades para um PEI.
         Cria materiais, exercícios e provas para cada objetivo.
+        Suporta atualização de progresso (task_id/task_manager).
+        
+        Fases: (0) datas de todos os objetivos calculadas antes de tudo;
+        (1) conteúdo da IA gerado para todos os objetivos em paralelo
+        (limite global de chamadas simultâneas em chamar_ia), sem tocar no
+        banco; (2) tudo gravado numa transação com inserts em lote
+        (_persistir_calendario). Antes eram ~3 chamadas à IA em série por
+        objetivo - 30 objetivos = 90 chamadas uma após a outra.
         """
+        def update_progress(progress: int, message: str):
+            if task_manager and task_id:
+                task_manager.update_task(task_id, progress=progress, message=message)
+        
         
         # Buscar PEI com objetivos
         pei = self.db.query(PEI).filter(PEI.id == pei_id).first()
@@ -110,7 +200,8 @@ class CalendarioAtividadesService:
             "calendario": []
         }
         
-        # Para cada trimestre e seus objetivos
+        # Fase 0: datas de cada objetivo (não dependem da IA)
+        agenda = []
         for trimestre, objetivos in sorted(objetivos_por_trimestre.items()):
             datas_tri = trimestres_datas.get(trimestre, trimestres_datas[1])
             
@@ -121,41 +212,198 @@ class CalendarioAtividadesService:
             data_atual = datas_tri["inicio"]
             
             for obj in objetivos:
-                # Gerar sequência de atividades para este objetivo
-                atividades_obj = await self._gerar_atividades_objetivo(
-                    pei=pei,
-                    objetivo=obj,
-                    student=student,
-                    data_inicio=data_atual,
-                    semanas=semanas_por_objetivo,
-                    user_id=user_id
-                )
-                
-                resultado["atividades_geradas"] += atividades_obj["total_atividades"]
-                resultado["materiais_gerados"] += atividades_obj["materiais_criados"]
-                resultado["provas_geradas"] += atividades_obj["provas_criadas"]
-                resultado["calendario"].extend(atividades_obj["atividades"])
+                agenda.append((obj, data_atual, semanas_por_objetivo))
                 
                 # Avançar data para próximo objetivo
                 data_atual = data_atual + timedelta(weeks=semanas_por_objetivo)
         
+        # Fase 1: conteúdo da IA de todos os objetivos em paralelo (sem
+        # escrita no banco). gather mantém a ordem da agenda.
+        update_progress(5, f"Gerando conteúdo de {len(agenda)} objetivos...")
+        concluidos = 0
+        
+        async def gerar(obj: PEIObjetivo, inicio: date, semanas: int) -> _PlanoObjetivo:
+            nonlocal concluidos
+            plano = await self._gerar_conteudo_objetivo(
+                objetivo=obj,
+                student=student,
+                data_inicio=inicio,
+                semanas=semanas,
+                user_id=user_id
+            )
+            concluidos += 1
+            update_progress(
+                5 + 85 * concluidos // len(agenda),
+                f"Conteúdo gerado para {concluidos} de {len(agenda)} objetivos"
+            )
+            return plano
+        
+        planos = await asyncio.gather(*(gerar(*item) for item in agenda))
+        
+        update_progress(92, "Salvando calendário...")
+        # Fase 2: tudo no banco de uma vez. A conexão ficou ociosa durante as
+        # chamadas à IA - um ping antes de escrever.
+        self._keep_alive()
+        for atividades_obj in self._persistir_calendario(pei, student, user_id, planos):
+            resultado["atividades_geradas"] += atividades_obj["total_atividades"]
+            resultado["materiais_gerados"] += atividades_obj["materiais_criados"]
+            resultado["provas_geradas"] += atividades_obj["provas_criadas"]
+            resultado["calendario"].extend(atividades_obj["atividades"])
+        
         self.db.commit()
         
         return resultado
     
-    async def _gerar_atividades_objetivo(
+    async def _gerar_conteudo_objetivo(
         self,
-        pei: PEI,
         objetivo: PEIObjetivo,
         student: Student,
         data_inicio: date,
         semanas: int,
         user_id: int
-    ) -> Dict[str, Any]:
+    ) -> _PlanoObjetivo:
         """
-        Gera todas as atividades para um objetivo específico.
-        Inclui: materiais de estudo, exercícios e prova final.
+        Gera os 2 materiais e a prova de um objetivo (sem gravar).
+        
+        Modo combinado (padrão): uma chamada com o perfil/objetivo enviados
+        uma vez só para os 3 artefatos - ~1/3 das chamadas e dos tokens de
+        entrada. Artefato ausente ou inválido na resposta combinada é gerado
+        com a chamada individual (em paralelo), como no modo separado.
         """
+        combinados = {}
+        if self.geracao_combinada:
+            combinados = await self._gerar_artefatos_combinados(objetivo, student)
+        
+        # Montar a parte combinada não pode derrubar o gather dos outros
+        # artefatos: se falhar, vai para a chamada individual
+        async def material(numero: int, tipo: str, chave: str) -> Optional[Material]:
+            if chave in combinados:
+                try:
+                    return self._montar_material(combinados[chave], objetivo, student, numero, tipo, user_id)
+                except Exception as e:
+                    print(f"[AVISO] Material combinado inválido, gerando individualmente: {e}")
+            return await self._criar_material_para_objetivo(
+                objetivo=objetivo, student=student, numero=numero, tipo=tipo, user_id=user_id
+            )
+        
+        async def prova_objetivo():
+            if "prova" in combinados:
+                try:
+                    return self._montar_prova(combinados["prova"], objetivo, student, user_id)
+                except Exception as e:
+                    print(f"[AVISO] Prova combinada inválida, gerando individualmente: {e}")
+            return await self._criar_prova_para_objetivo(objetivo=objetivo, student=student, user_id=user_id)
+        
+        material1, material2, prova = await asyncio.gather(
+            material(1, "introducao", "material_introducao"),
+            material(2, "aprofundamento", "material_aprofundamento"),
+            prova_objetivo()
+        )
+        
+        return _PlanoObjetivo(
+            objetivo=objetivo,
+            data_inicio=data_inicio,
+            semanas=semanas,
+            materiais=[material1, material2],
+            prova=prova[0] if prova else None,
+            questoes=prova[1] if prova else []
+        )
+    
+    def _persistir_calendario(
+        self,
+        pei: PEI,
+        student: Student,
+        user_id: int,
+        planos: List[_PlanoObjetivo]
+    ) -> List[Dict[str, Any]]:
+        """
+        Grava materiais, provas, questões, atividades e sequências de todos os
+        objetivos. Não faz commit (o chamador commita).
+        
+        - Material/Prova: add_all + um flush (os ids são usados pelas
+          atividades e não há chave natural para buscá-los depois; sem
+          RETURNING no MySQL, o flush faz um INSERT por linha - 3 por objetivo).
+        - Vínculos com o aluno: INSERT em lote + um SELECT dos ids por
+          (aluno_id, material_id/prova_id).
+        - QuestaoGerada, AtividadePEI e SequenciaObjetivo: INSERT em lote
+          (executemany), ninguém precisa dos ids.
+        """
+        materiais = [m for p in planos for m in p.materiais if m]
+        provas = [p.prova for p in planos if p.prova]
+        self.db.add_all(materiais + provas)
+        self.db.flush()
+        
+        materiais_alunos = {}
+        if materiais:
+            self.db.execute(insert(MaterialAluno), [
+                {"material_id": m.id, "aluno_id": student.id} for m in materiais
+            ])
+            materiais_alunos = dict(self.db.execute(
+                select(MaterialAluno.material_id, MaterialAluno.id).where(
+                    MaterialAluno.aluno_id == student.id,
+                    MaterialAluno.material_id.in_([m.id for m in materiais])
+                )
+            ).all())
+        provas_alunos = {}
+        if provas:
+            self.db.execute(insert(ProvaAluno), [
+                {"prova_id": p.id, "aluno_id": student.id, "status": StatusProvaAluno.PENDENTE}
+                for p in provas
+            ])
+            provas_alunos = dict(self.db.execute(
+                select(ProvaAluno.prova_id, ProvaAluno.id).where(
+                    ProvaAluno.aluno_id == student.id,
+                    ProvaAluno.prova_id.in_([p.id for p in provas])
+                )
+            ).all())
+        
+        questoes = [
+            {**q, "prova_id": p.prova.id}
+            for p in planos if p.prova
+            for q in p.questoes
+        ]
+        atividades = []
+        sequencias = []
+        resumos = []
+        for plano in planos:
+            linhas, resumo, sequencia = self._atividades_objetivo(
+                pei, student, user_id, plano, materiais_alunos, provas_alunos
+            )
+            atividades.extend(linhas)
+            sequencias.append(sequencia)
+            resumos.append(resumo)
+        
+        if questoes:
+            self.db.execute(insert(QuestaoGerada), questoes)
+        if atividades:
+            # render_nulls: material/prova None entram como NULL em vez de
+            # sumir da linha - todas com as mesmas colunas, um só lote
+            self.db.execute(insert(AtividadePEI), atividades,
+                            execution_options={"render_nulls": True})
+        if sequencias:
+            self.db.execute(insert(SequenciaObjetivo), sequencias)
+        
+        return resumos
+    
+    def _atividades_objetivo(
+        self,
+        pei: PEI,
+        student: Student,
+        user_id: int,
+        plano: _PlanoObjetivo,
+        materiais_alunos: Dict[int, int],
+        provas_alunos: Dict[int, int]
+    ):
+        """
+        Linhas de AtividadePEI e SequenciaObjetivo de um objetivo + resumo
+        para o calendário.
+        Sequência: material 1 + exercícios, material 2 + exercícios,
+        revisão + prova na última semana.
+        """
+        objetivo = plano.objetivo
+        data_inicio = plano.data_inicio
+        semanas = plano.semanas
+        material1, material2 = plano.materiais
         
         resultado = {
             "objetivo_id": objetivo.id,
@@ -165,221 +413,124 @@ class CalendarioAtividadesService:
             "provas_criadas": 0,
             "atividades": []
         }
+        linhas = []
+        
+        def adicionar(tipo_calendario: str, **campos):
+            linhas.append({
+                "pei_id": pei.id,
+                "objetivo_id": objetivo.id,
+                "student_id": student.id,
+                "adaptacoes": objetivo.adaptacoes,
+                "created_by": user_id,
+                "material_id": None,
+                "material_aluno_id": None,
+                "prova_id": None,
+                "prova_aluno_id": None,
+                **campos
+            })
+            resultado["atividades"].append({
+                "data": campos["data_programada"].isoformat(),
+                "tipo": tipo_calendario,
+                "titulo": campos["titulo"]
+            })
+            resultado["total_atividades"] += 1
         
-        # Planejar distribuição das atividades
-        # Semana 1-2: Material 1 + Exercícios
-        # Semana 2-3: Material 2 + Exercícios  
-        # Semana final: Revisão + Prova
-        
-        dias_por_semana = 5  # Segunda a sexta
-        
-        # ========================================
         # MATERIAL 1 - Introdução ao conteúdo
-        # ========================================
         data_material1 = data_inicio
-        material1 = await self._criar_material_para_objetivo(
-            pei=pei,
-            objetivo=objetivo,
-            student=student,
-            numero=1,
-            tipo="introducao",
-            user_id=user_id
-        )
-        
         if material1:
-            # Reconectar se necessário
-            try:
-                self.db.execute(text("SELECT 1"))
-            except:
-                self.db.rollback()
-            
-            atividade1 = AtividadePEI(
-                pei_id=pei.id,
-                objetivo_id=objetivo.id,
-                student_id=student.id,
-                material_id=material1.get("material_id"),
-                material_aluno_id=material1.get("material_aluno_id"),
+            adicionar(
+                "material",
+                material_id=material1.id,
+                material_aluno_id=materiais_alunos[material1.id],
                 tipo=TipoAtividade.MATERIAL,
-                titulo=f"📚 {material1.get('titulo', 'Material de Introdução')}",
+                titulo=f"📚 {material1.titulo or 'Material de Introdução'}",
                 descricao=f"Estudar o material introdutório sobre: {objetivo.titulo}",
                 data_programada=data_material1,
                 duracao_estimada_min=30,
                 ordem_sequencial=1,
-                instrucoes="Leia o material com atenção. Use os recursos visuais para melhor compreensão.",
-                adaptacoes=objetivo.adaptacoes,
-                created_by=user_id
+                instrucoes="Leia o material com atenção. Use os recursos visuais para melhor compreensão."
             )
-            self.db.add(atividade1)
-            resultado["atividades"].append({
-                "data": data_material1.isoformat(),
-                "tipo": "material",
-                "titulo": atividade1.titulo
-            })
-            resultado["total_atividades"] += 1
             resultado["materiais_criados"] += 1
         
-        # ========================================
         # EXERCÍCIOS 1 - Prática inicial
-        # ========================================
-        data_exercicio1 = data_material1 + timedelta(days=2)
-        atividade_ex1 = AtividadePEI(
-            pei_id=pei.id,
-            objetivo_id=objetivo.id,
-            student_id=student.id,
+        adicionar(
+            "exercicio",
             tipo=TipoAtividade.EXERCICIO,
             titulo=f"📝 Exercícios: {objetivo.titulo[:50]}...",
             descricao=f"Exercícios práticos para fixação do conteúdo introdutório",
-            data_programada=data_exercicio1,
+            data_programada=data_material1 + timedelta(days=2),
             duracao_estimada_min=20,
             ordem_sequencial=2,
-            instrucoes="Complete os exercícios no seu ritmo. Peça ajuda se precisar.",
-            adaptacoes=objetivo.adaptacoes,
-            created_by=user_id
+            instrucoes="Complete os exercícios no seu ritmo. Peça ajuda se precisar."
         )
-        self.db.add(atividade_ex1)
-        resultado["atividades"].append({
-            "data": data_exercicio1.isoformat(),
-            "tipo": "exercicio",
-            "titulo": atividade_ex1.titulo
-        })
-        resultado["total_atividades"] += 1
-        
-        # ========================================
+        
         # MATERIAL 2 - Aprofundamento
-        # ========================================
         data_material2 = data_inicio + timedelta(weeks=1)
-        material2 = await self._criar_material_para_objetivo(
-            pei=pei,
-            objetivo=objetivo,
-            student=student,
-            numero=2,
-            tipo="aprofundamento",
-            user_id=user_id
-        )
-        
         if material2:
-            atividade2 = AtividadePEI(
-                pei_id=pei.id,
-                objetivo_id=objetivo.id,
-                student_id=student.id,
-                material_id=material2.get("material_id"),
-                material_aluno_id=material2.get("material_aluno_id"),
+            adicionar(
+                "material",
+                material_id=material2.id,
+                material_aluno_id=materiais_alunos[material2.id],
                 tipo=TipoAtividade.MATERIAL,
-                titulo=f"📚 {material2.get('titulo', 'Material de Aprofundamento')}",
+                titulo=f"📚 {material2.titulo or 'Material de Aprofundamento'}",
                 descricao=f"Aprofundar conhecimentos sobre: {objetivo.titulo}",
                 data_programada=data_material2,
                 duracao_estimada_min=35,
                 ordem_sequencial=3,
-                instrucoes="Este material aprofunda o conteúdo anterior. Revise se necessário.",
-                adaptacoes=objetivo.adaptacoes,
-                created_by=user_id
+                instrucoes="Este material aprofunda o conteúdo anterior. Revise se necessário."
             )
-            self.db.add(atividade2)
-            resultado["atividades"].append({
-                "data": data_material2.isoformat(),
-                "tipo": "material",
-                "titulo": atividade2.titulo
-            })
-            resultado["total_atividades"] += 1
             resultado["materiais_criados"] += 1
         
-        # ========================================
         # EXERCÍCIOS 2 - Prática avançada
-        # ========================================
-        data_exercicio2 = data_material2 + timedelta(days=2)
-        atividade_ex2 = AtividadePEI(
-            pei_id=pei.id,
-            objetivo_id=objetivo.id,
-            student_id=student.id,
+        adicionar(
+            "exercicio",
             tipo=TipoAtividade.EXERCICIO,
             titulo=f"📝 Exercícios Avançados: {objetivo.titulo[:40]}...",
             descricao=f"Exercícios de fixação do conteúdo avançado",
-            data_programada=data_exercicio2,
+            data_programada=data_material2 + timedelta(days=2),
             duracao_estimada_min=25,
             ordem_sequencial=4,
-            instrucoes="Estes exercícios são um pouco mais desafiadores. Faça com calma.",
-            adaptacoes=objetivo.adaptacoes,
-            created_by=user_id
+            instrucoes="Estes exercícios são um pouco mais desafiadores. Faça com calma."
         )
-        self.db.add(atividade_ex2)
-        resultado["atividades"].append({
-            "data": data_exercicio2.isoformat(),
-            "tipo": "exercicio",
-            "titulo": atividade_ex2.titulo
-        })
-        resultado["total_atividades"] += 1
-        
-        # ========================================
+        
         # REVISÃO
-        # ========================================
         data_revisao = data_inicio + timedelta(weeks=semanas-1)
-        atividade_rev = AtividadePEI(
-            pei_id=pei.id,
-            objetivo_id=objetivo.id,
-            student_id=student.id,
+        adicionar(
+            "revisao",
             tipo=TipoAtividade.REVISAO,
             titulo=f"🔄 Revisão: {objetivo.titulo[:50]}...",
             descricao=f"Revisão de todo o conteúdo antes da avaliação",
             data_programada=data_revisao,
             duracao_estimada_min=20,
             ordem_sequencial=5,
-            instrucoes="Revise os materiais e exercícios anteriores. Tire dúvidas com o professor.",
-            adaptacoes=objetivo.adaptacoes,
-            created_by=user_id
+            instrucoes="Revise os materiais e exercícios anteriores. Tire dúvidas com o professor."
         )
-        self.db.add(atividade_rev)
-        resultado["atividades"].append({
-            "data": data_revisao.isoformat(),
-            "tipo": "revisao",
-            "titulo": atividade_rev.titulo
-        })
-        resultado["total_atividades"] += 1
-        
-        # ========================================
+        
         # PROVA - Avaliação do objetivo
-        # ========================================
         data_prova = data_revisao + timedelta(days=2)
-        prova_info = await self._criar_prova_para_objetivo(
-            pei=pei,
-            objetivo=objetivo,
-            student=student,
-            user_id=user_id
-        )
-        
-        if prova_info:
-            atividade_prova = AtividadePEI(
-                pei_id=pei.id,
-                objetivo_id=objetivo.id,
-                student_id=student.id,
-                prova_id=prova_info.get("prova_id"),
-                prova_aluno_id=prova_info.get("prova_aluno_id"),
+        if plano.prova:
+            adicionar(
+                "prova",
+                prova_id=plano.prova.id,
+                prova_aluno_id=provas_alunos[plano.prova.id],
                 tipo=TipoAtividade.PROVA,
                 titulo=f"✅ Avaliação: {objetivo.titulo[:50]}...",
                 descricao=f"Prova para avaliar o domínio do objetivo",
                 data_programada=data_prova,
                 duracao_estimada_min=30,
                 ordem_sequencial=6,
-                instrucoes="Faça a prova com calma. Leia cada questão com atenção.",
-                adaptacoes=objetivo.adaptacoes,
-                created_by=user_id
+                instrucoes="Faça a prova com calma. Leia cada questão com atenção."
             )
-            self.db.add(atividade_prova)
-            resultado["atividades"].append({
-                "data": data_prova.isoformat(),
-                "tipo": "prova",
-                "titulo": atividade_prova.titulo
-            })
-            resultado["total_atividades"] += 1
             resultado["provas_criadas"] += 1
         
-        # Criar registro de sequência
-        sequencia = SequenciaObjetivo(
-            objetivo_id=objetivo.id,
-            total_semanas=semanas,
-            total_materiais=2,
-            total_exercicios=2,
-            incluir_prova=True,
-            plano_sequencial={
+        # Registro de sequência
+        sequencia = {
+            "objetivo_id": objetivo.id,
+            "total_semanas": semanas,
+            "total_materiais": 2,
+            "total_exercicios": 2,
+            "incluir_prova": True,
+            "plano_sequencial": {
                 "data_inicio": data_inicio.isoformat(),
                 "data_fim": data_prova.isoformat(),
                 "etapas": [
@@ -388,24 +539,23 @@ class CalendarioAtividadesService:
                     {"semana": semanas, "atividades": ["revisao", "prova"]}
                 ]
             },
-            gerado=True,
-            data_geracao=datetime.now(timezone.utc)
-        )
-        self.db.add(sequencia)
+            "gerado": True,
+            "data_geracao": datetime.now(timezone.utc)
+        }
         
-        return resultado
+        return linhas, resultado, sequencia
     
     async def _criar_material_para_objetivo(
         self,
-        pei: PEI,
         objetivo: PEIObjetivo,
         student: Student,
         numero: int,
         tipo: str,
         user_id: int
-    ) -> Optional[Dict[str, Any]]:
+    ) -> Optional[Material]:
         """
-        Cria um material de estudo para o objetivo usando IA.
+        Gera com IA um material de estudo para o objetivo.
+        Devolve o Material ainda fora da sessão (gravado em _persistir_calendario).
         """
         
         if not self.client:
@@ -463,61 +613,54 @@ class CalendarioAtividadesService:
 Retorne APENAS o JSON."""
 
         try:
-            message = self.client.messages.create(
+            conteudo = await gerar_estruturado_async(
+                self.client,
+                MaterialIA,
+                prompt,
                 model=MODELO_IA,
                 max_tokens=4000,
-                messages=[{"role": "user", "content": prompt}]
+                nome="registrar_material"
             )
-            
-            response_text = message.content[0].text.strip()
-            response_text = self._limpar_json(response_text)
-            conteudo = json.loads(response_text)
-            
-            # Manter conexão viva antes de inserir
-            self._keep_alive()
-            
-            # Criar material no banco
-            material = Material(
-                titulo=conteudo.get("titulo", f"Material {numero}: {objetivo.titulo[:50]}"),
-                descricao=f"Material {tipo} para o objetivo: {objetivo.titulo}",
-                conteudo_prompt=f"Objetivo PEI: {objetivo.titulo}",
-                tipo=TipoMaterial.VISUAL,
-                materia=objetivo.area or "geral",
-                serie_nivel=student.grade_level,
-                metadados={"conteudo": conteudo, "tipo_geracao": "ia_pei"},
-                status=StatusMaterial.DISPONIVEL,
-                criado_por_id=user_id
+            return self._montar_material(
+                conteudo.model_dump(exclude_unset=True), objetivo, student, numero, tipo, user_id
             )
-            self.db.add(material)
-            self.db.flush()
-            
-            # Associar ao aluno
-            material_aluno = MaterialAluno(
-                material_id=material.id,
-                aluno_id=student.id
-            )
-            self.db.add(material_aluno)
-            self.db.flush()
-            
-            return {
-                "material_id": material.id,
-                "material_aluno_id": material_aluno.id,
-                "titulo": conteudo.get("titulo")
-            }
             
         except Exception as e:
             print(f"[ERRO] Criando material: {e}")
             return None
     
+    def _montar_material(
+        self,
+        conteudo: Dict[str, Any],
+        objetivo: PEIObjetivo,
+        student: Student,
+        numero: int,
+        tipo: str,
+        user_id: int
+    ) -> Material:
+        """Material (fora da sessão) a partir do JSON gerado pela IA."""
+        return Material(
+            titulo=conteudo.get("titulo", f"Material {numero}: {objetivo.titulo[:50]}"),
+            descricao=f"Material {tipo} para o objetivo: {objetivo.titulo}",
+            conteudo_prompt=f"Objetivo PEI: {objetivo.titulo}",
+            tipo=TipoMaterial.VISUAL,
+            materia=objetivo.area or "geral",
+            serie_nivel=student.grade_level,
+            metadados={"conteudo": conteudo, "tipo_geracao": "ia_pei"},
+            status=StatusMaterial.DISPONIVEL,
+            criado_por_id=user_id
+        )
+    
     async def _criar_prova_para_objetivo(
         self,
-        pei: PEI,
         objetivo: PEIObjetivo,
         student: Student,
         user_id: int
-    ) -> Optional[Dict[str, Any]]:
+    ) -> Optional[Tuple[Prova, List[Dict[str, Any]]]]:
         """
-        Cria uma prova de avaliação para o objetivo usando IA.
+        Gera com IA uma prova de avaliação para o objetivo.
+        Devolve a Prova (fora da sessão) e as questões como dicts de
+        QuestaoGerada sem prova_id (preenchido em _persistir_calendario).
         """
         
         if not self.client:
@@ -574,81 +717,159 @@ Retorne APENAS o JSON."""
 Retorne APENAS o JSON."""
 
         try:
-            message = self.client.messages.create(
+            prova_data = await gerar_estruturado_async(
+                self.client,
+                ProvaObjetivoIA,
+                prompt,
                 model=MODELO_IA,
                 max_tokens=4000,
-                messages=[{"role": "user", "content": prompt}]
+                nome="registrar_prova"
             )
-            
-            response_text = message.content[0].text.strip()
-            response_text = self._limpar_json(response_text)
-            prova_data = json.loads(response_text)
-            
-            # Manter conexão viva antes de inserir
-            self._keep_alive()
-            
-            # Criar prova no banco
-            prova = Prova(
-                titulo=prova_data.get("titulo", f"Avaliação: {objetivo.titulo[:50]}"),
-                descricao=f"Avaliação do objetivo PEI: {objetivo.titulo}",
-                conteudo_prompt=f"Objetivo: {objetivo.titulo}\nDescrição: {objetivo.descricao}",
-                materia=objetivo.area or "geral",
-                serie_nivel=student.grade_level,
-                quantidade_questoes=len(prova_data.get("questoes", [])),
-                status=StatusProva.ATIVA,
-                criado_por_id=user_id
-            )
-            self.db.add(prova)
-            self.db.flush()
-            
-            # Criar questões
-            for q in prova_data.get("questoes", []):
-                questao = QuestaoGerada(
-                    prova_id=prova.id,
-                    numero=q.get("numero", 1),
-                    enunciado=q.get("enunciado", ""),
-                    tipo=TipoQuestao.MULTIPLA_ESCOLHA,
-                    dificuldade=DificuldadeQuestao.MEDIO,
-                    opcoes=[alt.get("texto", alt) for alt in q.get("alternativas", [])],
-                    resposta_correta=q.get("resposta_correta", "A"),
-                    explicacao=q.get("habilidade_avaliada")
-                )
-                self.db.add(questao)
-            
-            # Associar ao aluno
-            prova_aluno = ProvaAluno(
-                prova_id=prova.id,
-                aluno_id=student.id,
-                status=StatusProvaAluno.PENDENTE
-            )
-            self.db.add(prova_aluno)
-            self.db.flush()
-            
-            return {
-                "prova_id": prova.id,
-                "prova_aluno_id": prova_aluno.id,
-                "titulo": prova_data.get("titulo")
-            }
+            return self._montar_prova(prova_data.model_dump(exclude_unset=True), objetivo, student, user_id)
             
         except Exception as e:
             print(f"[ERRO] Criando prova: {e}")
             return None
     
+    def _montar_prova(
+        self,
+        prova_data: Dict[str, Any],
+        objetivo: PEIObjetivo,
+        student: Student,
+        user_id: int
+    ) -> Tuple[Prova, List[Dict[str, Any]]]:
+        """Prova (fora da sessão) + questões a partir do JSON gerado pela IA."""
+        prova = Prova(
+            titulo=prova_data.get("titulo", f"Avaliação: {objetivo.titulo[:50]}"),
+            descricao=f"Avaliação do objetivo PEI: {objetivo.titulo}",
+            conteudo_prompt=f"Objetivo: {objetivo.titulo}\nDescrição: {objetivo.descricao}",
+            materia=objetivo.area or "geral",
+            serie_nivel=student.grade_level,
+            quantidade_questoes=len(prova_data.get("questoes", [])),
+            status=StatusProva.ATIVA,
+            criado_por_id=user_id
+        )
+        
+        questoes = [
+            {
+                "numero": q.get("numero", 1),
+                "enunciado": q.get("enunciado", ""),
+                "tipo": TipoQuestao.MULTIPLA_ESCOLHA,
+                "dificuldade": DificuldadeQuestao.MEDIO,
+                "opcoes": [
+                    alt if isinstance(alt, str) else alt.get("texto", "")
+                    for alt in q.get("alternativas", [])
+                ],
+                "resposta_correta": q.get("resposta_correta", "A"),
+                "explicacao": q.get("habilidade_avaliada")
+            }
+            for q in prova_data.get("questoes", [])
+        ]
+        return prova, questoes
+    
+    async def _gerar_artefatos_combinados(
+        self,
+        objetivo: PEIObjetivo,
+        student: Student
+    ) -> Dict[str, Any]:
+        """
+        Uma chamada à IA para os 3 artefatos do objetivo (material de
+        introdução, de aprofundamento e prova). Devolve só as partes que
+        passaram na validação ({} se a chamada ou o JSON falharem) - o
+        chamador gera as que faltarem com as chamadas individuais.
+        """
+        if not self.client:
+            return {}
+        
+        diagnosticos = student.diagnosis or {}
+        adaptacoes = objetivo.adaptacoes or []
+        
+        prompt = f"""Crie TRÊS artefatos de estudo para um aluno com necessidades especiais, todos sobre o mesmo objetivo de aprendizagem.
+
+## ALUNO:
+- Nome: {student.name}
+- Ano escolar: {student.grade_level}
+- Diagnósticos: {json.dumps(diagnosticos, ensure_ascii=False)}
+
+## OBJETIVO DE APRENDIZAGEM:
+- Código BNCC: {objetivo.codigo_bncc or 'N/A'}
+- Título: {objetivo.titulo}
+- Descrição: {objetivo.descricao}
+- Meta: {objetivo.meta_especifica}
+
+## ADAPTAÇÕES NECESSÁRIAS:
+{json.dumps(adaptacoes, ensure_ascii=False) if adaptacoes else 'Adaptar conforme o perfil'}
+
+## ARTEFATOS:
+1. "material_introducao": material introdutório e básico. Use linguagem simples e exemplos do cotidiano.
+2. "material_aprofundamento": material de aprofundamento. Explore mais detalhes e conexões com outros conceitos.
+3. "prova": avaliação com 5 questões progressivas (fácil → difícil), múltipla escolha com 4 alternativas cada.
+
+Para os materiais: seções claras, recursos visuais (emojis, listas), exemplos práticos e linguagem adequada para {student.grade_level}.
+Para a prova: linguagem clara e direta, recursos visuais nas questões.
+
+## FORMATO DE RESPOSTA (JSON):
+{{
+    "material_introducao": {{
+        "titulo": "Título do material",
+        "introducao": "Parágrafo de introdução",
+        "secoes": [
+            {{"titulo": "Título da seção", "conteudo": "Conteúdo com explicações claras", "exemplo": "Exemplo prático"}}
+        ],
+        "resumo": "Resumo dos pontos principais",
+        "dicas": ["Dica 1", "Dica 2"]
+    }},
+    "material_aprofundamento": {{ ...mesmo formato do material_introducao... }},
+    "prova": {{
+        "titulo": "Título da prova",
+        "instrucoes": "Instruções para o aluno",
+        "questoes": [
+            {{
+                "numero": 1,
+                "enunciado": "Texto da questão",
+                "tipo": "multipla_escolha",
+                "alternativas": [
+                    {{"letra": "A", "texto": "Alternativa A"}},
+                    {{"letra": "B", "texto": "Alternativa B"}},
+                    {{"letra": "C", "texto": "Alternativa C"}},
+                    {{"letra": "D", "texto": "Alternativa D"}}
+                ],
+                "resposta_correta": "A",
+                "dificuldade": "facil",
+                "habilidade_avaliada": "Descrição do que avalia"
+            }}
+        ]
+    }}
+}}
+
+Retorne APENAS o JSON."""
+
+        try:
+            # Sem reparo: o que faltar vai para as chamadas individuais
+            artefatos = await gerar_estruturado_async(
+                self.client,
+                ArtefatosObjetivoIA,
+                prompt,
+                model=MODELO_IA,
+                max_tokens=8000,
+                nome="registrar_artefatos",
+                reparos=0
+            )
+        except Exception as e:
+            print(f"[AVISO] Geração combinada falhou, usando chamadas individuais: {e}")
+            return {}
+        
+        return {
+            chave: parte.model_dump(exclude_unset=True)
+            for chave, parte in artefatos
+            if parte is not None
+        }
+    
     def _calcular_semanas(self, data_inicio: date, data_fim: date) -> int:
         """Calcula o número de semanas entre duas datas"""
         dias = (data_fim - data_inicio).days
         return max(1, dias // 7)
     
-    def _limpar_json(self, text: str) -> str:
-        """Remove marcadores de código"""
-        if text.startswith("```json"):
-            text = text[7:]
-        if text.startswith("```"):
-            text = text[3:]
-        if text.endswith("```"):
-            text = text[:-3]
-        return text.strip()
-    
     def listar_atividades_aluno(
         self,
         student_id: int,
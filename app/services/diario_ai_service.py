@@ -19,6 +19,8 @@ from app.models.diario_aprendizagem import (
     NivelCompreensao
 )
 from app.models.student import Student
+from app.services import diario_busca
+from app.services.ia_estruturada import extrair_json
 
 
 class DiarioAIService:
@@ -126,8 +128,7 @@ Retorne APENAS o JSON, sem explicações."""
             )
             
             response_text = message.content[0].text.strip()
-            response_text = self._limpar_json(response_text)
-            analise = json.loads(response_text)
+            analise = extrair_json(response_text)
             
             # Atualizar o diário com a análise
             diario.ia_processado = True
@@ -146,6 +147,7 @@ Retorne APENAS o JSON, sem explicações."""
             
             # Criar registros de conteúdo extraído
             await self._criar_conteudos_extraidos(db, diario, analise)
+            diario_busca.invalidar(diario.student_id)
             
             return {
                 "success": True,
@@ -400,8 +402,7 @@ Retorne APENAS o JSON."""
                 messages=[{"role": "user", "content": prompt}]
             )
             
-            response_text = self._limpar_json(message.content[0].text.strip())
-            analise_semanal = json.loads(response_text)
+            analise_semanal = extrair_json(message.content[0].text)
             
             # Salvar resumo
             numero_semana = data_referencia.isocalendar()[1]
@@ -502,16 +503,6 @@ Retorne APENAS o JSON."""
             for c in conteudos
         ]
     
-    def _limpar_json(self, text: str) -> str:
-        """Remove marcadores de código"""
-        if text.startswith("```json"):
-            text = text[7:]
-        if text.startswith("```"):
-            text = text[3:]
-        if text.endswith("```"):
-            text = text[:-3]
-        return text.strip()
-
 
 # Instância global
 diario_ai_service = DiarioAIService()
@@ -0,0 +1,322 @@
+"""
+Busca textual no diario de aprendizagem de um aluno (indice invertido in-process).
+
+MOTIVACAO: /diario-aprendizagem/buscar fazia `registro_texto ILIKE '%q%'` -
+full scan dos textos livres do aluno a cada tecla, sem acento-insensivel,
+sem ranking e ignorando o que a IA extraiu (resumo, disciplinas, tags,
+conceitos, topicos, ConteudoExtraido).
+
+Mesmo desenho da busca BNCC (app/services/bncc_busca.py, de onde vem a
+normalizacao: minusculas, sem acento, plural simples):
+
+    - Um documento por registro do diario, campos com peso (BM25F
+      simplificado): disciplinas/tags/conceitos/topicos > resumo IA > texto.
+      Os ConteudoExtraido entram no registro que os originou.
+    - Termo da consulta casa igual (peso 1) ou por prefixo (peso 0.8) - a
+      busca roda enquanto o professor digita ("fraç" -> "fracao").
+    - Trecho com destaques: janela do texto original (com acento) em volta
+      do primeiro termo casado, mais os offsets [inicio, fim] de cada termo
+      destacado dentro do trecho (o cliente marca; nada de HTML aqui).
+
+Indice por aluno, cacheado em memoria (LRU) junto com uma "versao" do
+diario (contagens e maximos de id/updated_at de diarios e conteudos, uma
+query agregada pelo indice de student_id). Insert/update/delete mudam a
+versao, entao o proximo request reconstroi - vale tambem entre workers.
+As rotas que escrevem chamam invalidar() para nao depender da precisao
+de segundos do DATETIME do MySQL.
+
+Escolhido in-process em vez de FULLTEXT ngram: o volume por aluno e de
+centenas de registros, o indice sai em milissegundos, e o FULLTEXT nao
+ranqueia por campo nem dobra plural.
+
+Uso:
+    from app.services.diario_busca import buscar_diario
+    resultados = buscar_diario(db, student_id, "frações", disciplina="Matemática")
+"""
+from __future__ import annotations
+
+import heapq
+import math
+import re
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.models.diario_aprendizagem import ConteudoExtraido, DiarioAprendizagem
+from app.services.bncc_busca import (
+    B,
+    K1,
+    MAX_EXPANSOES,
+    PESO_PREFIXO,
+    _singular,
+    normalizar,
+    tokenizar,
+)
+
+
+# Peso de cada campo no documento
+PESO_ETIQUETAS = 2.0   # disciplinas, tags, conceitos, topicos, ConteudoExtraido
+PESO_RESUMO = 1.5
+PESO_TEXTO = 1.0
+
+TAMANHO_TRECHO = 200
+MAX_ALUNOS_EM_CACHE = 256
+
+_PALAVRA = re.compile(r"\w+")
+
+
+@dataclass
+class DocumentoDiario:
+    id: int
+    data_estudo: date
+    registro_texto: str
+    ia_resumo: Optional[str]
+    disciplinas: List[str]
+    etiquetas: str          # texto achatado dos campos de IA (indexacao)
+
+
+def _textos(valor: Any) -> Iterable[str]:
+    """Strings de um JSON qualquer (listas/dicts aninhados da IA)."""
+    if isinstance(valor, str):
+        yield valor
+    elif isinstance(valor, dict):
+        for v in valor.values():
+            yield from _textos(v)
+    elif isinstance(valor, (list, tuple)):
+        for v in valor:
+            yield from _textos(v)
+
+
+class IndiceDiario:
+    """Indice invertido imutavel sobre os registros de diario de UM aluno."""
+
+    def __init__(self, documentos: Iterable[DocumentoDiario]):
+        self._docs: List[DocumentoDiario] = []
+        comprimentos: List[float] = []
+        postings: Dict[str, List[Tuple[int, float]]] = {}
+
+        for doc_id, d in enumerate(documentos):
+            self._docs.append(d)
+            tf: Dict[str, float] = {}
+            comprimento = 0.0
+            for texto, peso in (
+                (d.etiquetas, PESO_ETIQUETAS),
+                (d.ia_resumo, PESO_RESUMO),
+                (d.registro_texto, PESO_TEXTO),
+            ):
+                for termo in tokenizar(texto):
+                    tf[termo] = tf.get(termo, 0.0) + peso
+                    comprimento += peso
+            comprimentos.append(comprimento)
+            for termo, freq in tf.items():
+                postings.setdefault(termo, []).append((doc_id, freq))
+
+        n = len(self._docs)
+        self._comprimentos = comprimentos
+        self._media_comprimento = (sum(comprimentos) / n) if n else 0.0
+        self._postings = {t: tuple(p) for t, p in postings.items()}
+        self._idf = {
+            t: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5))
+            for t, p in self._postings.items()
+        }
+        self._vocabulario: Tuple[str, ...] = tuple(sorted(self._postings))
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def _expandir(self, termo: str) -> Dict[str, float]:
+        """termo da consulta -> {termo do indice: peso} (igual + prefixos)"""
+        expansoes: Dict[str, float] = {}
+        if termo in self._postings:
+            expansoes[termo] = 1.0
+        if len(termo) >= 3:
+            i = bisect_left(self._vocabulario, termo)
+            while (
+                i < len(self._vocabulario)
+                and self._vocabulario[i].startswith(termo)
+                and len(expansoes) < MAX_EXPANSOES
+            ):
+                expansoes.setdefault(self._vocabulario[i], PESO_PREFIXO)
+                i += 1
+        return expansoes
+
+    def _bm25(self, termo: str) -> Iterable[Tuple[int, float]]:
+        idf = self._idf[termo]
+        media = self._media_comprimento or 1.0
+        for doc_id, tf in self._postings[termo]:
+            norm = K1 * (1 - B + B * self._comprimentos[doc_id] / media)
+            yield doc_id, idf * tf * (K1 + 1) / (tf + norm)
+
+    def buscar(
+        self,
+        consulta: str,
+        disciplina: Optional[str] = None,
+        limite: int = 20,
+    ) -> List[Dict[str, Any]]:
+        """Top `limite` registros por relevancia, com trecho e destaques."""
+        scores: Dict[int, float] = {}
+        casados: set = set()
+
+        # Todo termo da consulta precisa casar (AND): busca incremental
+        # estreita conforme o professor digita
+        for n_termo, termo in enumerate(dict.fromkeys(tokenizar(consulta))):
+            melhor: Dict[int, float] = {}
+            for termo_indice, peso in self._expandir(termo).items():
+                casados.add(termo_indice)
+                for doc_id, s in self._bm25(termo_indice):
+                    s *= peso
+                    if s > melhor.get(doc_id, 0.0):
+                        melhor[doc_id] = s
+            if n_termo == 0:
+                scores = melhor
+            else:
+                scores = {d: s + melhor[d] for d, s in scores.items() if d in melhor}
+            if not scores:
+                return []
+
+        if disciplina:
+            alvo = normalizar(disciplina)
+            scores = {
+                d: s for d, s in scores.items()
+                if any(normalizar(x) == alvo for x in self._docs[d].disciplinas)
+            }
+
+        # Empate: registro mais recente primeiro
+        top = heapq.nsmallest(
+            limite, scores.items(),
+            key=lambda c: (-c[1], -self._docs[c[0]].data_estudo.toordinal(), -self._docs[c[0]].id),
+        )
+        return [self._resultado(self._docs[d], s, casados) for d, s in top]
+
+    def _resultado(self, doc: DocumentoDiario, score: float, casados: set) -> Dict[str, Any]:
+        campo, trecho, destaques = "registro_texto", doc.registro_texto[:TAMANHO_TRECHO], []
+        for nome, texto in (("registro_texto", doc.registro_texto), ("ia_resumo", doc.ia_resumo)):
+            achado = _destacar(texto, casados)
+            if achado:
+                campo, (trecho, destaques) = nome, achado
+                break
+        return {
+            "id": doc.id,
+            "data": doc.data_estudo,
+            "score": round(score, 4),
+            "resumo": doc.ia_resumo,
+            "disciplinas": doc.disciplinas,
+            "campo": campo,
+            "trecho": trecho,
+            "destaques": destaques,
+        }
+
+
+def _destacar(texto: Optional[str], casados: set) -> Optional[Tuple[str, List[List[int]]]]:
+    """
+    Janela de TAMANHO_TRECHO caracteres do texto original em volta do
+    primeiro termo casado + offsets [inicio, fim] dos termos casados nela.
+    None se nenhum termo aparece no texto (casou so por etiqueta da IA).
+    """
+    if not texto:
+        return None
+    posicoes = []
+    for m in _PALAVRA.finditer(texto):
+        palavra = normalizar(m.group())
+        if palavra and " " not in palavra and _singular(palavra) in casados:
+            posicoes.append((m.start(), m.end()))
+    if not posicoes:
+        return None
+
+    inicio = max(0, min(posicoes[0][0] - TAMANHO_TRECHO // 4, len(texto) - TAMANHO_TRECHO))
+    fim = inicio + TAMANHO_TRECHO
+    return texto[inicio:fim], [
+        [a - inicio, b - inicio] for a, b in posicoes if a >= inicio and b <= fim
+    ]
+
+
+# ============================================================
+# CACHE POR ALUNO
+# ============================================================
+
+_cache: "OrderedDict[int, Tuple[tuple, IndiceDiario]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _versao(db: Session, student_id: int) -> tuple:
+    """Uma query: muda a cada insert/update/delete de diario ou conteudo do aluno."""
+    D, C = DiarioAprendizagem, ConteudoExtraido
+    diarios = select(D.id).where(D.student_id == student_id)
+    conteudos = select(C.id).where(C.student_id == student_id)
+    linha = db.execute(select(
+        diarios.with_only_columns(func.count(D.id)).scalar_subquery(),
+        diarios.with_only_columns(func.max(D.id)).scalar_subquery(),
+        diarios.with_only_columns(func.max(func.coalesce(D.updated_at, D.created_at))).scalar_subquery(),
+        conteudos.with_only_columns(func.count(C.id)).scalar_subquery(),
+        conteudos.with_only_columns(func.sum(C.vezes_mencionado)).scalar_subquery(),
+    )).one()
+    return tuple(linha)
+
+
+def _construir(db: Session, student_id: int) -> IndiceDiario:
+    D, C = DiarioAprendizagem, ConteudoExtraido
+    extras: Dict[int, List[Any]] = {}
+    for c in db.execute(
+        select(C.diario_id, C.disciplina, C.topico, C.subtopicos, C.conceitos)
+        .where(C.student_id == student_id)
+    ):
+        extras.setdefault(c.diario_id, []).extend([c.disciplina, c.topico, c.subtopicos, c.conceitos])
+
+    documentos = []
+    for d in db.execute(
+        select(
+            D.id, D.data_estudo, D.registro_texto, D.ia_resumo, D.ia_disciplinas_detectadas,
+            D.ia_tags, D.ia_conceitos_chave, D.ia_topicos_extraidos,
+        ).where(D.student_id == student_id)
+    ):
+        disciplinas = list(_textos(d.ia_disciplinas_detectadas))
+        etiquetas = [disciplinas, d.ia_tags, d.ia_conceitos_chave, d.ia_topicos_extraidos, extras.get(d.id)]
+        documentos.append(DocumentoDiario(
+            id=d.id,
+            data_estudo=d.data_estudo,
+            registro_texto=d.registro_texto or "",
+            ia_resumo=d.ia_resumo,
+            disciplinas=disciplinas,
+            etiquetas=" ".join(_textos(etiquetas)),
+        ))
+    return IndiceDiario(documentos)
+
+
+def obter_indice_diario(db: Session, student_id: int) -> IndiceDiario:
+    """Indice do aluno na versao atual do diario (reconstroi se mudou)."""
+    versao = _versao(db, student_id)
+    with _lock:
+        cacheado = _cache.get(student_id)
+        if cacheado and cacheado[0] == versao:
+            _cache.move_to_end(student_id)
+            return cacheado[1]
+
+    indice = _construir(db, student_id)
+    with _lock:
+        _cache[student_id] = (versao, indice)
+        _cache.move_to_end(student_id)
+        while len(_cache) > MAX_ALUNOS_EM_CACHE:
+            _cache.popitem(last=False)
+    return indice
+
+
+def invalidar(student_id: int) -> None:
+    """Descarta o indice do aluno neste processo (chamado pelas rotas que escrevem)."""
+    with _lock:
+        _cache.pop(student_id, None)
+
+
+def buscar_diario(
+    db: Session,
+    student_id: int,
+    consulta: str,
+    disciplina: Optional[str] = None,
+    limite: int = 20,
+) -> List[Dict[str, Any]]:
+    return obter_indice_diario(db, student_id).buscar(consulta, disciplina=disciplina, limite=limite)
@@ -0,0 +1,170 @@
+"""
+Estatisticas do diario de aprendizagem calculadas no banco.
+
+MOTIVACAO: /diario-aprendizagem/estatisticas carregava TODOS os registros do
+periodo como objetos ORM (texto livre + ~10 colunas JSON da IA cada) e
+fazia varias passadas em Python para contar por disciplina, humor, nivel
+e semana. Com periodo de 365 dias isso e o diario inteiro do aluno em
+memoria so para devolver contadores.
+
+Agora:
+    - Humor, nivel, minutos e semanas: um GROUP BY (data_estudo, humor,
+      nivel_compreensao) so com colunas leves - no maximo uma linha por dia
+      (ha um registro por aluno/data). Semana ISO e calculada em Python
+      sobre essas linhas, igual em qualquer banco.
+    - Disciplinas (array JSON ia_disciplinas_detectadas): desaninhado no
+      banco com JSON_TABLE (MySQL 8) / json_each (SQLite) + GROUP BY. Em
+      outros bancos, le so a coluna JSON e conta em Python.
+    - Topicos: so as colunas exibidas, sem carregar ConteudoExtraido inteiro.
+"""
+from datetime import date
+from typing import Any, Dict, List
+
+from sqlalchemy import desc, func, text
+from sqlalchemy.orm import Session
+
+from app.models.diario_aprendizagem import ConteudoExtraido, DiarioAprendizagem
+
+
+# Por dialeto: array JSON -> uma linha por disciplina, ja agrupado.
+# Disciplina repetida no mesmo registro conta duas vezes (como antes).
+_SQL_DISCIPLINAS = {
+    "mysql": """
+        SELECT jt.disciplina, COUNT(*)
+        FROM diario_aprendizagem d,
+             JSON_TABLE(d.ia_disciplinas_detectadas, '$[*]'
+                        COLUMNS (disciplina VARCHAR(100) PATH '$')) AS jt
+        WHERE d.student_id = :student_id AND d.data_estudo >= :data_inicio
+          AND jt.disciplina IS NOT NULL
+        GROUP BY jt.disciplina
+    """,
+    "sqlite": """
+        SELECT je.value, COUNT(*)
+        FROM diario_aprendizagem d, json_each(d.ia_disciplinas_detectadas) AS je
+        WHERE d.student_id = :student_id AND d.data_estudo >= :data_inicio
+          AND je.type = 'text'
+        GROUP BY je.value
+    """,
+}
+
+
+def contar_disciplinas(db: Session, student_id: int, data_inicio: date) -> Dict[str, int]:
+    """Quantas vezes cada disciplina foi detectada pela IA no periodo."""
+    sql = _SQL_DISCIPLINAS.get(db.get_bind().dialect.name)
+    if sql:
+        linhas = db.execute(text(sql), {"student_id": student_id, "data_inicio": data_inicio})
+        return {disciplina: total for disciplina, total in linhas}
+
+    contagem: Dict[str, int] = {}
+    for (disciplinas,) in db.query(DiarioAprendizagem.ia_disciplinas_detectadas).filter(
+        DiarioAprendizagem.student_id == student_id,
+        DiarioAprendizagem.data_estudo >= data_inicio,
+        DiarioAprendizagem.ia_disciplinas_detectadas.isnot(None),
+    ):
+        for disciplina in disciplinas or []:
+            contagem[disciplina] = contagem.get(disciplina, 0) + 1
+    return contagem
+
+
+def estatisticas_periodo(db: Session, student_id: int, data_inicio: date) -> Dict[str, Any]:
+    """
+    Contadores do diario a partir de `data_inicio` (campos de
+    EstatisticasDiarioResponse, exceto identificacao do aluno/periodo).
+    """
+    D = DiarioAprendizagem
+    por_dia = (
+        db.query(
+            D.data_estudo,
+            D.humor,
+            D.nivel_compreensao,
+            func.count(D.id),
+            func.coalesce(func.sum(D.tempo_estudo_minutos), 0),
+        )
+        .filter(D.student_id == student_id, D.data_estudo >= data_inicio)
+        .group_by(D.data_estudo, D.humor, D.nivel_compreensao)
+        .all()
+    )
+
+    total_registros = 0
+    total_minutos = 0
+    por_humor: Dict[str, int] = {}
+    por_nivel: Dict[str, int] = {}
+    registros_por_semana: Dict[str, int] = {}
+    for data_estudo, humor, nivel, registros, minutos in por_dia:
+        total_registros += registros
+        total_minutos += int(minutos)
+        if humor:
+            por_humor[humor.value] = por_humor.get(humor.value, 0) + registros
+        if nivel:
+            por_nivel[nivel.value] = por_nivel.get(nivel.value, 0) + registros
+        semana = data_estudo.isocalendar()[1]
+        chave = f"{data_estudo.year}-S{semana:02d}"
+        registros_por_semana[chave] = registros_por_semana.get(chave, 0) + registros
+
+    C = ConteudoExtraido
+    mais_estudados = (
+        db.query(C.topico, C.disciplina, C.vezes_mencionado)
+        .filter(C.student_id == student_id)
+        .order_by(desc(C.vezes_mencionado))
+        .limit(5)
+        .all()
+    )
+    com_dificuldade = (
+        db.query(C.topico, C.disciplina, C.prioridade_revisao)
+        .filter(
+            C.student_id == student_id,
+            C.nivel_dificuldade_percebido.in_(["dificil", "muito_dificil"]),
+        )
+        .order_by(desc(C.prioridade_revisao))
+        .limit(5)
+        .all()
+    )
+
+    return {
+        "total_registros": total_registros,
+        "total_minutos_estudo": total_minutos,
+        "media_minutos_por_dia": round(total_minutos / total_registros, 1) if total_registros else 0,
+        "por_disciplina": contar_disciplinas(db, student_id, data_inicio),
+        "por_humor": por_humor,
+        "por_nivel_compreensao": por_nivel,
+        "topicos_mais_estudados": [
+            {"topico": t, "disciplina": d, "vezes": v} for t, d, v in mais_estudados
+        ],
+        "topicos_com_dificuldade": [
+            {"topico": t, "disciplina": d, "prioridade": p} for t, d, p in com_dificuldade
+        ],
+        "registros_por_semana": registros_por_semana,
+    }
+
+
+def itens_timeline(db: Session, student_id: int, data_inicio: date) -> List[Dict[str, Any]]:
+    """
+    Registros do periodo para a timeline, mais recentes primeiro. Traz do
+    banco so os 201 primeiros caracteres do texto (o 201o indica "...").
+    """
+    D = DiarioAprendizagem
+    linhas = (
+        db.query(
+            D.data_estudo,
+            D.ia_resumo,
+            func.substr(D.registro_texto, 1, 201),
+            D.ia_disciplinas_detectadas,
+            D.humor,
+            D.ia_sentimento_geral,
+        )
+        .filter(D.student_id == student_id, D.data_estudo >= data_inicio)
+        .order_by(desc(D.data_estudo))
+        .all()
+    )
+    return [
+        {
+            "data": data_estudo,
+            "tipo": "diario",
+            "titulo": resumo or f"Estudo - {data_estudo}",
+            "descricao": inicio_texto[:200] + "..." if len(inicio_texto) > 200 else inicio_texto,
+            "disciplinas": disciplinas,
+            "humor": humor.value if humor else None,
+            "destaque": sentimento == "positivo",
+        }
+        for data_estudo, resumo, inicio_texto, disciplinas, humor, sentimento in linhas
+    ]
@@ -1,7 +1,30 @@
 from anthropic import Anthropic
 from app.core.config import settings
-import json
-from typing import List, Dict
+from typing import List, Dict, Optional
+from pydantic import BaseModel, ConfigDict
+
+from app.services.ia_estruturada import gerar_estruturado
+
+
+class QuestaoProvaIA(BaseModel):
+    """Questão de múltipla escolha gerada pela IA."""
+    model_config = ConfigDict(extra="allow")
+    
+    difficulty_level: int
+    question_text: str
+    option_a: str
+    option_b: str
+    option_c: str
+    option_d: str
+    correct_answer: str
+    explanation: Optional[str] = None
+    skill: Optional[str] = None
+
+
+class ProvaIA(BaseModel):
+    """Registra as questões geradas para a prova."""
+    questoes: List[QuestaoProvaIA]
+
 
 class GeradorProvasService:
     """Serviço para gerar provas com IA (Claude)"""
@@ -53,25 +76,16 @@ class GeradorProvasService:
         
         # Chamar Claude API
         try:
-            response = self.client.messages.create(
+            prova = gerar_estruturado(
+                self.client,
+                ProvaIA,
+                prompt,
                 model=self.model,
                 max_tokens=8000,
                 temperature=0.7,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
+                nome="registrar_questoes"
             )
-            
-            # Extrair texto da resposta
-            response_text = response.content[0].text
-            
-            # Parse JSON
-            questoes = self._parse_response(response_text)
-            
-            return questoes
+            return [q.model_dump(exclude_unset=True) for q in prova.questoes]
             
         except Exception as e:
             print(f"Erro ao gerar prova com IA: {e}")
@@ -164,47 +178,6 @@ RESPONDA APENAS COM UM JSON VÁLIDO NO SEGUINTE FORMATO (SEM MARKDOWN, SEM BACKT
 GERE AGORA AS {num_questions} QUESTÕES EM JSON:"""
         
         return prompt
-    
-    def _parse_response(self, response_text: str) -> List[Dict]:
-        """Parse da resposta da IA"""
-        try:
-            # Remover markdown se houver
-            response_text = response_text.strip()
-            if response_text.startswith("```json"):
-                response_text = response_text[7:]
-            if response_text.startswith("```"):
-                response_text = response_text[3:]
-            if response_text.endswith("```"):
-                response_text = response_text[:-3]
-            response_text = response_text.strip()
-            
-            # Parse JSON
-            questoes = json.loads(response_text)
-            
-            # Validar estrutura
-            if not isinstance(questoes, list):
-                raise ValueError("Resposta não é uma lista")
-            
-            # Validar cada questão
-            for q in questoes:
-                required_fields = [
-                    'difficulty_level', 'question_text',
-                    'option_a', 'option_b', 'option_c', 'option_d',
-                    'correct_answer'
-                ]
-                for field in required_fields:
-                    if field not in q:
-                        raise ValueError(f"Campo obrigatório ausente: {field}")
-            
-            return questoes
-            
-        except json.JSONDecodeError as e:
-            print(f"Erro ao fazer parse do JSON: {e}")
-            print(f"Response text: {response_text}")
-            raise ValueError("IA retornou formato inválido")
-        except Exception as e:
-            print(f"Erro ao validar resposta: {e}")
-            raise
 
 # Singleton
 gerador_provas_service = GeradorProvasService()
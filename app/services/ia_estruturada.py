@@ -0,0 +1,320 @@
+"""
+Geracao estruturada com a IA: saida restrita por schema (tool use) e um
+unico parser JSON tolerante.
+
+MOTIVACAO: varios services repetiam o mesmo ritual com a resposta do
+Claude - tirar cercas ```json, json.loads, regex procurando {...} ou [...]
+e "consertos" com regex (_limpar_json, _consertar_json,
+_validar_e_extrair_json, _parse_questoes_json, _parse_response...). Quando
+nada funcionava, o caller repetia a chamada inteira (paga, mesmo prompt)
+ou caia no fallback. Causas tipicas: texto antes/depois do JSON, virgula
+sobrando, resposta truncada em max_tokens.
+
+Agora:
+    - gerar_estruturado(client, Schema, prompt, ...): o caller declara um
+      modelo Pydantic. A chamada usa tool use com
+      input_schema = Schema.model_json_schema() e tool_choice forcado - a
+      API devolve o objeto ja como dict, sem texto para limpar - e valida
+      com o schema.
+    - Resposta em texto (cliente/modelo sem tool use): extrair_json.
+    - Validacao falhou: no maximo `reparos` (padrao 1) chamadas de reparo
+      que devolvem ao modelo a resposta + os erros do Pydantic, em vez de
+      regerar do zero. Esgotou: RespostaIAInvalida - o caller decide o
+      fallback.
+    - extrair_json(texto): parser tolerante. Decodifica a partir do
+      primeiro { ou [ (ignora cercas e texto em volta); se falhar, UMA
+      passada pelo texto acompanhando strings e a pilha de {}/[]: tira
+      virgulas antes de } e ] e, se a resposta foi truncada, descarta o
+      elemento incompleto e fecha o que ficou aberto.
+    - Resposta cortada em max_tokens: RespostaTruncada, sem reparo (o
+      reparo reenviaria o mesmo pedido grande demais). Quem chama reduz o
+      pedido - ex.: o lote BNCC se divide ao meio.
+    - estatisticas(): chamadas, reparos, falhas, truncadas e tokens (total
+      e gasto em tentativas descartadas) por ferramenta -
+      GET /admin/ai-estruturada/stats.
+
+Uso:
+
+    class QuestoesIA(BaseModel):
+        questoes: List[QuestaoIA]
+
+    resultado = gerar_estruturado(client, QuestoesIA, prompt,
+                                  model=get_default_model(), max_tokens=4000)
+    # em codigo async (limite global de concorrencia de chamar_ia):
+    resultado = await gerar_estruturado_async(client, QuestoesIA, prompt, ...)
+"""
+import json
+import re
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+from app.core.anthropic_client import chamar_ia
+from app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+M = TypeVar("M", bound=BaseModel)
+
+_DECODER = json.JSONDecoder()
+_FECHA = {"{": "}", "[": "]"}
+
+
+class RespostaIAInvalida(ValueError):
+    """A IA nao devolveu um objeto que passe no schema (mesmo apos reparo)."""
+
+
+class RespostaTruncada(RespostaIAInvalida):
+    """A resposta foi cortada em max_tokens: o pedido nao cabe na saida."""
+
+
+# ============================================
+# Parser tolerante
+# ============================================
+
+def _reparar(texto: str, inicio: int) -> str:
+    """
+    Uma passada a partir de `inicio`: remove virgulas antes de } / ] e, se
+    o texto acabar com estruturas abertas (truncado), corta no ultimo
+    elemento completo e fecha o que estiver aberto.
+    """
+    saida: List[str] = []
+    pilha: List[str] = []
+    em_string = escape = False
+    # (tamanho da saida, pilha) no fim do ultimo elemento completo
+    seguro: Tuple[int, Tuple[str, ...]] = (0, ())
+
+    for ch in texto[inicio:]:
+        if em_string:
+            saida.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                em_string = False
+            continue
+
+        if ch == '"':
+            em_string = True
+        elif ch in "{[":
+            pilha.append(ch)
+        elif ch in "}]":
+            while saida and (saida[-1].isspace() or saida[-1] == ","):
+                saida.pop()
+            if not pilha:
+                break
+            saida.append(_FECHA[pilha.pop()])
+            if not pilha:
+                return "".join(saida)
+            seguro = (len(saida), tuple(pilha))
+            continue
+        elif ch == ",":
+            seguro = (len(saida), tuple(pilha))
+        saida.append(ch)
+
+    tamanho, aberta = seguro
+    corte = "".join(saida[:tamanho]).rstrip().rstrip(",")
+    return corte + "".join(_FECHA[c] for c in reversed(aberta))
+
+
+def extrair_json(texto: str) -> Any:
+    """
+    Extrai o primeiro objeto/array JSON de uma resposta da IA, tolerando
+    cercas de markdown, texto em volta, virgulas sobrando e truncamento
+    (resposta truncada devolve os elementos completos).
+
+    Raises:
+        RespostaIAInvalida: se nao houver JSON aproveitavel.
+    """
+    candidatos = [m.start() for m in re.finditer(r"[\[{]", texto or "")]
+    if not candidatos:
+        raise RespostaIAInvalida("Nenhum JSON na resposta")
+
+    erro: Optional[json.JSONDecodeError] = None
+    # Poucas tentativas: um "[" ou "{" no texto antes do JSON de verdade
+    for inicio in candidatos[:5]:
+        try:
+            valor, _ = _DECODER.raw_decode(texto, inicio)
+            return valor
+        except json.JSONDecodeError:
+            pass
+        try:
+            return json.loads(_reparar(texto, inicio))
+        except json.JSONDecodeError as e:
+            erro = e
+    raise RespostaIAInvalida(f"JSON invalido: {erro}")
+
+
+# ============================================
+# Estatisticas
+# ============================================
+
+_estatisticas: Dict[str, Dict[str, int]] = {}
+_estatisticas_lock = Lock()
+
+
+def _registrar(
+    nome: str, reparos: int, tokens: int, desperdicados: int, falhou: bool, truncada: bool = False
+) -> None:
+    with _estatisticas_lock:
+        e = _estatisticas.setdefault(nome, {
+            "chamadas": 0, "reparos": 0, "falhas": 0, "truncadas": 0,
+            "tokens": 0, "tokens_desperdicados": 0,
+        })
+        e["chamadas"] += 1
+        e["reparos"] += reparos
+        e["falhas"] += int(falhou)
+        e["truncadas"] += int(truncada)
+        e["tokens"] += tokens
+        e["tokens_desperdicados"] += desperdicados
+
+
+def estatisticas() -> Dict[str, Dict[str, int]]:
+    """Contadores por ferramenta desde o start do processo."""
+    with _estatisticas_lock:
+        return {nome: dict(valores) for nome, valores in _estatisticas.items()}
+
+
+def resetar_estatisticas() -> None:
+    with _estatisticas_lock:
+        _estatisticas.clear()
+
+
+# ============================================
+# Geracao
+# ============================================
+
+def _nome_ferramenta(schema: Type[BaseModel]) -> str:
+    return re.sub(r"(?<!^)(?=[A-Z])", "_", schema.__name__).lower()
+
+
+def _tokens(resposta: Any) -> int:
+    uso = getattr(resposta, "usage", None)
+    if not uso:
+        return 0
+    return (getattr(uso, "input_tokens", 0) or 0) + (getattr(uso, "output_tokens", 0) or 0)
+
+
+def _ajustar_raiz(schema: Type[BaseModel], dados: Any) -> Any:
+    """Lista solta em resposta de texto para schema com um unico campo: embrulha."""
+    campos = list(schema.model_fields)
+    if isinstance(dados, list) and len(campos) == 1:
+        return {campos[0]: dados}
+    return dados
+
+
+def _conteudo(resposta: Any, nome: str) -> Tuple[Optional[Any], Any]:
+    """(bloco tool_use, dados) da resposta. Sem tool_use: parse do texto."""
+    blocos = getattr(resposta, "content", None) or []
+    for bloco in blocos:
+        if getattr(bloco, "type", None) == "tool_use" and getattr(bloco, "name", None) == nome:
+            return bloco, bloco.input
+    texto = "".join(getattr(b, "text", "") or "" for b in blocos)
+    return None, extrair_json(texto)
+
+
+def _mensagens_reparo(resposta: Any, bloco: Any, erro: str, nome: str) -> List[Dict[str, Any]]:
+    instrucao = (
+        f"A resposta nao passou na validacao: {erro}. "
+        f"Chame {nome} novamente com o objeto completo e corrigido."
+    )
+    if bloco is not None:
+        return [
+            {"role": "assistant", "content": resposta.content},
+            {"role": "user", "content": [{
+                "type": "tool_result", "tool_use_id": bloco.id, "is_error": True, "content": instrucao,
+            }]},
+        ]
+    texto = "".join(getattr(b, "text", "") or "" for b in (getattr(resposta, "content", None) or []))
+    return [
+        {"role": "assistant", "content": texto or "(vazio)"},
+        {"role": "user", "content": instrucao},
+    ]
+
+
+def _resumir_erros(erro: ValidationError, limite: int = 10) -> str:
+    itens = [
+        f"{'.'.join(str(p) for p in e['loc']) or '(raiz)'}: {e['msg']}"
+        for e in erro.errors()[:limite]
+    ]
+    return "; ".join(itens)
+
+
+def gerar_estruturado(
+    client: Any,
+    schema: Type[M],
+    prompt: str,
+    *,
+    model: str,
+    max_tokens: int,
+    nome: Optional[str] = None,
+    descricao: Optional[str] = None,
+    system: Optional[str] = None,
+    temperature: Optional[float] = None,
+    reparos: int = 1,
+) -> M:
+    """
+    Chama a IA forcando a ferramenta `nome` (input_schema do `schema`) e
+    devolve o objeto validado.
+
+    Erros da API (rede, rate limit...) sobem sem tratamento - quem chama ja
+    tem retry proprio para isso. So problemas de formato/schema viram
+    reparo e, no fim, RespostaIAInvalida. Resposta cortada em max_tokens
+    vira RespostaTruncada na hora, mesmo que o pedaco recebido valide:
+    estaria incompleta.
+    """
+    nome = nome or _nome_ferramenta(schema)
+    ferramenta = {
+        "name": nome,
+        "description": descricao or (schema.__doc__ or nome).strip(),
+        "input_schema": schema.model_json_schema(),
+    }
+    parametros: Dict[str, Any] = {
+        "model": model,
+        "max_tokens": max_tokens,
+        "tools": [ferramenta],
+        "tool_choice": {"type": "tool", "name": nome},
+    }
+    if system:
+        parametros["system"] = system
+    if temperature is not None:
+        parametros["temperature"] = temperature
+
+    mensagens: List[Dict[str, Any]] = [{"role": "user", "content": prompt}]
+    total = desperdicados = 0
+    erro = ""
+    for tentativa in range(reparos + 1):
+        resposta = client.messages.create(messages=mensagens, **parametros)
+        tokens = _tokens(resposta)
+        total += tokens
+        if getattr(resposta, "stop_reason", None) == "max_tokens":
+            _registrar(nome, tentativa, total, desperdicados + tokens, falhou=True, truncada=True)
+            raise RespostaTruncada(f"{nome}: resposta cortada em max_tokens={max_tokens}")
+        bloco = None
+        try:
+            bloco, dados = _conteudo(resposta, nome)
+            resultado = schema.model_validate(_ajustar_raiz(schema, dados))
+            _registrar(nome, tentativa, total, desperdicados, falhou=False)
+            return resultado
+        except RespostaIAInvalida as e:
+            erro = str(e)
+        except ValidationError as e:
+            erro = _resumir_erros(e)
+
+        desperdicados += tokens
+        logger.warning(
+            "Resposta estruturada invalida",
+            extra={"ferramenta": nome, "tentativa": tentativa + 1, "erro": erro[:500]},
+        )
+        if tentativa < reparos:
+            mensagens = mensagens + _mensagens_reparo(resposta, bloco, erro, nome)
+
+    _registrar(nome, reparos, total, desperdicados, falhou=True)
+    raise RespostaIAInvalida(f"{nome}: {erro}")
+
+
+async def gerar_estruturado_async(client: Any, schema: Type[M], prompt: str, **kwargs) -> M:
+    """gerar_estruturado numa thread, sob o limite global de chamadas (chamar_ia)."""
+    return await chamar_ia(gerar_estruturado, client, schema, prompt, **kwargs)
@@ -1,141 +1,360 @@
+"""
+Analise de desempenho de aplicacoes (PerformanceAnalysis).
+
+MOTIVACAO: analyze_application percorria as respostas quatro vezes (por
+dificuldade, por habilidade, pontos fracos, payload da IA) e cada
+`answer.question` era um lazy-load - uma query por resposta.
+
+Agora:
+    - Respostas + questoes vem de UMA query com join, em colunas
+      (_Colunas: listas paralelas, uma posicao por resposta).
+    - Todos os agrupamentos (dificuldade, dominio por habilidade, questoes
+      erradas por habilidade) saem de uma unica passada (_agregar), com
+      NumPy (bincount sobre chaves aplicacao x categoria) quando instalado
+      e fallback em Python puro com o mesmo resultado.
+    - analyze_applications(ids) analisa varias aplicacoes com as mesmas 2
+      queries e uma passada vetorizada sobre todas as respostas juntas -
+      usado pelo reprocessamento noturno
+      (python -m app.scripts.reprocessar_analises_desempenho).
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+
+from app.core.logging_config import get_logger
 from app.models.application import Application, StudentAnswer
 from app.models.performance import PerformanceAnalysis
+from app.models.question import Question
 from app.models.student import Student
 from app.services.ai_service import AIService
-from typing import Dict, List
-from collections import defaultdict
+from app.services.performance_rollup import nivel_dominio
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - dependencia opcional
+    np = None
+
+logger = get_logger(__name__)
+
+
+# Pelo menos N erros na mesma habilidade = ponto fraco
+MIN_ERROS_PONTO_FRACO = 2
+
+
+@dataclass
+class _Colunas:
+    """Respostas em colunas (listas paralelas), varias aplicacoes juntas."""
+    aplicacao: List[int] = field(default_factory=list)      # indice da aplicacao
+    question_id: List[int] = field(default_factory=list)
+    dificuldade: List[int] = field(default_factory=list)
+    habilidade: List[int] = field(default_factory=list)     # codigo em `habilidades`, -1 = sem
+    correta: List[bool] = field(default_factory=list)
+    # Payload da IA (nao participa das contas)
+    question_text: List[str] = field(default_factory=list)
+    selected_answer: List[Optional[str]] = field(default_factory=list)
+    correct_answer: List[str] = field(default_factory=list)
+    habilidades: List[str] = field(default_factory=list)    # codigo -> nome
+    _codigos: Dict[str, int] = field(default_factory=dict)
+
+    def adicionar(self, aplicacao: int, linha) -> None:
+        self.aplicacao.append(aplicacao)
+        self.question_id.append(linha.question_id)
+        self.dificuldade.append(int(linha.difficulty_level.value))
+        if linha.skill:
+            codigo = self._codigos.get(linha.skill)
+            if codigo is None:
+                codigo = self._codigos[linha.skill] = len(self.habilidades)
+                self.habilidades.append(linha.skill)
+            self.habilidade.append(codigo)
+        else:
+            self.habilidade.append(-1)
+        self.correta.append(bool(linha.is_correct))
+        self.question_text.append(linha.question_text)
+        self.selected_answer.append(linha.selected_answer)
+        self.correct_answer.append(linha.correct_answer)
+
+
+@dataclass
+class _Estatisticas:
+    """Contagens de uma aplicacao, na ordem de primeira aparicao (como antes)."""
+    total: int = 0
+    corretas: int = 0
+    # chave -> [corretas, total]
+    por_dificuldade: Dict[int, List[int]] = field(default_factory=dict)
+    por_habilidade: Dict[str, List[int]] = field(default_factory=dict)
+    # habilidade -> question_ids errados
+    erros_por_habilidade: Dict[str, List[int]] = field(default_factory=dict)
+
+
+# ============================================================
+# AGREGACAO (uma passada)
+# ============================================================
+
+def _agregar_python(c: _Colunas, n_aplicacoes: int) -> List[_Estatisticas]:
+    stats = [_Estatisticas() for _ in range(n_aplicacoes)]
+    for i in range(len(c.aplicacao)):
+        s = stats[c.aplicacao[i]]
+        ok = c.correta[i]
+        s.total += 1
+        s.corretas += ok
+        d = s.por_dificuldade.setdefault(c.dificuldade[i], [0, 0])
+        d[0] += ok
+        d[1] += 1
+        if c.habilidade[i] >= 0:
+            nome = c.habilidades[c.habilidade[i]]
+            h = s.por_habilidade.setdefault(nome, [0, 0])
+            h[0] += ok
+            h[1] += 1
+            if not ok:
+                s.erros_por_habilidade.setdefault(nome, []).append(c.question_id[i])
+    return stats
+
+
+def _grupos_numpy(chave, correta, n_chaves):
+    """(chaves na ordem de primeira aparicao, corretas[chave], total[chave])."""
+    total = np.bincount(chave, minlength=n_chaves)
+    corretas = np.bincount(chave, weights=correta, minlength=n_chaves)
+    presentes, primeira = np.unique(chave, return_index=True)
+    ordem = presentes[np.argsort(primeira, kind="stable")]
+    return ordem, corretas, total
+
+
+def _agregar_numpy(c: _Colunas, n_aplicacoes: int) -> List[_Estatisticas]:
+    stats = [_Estatisticas() for _ in range(n_aplicacoes)]
+    if not c.aplicacao:
+        return stats
+    aplicacao = np.asarray(c.aplicacao, dtype=np.int64)
+    dificuldade = np.asarray(c.dificuldade, dtype=np.int64)
+    habilidade = np.asarray(c.habilidade, dtype=np.int64)
+    correta = np.asarray(c.correta, dtype=bool)
+    question_id = np.asarray(c.question_id, dtype=np.int64)
+
+    total = np.bincount(aplicacao, minlength=n_aplicacoes)
+    corretas = np.bincount(aplicacao, weights=correta, minlength=n_aplicacoes)
+    for a in range(n_aplicacoes):
+        stats[a].total = int(total[a])
+        stats[a].corretas = int(corretas[a])
+
+    # Chave composta aplicacao x dificuldade
+    n_dif = int(dificuldade.max()) + 1
+    ordem, cor, tot = _grupos_numpy(aplicacao * n_dif + dificuldade, correta, n_aplicacoes * n_dif)
+    for k in ordem.tolist():
+        stats[k // n_dif].por_dificuldade[k % n_dif] = [int(cor[k]), int(tot[k])]
+
+    com_habilidade = habilidade >= 0
+    if com_habilidade.any():
+        n_hab = len(c.habilidades)
+        chave = aplicacao[com_habilidade] * n_hab + habilidade[com_habilidade]
+        ordem, cor, tot = _grupos_numpy(chave, correta[com_habilidade], n_aplicacoes * n_hab)
+        for k in ordem.tolist():
+            stats[k // n_hab].por_habilidade[c.habilidades[k % n_hab]] = [int(cor[k]), int(tot[k])]
+
+        # Erradas por habilidade: ordenacao estavel pela chave preserva a
+        # ordem das respostas dentro de cada grupo; os grupos saem na ordem
+        # da primeira resposta errada (como no fallback)
+        errada = com_habilidade & ~correta
+        if errada.any():
+            posicao = np.flatnonzero(errada)
+            chave = aplicacao[errada] * n_hab + habilidade[errada]
+            ordem_estavel = np.argsort(chave, kind="stable")
+            chave, posicao = chave[ordem_estavel], posicao[ordem_estavel]
+            inicio = np.flatnonzero(np.r_[True, chave[1:] != chave[:-1]])
+            grupos = np.split(question_id[posicao], inicio[1:])
+            for g in np.argsort(posicao[inicio], kind="stable").tolist():
+                k = int(chave[inicio[g]])
+                stats[k // n_hab].erros_por_habilidade[c.habilidades[k % n_hab]] = grupos[g].tolist()
+    return stats
+
+
+def _agregar(c: _Colunas, n_aplicacoes: int) -> List[_Estatisticas]:
+    if np is not None:
+        return _agregar_numpy(c, n_aplicacoes)
+    return _agregar_python(c, n_aplicacoes)
+
 
 class PerformanceAnalyzerService:
     def __init__(self, db: Session):
         self.db = db
         self.ai_service = AIService()
-    
+
     def analyze_application(self, application_id: int) -> PerformanceAnalysis:
         """
         Analisa o desempenho de um aluno em uma aplicação
         """
-        
-        # Buscar a aplicação com respostas
-        application = self.db.query(Application).filter(
-            Application.id == application_id
-        ).first()
-        
-        if not application:
+        analyses = self.analyze_applications([application_id], atualizar_existente=False)
+        if not analyses:
             raise ValueError("Application not found")
-        
-        answers = self.db.query(StudentAnswer).filter(
-            StudentAnswer.application_id == application_id
+        self.db.refresh(analyses[0])
+        return analyses[0]
+
+    def analyze_applications(
+        self,
+        application_ids: Sequence[int],
+        com_ia: bool = True,
+        atualizar_existente: bool = True,
+    ) -> List[PerformanceAnalysis]:
+        """
+        Analisa varias aplicacoes de uma vez (2 queries + uma passada).
+
+        com_ia=False recalcula so os numeros (mantem recommendations de uma
+        analise existente). atualizar_existente=True reaproveita a analise
+        mais recente da aplicacao em vez de criar outra (reprocessamento).
+        Ids inexistentes sao ignorados; um unico commit no fim.
+        """
+        ids = list(dict.fromkeys(application_ids))
+        if not ids:
+            return []
+
+        aplicacoes = self.db.execute(
+            select(Application, Student)
+            .join(Student, Application.student_id == Student.id)
+            .where(Application.id.in_(ids))
         ).all()
-        
-        # Buscar o aluno
-        student = self.db.query(Student).filter(
-            Student.id == application.student_id
-        ).first()
-        
-        # Calcular estatísticas básicas
-        total_questions = len(answers)
-        correct_answers = sum(1 for a in answers if a.is_correct)
-        overall_score = (correct_answers / total_questions * 100) if total_questions > 0 else 0
-        
-        # Análise por nível de dificuldade
-        by_difficulty = defaultdict(lambda: {"correct": 0, "total": 0})
-        
-        for answer in answers:
-            question = answer.question
-            level = str(question.difficulty_level.value)
-            by_difficulty[level]["total"] += 1
-            if answer.is_correct:
-                by_difficulty[level]["correct"] += 1
-        
-        # Calcular porcentagens
-        by_difficulty_with_percentage = {}
-        for level, stats in by_difficulty.items():
-            percentage = (stats["correct"] / stats["total"] * 100) if stats["total"] > 0 else 0
-            by_difficulty_with_percentage[level] = {
-                "correct": stats["correct"],
-                "total": stats["total"],
-                "percentage": round(percentage, 2)
-            }
-        
-        # Análise por habilidade/skill
-        by_skill = defaultdict(lambda: {"correct": 0, "total": 0})
-        
-        for answer in answers:
-            question = answer.question
-            if question.skill:
-                by_skill[question.skill]["total"] += 1
-                if answer.is_correct:
-                    by_skill[question.skill]["correct"] += 1
-        
-        # Calcular mastery level por skill
-        by_skill_with_mastery = {}
-        for skill, stats in by_skill.items():
-            percentage = (stats["correct"] / stats["total"] * 100) if stats["total"] > 0 else 0
-            
-            if percentage >= 90:
-                mastery = "excellent"
-            elif percentage >= 75:
-                mastery = "good"
-            elif percentage >= 60:
-                mastery = "developing"
+        por_id = {app.id: (app, student) for app, student in aplicacoes}
+        ordem = [i for i in ids if i in por_id]
+        indice = {app_id: i for i, app_id in enumerate(ordem)}
+
+        colunas = _Colunas()
+        for linha in self.db.execute(
+            select(
+                StudentAnswer.application_id,
+                StudentAnswer.question_id,
+                StudentAnswer.selected_answer,
+                StudentAnswer.is_correct,
+                Question.difficulty_level,
+                Question.skill,
+                Question.question_text,
+                Question.correct_answer,
+            )
+            .join(Question, StudentAnswer.question_id == Question.id)
+            .where(StudentAnswer.application_id.in_(ordem))
+            .order_by(StudentAnswer.application_id, StudentAnswer.id)
+        ):
+            colunas.adicionar(indice[linha.application_id], linha)
+
+        estatisticas = _agregar(colunas, len(ordem))
+
+        existentes = {}
+        if atualizar_existente:
+            for analise in self.db.query(PerformanceAnalysis).filter(
+                PerformanceAnalysis.application_id.in_(ordem)
+            ).order_by(PerformanceAnalysis.analyzed_at, PerformanceAnalysis.id):
+                existentes[analise.application_id] = analise  # fica a mais recente
+
+        # Posicoes de cada aplicacao nas colunas (ordenadas por aplicacao)
+        posicoes: Dict[int, List[int]] = {}
+        for pos, a in enumerate(colunas.aplicacao):
+            posicoes.setdefault(a, []).append(pos)
+
+        resultado = []
+        for i, app_id in enumerate(ordem):
+            application, student = por_id[app_id]
+            stats = estatisticas[i]
+            campos = self._campos(stats)
+
+            if com_ia:
+                campos["recommendations"] = self._recomendacoes(
+                    student, self._answers_data(colunas, posicoes.get(i, []))
+                )
+
+            analise = existentes.get(app_id)
+
+            if analise is None:
+                analise = PerformanceAnalysis(
+                    student_id=application.student_id,
+                    application_id=app_id,
+                    **campos
+                )
+                self.db.add(analise)
             else:
-                mastery = "needs_work"
-            
-            by_skill_with_mastery[skill] = {
-                "correct": stats["correct"],
-                "total": stats["total"],
+                for chave, valor in campos.items():
+                    setattr(analise, chave, valor)
+            resultado.append(analise)
+
+        self.db.commit()
+
+        if len(ordem) > 1:
+            logger.info(
+                "analises de desempenho em lote",
+                extra={"aplicacoes": len(ordem), "respostas": len(colunas.aplicacao), "com_ia": com_ia},
+            )
+        return resultado
+
+    # ---------- Montagem ----------
+
+    def _campos(self, stats: _Estatisticas) -> Dict:
+        overall_score = (stats.corretas / stats.total * 100) if stats.total > 0 else 0
+
+        by_difficulty = {}
+        for level, (corretas, total) in stats.por_dificuldade.items():
+            by_difficulty[str(level)] = {
+                "correct": corretas,
+                "total": total,
+                "percentage": round(corretas / total * 100, 2)
+            }
+
+        by_skill = {}
+        strong_points = []
+        for skill, (corretas, total) in stats.por_habilidade.items():
+            percentage = corretas / total * 100
+            mastery = nivel_dominio(percentage)
+            by_skill[skill] = {
+                "correct": corretas,
+                "total": total,
                 "percentage": round(percentage, 2),
                 "mastery": mastery
             }
-        
-        # Identificar pontos fracos (questões erradas)
-        weak_points = []
-        questions_by_skill = defaultdict(list)
-        
-        for answer in answers:
-            if not answer.is_correct and answer.question.skill:
-                questions_by_skill[answer.question.skill].append(answer.question.id)
-        
-        for skill, question_ids in questions_by_skill.items():
-            if len(question_ids) >= 2:  # Pelo menos 2 erros na mesma habilidade
-                weak_points.append({
-                    "skill": skill,
-                    "description": f"Dificuldade em {skill.replace('_', ' ')}",
-                    "questions_missed": question_ids,
-                    "recommendation": self._get_skill_recommendation(skill)
-                })
-        
-        # Identificar pontos fortes
-        strong_points = []
-        for skill, stats in by_skill_with_mastery.items():
-            if stats["mastery"] in ["excellent", "good"]:
+            if mastery in ("excellent", "good"):
                 strong_points.append({
                     "skill": skill,
                     "description": f"Bom desempenho em {skill.replace('_', ' ')}"
                 })
-        
-        # Preparar dados para análise da IA
-        answers_data = []
-        for answer in answers:
-            answers_data.append({
-                "question_id": answer.question.id,
-                "question_text": answer.question.question_text,
-                "selected_answer": answer.selected_answer,
-                "correct_answer": answer.question.correct_answer,
-                "is_correct": answer.is_correct,
-                "skill": answer.question.skill,
-                "difficulty_level": answer.question.difficulty_level.value
-            })
-        
+
+        weak_points = [
+            {
+                "skill": skill,
+                "description": f"Dificuldade em {skill.replace('_', ' ')}",
+                "questions_missed": question_ids,
+                "recommendation": self._get_skill_recommendation(skill)
+            }
+            for skill, question_ids in stats.erros_por_habilidade.items()
+            if len(question_ids) >= MIN_ERROS_PONTO_FRACO
+        ]
+
+        return {
+            "overall_score": round(overall_score, 2),
+            "by_difficulty_level": by_difficulty,
+            "by_skill": by_skill,
+            "weak_points": weak_points,
+            "strong_points": strong_points,
+        }
+
+    @staticmethod
+    def _answers_data(c: _Colunas, posicoes: List[int]) -> List[Dict]:
+        return [
+            {
+                "question_id": c.question_id[p],
+                "question_text": c.question_text[p],
+                "selected_answer": c.selected_answer[p],
+                "correct_answer": c.correct_answer[p],
+                "is_correct": c.correta[p],
+                "skill": c.habilidades[c.habilidade[p]] if c.habilidade[p] >= 0 else None,
+                "difficulty_level": c.dificuldade[p]
+            }
+            for p in posicoes
+        ]
+
+    def _recomendacoes(self, student: Student, answers_data: List[Dict]) -> str:
         # Gerar recomendações com IA
         ai_analysis = self.ai_service.analyze_performance(
             student_name=student.name,
             answers_data=answers_data,
             student_profile=student.profile_data
         )
-        
-        recommendations_text = f"""
+
+        return f"""
 {ai_analysis.get('summary', '')}
 
 PONTOS FORTES:
@@ -150,25 +369,7 @@ RECOMENDAÇÕES:
 PRÓXIMOS PASSOS:
 {chr(10).join('• ' + step for step in ai_analysis.get('next_steps', []))}
 """
-        
-        # Criar a análise de desempenho
-        performance_analysis = PerformanceAnalysis(
-            student_id=application.student_id,
-            application_id=application_id,
-            overall_score=round(overall_score, 2),
-            by_difficulty_level=by_difficulty_with_percentage,
-            by_skill=by_skill_with_mastery,
-            weak_points=weak_points,
-            strong_points=strong_points,
-            recommendations=recommendations_text
-        )
-        
-        self.db.add(performance_analysis)
-        self.db.commit()
-        self.db.refresh(performance_analysis)
-        
-        return performance_analysis
-    
+
     def _get_skill_recommendation(self, skill: str) -> str:
         """
         Retorna recomendação baseada na habilidade
@@ -180,5 +381,5 @@ PRÓXIMOS PASSOS:
             "analisar_informacoes": "Trabalhar com textos curtos e questões direcionadas",
             "comparar_e_contrastar": "Usar tabelas comparativas e diagramas de Venn"
         }
-        
+
         return recommendations.get(skill, "Praticar mais exercícios sobre este tópico")
@@ -0,0 +1,584 @@
+"""
+Rollup de desempenho por aluno (tabela student_performance_rollup).
+
+MOTIVACAO: comparar alunos, resumo por materia/habilidade etc. agregavam
+todo o historico de ProvaAluno/RespostaAluno/StudentAnswer a cada request
+(e em varios casos uma query por aluno). Agora os contadores sao somados
+uma vez, quando a avaliacao e corrigida, e as telas leem poucas linhas.
+
+Escrita (sempre na transacao do chamador - quem chama faz o commit, entao
+nota e rollup sao gravados juntos ou nenhum dos dois):
+
+    registrar_prova(db, prova_aluno, prova, respostas)   # ao corrigir prova
+    registrar_aplicacao(db, application)                 # ao completar aplicacao
+    recalcular_aluno(db, aluno_id)                       # ao re-corrigir (nota muda)
+    db.commit()
+
+    Cada avaliacao vira deltas por (aluno, professor, fonte, materia,
+    habilidade) aplicados com UPDATE col = col + delta; linha nova entra por
+    INSERT em savepoint (corrida com outro worker -> IntegrityError pela
+    unique -> refaz o UPDATE), mesmo desenho do metering (app/core/metering.py).
+
+Avaliacao sem professor (Prova.criado_por_id NULL - prova de sistema ou
+professor apagado) nao entra: professor_id faz parte da chave do rollup e
+e NOT NULL. O registro e pulado com log, no incremental e no backfill.
+
+Backfill / correcao de divergencia (prova apagada, nota editada a mao):
+
+    python -m app.scripts.backfill_performance_rollup [--alunos 1,2,3]
+
+Leitura:
+
+    resumo_aluno(db, aluno_id, professor_id=...)    # geral/por materia/por habilidade
+    totais_por_aluno(db, professor_id, [ids])       # uma query para N alunos
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.logging_config import get_logger
+from app.models.application import Application, ApplicationStatus, StudentAnswer
+from app.models.performance_rollup import StudentPerformanceRollup
+from app.models.prova import Prova, ProvaAluno, QuestaoGerada, RespostaAluno, StatusProvaAluno
+from app.models.question import Question, QuestionSet
+
+logger = get_logger(__name__)
+
+
+FONTE_PROVA = "prova"
+FONTE_APLICACAO = "aplicacao"
+
+# habilidade da linha de total da materia
+TOTAL = ""
+
+TAMANHO_CHAVE = 100
+
+# Alunos por lote no backfill (um commit por lote)
+LOTE_BACKFILL = 200
+
+STATUS_CORRIGIDOS = (StatusProvaAluno.CONCLUIDA, StatusProvaAluno.CORRIGIDA)
+
+# (student_id, professor_id, fonte, materia, habilidade)
+Chave = Tuple[int, int, str, str, str]
+
+R = StudentPerformanceRollup
+
+
+def nivel_dominio(percentual: float) -> str:
+    """Mesma escala do PerformanceAnalyzerService (excellent/good/developing/needs_work)."""
+    if percentual >= 90:
+        return "excellent"
+    if percentual >= 75:
+        return "good"
+    if percentual >= 60:
+        return "developing"
+    return "needs_work"
+
+
+# ============================================================
+# AVALIACAO -> DELTAS
+# ============================================================
+
+@dataclass
+class Avaliacao:
+    """Prova ou aplicacao corrigida, no formato comum das duas fontes."""
+    student_id: int
+    professor_id: Optional[int]
+    fonte: str
+    materia: Optional[str]
+    nota: Optional[float]
+    aprovado: Optional[bool]
+    quando: Optional[datetime]
+    # (habilidades da questao, acertou?)
+    questoes: List[Tuple[Tuple[str, ...], bool]] = field(default_factory=list)
+
+
+@dataclass
+class _Delta:
+    avaliacoes: int = 0
+    avaliacoes_com_nota: int = 0
+    soma_notas: float = 0.0
+    nota_maxima: Optional[float] = None
+    nota_minima: Optional[float] = None
+    aprovacoes: int = 0
+    reprovacoes: int = 0
+    questoes_total: int = 0
+    questoes_corretas: int = 0
+    ultima_avaliacao_em: Optional[datetime] = None
+
+    def somar(self, outro: "_Delta") -> None:
+        self.avaliacoes += outro.avaliacoes
+        self.avaliacoes_com_nota += outro.avaliacoes_com_nota
+        self.soma_notas += outro.soma_notas
+        self.nota_maxima = _max(self.nota_maxima, outro.nota_maxima)
+        self.nota_minima = _min(self.nota_minima, outro.nota_minima)
+        self.aprovacoes += outro.aprovacoes
+        self.reprovacoes += outro.reprovacoes
+        self.questoes_total += outro.questoes_total
+        self.questoes_corretas += outro.questoes_corretas
+        self.ultima_avaliacao_em = _max(self.ultima_avaliacao_em, outro.ultima_avaliacao_em)
+
+
+def _max(a, b):
+    return b if a is None else (a if b is None else max(a, b))
+
+
+def _min(a, b):
+    return b if a is None else (a if b is None else min(a, b))
+
+
+def _texto_chave(valor) -> str:
+    return str(valor).strip()[:TAMANHO_CHAVE] if valor else ""
+
+
+def _naive_utc(quando: Optional[datetime]) -> Optional[datetime]:
+    # Colunas DateTime sem timezone (MySQL): grava UTC naive
+    if quando is not None and quando.tzinfo is not None:
+        return quando.astimezone(timezone.utc).replace(tzinfo=None)
+    return quando
+
+
+def _habilidades(valor) -> Tuple[str, ...]:
+    """Question.skill (str) ou QuestaoGerada.tags (lista) -> habilidades distintas."""
+    if not valor:
+        return ()
+    itens = [valor] if isinstance(valor, str) else valor
+    if not isinstance(itens, (list, tuple)):
+        return ()
+    return tuple(dict.fromkeys(
+        t for t in (_texto_chave(i) for i in itens if isinstance(i, str)) if t
+    ))
+
+
+def _deltas(avaliacao: Avaliacao) -> Dict[Chave, _Delta]:
+    base = (avaliacao.student_id, avaliacao.professor_id, avaliacao.fonte, _texto_chave(avaliacao.materia))
+    quando = _naive_utc(avaliacao.quando)
+
+    total = _Delta(avaliacoes=1, ultima_avaliacao_em=quando)
+    if avaliacao.nota is not None:
+        total.avaliacoes_com_nota = 1
+        total.soma_notas = total.nota_maxima = total.nota_minima = float(avaliacao.nota)
+    if avaliacao.aprovado is True:
+        total.aprovacoes = 1
+    elif avaliacao.aprovado is False:
+        total.reprovacoes = 1
+
+    deltas: Dict[Chave, _Delta] = {base + (TOTAL,): total}
+    for habilidades, correta in avaliacao.questoes:
+        total.questoes_total += 1
+        total.questoes_corretas += int(correta)
+        for habilidade in habilidades:
+            d = deltas.get(base + (habilidade,))
+            if d is None:
+                d = deltas[base + (habilidade,)] = _Delta(avaliacoes=1, ultima_avaliacao_em=quando)
+            d.questoes_total += 1
+            d.questoes_corretas += int(correta)
+    return deltas
+
+
+# ============================================================
+# ESCRITA
+# ============================================================
+
+def _filtro(chave: Chave):
+    student_id, professor_id, fonte, materia, habilidade = chave
+    return (
+        R.student_id == student_id,
+        R.professor_id == professor_id,
+        R.fonte == fonte,
+        R.materia == materia,
+        R.habilidade == habilidade,
+    )
+
+
+def _maior(coluna, valor):
+    return case((coluna.is_(None), valor), (coluna < valor, valor), else_=coluna)
+
+
+def _menor(coluna, valor):
+    return case((coluna.is_(None), valor), (coluna > valor, valor), else_=coluna)
+
+
+def _incrementos(d: _Delta) -> dict:
+    valores = {
+        "avaliacoes": R.avaliacoes + d.avaliacoes,
+        "avaliacoes_com_nota": R.avaliacoes_com_nota + d.avaliacoes_com_nota,
+        "soma_notas": R.soma_notas + d.soma_notas,
+        "aprovacoes": R.aprovacoes + d.aprovacoes,
+        "reprovacoes": R.reprovacoes + d.reprovacoes,
+        "questoes_total": R.questoes_total + d.questoes_total,
+        "questoes_corretas": R.questoes_corretas + d.questoes_corretas,
+        "updated_at": datetime.now(timezone.utc),
+    }
+    if d.nota_maxima is not None:
+        valores["nota_maxima"] = _maior(R.nota_maxima, d.nota_maxima)
+    if d.nota_minima is not None:
+        valores["nota_minima"] = _menor(R.nota_minima, d.nota_minima)
+    if d.ultima_avaliacao_em is not None:
+        valores["ultima_avaliacao_em"] = _maior(R.ultima_avaliacao_em, d.ultima_avaliacao_em)
+    return valores
+
+
+def _linha(chave: Chave, d: _Delta) -> dict:
+    student_id, professor_id, fonte, materia, habilidade = chave
+    return {
+        "student_id": student_id,
+        "professor_id": professor_id,
+        "fonte": fonte,
+        "materia": materia,
+        "habilidade": habilidade,
+        "avaliacoes": d.avaliacoes,
+        "avaliacoes_com_nota": d.avaliacoes_com_nota,
+        "soma_notas": d.soma_notas,
+        "nota_maxima": d.nota_maxima,
+        "nota_minima": d.nota_minima,
+        "aprovacoes": d.aprovacoes,
+        "reprovacoes": d.reprovacoes,
+        "questoes_total": d.questoes_total,
+        "questoes_corretas": d.questoes_corretas,
+        "ultima_avaliacao_em": d.ultima_avaliacao_em,
+        "updated_at": datetime.now(timezone.utc),
+    }
+
+
+def _atualizar(db: Session, chave: Chave, d: _Delta) -> int:
+    return db.execute(
+        update(R).where(*_filtro(chave)).values(**_incrementos(d))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def _aplicar(db: Session, deltas: Dict[Chave, _Delta]) -> None:
+    """Soma os deltas no rollup, sem commit (transacao do chamador)."""
+    for chave, d in deltas.items():
+        if _atualizar(db, chave, d):
+            continue
+        try:
+            # Savepoint: a IntegrityError nao derruba a transacao do chamador
+            with db.begin_nested():
+                db.execute(insert(R).values(**_linha(chave, d)))
+        except IntegrityError:
+            # Outro worker criou a linha entre o UPDATE e o INSERT
+            if not _atualizar(db, chave, d):
+                logger.error("rollup de desempenho: linha nao gravada", extra={"chave": chave})
+
+
+def _sem_professor(avaliacao: Avaliacao) -> bool:
+    if avaliacao.professor_id is not None:
+        return False
+    logger.warning(
+        "rollup de desempenho: avaliacao sem professor ignorada",
+        extra={"student_id": avaliacao.student_id, "fonte": avaliacao.fonte},
+    )
+    return True
+
+
+def registrar_avaliacao(db: Session, avaliacao: Avaliacao) -> None:
+    if _sem_professor(avaliacao):
+        return
+    _aplicar(db, _deltas(avaliacao))
+
+
+def _avaliacao_prova(pa, prova_criado_por_id, materia, respostas, tags_por_questao) -> Avaliacao:
+    return Avaliacao(
+        student_id=pa.aluno_id,
+        professor_id=prova_criado_por_id,
+        fonte=FONTE_PROVA,
+        materia=materia,
+        nota=pa.nota_final,
+        # Prova corrigida sem aprovacao (False ou NULL) conta como reprovacao,
+        # como o comparar_alunos sempre contou
+        aprovado=bool(pa.aprovado),
+        quando=pa.data_conclusao,
+        questoes=[
+            (_habilidades(tags_por_questao.get(questao_id)), bool(correta))
+            for questao_id, correta in respostas
+        ],
+    )
+
+
+def registrar_prova(
+    db: Session,
+    prova_aluno: ProvaAluno,
+    prova: Prova,
+    respostas: Sequence[RespostaAluno],
+) -> None:
+    """
+    Soma uma prova corrigida no rollup. Chamar UMA vez por ProvaAluno, antes
+    do commit que grava a nota (habilidades = tags das questoes).
+    """
+    questao_ids = {r.questao_id for r in respostas}
+    tags = dict(db.execute(
+        select(QuestaoGerada.id, QuestaoGerada.tags).where(QuestaoGerada.id.in_(questao_ids))
+    ).all()) if questao_ids else {}
+    registrar_avaliacao(db, _avaliacao_prova(
+        prova_aluno, prova.criado_por_id, prova.materia,
+        [(r.questao_id, r.esta_correta) for r in respostas], tags,
+    ))
+
+
+def _nota_aplicacao(corretas: int, total: int) -> Optional[float]:
+    # Mesma conta do overall_score do PerformanceAnalyzerService, escala 0-10
+    return corretas / total * 10 if total else None
+
+
+def registrar_aplicacao(db: Session, application: Application) -> None:
+    """
+    Soma uma aplicacao completada no rollup (habilidades = Question.skill).
+    Aplicacao nao tem nota minima: aprovado fica indefinido.
+    """
+    materia = db.execute(
+        select(QuestionSet.subject).where(QuestionSet.id == application.question_set_id)
+    ).scalar()
+    respostas = db.execute(
+        select(StudentAnswer.is_correct, Question.skill)
+        .join(Question, StudentAnswer.question_id == Question.id)
+        .where(StudentAnswer.application_id == application.id)
+    ).all()
+    corretas = sum(1 for r in respostas if r.is_correct)
+    registrar_avaliacao(db, Avaliacao(
+        student_id=application.student_id,
+        professor_id=application.applied_by_user_id,
+        fonte=FONTE_APLICACAO,
+        materia=materia,
+        nota=_nota_aplicacao(corretas, len(respostas)),
+        aprovado=None,
+        quando=application.completed_at,
+        questoes=[(_habilidades(r.skill), bool(r.is_correct)) for r in respostas],
+    ))
+
+
+# ============================================================
+# BACKFILL
+# ============================================================
+
+def _avaliacoes_provas(db: Session, student_ids: Sequence[int]) -> Iterable[Avaliacao]:
+    provas = db.execute(
+        select(ProvaAluno, Prova.criado_por_id, Prova.materia)
+        .join(Prova, ProvaAluno.prova_id == Prova.id)
+        .where(ProvaAluno.aluno_id.in_(student_ids), ProvaAluno.status.in_(STATUS_CORRIGIDOS))
+    ).all()
+    if not provas:
+        return
+    respostas: Dict[int, List[Tuple[int, bool]]] = {}
+    tags: Dict[int, object] = {}
+    for r in db.execute(
+        select(RespostaAluno.prova_aluno_id, RespostaAluno.questao_id,
+               RespostaAluno.esta_correta, QuestaoGerada.tags)
+        .join(QuestaoGerada, RespostaAluno.questao_id == QuestaoGerada.id)
+        .where(RespostaAluno.prova_aluno_id.in_([pa.id for pa, _, _ in provas]))
+    ):
+        respostas.setdefault(r.prova_aluno_id, []).append((r.questao_id, r.esta_correta))
+        tags[r.questao_id] = r.tags
+    for pa, criado_por_id, materia in provas:
+        yield _avaliacao_prova(pa, criado_por_id, materia, respostas.get(pa.id, []), tags)
+
+
+def _avaliacoes_aplicacoes(db: Session, student_ids: Sequence[int]) -> Iterable[Avaliacao]:
+    aplicacoes = db.execute(
+        select(Application, QuestionSet.subject)
+        .join(QuestionSet, Application.question_set_id == QuestionSet.id)
+        .where(Application.student_id.in_(student_ids),
+               Application.status == ApplicationStatus.COMPLETED)
+    ).all()
+    if not aplicacoes:
+        return
+    respostas: Dict[int, List[Tuple[Optional[bool], Optional[str]]]] = {}
+    for r in db.execute(
+        select(StudentAnswer.application_id, StudentAnswer.is_correct, Question.skill)
+        .join(Question, StudentAnswer.question_id == Question.id)
+        .where(StudentAnswer.application_id.in_([a.id for a, _ in aplicacoes]))
+    ):
+        respostas.setdefault(r.application_id, []).append((r.is_correct, r.skill))
+    for app, materia in aplicacoes:
+        linhas = respostas.get(app.id, [])
+        corretas = sum(1 for correta, _ in linhas if correta)
+        yield Avaliacao(
+            student_id=app.student_id,
+            professor_id=app.applied_by_user_id,
+            fonte=FONTE_APLICACAO,
+            materia=materia,
+            nota=_nota_aplicacao(corretas, len(linhas)),
+            aprovado=None,
+            quando=app.completed_at,
+            questoes=[(_habilidades(skill), bool(correta)) for correta, skill in linhas],
+        )
+
+
+def _reconstruir_lote(db: Session, student_ids: Sequence[int]) -> Tuple[int, int]:
+    """Apaga e recria as linhas dos alunos, sem commit. Retorna (avaliacoes, linhas)."""
+    db.execute(delete(R).where(R.student_id.in_(student_ids)))
+    processadas = 0
+    acumulado: Dict[Chave, _Delta] = {}
+    for fonte in (_avaliacoes_provas, _avaliacoes_aplicacoes):
+        for avaliacao in fonte(db, student_ids):
+            if _sem_professor(avaliacao):
+                continue
+            processadas += 1
+            for chave, d in _deltas(avaliacao).items():
+                if chave in acumulado:
+                    acumulado[chave].somar(d)
+                else:
+                    acumulado[chave] = d
+    if acumulado:
+        db.execute(insert(R), [_linha(chave, d) for chave, d in acumulado.items()])
+    return processadas, len(acumulado)
+
+
+def recalcular_aluno(db: Session, student_id: int) -> None:
+    """
+    Recalcula as linhas de um aluno a partir do historico, na transacao do
+    chamador. Para quando uma avaliacao ja somada muda (prova CORRIGIDA
+    finalizada de novo): delta nao desfaz nota_maxima/nota_minima.
+    """
+    # Sessao da app e autoflush=False: a nota nova precisa estar no banco
+    db.flush()
+    _reconstruir_lote(db, [student_id])
+
+
+def reconstruir(db: Session, student_ids: Optional[Sequence[int]] = None) -> int:
+    """
+    Recalcula o rollup a partir do historico (todos os alunos ou so os
+    informados), em lotes de LOTE_BACKFILL alunos com um commit por lote.
+    Retorna o numero de avaliacoes processadas.
+    """
+    if student_ids is None:
+        com_provas = select(ProvaAluno.aluno_id).where(ProvaAluno.status.in_(STATUS_CORRIGIDOS))
+        com_aplicacoes = select(Application.student_id).where(
+            Application.status == ApplicationStatus.COMPLETED
+        )
+        student_ids = sorted(
+            set(db.execute(com_provas.distinct()).scalars())
+            | set(db.execute(com_aplicacoes.distinct()).scalars())
+        )
+        db.execute(delete(R))
+    else:
+        student_ids = sorted(set(student_ids))
+
+    processadas = 0
+    for i in range(0, len(student_ids), LOTE_BACKFILL):
+        lote = student_ids[i:i + LOTE_BACKFILL]
+        avaliacoes, linhas = _reconstruir_lote(db, lote)
+        processadas += avaliacoes
+        db.commit()
+        logger.info(
+            "rollup de desempenho reconstruido",
+            extra={"alunos": len(lote), "linhas": linhas},
+        )
+    db.commit()
+    return processadas
+
+
+# ============================================================
+# LEITURA
+# ============================================================
+
+def _resumo(linhas: Iterable[StudentPerformanceRollup]) -> dict:
+    d = _Delta()
+    for linha in linhas:
+        d.somar(_Delta(
+            avaliacoes=linha.avaliacoes,
+            avaliacoes_com_nota=linha.avaliacoes_com_nota,
+            soma_notas=linha.soma_notas,
+            nota_maxima=linha.nota_maxima,
+            nota_minima=linha.nota_minima,
+            aprovacoes=linha.aprovacoes,
+            reprovacoes=linha.reprovacoes,
+            questoes_total=linha.questoes_total,
+            questoes_corretas=linha.questoes_corretas,
+            ultima_avaliacao_em=linha.ultima_avaliacao_em,
+        ))
+    percentual = d.questoes_corretas / d.questoes_total * 100 if d.questoes_total else 0
+    return {
+        "avaliacoes": d.avaliacoes,
+        "media": round(d.soma_notas / d.avaliacoes_com_nota, 2) if d.avaliacoes_com_nota else 0,
+        "nota_maxima": round(d.nota_maxima, 2) if d.nota_maxima is not None else 0,
+        "nota_minima": round(d.nota_minima, 2) if d.nota_minima is not None else 0,
+        "aprovacoes": d.aprovacoes,
+        "reprovacoes": d.reprovacoes,
+        "questoes_total": d.questoes_total,
+        "questoes_corretas": d.questoes_corretas,
+        "percentual_acerto": round(percentual, 2),
+        "ultima_avaliacao_em": d.ultima_avaliacao_em.isoformat() if d.ultima_avaliacao_em else None,
+    }
+
+
+def resumo_aluno(db: Session, student_id: int, professor_id: Optional[int] = None) -> dict:
+    """Desempenho geral, por materia e por habilidade (provas + aplicacoes)."""
+    query = db.query(R).filter(R.student_id == student_id)
+    if professor_id is not None:
+        query = query.filter(R.professor_id == professor_id)
+    linhas = query.all()
+
+    totais = [linha for linha in linhas if linha.habilidade == TOTAL]
+    por_materia: Dict[str, list] = {}
+    for linha in totais:
+        por_materia.setdefault(linha.materia, []).append(linha)
+    por_habilidade: Dict[Tuple[str, str], list] = {}
+    for linha in linhas:
+        if linha.habilidade != TOTAL:
+            por_habilidade.setdefault((linha.materia, linha.habilidade), []).append(linha)
+
+    habilidades = []
+    for (materia, habilidade), grupo in sorted(por_habilidade.items()):
+        resumo = _resumo(grupo)
+        habilidades.append({
+            "materia": materia,
+            "habilidade": habilidade,
+            "questoes_total": resumo["questoes_total"],
+            "questoes_corretas": resumo["questoes_corretas"],
+            "percentual_acerto": resumo["percentual_acerto"],
+            "dominio": nivel_dominio(resumo["percentual_acerto"]),
+        })
+
+    return {
+        "geral": _resumo(totais),
+        "por_materia": [
+            {"materia": materia, **_resumo(grupo)}
+            for materia, grupo in sorted(por_materia.items())
+        ],
+        "por_habilidade": habilidades,
+    }
+
+
+def totais_por_aluno(
+    db: Session,
+    professor_id: int,
+    student_ids: Sequence[int],
+    fonte: str = FONTE_PROVA,
+) -> Dict[int, dict]:
+    """Totais (todas as materias) de varios alunos em uma query agrupada."""
+    if not student_ids:
+        return {}
+    linhas = db.query(
+        R.student_id,
+        func.sum(R.avaliacoes).label("avaliacoes"),
+        func.sum(R.avaliacoes_com_nota).label("avaliacoes_com_nota"),
+        func.sum(R.soma_notas).label("soma_notas"),
+        func.max(R.nota_maxima).label("nota_maxima"),
+        func.min(R.nota_minima).label("nota_minima"),
+        func.sum(R.aprovacoes).label("aprovacoes"),
+        func.sum(R.reprovacoes).label("reprovacoes"),
+    ).filter(
+        R.professor_id == professor_id,
+        R.student_id.in_(student_ids),
+        R.fonte == fonte,
+        R.habilidade == TOTAL,
+    ).group_by(R.student_id).all()
+    return {
+        linha.student_id: {
+            "avaliacoes": int(linha.avaliacoes or 0),
+            "media": (linha.soma_notas / linha.avaliacoes_com_nota) if linha.avaliacoes_com_nota else 0,
+            "nota_maxima": linha.nota_maxima,
+            "nota_minima": linha.nota_minima,
+            "aprovacoes": int(linha.aprovacoes or 0),
+            "reprovacoes": int(linha.reprovacoes or 0),
+        }
+        for linha in linhas
+    }
@@ -11,11 +11,11 @@ import asyncio
 import uuid
 import gzip
 import hashlib
-import re
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Sequence
 from datetime import datetime, date, timedelta, timezone
 from sqlalchemy.orm import Session
-from sqlalchemy import func, text
+from sqlalchemy import insert, text
+from pydantic import BaseModel, ConfigDict
 
 from app.core.config import settings
 from app.core.anthropic_client import (
@@ -23,9 +23,11 @@ from app.core.anthropic_client import (
     get_default_model,
 )
 from app.models.student import Student
-from app.models.curriculo import CurriculoNacional, MapeamentoPrerequisitos
 from app.models.pei import PEI, PEIObjetivo
 from app.models.relatorio import Relatorio
+from app.services import adaptacoes_bncc
+from app.services.bncc_catalogo import HabilidadeBNCC, obter_catalogo
+from app.services.ia_estruturada import RespostaIAInvalida, RespostaTruncada, gerar_estruturado
 from app.models.planejamento_job import PlanejamentoJob, PlanejamentoJobLog, JobStatus
 
 from app.core.logging_config import get_logger
@@ -40,10 +42,105 @@ logger = get_logger(__name__)
 # Configurações de retry e processamento
 MAX_RETRIES = 3  # Tentativas por lote
 RETRY_DELAY = 2  # Segundos entre tentativas
-LOTE_SIZE = 12   # Habilidades por lote (reduzido para maior segurança)
 KEEPALIVE_INTERVAL = 30  # Segundos entre pings no MySQL
 MAX_JSON_SIZE_BYTES = 500_000  # 500KB - acima disso comprime
 
+# Lotes de habilidades por orçamento de tokens (ver _empacotar_lotes).
+# Antes eram 12 habilidades fixas: habilidades curtas desperdiçavam
+# chamadas e lotes longos estouravam max_tokens.
+LOTE_MAX_TOKENS = 6000          # max_tokens de cada chamada
+LOTE_ORCAMENTO_SAIDA = 5000     # saída estimada por lote (folga sobre max_tokens)
+LOTE_ORCAMENTO_ENTRADA = 20000  # prompt estimado por lote
+LOTE_MAX_HABILIDADES = 30
+TOKENS_PROMPT_FIXO = 600        # instruções + formato do prompt do lote
+TOKENS_SAIDA_POR_OBJETIVO = 320  # JSON de um objetivo, fora a descrição ecoada
+CHARS_POR_TOKEN = 3.5           # estimativa conservadora para português
+
+
+class ObjetivoAdaptadoIA(BaseModel):
+    """Adaptação de uma habilidade da BNCC para o aluno."""
+    model_config = ConfigDict(extra="allow")
+    
+    codigo_bncc: str
+    area: Optional[str] = None
+    trimestre: Optional[int] = None
+    titulo: Optional[str] = None
+    descricao_original: Optional[str] = None
+    descricao_adaptada: Optional[str] = None
+    adaptacoes: Optional[List[str]] = None
+    estrategias_ensino: Optional[List[str]] = None
+    materiais_recursos: Optional[List[str]] = None
+    criterios_avaliacao: Optional[List[str]] = None
+    nivel_suporte: Optional[str] = None
+    prioridade: Optional[str] = None
+
+
+class ObjetivosLoteIA(BaseModel):
+    """Registra os objetivos adaptados - um para cada habilidade do lote."""
+    objetivos: List[ObjetivoAdaptadoIA]
+
+
+class PersonalizacaoIA(BaseModel):
+    """Campos de um objetivo ajustados ao aluno (omitidos = mantidos)."""
+    codigo_bncc: str
+    descricao_adaptada: Optional[str] = None
+    adaptacoes: Optional[List[str]] = None
+    estrategias_ensino: Optional[List[str]] = None
+    criterios_avaliacao: Optional[List[str]] = None
+    nivel_suporte: Optional[str] = None
+
+
+class PersonalizacoesLoteIA(BaseModel):
+    """Registra os ajustes ao aluno - só dos objetivos que precisam mudar."""
+    personalizacoes: List[PersonalizacaoIA]
+
+
+def _estimar_tokens(texto: str) -> int:
+    return int(len(texto) / CHARS_POR_TOKEN) + 1
+
+
+def _linha_habilidade(h: Dict) -> str:
+    """Linha da habilidade no prompt do lote."""
+    return f"- [{h['codigo']}] T{h.get('trimestre', '?')}: {h['descricao'][:180]}"
+
+
+def _empacotar_lotes(habilidades: List[Dict], perfil_resumido: str) -> List[List[Dict]]:
+    """
+    Agrupa as habilidades (na ordem) em lotes que caibam no orçamento de
+    entrada e de saída estimados.
+
+    Entrada: parte fixa do prompt + perfil + uma linha por habilidade.
+    Saída: por objetivo, a parte fixa do JSON + a descrição ecoada em
+    descricao_original + um acréscimo pelo tamanho do perfil (mais
+    diagnósticos/adaptações geram adaptações mais longas). Se a estimativa
+    errar para baixo, o lote truncado se divide em
+    _gerar_objetivos_lote.
+    """
+    tokens_perfil = _estimar_tokens(perfil_resumido)
+    extra_perfil = min(tokens_perfil // 10, 100)
+
+    lotes: List[List[Dict]] = []
+    lote: List[Dict] = []
+    entrada = saida = 0
+    for h in habilidades:
+        linha = _linha_habilidade(h)
+        entrada_h = _estimar_tokens(linha)
+        saida_h = TOKENS_SAIDA_POR_OBJETIVO + _estimar_tokens(h["descricao"][:180]) + extra_perfil
+        cabe = (
+            len(lote) < LOTE_MAX_HABILIDADES
+            and TOKENS_PROMPT_FIXO + tokens_perfil + entrada + entrada_h <= LOTE_ORCAMENTO_ENTRADA
+            and saida + saida_h <= LOTE_ORCAMENTO_SAIDA
+        )
+        if lote and not cabe:
+            lotes.append(lote)
+            lote, entrada, saida = [], 0, 0
+        lote.append(h)
+        entrada += entrada_h
+        saida += saida_h
+    if lote:
+        lotes.append(lote)
+    return lotes
+
 
 def _utcnow() -> datetime:
     """
@@ -470,40 +567,19 @@ class PlanejamentoBNNCCompletoService:
     # ============================================
     
     def listar_componentes_disponiveis(self, ano_escolar: str) -> List[Dict[str, Any]]:
-        """Lista componentes disponíveis para um ano escolar"""
-        self._keep_alive()
-        
-        results = self.db.query(
-            CurriculoNacional.componente,
-            func.count(CurriculoNacional.id).label('total')
-        ).filter(
-            CurriculoNacional.ano_escolar == ano_escolar
-        ).group_by(
-            CurriculoNacional.componente
-        ).all()
-        
-        return [{"componente": r[0], "total_habilidades": r[1]} for r in results]
+        """Lista componentes disponíveis para um ano escolar (catalogo em memoria)"""
+        return obter_catalogo(self.db).componentes_do_ano(ano_escolar)
     
     def buscar_todas_habilidades(
         self,
         ano_escolar: str,
         componente: Optional[str] = None
-    ) -> List[CurriculoNacional]:
-        """Busca todas as habilidades da BNCC"""
-        self._keep_alive()
-        
-        query = self.db.query(CurriculoNacional).filter(
-            CurriculoNacional.ano_escolar == ano_escolar
-        )
-        
-        if componente:
-            query = query.filter(CurriculoNacional.componente == componente)
-        
-        return query.order_by(
-            CurriculoNacional.componente,
-            CurriculoNacional.trimestre_sugerido,
-            CurriculoNacional.codigo_bncc
-        ).all()
+    ) -> Sequence[HabilidadeBNCC]:
+        """
+        Busca todas as habilidades da BNCC (catalogo em memoria), ordenadas
+        por componente, trimestre sugerido e codigo
+        """
+        return obter_catalogo(self.db).habilidades(ano_escolar, componente)
     
     def obter_perfil_aluno(self, student_id: int) -> Dict[str, Any]:
         """Obtém perfil completo do aluno"""
@@ -688,11 +764,29 @@ DIFICULDADES:
         lote_numero: int
     ) -> Dict[str, Any]:
         """Processa um lote de habilidades (sem retry) - com validação robusta de JSON"""
-        
-        habilidades_texto = "\n".join([
-            f"- [{h['codigo']}] T{h.get('trimestre', '?')}: {h['descricao'][:180]}"
-            for h in habilidades
-        ])
+        objetivos = await self._gerar_objetivos_lote(
+            perfil_resumido, componente, habilidades, ano_letivo, lote_numero
+        )
+        return {
+            "componente": componente,
+            "lote": lote_numero,
+            "objetivos": objetivos
+        }
+    
+    async def _gerar_objetivos_lote(
+        self,
+        perfil_resumido: str,
+        componente: str,
+        habilidades: List[Dict],
+        ano_letivo: str,
+        lote_numero: int
+    ) -> List[Dict]:
+        """
+        Objetivos de um lote. Resposta cortada em max_tokens divide o lote
+        ao meio (em vez de repetir o mesmo prompt grande demais); formato
+        inválido mesmo após reparo -> fallback.
+        """
+        habilidades_texto = "\n".join(_linha_habilidade(h) for h in habilidades)
         
         prompt = f"""Você é um especialista em educação inclusiva.
 
@@ -734,22 +828,105 @@ IMPORTANTE:
 - Mantenha o código BNCC original
 - Retorne APENAS o JSON válido, sem texto adicional"""
 
-        message = self.client.messages.create(
-            model=get_default_model(),
-            max_tokens=6000,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        response_text = message.content[0].text.strip()
-        
-        # Usar validação robusta com fallback
-        resultado = self._validar_e_extrair_json(response_text, habilidades)
+        # Saída restrita pelo schema (tool use). Erro de API sobe para o
+        # retry do lote.
+        try:
+            lote = gerar_estruturado(
+                self.client,
+                ObjetivosLoteIA,
+                prompt,
+                model=get_default_model(),
+                max_tokens=LOTE_MAX_TOKENS,
+                nome="registrar_objetivos"
+            )
+            resultado = lote.model_dump(exclude_unset=True)
+        except RespostaTruncada:
+            if len(habilidades) > 1:
+                meio = len(habilidades) // 2
+                logger.info(
+                    f"[✂️ SPLIT] Lote {lote_numero} de {componente} truncado: "
+                    f"dividindo {len(habilidades)} habilidades em {meio} + {len(habilidades) - meio}"
+                )
+                primeira = await self._gerar_objetivos_lote(
+                    perfil_resumido, componente, habilidades[:meio], ano_letivo, lote_numero
+                )
+                segunda = await self._gerar_objetivos_lote(
+                    perfil_resumido, componente, habilidades[meio:], ano_letivo, lote_numero
+                )
+                return primeira + segunda
+            logger.warning(f"[⚠️ JSON] Habilidade {habilidades[0]['codigo']} não cabe em max_tokens")
+            resultado = None
+        except RespostaIAInvalida as e:
+            logger.warning(f"[⚠️ JSON] Lote {lote_numero} de {componente} inválido: {e}")
+            resultado = None
+        
+        if resultado is None or not self._validar_estrutura_objetivos(resultado, habilidades):
+            logger.info(f"[🔄 FALLBACK] Gerando objetivos mínimos para {len(habilidades)} habilidades")
+            resultado = self._gerar_objetivos_fallback(habilidades)
+        
+        return resultado.get("objetivos", [])
+    
+    async def _personalizar_lote(
+        self,
+        perfil_resumido: str,
+        componente: str,
+        objetivos: List[Dict],
+        lote_numero: int
+    ) -> List[Dict]:
+        """
+        Ajusta ao aluno objetivos gerados para o perfil canônico
+        (reaproveitados ou novos). A IA devolve só os campos que mudam;
+        qualquer falha mantém os objetivos genéricos.
+        """
+        resumo = [
+            {
+                "codigo_bncc": o.get("codigo_bncc"),
+                "titulo": o.get("titulo"),
+                "descricao_adaptada": o.get("descricao_adaptada"),
+                "adaptacoes": o.get("adaptacoes"),
+                "estrategias_ensino": o.get("estrategias_ensino"),
+            }
+            for o in objetivos
+        ]
+        prompt = f"""Você é um especialista em educação inclusiva.
+
+Os objetivos abaixo foram adaptados para o perfil diagnóstico geral do aluno.
+Ajuste-os ao aluno específico, usando o perfil completo.
+
+{perfil_resumido}
+
+## COMPONENTE: {componente}
+
+## OBJETIVOS:
+{json.dumps(resumo, ensure_ascii=False)}
+
+## INSTRUÇÕES:
+- Inclua SOMENTE os objetivos que precisam mudar para este aluno
+- Em cada um, informe o codigo_bncc e apenas os campos alterados
+- Aproveite os pontos fortes e as adaptações recomendadas do perfil"""
+
+        try:
+            resultado = gerar_estruturado(
+                self.client,
+                PersonalizacoesLoteIA,
+                prompt,
+                model=get_default_model(),
+                max_tokens=LOTE_MAX_TOKENS,
+                nome="registrar_personalizacao"
+            )
+        except Exception as e:
+            logger.warning(f"[⚠️ PERSONALIZAÇÃO] Lote {lote_numero} de {componente} mantido genérico: {e}")
+            return objetivos
         
-        return {
-            "componente": componente,
-            "lote": lote_numero,
-            "objetivos": resultado.get("objetivos", [])
+        ajustes = {
+            p.codigo_bncc: p.model_dump(exclude_unset=True, exclude_none=True, exclude={"codigo_bncc"})
+            for p in resultado.personalizacoes
         }
+        return [
+            {**o, **ajustes[o.get("codigo_bncc")], "_personalizado": True}
+            if ajustes.get(o.get("codigo_bncc")) else o
+            for o in objetivos
+        ]
     
     # ============================================
     # PROCESSAMENTO PRINCIPAL
@@ -763,11 +940,17 @@ IMPORTANTE:
         user_id: int = None,
         task_id: str = None,
         task_manager = None,
-        retomar_job: bool = True
+        retomar_job: bool = True,
+        personalizar: bool = False
     ) -> Dict[str, Any]:
         """
         Gera planejamento COMPLETO para TODAS as habilidades.
         Com persistência, keep-alive, retry, lock anti-duplicação e compressão.
+        
+        Com settings.BNCC_REUSO_ADAPTACOES, as adaptações vêm do perfil
+        canônico (ano + condições) e são reaproveitadas entre alunos; a IA
+        só gera as que faltam. `personalizar` ajusta o resultado ao perfil
+        completo do aluno numa passada extra (ver app/services/adaptacoes_bncc.py).
         """
         
         def update_progress(progress: int, message: str):
@@ -845,6 +1028,14 @@ IMPORTANTE:
         
         perfil_resumido = self._criar_perfil_resumido(perfil)
         
+        # REUSO: objetivos novos saem do perfil canônico (sem texto livre do
+        # aluno) para servirem a todos os alunos com a mesma assinatura
+        reusar = settings.BNCC_REUSO_ADAPTACOES
+        modelo = get_default_model()
+        perfil_canonico = adaptacoes_bncc.perfil_canonico(perfil)
+        assinatura = adaptacoes_bncc.assinatura_perfil(perfil)
+        perfil_geracao = adaptacoes_bncc.descrever_perfil(perfil) if reusar else perfil_resumido
+        
         # Processar cada componente pendente
         progresso_base = 10
         progresso_por_componente = 80 / len(componentes)
@@ -897,18 +1088,49 @@ IMPORTANTE:
             lotes_ja_processados, objetivos_recuperados = self._obter_lotes_ja_processados(job, componente)
             todos_objetivos = objetivos_recuperados.copy() if objetivos_recuperados else []
             
-            # Processar em lotes
-            total_lotes = (len(habilidades) + LOTE_SIZE - 1) // LOTE_SIZE
+            # PULAR habilidades já processadas (recuperação granular). Por
+            # código e não por número do lote: o empacotamento depende do
+            # orçamento de tokens e pode mudar entre execuções.
+            codigos_prontos = {o.get("codigo_bncc") for o in todos_objetivos}
+            pendentes = [h for h in habilidades if h["codigo"] not in codigos_prontos]
+            if len(pendentes) < len(habilidades):
+                logger.info(
+                    f"[⏭️ SKIP] {componente}: {len(habilidades) - len(pendentes)} habilidades já processadas"
+                )
             
-            for lote_idx in range(0, len(habilidades), LOTE_SIZE):
-                lote_numero = lote_idx // LOTE_SIZE + 1
-                
-                # PULAR lotes já processados (recuperação granular)
-                if lote_numero in lotes_ja_processados:
-                    logger.info(f"[⏭️ SKIP] {componente} lote {lote_numero}/{total_lotes} já processado")
-                    continue
-                
-                lote = habilidades[lote_idx:lote_idx + LOTE_SIZE]
+            # REUSO: um SELECT por componente; a IA só gera o que falta
+            reutilizadas: Dict[str, Dict] = {}
+            if reusar and pendentes:
+                try:
+                    reutilizadas = adaptacoes_bncc.buscar(
+                        self.db, [h["codigo"] for h in pendentes], assinatura, modelo
+                    )
+                    self.db.commit()
+                except Exception as e:
+                    self.db.rollback()
+                    logger.exception(f"[⚠️ REUSO] Erro ao buscar adaptações de {componente}: {e}")
+                if reutilizadas:
+                    self._registrar_log(
+                        job, "adaptacoes_reutilizadas", componente,
+                        mensagem=f"{len(reutilizadas)} de {len(pendentes)} habilidades reaproveitadas",
+                        dados={"reutilizadas": len(reutilizadas), "perfil": perfil_canonico}
+                    )
+            
+            # Lotes: reaproveitados (sem IA; do tamanho da personalização,
+            # se houver) e depois os novos, por orçamento de tokens
+            ja_geradas = [h for h in pendentes if h["codigo"] in reutilizadas]
+            a_gerar = [h for h in pendentes if h["codigo"] not in reutilizadas]
+            if personalizar:
+                lotes_reutilizados = _empacotar_lotes(ja_geradas, perfil_resumido)
+            else:
+                lotes_reutilizados = [ja_geradas] if ja_geradas else []
+            lotes = [(lote, True) for lote in lotes_reutilizados]
+            lotes += [(lote, False) for lote in _empacotar_lotes(a_gerar, perfil_geracao)]
+            primeiro_lote = max(lotes_ja_processados, default=0) + 1
+            total_lotes = primeiro_lote - 1 + len(lotes)
+            
+            for lote_idx, (lote, reutilizado) in enumerate(lotes):
+                lote_numero = primeiro_lote + lote_idx
                 
                 self._atualizar_job(job, lote_atual=lote_numero,
                                   message=f"{componente}: lote {lote_numero}/{total_lotes}")
@@ -917,24 +1139,49 @@ IMPORTANTE:
                 update_progress(int(progresso_lote), 
                               f"{componente}: processando lote {lote_numero}/{total_lotes}")
                 
-                # Processar lote COM RETRY
-                resultado = await self._processar_lote_com_retry(
-                    job, perfil_resumido, componente, lote, ano_letivo, lote_numero
-                )
+                if reutilizado:
+                    objetivos = [{**reutilizadas[h["codigo"]], "_reutilizado": True} for h in lote]
+                else:
+                    # Processar lote COM RETRY
+                    resultado = await self._processar_lote_com_retry(
+                        job, perfil_geracao, componente, lote, ano_letivo, lote_numero
+                    )
+                    objetivos = resultado.get("objetivos", [])
+                    if reusar and objetivos:
+                        # Só códigos do lote (a IA pode ecoar um código errado);
+                        # gravado junto com o checkpoint abaixo
+                        codigos_lote = {h["codigo"] for h in lote}
+                        try:
+                            adaptacoes_bncc.salvar(
+                                self.db,
+                                [o for o in objetivos if o.get("codigo_bncc") in codigos_lote],
+                                assinatura, perfil_canonico, modelo
+                            )
+                        except Exception as e:
+                            self.db.rollback()
+                            logger.exception(f"[⚠️ REUSO] Erro ao gravar adaptações do lote {lote_numero}: {e}")
                 
-                if resultado.get("objetivos"):
-                    todos_objetivos.extend(resultado["objetivos"])
+                if personalizar and objetivos:
+                    objetivos = await self._personalizar_lote(perfil_resumido, componente, objetivos, lote_numero)
+                
+                if objetivos:
+                    todos_objetivos.extend(objetivos)
                     
                     # CHECKPOINT: Salvar após cada lote processado com sucesso
                     self._salvar_checkpoint_lote(
                         job, componente, lote_numero,
-                        resultado["objetivos"], todos_objetivos
+                        objetivos, todos_objetivos
                     )
                 
-                # Pequena pausa entre lotes
-                await asyncio.sleep(0.5)
+                # Pequena pausa entre lotes que chamaram a IA
+                if not reutilizado or personalizar:
+                    await asyncio.sleep(0.5)
                 self._keep_alive()
             
+            # Mesma ordem das habilidades (reaproveitados vieram antes)
+            ordem = {h["codigo"]: i for i, h in enumerate(habilidades)}
+            todos_objetivos.sort(key=lambda o: ordem.get(o.get("codigo_bncc"), len(ordem)))
+            
             # Salvar resultado do componente
             self._salvar_resultado_parcial(job, componente, todos_objetivos)
             resultados_parciais[componente] = {
@@ -1088,53 +1335,44 @@ IMPORTANTE:
         self.db.add(pei)
         self.db.flush()
         
-        # Criar objetivos
-        total_objetivos = 0
+        # Criar objetivos: codigo_bncc -> id pelo catalogo em memoria (sem
+        # query por objetivo) e um INSERT em lote (executemany) para todos.
+        # Antes: um objeto ORM por objetivo + flush/keep-alive (com commit)
+        # a cada 50 - plano de 200 objetivos = centenas de round-trips e
+        # PEI parcialmente salvo se falhasse no meio.
+        catalogo = obter_catalogo(self.db)
+        linhas = []
         for componente, dados in planejamento.get("componentes", {}).items():
             for obj_data in dados.get("objetivos", []):
                 codigo_bncc = obj_data.get("codigo_bncc")
-                
-                curriculo_id = None
-                if codigo_bncc:
-                    curriculo = self.db.query(CurriculoNacional).filter(
-                        CurriculoNacional.codigo_bncc == codigo_bncc
-                    ).first()
-                    if curriculo:
-                        curriculo_id = curriculo.id
-                
+                curriculo = catalogo.habilidade(codigo_bncc) if codigo_bncc else None
                 trimestre = obj_data.get("trimestre", 1)
-                prazo = self._calcular_prazo_trimestre(ano, trimestre)
-                
-                objetivo = PEIObjetivo(
-                    pei_id=pei.id,
-                    area=obj_data.get("area", componente.lower()),
-                    curriculo_nacional_id=curriculo_id,
-                    codigo_bncc=codigo_bncc,
-                    titulo=obj_data.get("titulo", ""),
-                    descricao=obj_data.get("descricao_adaptada", obj_data.get("descricao", "")),
-                    meta_especifica=obj_data.get("meta_especifica", ""),
-                    criterio_medicao=obj_data.get("criterios_avaliacao", [""])[0] if obj_data.get("criterios_avaliacao") else "",
-                    valor_alvo=80,
-                    prazo=prazo,
-                    trimestre=trimestre,
-                    adaptacoes=obj_data.get("adaptacoes"),
-                    estrategias=obj_data.get("estrategias_ensino"),
-                    materiais_recursos=obj_data.get("materiais_recursos"),
-                    criterios_avaliacao=obj_data.get("criterios_avaliacao"),
-                    origem="ia_sugestao",
-                    ia_sugestao_original=obj_data
-                )
-                
-                self.db.add(objetivo)
-                total_objetivos += 1
                 
-                # Commit a cada 50 objetivos para evitar timeout
-                if total_objetivos % 50 == 0:
-                    self.db.flush()
-                    self._keep_alive()
+                linhas.append({
+                    "pei_id": pei.id,
+                    "area": obj_data.get("area", componente.lower()),
+                    "curriculo_nacional_id": curriculo.id if curriculo else None,
+                    "codigo_bncc": codigo_bncc,
+                    "titulo": obj_data.get("titulo", ""),
+                    "descricao": obj_data.get("descricao_adaptada", obj_data.get("descricao", "")),
+                    "meta_especifica": obj_data.get("meta_especifica", ""),
+                    "criterio_medicao": obj_data.get("criterios_avaliacao", [""])[0] if obj_data.get("criterios_avaliacao") else "",
+                    "valor_alvo": 80,
+                    "prazo": self._calcular_prazo_trimestre(ano, trimestre),
+                    "trimestre": trimestre,
+                    "adaptacoes": obj_data.get("adaptacoes"),
+                    "estrategias": obj_data.get("estrategias_ensino"),
+                    "materiais_recursos": obj_data.get("materiais_recursos"),
+                    "criterios_avaliacao": obj_data.get("criterios_avaliacao"),
+                    "origem": "ia_sugestao",
+                    "ia_sugestao_original": obj_data,
+                })
+        
+        if linhas:
+            self.db.execute(insert(PEIObjetivo), linhas, execution_options={"render_nulls": True})
         
         self.db.commit()
-        self.db.refresh(pei)
+        logger.info("Planejamento completo salvo", extra={"pei_id": pei.id, "objetivos": len(linhas)})
         
         # Atualizar job se fornecido
         if job_id:
@@ -1145,74 +1383,6 @@ IMPORTANTE:
         
         return pei
     
-    def _limpar_json(self, text: str) -> str:
-        """Remove marcadores de código do texto"""
-        if text.startswith("```json"):
-            text = text[7:]
-        if text.startswith("```"):
-            text = text[3:]
-        if text.endswith("```"):
-            text = text[:-3]
-        return text.strip()
-    
-    def _validar_e_extrair_json(self, response_text: str, habilidades: List[Dict]) -> Dict[str, Any]:
-        """
-        Validação ROBUSTA de JSON retornado pela IA.
-        Tenta múltiplas estratégias para extrair dados válidos.
-        """
-        
-        # Estratégia 1: Parse direto do JSON limpo
-        try:
-            texto_limpo = self._limpar_json(response_text)
-            resultado = json.loads(texto_limpo)
-            
-            # Validar estrutura básica
-            if self._validar_estrutura_objetivos(resultado, habilidades):
-                return resultado
-            
-            logger.warning(f"[⚠️ JSON] Estrutura inválida, tentando recuperação...")
-        except json.JSONDecodeError as e:
-            logger.exception(f"[⚠️ JSON] Parse falhou: {e}. Tentando recuperação...")
-        
-        # Estratégia 2: Encontrar JSON dentro do texto com regex
-        try:
-            # Procurar por {"objetivos": [...]} no texto
-            json_match = re.search(r'\{\s*["\']objetivos["\']\s*:\s*\[.*\]\s*\}', response_text, re.DOTALL)
-            if json_match:
-                resultado = json.loads(json_match.group())
-                if self._validar_estrutura_objetivos(resultado, habilidades):
-                    logger.info(f"[✅ JSON] Recuperado via regex (padrão 1)")
-                    return resultado
-        except Exception as e:
-            logger.exception(f"[⚠️ JSON] Regex padrão 1 falhou: {e}")
-        
-        # Estratégia 3: Extrair array de objetivos diretamente
-        try:
-            # Procurar por array de objetivos
-            array_match = re.search(r'\[\s*\{.*?"codigo_bncc".*?\}\s*\]', response_text, re.DOTALL)
-            if array_match:
-                objetivos = json.loads(array_match.group())
-                resultado = {"objetivos": objetivos}
-                if self._validar_estrutura_objetivos(resultado, habilidades):
-                    logger.info(f"[✅ JSON] Recuperado via regex (array direto)")
-                    return resultado
-        except Exception as e:
-            logger.exception(f"[⚠️ JSON] Regex array falhou: {e}")
-        
-        # Estratégia 4: Consertar JSON com problemas comuns
-        try:
-            texto_consertado = self._consertar_json(response_text)
-            resultado = json.loads(texto_consertado)
-            if self._validar_estrutura_objetivos(resultado, habilidades):
-                logger.info(f"[✅ JSON] Recuperado após conserto")
-                return resultado
-        except Exception as e:
-            logger.exception(f"[⚠️ JSON] Conserto falhou: {e}")
-        
-        # Estratégia 5: Gerar objetivos mínimos de fallback
-        logger.info(f"[🔄 FALLBACK] Gerando objetivos mínimos para {len(habilidades)} habilidades")
-        return self._gerar_objetivos_fallback(habilidades)
-    
     def _validar_estrutura_objetivos(self, resultado: Dict, habilidades: List[Dict]) -> bool:
         """
         Valida se o resultado tem estrutura correta e quantidade mínima de objetivos.
@@ -1242,33 +1412,6 @@ IMPORTANTE:
         
         return True
     
-    def _consertar_json(self, texto: str) -> str:
-        """
-        Tenta consertar problemas comuns em JSON malformado.
-        """
-        # Remover texto antes/depois do JSON
-        texto = self._limpar_json(texto)
-        
-        # Encontrar início e fim do JSON
-        inicio = texto.find('{')
-        fim = texto.rfind('}')
-        if inicio != -1 and fim != -1:
-            texto = texto[inicio:fim+1]
-        
-        # Consertar vírgulas extras
-        texto = re.sub(r',\s*}', '}', texto)
-        texto = re.sub(r',\s*]', ']', texto)
-        
-        # Consertar aspas simples para duplas
-        # Cuidado: não substituir aspas dentro de strings
-        texto = re.sub(r"(?<![\w])'([^']*)'(?![\w])", r'"\1"', texto)
-        
-        # Remover comentários
-        texto = re.sub(r'//.*?\n', '\n', texto)
-        texto = re.sub(r'/\*.*?\*/', '', texto, flags=re.DOTALL)
-        
-        return texto
-    
     def _gerar_objetivos_fallback(self, habilidades: List[Dict]) -> Dict[str, Any]:
         """
         Gera objetivos mínimos quando a IA falha completamente.
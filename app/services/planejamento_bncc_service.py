@@ -4,14 +4,16 @@
 # Versão com suporte a processamento em background
 
 import json
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Sequence
 from datetime import datetime, date, timedelta
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
 from app.core.logging_config import get_logger
 from app.models.student import Student
-from app.models.curriculo import CurriculoNacional, MapeamentoPrerequisitos
+from app.services.bncc_catalogo import HabilidadeBNCC, PrerequisitoBNCC, obter_catalogo
+from app.services.ia_estruturada import RespostaIAInvalida, extrair_json
 from app.models.pei import PEI, PEIObjetivo
 from app.models.relatorio import Relatorio
 
@@ -50,29 +52,17 @@ class PlanejamentoBNNCService:
         componente: Optional[str] = None,
         trimestre: Optional[int] = None,
         limit: int = 100
-    ) -> List[CurriculoNacional]:
+    ) -> Sequence[HabilidadeBNCC]:
         """
-        Busca habilidades da BNCC por filtros
+        Busca habilidades da BNCC por filtros (catalogo em memoria)
         """
-        query = self.db.query(CurriculoNacional).filter(
-            CurriculoNacional.ano_escolar == ano_escolar
-        )
-        
-        if componente:
-            query = query.filter(CurriculoNacional.componente == componente)
-        
-        if trimestre:
-            query = query.filter(CurriculoNacional.trimestre_sugerido == trimestre)
-        
-        return query.limit(limit).all()
+        return obter_catalogo(self.db).habilidades(ano_escolar, componente, trimestre)[:limit]
     
-    def buscar_prerequisitos(self, codigo_bncc: str) -> List[MapeamentoPrerequisitos]:
+    def buscar_prerequisitos(self, codigo_bncc: str) -> Sequence[PrerequisitoBNCC]:
         """
-        Busca os pré-requisitos de uma habilidade
+        Busca os pré-requisitos de uma habilidade (catalogo em memoria)
         """
-        return self.db.query(MapeamentoPrerequisitos).filter(
-            MapeamentoPrerequisitos.habilidade_codigo == codigo_bncc
-        ).all()
+        return obter_catalogo(self.db).prerequisitos(codigo_bncc)
     
     def obter_perfil_aluno(self, student_id: int) -> Dict[str, Any]:
         """
@@ -205,12 +195,9 @@ class PlanejamentoBNNCService:
             
             response_text = message.content[0].text.strip()
             
-            # Limpar e parsear resposta
-            response_text = self._limpar_json(response_text)
-            
             update_progress(90, "Validando planejamento gerado...")
             
-            planejamento = json.loads(response_text)
+            planejamento = extrair_json(response_text)
             
             # Validar estrutura
             if "objetivos" not in planejamento or len(planejamento.get("objetivos", [])) == 0:
@@ -224,7 +211,7 @@ class PlanejamentoBNNCService:
                 "planejamento": planejamento
             }
             
-        except json.JSONDecodeError as e:
+        except RespostaIAInvalida as e:
             return {
                 "success": False,
                 "error": f"Erro ao processar resposta da IA: {str(e)}",
@@ -303,8 +290,7 @@ class PlanejamentoBNNCService:
             
             update_progress(85, "Processando resposta...")
             
-            response_text = self._limpar_json(message.content[0].text.strip())
-            objetivos = json.loads(response_text)
+            objetivos = extrair_json(message.content[0].text)
             
             update_progress(95, "Finalizando...")
             
@@ -352,46 +338,40 @@ class PlanejamentoBNNCService:
         self.db.add(pei)
         self.db.flush()  # Para obter o ID
         
-        # Criar objetivos
+        # Criar objetivos (codigo_bncc -> id pelo catalogo em memoria e um
+        # INSERT em lote para todos, em vez de um objeto ORM por objetivo)
         if "objetivos" in planejamento:
+            catalogo = obter_catalogo(self.db)
+            linhas = []
             for obj_data in planejamento["objetivos"]:
-                # Buscar currículo nacional correspondente
-                curriculo_id = None
                 codigo_bncc = obj_data.get("codigo_bncc")
-                
-                if codigo_bncc:
-                    curriculo = self.db.query(CurriculoNacional).filter(
-                        CurriculoNacional.codigo_bncc == codigo_bncc
-                    ).first()
-                    if curriculo:
-                        curriculo_id = curriculo.id
+                curriculo = catalogo.habilidade(codigo_bncc) if codigo_bncc else None
                 
                 # Calcular prazo baseado no trimestre
                 trimestre = obj_data.get("trimestre", 1)
-                prazo = self._calcular_prazo_trimestre(ano, trimestre)
-                
-                objetivo = PEIObjetivo(
-                    pei_id=pei.id,
-                    area=obj_data.get("area", "outro"),
-                    curriculo_nacional_id=curriculo_id,
-                    codigo_bncc=codigo_bncc,
-                    titulo=obj_data.get("titulo", ""),
-                    descricao=obj_data.get("descricao", ""),
-                    meta_especifica=obj_data.get("meta_especifica", ""),
-                    criterio_medicao=obj_data.get("criterio_sucesso", ""),
-                    valor_alvo=obj_data.get("valor_alvo", 80),
-                    prazo=prazo,
-                    trimestre=trimestre,
-                    adaptacoes=obj_data.get("adaptacoes"),
-                    estrategias=obj_data.get("estrategias_ensino"),
-                    materiais_recursos=obj_data.get("materiais_recursos"),
-                    criterios_avaliacao=obj_data.get("criterios_avaliacao"),
-                    origem="ia_sugestao",
-                    ia_sugestao_original=obj_data,
-                    justificativa=obj_data.get("justificativa")
-                )
                 
-                self.db.add(objetivo)
+                linhas.append({
+                    "pei_id": pei.id,
+                    "area": obj_data.get("area", "outro"),
+                    "curriculo_nacional_id": curriculo.id if curriculo else None,
+                    "codigo_bncc": codigo_bncc,
+                    "titulo": obj_data.get("titulo", ""),
+                    "descricao": obj_data.get("descricao", ""),
+                    "meta_especifica": obj_data.get("meta_especifica", ""),
+                    "criterio_medicao": obj_data.get("criterio_sucesso", ""),
+                    "valor_alvo": obj_data.get("valor_alvo", 80),
+                    "prazo": self._calcular_prazo_trimestre(ano, trimestre),
+                    "trimestre": trimestre,
+                    "adaptacoes": obj_data.get("adaptacoes"),
+                    "estrategias": obj_data.get("estrategias_ensino"),
+                    "materiais_recursos": obj_data.get("materiais_recursos"),
+                    "criterios_avaliacao": obj_data.get("criterios_avaliacao"),
+                    "origem": "ia_sugestao",
+                    "ia_sugestao_original": obj_data,
+                    "justificativa": obj_data.get("justificativa"),
+                })
+            if linhas:
+                self.db.execute(insert(PEIObjetivo), linhas, execution_options={"render_nulls": True})
         
         self.db.commit()
         self.db.refresh(pei)
@@ -557,16 +537,6 @@ Gere 2 a 4 objetivos SMART adaptados ao perfil do aluno.
 }}
 
 Retorne APENAS o JSON."""
-
-    def _limpar_json(self, text: str) -> str:
-        """Remove marcadores de código do texto"""
-        if text.startswith("```json"):
-            text = text[7:]
-        if text.startswith("```"):
-            text = text[3:]
-        if text.endswith("```"):
-            text = text[:-3]
-        return text.strip()
     
     def _calcular_prazo_trimestre(self, ano: int, trimestre: int) -> date:
         """Calcula a data limite de um trimestre"""
@@ -4,9 +4,43 @@ Integração com Claude API da Anthropic
 """
 import anthropic
 import json
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, ConfigDict
 from app.core.config import settings
 from app.models.prova import TipoQuestao, DificuldadeQuestao
+from app.services.ia_estruturada import gerar_estruturado
+
+
+class QuestaoIA(BaseModel):
+    """Questão gerada pela IA."""
+    model_config = ConfigDict(extra="allow")
+    
+    numero: int
+    enunciado: str
+    tipo: Optional[str] = None
+    dificuldade: Optional[str] = None
+    opcoes: Optional[List[str]] = None
+    resposta_correta: Optional[str] = None
+    explicacao: Optional[str] = None
+    tags: Optional[List[str]] = None
+
+
+class QuestoesIA(BaseModel):
+    """Registra as questões geradas."""
+    questoes: List[QuestaoIA]
+
+
+class AnaliseDesempenhoIA(BaseModel):
+    """Registra a análise pedagógica do desempenho do aluno."""
+    model_config = ConfigDict(extra="allow")
+    
+    pontos_fortes: List[str] = []
+    pontos_melhoria: List[str] = []
+    conceitos_dominados: List[str] = []
+    conceitos_revisar: List[str] = []
+    recomendacoes: List[str] = []
+    adaptacoes_sugeridas: List[str] = []
+    nivel_compreensao: Optional[int] = None
 
 
 class ProvaAIService:
@@ -59,23 +93,16 @@ class ProvaAIService:
         
         try:
             # Chama Claude API
-            message = self.client.messages.create(
+            resultado = gerar_estruturado(
+                self.client,
+                QuestoesIA,
+                prompt,
                 model=self.model,
                 max_tokens=4000,
                 temperature=0.7,
-                messages=[{
-                    "role": "user",
-                    "content": prompt
-                }]
+                nome="registrar_questoes"
             )
-            
-            # Extrai o conteúdo da resposta
-            resposta = message.content[0].text
-            
-            # Parse do JSON
-            questoes = self._parse_questoes_json(resposta)
-            
-            return questoes
+            return [q.model_dump(exclude_unset=True) for q in resultado.questoes]
             
         except Exception as e:
             print(f"❌ Erro ao gerar questões com IA: {e}")
@@ -154,32 +181,6 @@ Gere as {quantidade} questões agora:"""
         
         return prompt
     
-    def _parse_questoes_json(self, resposta: str) -> List[Dict[str, Any]]:
-        """Parse da resposta JSON de Claude"""
-        try:
-            # Remove possíveis markdown
-            resposta = resposta.strip()
-            if resposta.startswith("```json"):
-                resposta = resposta[7:]
-            if resposta.startswith("```"):
-                resposta = resposta[3:]
-            if resposta.endswith("```"):
-                resposta = resposta[:-3]
-            resposta = resposta.strip()
-            
-            # Parse JSON
-            data = json.loads(resposta)
-            
-            if "questoes" in data:
-                return data["questoes"]
-            else:
-                return data
-                
-        except json.JSONDecodeError as e:
-            print(f"❌ Erro ao fazer parse do JSON: {e}")
-            print(f"Resposta recebida: {resposta[:500]}...")
-            raise Exception("Erro ao processar resposta da IA. Formato JSON inválido.")
-    
     async def analisar_desempenho(
         self,
         questoes: List[Dict],
@@ -237,20 +238,16 @@ Retorne APENAS um JSON válido (sem markdown):
 Gere a análise agora:"""
         
         try:
-            message = self.client.messages.create(
+            analise = gerar_estruturado(
+                self.client,
+                AnaliseDesempenhoIA,
+                prompt,
                 model=self.model,
                 max_tokens=4000,
                 temperature=0.5,
-                messages=[{
-                    "role": "user",
-                    "content": prompt
-                }]
+                nome="registrar_analise"
             )
-            
-            resposta = message.content[0].text
-            analise = self._parse_questoes_json(resposta)
-            
-            return analise
+            return analise.model_dump()
             
         except Exception as e:
             print(f"❌ Erro ao analisar desempenho: {e}")
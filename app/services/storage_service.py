@@ -2,9 +2,12 @@
 Service para gerenciamento de arquivos de materiais no storage
 """
 import json
+import os
 from pathlib import Path
 from typing import Optional, Dict, Any
 
+from app.core.compression import gravar_gz_irmao, remover_gz_irmao
+
 
 class StorageService:
     """Service para gerenciar arquivos de materiais"""
@@ -45,6 +48,8 @@ class StorageService:
         
         with open(file_path, 'w', encoding='utf-8') as f:
             f.write(html_content)
+        # .gz irmao servido direto pelo StaticFiles (sem gzip por request)
+        gravar_gz_irmao(file_path, html_content.encode('utf-8'))
         
         print(f"💾 HTML salvo: {file_path}")
         return f"{material_id}.html"
@@ -62,8 +67,10 @@ class StorageService:
         """
         file_path = self._get_file_path(material_id, "json")
         
+        conteudo = json.dumps(json_data, ensure_ascii=False, indent=2)
         with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(json_data, f, ensure_ascii=False, indent=2)
+            f.write(conteudo)
+        gravar_gz_irmao(file_path, conteudo.encode('utf-8'))
         
         print(f"💾 JSON salvo: {file_path}")
         return f"{material_id}.json"
@@ -122,6 +129,7 @@ class StorageService:
         html_path = self._get_file_path(material_id, "html")
         if html_path.exists():
             html_path.unlink()
+            remover_gz_irmao(html_path)
             print(f"🗑️ HTML deletado: {html_path}")
             deletou_algum = True
         
@@ -129,11 +137,30 @@ class StorageService:
         json_path = self._get_file_path(material_id, "json")
         if json_path.exists():
             json_path.unlink()
+            remover_gz_irmao(json_path)
             print(f"🗑️ JSON deletado: {json_path}")
             deletou_algum = True
         
         return deletou_algum
     
+    def stat(self, material_id: int, tipo: str) -> Optional[os.stat_result]:
+        """
+        Metadados do arquivo (mtime/tamanho) sem ler o conteudo
+        
+        Usado para gerar ETag/Last-Modified do conteudo do material.
+        
+        Args:
+            material_id: ID do material
+            tipo: 'html' ou 'json'
+        
+        Returns:
+            os.stat_result ou None se não encontrado
+        """
+        try:
+            return self._get_file_path(material_id, tipo).stat()
+        except FileNotFoundError:
+            return None
+    
     def existe(self, material_id: int, tipo: str = None) -> bool:
         """
         Verifica se arquivo do material existe
@@ -6,6 +6,8 @@ import json
 from pathlib import Path
 from typing import Dict, Any, Optional
 
+from app.core.compression import gravar_gz_irmao, remover_gz_irmao
+
 # Diretório base de storage
 STORAGE_BASE_DIR = Path(__file__).parent.parent.parent / "storage" / "materiais"
 
@@ -47,6 +49,8 @@ def salvar_conteudo_material(material_id: int, tipo: str, conteudo: str) -> str:
     # Salvar arquivo
     with open(arquivo_completo, 'w', encoding='utf-8') as f:
         f.write(conteudo)
+    # .gz irmao servido direto pelo StaticFiles (sem gzip por request)
+    gravar_gz_irmao(arquivo_completo, conteudo.encode('utf-8'))
     
     print(f"💾 Arquivo salvo: {arquivo_completo}")
     return arquivo_path
@@ -84,6 +88,7 @@ def deletar_arquivo_material(arquivo_path: str) -> bool:
     
     if arquivo_completo.exists():
         arquivo_completo.unlink()
+        remover_gz_irmao(arquivo_completo)
         print(f"🗑️ Arquivo deletado: {arquivo_completo}")
         return True
     
@@ -0,0 +1,38 @@
+"""
+Migration: Contadores de uso mensal por escola (metering dos limites do plano)
+"""
+
+-- Um contador por (escola, recurso, periodo AAAAMM). O consumo e um
+-- UPDATE ... WHERE usado + n <= limite, atomico pelo lock de linha.
+-- sincronizado = valor de usado na ultima reconciliacao com o Redis; a
+-- diferenca usado - sincronizado e o que foi consumido no banco enquanto
+-- o Redis estava fora (a reconciliacao soma isso no Redis).
+CREATE TABLE IF NOT EXISTS uso_mensal (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    escola_id INT NOT NULL,
+    recurso VARCHAR(30) NOT NULL,
+    periodo VARCHAR(6) NOT NULL,
+    usado INT NOT NULL DEFAULT 0,
+    sincronizado INT NOT NULL DEFAULT 0,
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    FOREIGN KEY (escola_id) REFERENCES escolas(id) ON DELETE CASCADE,
+    UNIQUE KEY uq_uso_mensal_escola_recurso_periodo (escola_id, recurso, periodo),
+    INDEX idx_uso_mensal_periodo (periodo)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Semente do mes corrente a partir dos contadores atuais de Assinatura, para
+-- que o deploy nao zere o uso ja feito no mes (o primeiro consumo no Redis
+-- semeia a chave a partir daqui).
+INSERT IGNORE INTO uso_mensal (escola_id, recurso, periodo, usado, sincronizado, updated_at)
+SELECT escola_id, 'provas', DATE_FORMAT(UTC_TIMESTAMP(), '%Y%m'), provas_mes_atual, provas_mes_atual, UTC_TIMESTAMP()
+FROM assinaturas WHERE provas_mes_atual > 0
+UNION ALL
+SELECT escola_id, 'materiais', DATE_FORMAT(UTC_TIMESTAMP(), '%Y%m'), materiais_mes_atual, materiais_mes_atual, UTC_TIMESTAMP()
+FROM assinaturas WHERE materiais_mes_atual > 0
+UNION ALL
+SELECT escola_id, 'peis', DATE_FORMAT(UTC_TIMESTAMP(), '%Y%m'), peis_mes_atual, peis_mes_atual, UTC_TIMESTAMP()
+FROM assinaturas WHERE peis_mes_atual > 0
+UNION ALL
+SELECT escola_id, 'relatorios', DATE_FORMAT(UTC_TIMESTAMP(), '%Y%m'), relatorios_mes_atual, relatorios_mes_atual, UTC_TIMESTAMP()
+FROM assinaturas WHERE relatorios_mes_atual > 0;
@@ -0,0 +1,13 @@
+"""
+Migration: Indices para o dashboard do professor (/professor/analytics/dashboard)
+"""
+
+-- Filtro por criador em todas as queries de analytics do professor.
+CREATE INDEX idx_provas_criado_por ON provas(criado_por_id);
+
+-- Indice de cobertura para os agregados condicionais do dashboard
+-- (COUNT por status, AVG(nota_final), SUM(aprovado)) sobre o join com provas:
+-- o InnoDB responde so pelo indice, sem ler as linhas de provas_alunos
+-- (que carregam analise_ia/feedback_ia em JSON/TEXT).
+CREATE INDEX idx_provas_alunos_prova_status_nota
+    ON provas_alunos(prova_id, status, nota_final, aprovado);
@@ -0,0 +1,33 @@
+"""
+Migration: Rollup de desempenho por aluno (agregados pre-calculados)
+"""
+
+-- Uma linha por (aluno, professor, fonte, materia, habilidade); habilidade ''
+-- e o total da materia. Atualizada na transacao que corrige a prova/aplicacao
+-- (UPDATE col = col + delta). Popular depois de criar:
+--   python -m app.scripts.backfill_performance_rollup
+CREATE TABLE IF NOT EXISTS student_performance_rollup (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    student_id INT NOT NULL,
+    professor_id INT NOT NULL,
+    fonte VARCHAR(20) NOT NULL,
+    materia VARCHAR(100) NOT NULL DEFAULT '',
+    habilidade VARCHAR(100) NOT NULL DEFAULT '',
+    avaliacoes INT NOT NULL DEFAULT 0,
+    avaliacoes_com_nota INT NOT NULL DEFAULT 0,
+    soma_notas DOUBLE NOT NULL DEFAULT 0,
+    nota_maxima DOUBLE NULL,
+    nota_minima DOUBLE NULL,
+    aprovacoes INT NOT NULL DEFAULT 0,
+    reprovacoes INT NOT NULL DEFAULT 0,
+    questoes_total INT NOT NULL DEFAULT 0,
+    questoes_corretas INT NOT NULL DEFAULT 0,
+    ultima_avaliacao_em DATETIME NULL,
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE,
+    FOREIGN KEY (professor_id) REFERENCES users(id),
+    UNIQUE KEY uq_rollup_aluno_professor_fonte_materia_habilidade
+        (student_id, professor_id, fonte, materia, habilidade),
+    INDEX idx_rollup_professor_aluno (professor_id, student_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,13 @@
+"""
+Migration: Indices compostos para paginacao por cursor (keyset)
+"""
+
+-- keyset_response (app/core/pagination.py) ordena por (created_at DESC, id DESC)
+-- e pagina com WHERE (created_at, id) < (?, ?). Com o indice na mesma ordem
+-- o InnoDB faz range scan a partir do cursor, sem filesort nem OFFSET.
+CREATE INDEX idx_background_tasks_created_id ON background_tasks(created_at, id);
+CREATE INDEX idx_ai_cache_created_id ON ai_cache(created_at, id);
+
+-- Logs de um job: igualdade em job_id + ordem de created_at, id.
+CREATE INDEX idx_planejamento_job_logs_job_created_id
+    ON planejamento_job_logs(job_id, created_at, id);
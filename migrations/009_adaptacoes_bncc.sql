@@ -0,0 +1,21 @@
+"""
+Migration: Adaptacoes BNCC reutilizaveis entre alunos com o mesmo perfil
+"""
+
+-- Uma linha por (habilidade, perfil canonico, modelo). Preenchida pelo
+-- planejamento completo (app/services/adaptacoes_bncc.py) a cada objetivo
+-- gerado pela IA; consultada antes de chamar a IA.
+CREATE TABLE IF NOT EXISTS adaptacoes_bncc (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    codigo_bncc VARCHAR(20) NOT NULL,
+    assinatura CHAR(64) NOT NULL,
+    model VARCHAR(100) NOT NULL,
+    perfil_canonico VARCHAR(255) NOT NULL,
+    objetivo JSON NOT NULL,
+    hit_count INT NOT NULL DEFAULT 0,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_hit_at DATETIME NULL,
+
+    UNIQUE KEY uq_adaptacao_bncc_codigo_perfil_modelo (codigo_bncc, assinatura, model),
+    INDEX idx_adaptacao_bncc_perfil (assinatura, model)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,134 @@
+"""
+Benchmark: serializacao de payloads grandes - caminho padrao do FastAPI
+(jsonable_encoder + json.dumps) vs FastJSONResponse (orjson direto).
+
+Payloads sinteticos no formato de:
+  - /materiais-adaptados/historico/{id}   (resultado_json de ~25 materiais)
+  - /planejamento-bncc/pei/{id}/completo  (~200 objetivos)
+  - /relatorios                           (pagina de 100 relatorios)
+
+Uso:
+    python scripts/bench_json.py [repeticoes]
+"""
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core.responses import dumps, orjson
+
+_TEXTO = "Atividade adaptada com linguagem simples, apoio visual e passos curtos. " * 8
+
+
+def _material():
+    return {
+        "id": 1,
+        "student_id": 10,
+        "student_name": "Aluno Exemplo",
+        "disciplina": "Matemática",
+        "serie": "5º ano",
+        "conteudo": "Frações equivalentes",
+        "tipos_material": [f"tipo_{i}" for i in range(25)],
+        "resultado": {
+            f"tipo_{i}": {
+                "titulo": f"Material {i}",
+                "html": "<div class='card'><p>" + _TEXTO + "</p></div>" * 4,
+                "questoes": [{"enunciado": _TEXTO, "opcoes": ["A", "B", "C", "D"], "resposta": "B"} for _ in range(5)],
+            }
+            for i in range(25)
+        },
+        "tempo_geracao": 12.5,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def _pei_completo():
+    objetivos = {
+        t: [
+            {
+                "id": t * 1000 + i,
+                "area": "Matemática",
+                "codigo_bncc": f"EF05MA{i:02d}",
+                "titulo": f"Objetivo {i}",
+                "descricao": _TEXTO,
+                "meta_especifica": _TEXTO[:200],
+                "valor_alvo": 80.0,
+                "valor_atual": 35.5,
+                "status": "em_andamento",
+                "adaptacoes": [_TEXTO[:120]] * 4,
+                "estrategias": [_TEXTO[:120]] * 4,
+                "materiais_recursos": [_TEXTO[:80]] * 3,
+                "criterios_avaliacao": [_TEXTO[:80]] * 3,
+                "prazo": datetime(2026, 12, 1).date(),
+            }
+            for i in range(50)
+        ]
+        for t in (1, 2, 3, 4)
+    }
+    return {
+        "pei": {"id": 1, "ano_letivo": 2026, "status": "ativo", "created_at": datetime.now(timezone.utc)},
+        "aluno": {"id": 10, "nome": "Aluno Exemplo", "serie": "5º ano"},
+        "objetivos_por_trimestre": objetivos,
+        "total_objetivos": 200,
+    }
+
+
+def _relatorios():
+    items = [
+        {
+            "id": i,
+            "student_id": 10,
+            "tipo": "Laudo neurológico",
+            "profissional_nome": "Dra. Exemplo",
+            "data_emissao": datetime(2026, 1, 15),
+            "cid": "F84.0",
+            "resumo": _TEXTO,
+            "dados_extraidos": {"condicoes_identificadas": {"tea": True, "nivel": 1}, "texto": _TEXTO},
+            "created_at": datetime.now(timezone.utc),
+            "updated_at": None,
+            "processando": False,
+        }
+        for i in range(100)
+    ]
+    return {"items": items, "meta": {"page": 1, "size": 100, "total": 500}, "relatorios": items}
+
+
+def _padrao_fastapi(payload) -> bytes:
+    # Mesmo caminho do JSONResponse do Starlette apos o jsonable_encoder
+    return json.dumps(
+        jsonable_encoder(payload), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def _medir(fn, payload, repeticoes: int) -> float:
+    fn(payload)
+    start = time.perf_counter()
+    for _ in range(repeticoes):
+        fn(payload)
+    return (time.perf_counter() - start) / repeticoes * 1000
+
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    print(f"orjson disponivel: {orjson is not None}  |  {repeticoes} repeticoes\n")
+    for nome, payload in [
+        ("historico material", _material()),
+        ("pei completo", _pei_completo()),
+        ("relatorios (100)", _relatorios()),
+    ]:
+        tamanho_kb = len(dumps(payload)) / 1024
+        antes = _medir(_padrao_fastapi, payload, repeticoes)
+        depois = _medir(dumps, payload, repeticoes)
+        print(
+            f"  {nome:<20} {tamanho_kb:7.0f} KB  "
+            f"jsonable_encoder+json {antes:7.2f} ms  orjson {depois:6.2f} ms  ({antes / depois:4.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Microbenchmark: overhead por request dos middlewares de request tracking
+e security headers - versao BaseHTTPMiddleware (antiga) vs ASGI pura (atual).
+
+Chama a app ASGI direto (sem servidor, sem rede), entao o numero medido e
+so o custo da pilha de middlewares + roteamento do Starlette.
+
+Uso:
+    python scripts/bench_middlewares.py [n_requests]
+"""
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("SECRET_KEY", "bench-secret-key-only-for-local-benchmark-use")
+
+from starlette.applications import Starlette
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from app.core.request_tracking import RequestTrackingMiddleware
+from app.core.security_headers import (
+    _HEADERS_SEMPRE,
+    _PATHS_SEM_FRAME_OPTIONS,
+    SecurityHeadersMiddleware,
+)
+
+
+# Copia das versoes BaseHTTPMiddleware anteriores (referencia do "antes")
+class _LegacyRequestTracking(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())[:8]
+        request.state.request_id = request_id
+        response = await call_next(request)
+        response.headers["X-Request-ID"] = request_id
+        return response
+
+
+class _LegacySecurityHeaders(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        response = await call_next(request)
+        for k, v in _HEADERS_SEMPRE.items():
+            response.headers.setdefault(k, v)
+        if not any(request.url.path.startswith(p) for p in _PATHS_SEM_FRAME_OPTIONS):
+            response.headers.setdefault("X-Frame-Options", "DENY")
+        return response
+
+
+async def _endpoint(request):
+    return JSONResponse({"ok": True})
+
+
+def _make_app(tracking, headers, **headers_kwargs):
+    app = Starlette(routes=[Route("/api/v1/coisa", _endpoint)])
+    if tracking is not None:
+        app.add_middleware(tracking)
+    if headers is not None:
+        app.add_middleware(headers, **headers_kwargs)
+    return app
+
+
+async def _run(app, n: int) -> float:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/api/v1/coisa",
+        "raw_path": b"/api/v1/coisa",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 1234),
+        "server": ("bench", 80),
+    }
+
+    async def request():
+        # Simula o servidor: entrega o corpo uma vez e so sinaliza
+        # http.disconnect depois que a resposta terminou de ser enviada
+        # (BaseHTTPMiddleware fica escutando disconnect durante a resposta).
+        entregue = False
+        resposta_enviada = asyncio.Event()
+
+        async def receive():
+            nonlocal entregue
+            if not entregue:
+                entregue = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await resposta_enviada.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                resposta_enviada.set()
+
+        await app(dict(scope), receive, send)
+
+    # Aquecimento
+    for _ in range(200):
+        await request()
+
+    start = time.perf_counter()
+    for _ in range(n):
+        await request()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def main():
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    cenarios = [
+        ("sem middleware", _make_app(None, None)),
+        ("BaseHTTPMiddleware (antes)", _make_app(_LegacyRequestTracking, _LegacySecurityHeaders)),
+        ("ASGI puro (agora)", _make_app(RequestTrackingMiddleware, SecurityHeadersMiddleware, is_production=False)),
+    ]
+
+    resultados = {nome: asyncio.run(_run(app, n)) for nome, app in cenarios}
+    base = resultados["sem middleware"]
+    print(f"{n} requests por cenario\n")
+    for nome, us in resultados.items():
+        print(f"  {nome:<28} {us:8.1f} us/request  (overhead {us - base:7.1f} us)")
+
+
+if __name__ == "__main__":
+    main()
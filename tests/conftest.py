@@ -2,6 +2,10 @@
 Conftest - fixtures compartilhadas entre testes.
 """
 import os
+import threading
+import time
+from types import SimpleNamespace
+
 import pytest
 
 # Marca ambiente como teste ANTES de qualquer import do app
@@ -20,3 +24,142 @@ def setup_logging_silent():
     logging.disable(logging.CRITICAL)
     yield
     logging.disable(logging.NOTSET)
+
+
+@pytest.fixture
+def db_session():
+    """
+    Sessao SQLAlchemy em SQLite em memoria com todas as tabelas do app.
+    Para testar rotas/queries chamando as funcoes direto (sem MySQL).
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    import app.models  # noqa: F401 - registra todos os modelos no metadata
+    from app.database import Base
+
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine, autocommit=False, autoflush=False)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def professor(db_session):
+    """Usuario professor gravado no db_session."""
+    from app.models.user import User
+
+    professor = User(name="Prof", email="prof@x.com", hashed_password="x")
+    db_session.add(professor)
+    db_session.commit()
+    return professor
+
+
+@pytest.fixture
+def professor_aluno(db_session, professor):
+    """(professor, aluno "Ana" do 5º ano criado por ele), gravados no db_session."""
+    from app.models.student import Student
+
+    aluno = Student(name="Ana", grade_level="5º ano", created_by_user_id=professor.id)
+    db_session.add(aluno)
+    db_session.commit()
+    return professor, aluno
+
+
+class ClienteIAFalso:
+    """
+    Imita client.messages.create do SDK da Anthropic (sincrono, thread-safe).
+
+    Cada chamada responde com `responder(prompt, **kwargs)` ou, sem ele, com
+    o proximo item de `respostas`. A resposta pode ser:
+        - dict: bloco tool_use com esse input (ferramenta do tool_choice)
+        - str: bloco de texto
+        - bloco pronto (SimpleNamespace com type=...)
+        - tupla (resposta, stop_reason)
+    Guarda os kwargs de cada chamada (`chamadas`), o primeiro prompt de
+    cada uma (`prompts`) e o pico de chamadas simultaneas; `espera` segura
+    cada chamada (testes de concorrencia).
+    """
+
+    def __init__(self, *respostas, responder=None, espera=0.0, stop_reason="tool_use"):
+        self.messages = self
+        self.respostas = list(respostas)
+        self.responder = responder
+        self.espera = espera
+        self.stop_reason = stop_reason
+        self.chamadas = []
+        self.prompts = []
+        self.simultaneas = 0
+        self.max_simultaneas = 0
+        self._lock = threading.Lock()
+
+    def create(self, **kwargs):
+        prompt = kwargs["messages"][0]["content"]
+        with self._lock:
+            self.chamadas.append(kwargs)
+            self.prompts.append(prompt)
+            self.simultaneas += 1
+            self.max_simultaneas = max(self.max_simultaneas, self.simultaneas)
+            resposta = self.responder(prompt, **kwargs) if self.responder else self.respostas.pop(0)
+        time.sleep(self.espera)
+        with self._lock:
+            self.simultaneas -= 1
+
+        stop_reason = self.stop_reason
+        if isinstance(resposta, tuple):
+            resposta, stop_reason = resposta
+        if isinstance(resposta, dict):
+            nome = (kwargs.get("tool_choice") or {}).get("name", "registrar")
+            resposta = SimpleNamespace(type="tool_use", name=nome, id=f"tu_{len(self.chamadas)}", input=resposta)
+        elif isinstance(resposta, str):
+            resposta = SimpleNamespace(type="text", text=resposta)
+        return SimpleNamespace(
+            content=[resposta],
+            stop_reason=stop_reason,
+            usage=SimpleNamespace(input_tokens=100, output_tokens=50),
+        )
+
+
+@pytest.fixture
+def cliente_ia():
+    """Fabrica de ClienteIAFalso: cliente_ia(*respostas, responder=..., espera=...)."""
+    return ClienteIAFalso
+
+
+@pytest.fixture
+def sem_n_mais_1(db_session):
+    """
+    Detector de N+1: para cada n em `tamanhos`, chama `popular(n)` (que
+    ACRESCENTA n linhas ao resultado), faz commit e conta as queries de
+    `executar()` com app.core.query_counter. Falha se a contagem variar com
+    o volume. Retorna as contagens (para asserts extras).
+
+        def test_lista(db_session, sem_n_mais_1):
+            sem_n_mais_1(popular=lambda n: ..., executar=lambda: listar(...))
+    """
+    from app.core.query_counter import contar_queries
+
+    def verificar(popular, executar, tamanhos=(1, 5)):
+        contagens = []
+        ultimas = []
+        for n in tamanhos:
+            popular(n)
+            db_session.commit()
+            with contar_queries() as contador:
+                executar()
+            contagens.append(contador.total)
+            ultimas = contador.statements
+        assert len(set(contagens)) == 1, (
+            f"N+1: queries por volume {dict(zip(tamanhos, contagens))}. "
+            f"Statements da ultima execucao: {ultimas}"
+        )
+        return contagens
+
+    return verificar
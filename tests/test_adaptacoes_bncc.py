@@ -0,0 +1,171 @@
+"""
+Testes do reuso de adaptacoes BNCC entre alunos (app/services/adaptacoes_bncc.py
+e planejamento completo), SQLite.
+"""
+import asyncio
+import re
+
+import pytest
+from sqlalchemy import false, select
+
+from app.core.config import settings
+from app.models.adaptacao_bncc import AdaptacaoBNCC
+from app.models.curriculo import CurriculoNacional
+from app.models.student import Student
+from app.services import adaptacoes_bncc, bncc_catalogo
+from app.services.planejamento_bncc_completo_service import PlanejamentoBNNCCompletoService
+
+
+def _perfil(diagnosticos, ano="5º ano"):
+    return {"ano_escolar": ano, "diagnosticos": diagnosticos}
+
+
+def _responder(prompt, tool_choice, **kwargs):
+    """Gera um objetivo por habilidade do prompt; personalizacao ajusta a primeira."""
+    if tool_choice["name"] == "registrar_personalizacao":
+        codigo = re.search(r'"codigo_bncc": "(\w+)"', prompt).group(1)
+        return {"personalizacoes": [
+            {"codigo_bncc": codigo, "adaptacoes": ["Usar o interesse por dinossauros"]},
+        ]}
+    codigos = re.findall(r"- \[(\w+)\] T", prompt)
+    return {"objetivos": [
+        {"codigo_bncc": c, "titulo": f"Objetivo {c}", "adaptacoes": ["Genérica"]} for c in codigos
+    ]}
+
+
+@pytest.fixture
+def cenario(db_session, professor_aluno, monkeypatch):
+    monkeypatch.setattr(bncc_catalogo, "_catalogo", None)
+    monkeypatch.setattr(bncc_catalogo, "_verificado_em", 0.0)
+    monkeypatch.setattr(settings, "BNCC_REUSO_ADAPTACOES", True)
+    db = db_session
+    professor, ana = professor_aluno
+    ana.diagnosis = {"TEA": {"nivel": "Nível 1"}, "tdah": True}
+    db.add_all([
+        CurriculoNacional(codigo_bncc=f"EF05MA{i:02d}", ano_escolar="5º ano", componente="Matemática",
+                          habilidade_descricao=f"Habilidade {i}", trimestre_sugerido=1 + i % 3)
+        for i in range(1, 6)
+    ])
+    bia = Student(name="Bia", grade_level="5º ano", created_by_user_id=professor.id,
+                  diagnosis={"autismo": "nivel 1", "TDAH": "sim", "dislexia": False})
+    db.add(bia)
+    db.commit()
+    return db, professor, [ana, bia]
+
+
+def _gerar(db, professor, aluno, cliente, **kwargs):
+    service = PlanejamentoBNNCCompletoService(db)
+    service.client = cliente
+    # SELECT ... FOR UPDATE NOWAIT e so do MySQL
+    service.verificar_job_em_andamento = lambda student_id, ano_letivo: None
+    return asyncio.run(service.gerar_planejamento_completo(
+        aluno.id, "2026", componentes=["Matemática"], user_id=professor.id, **kwargs
+    ))
+
+
+def _objetivos(resultado):
+    return resultado["planejamento"]["componentes"]["Matemática"]["objetivos"]
+
+
+class TestPerfilCanonico:
+    def test_perfis_equivalentes(self):
+        a = _perfil({"TEA": {"nivel": "Nível 1"}, "tdah": True})
+        b = _perfil({"autismo": "leve", "TDAH": "sim", "dislexia": False, "outro": None})
+        assert adaptacoes_bncc.perfil_canonico(a) == "5_ano|tdah,tea:1"
+        assert adaptacoes_bncc.assinatura_perfil(a) == adaptacoes_bncc.assinatura_perfil(b)
+
+    def test_nivel_e_ano_diferenciam(self):
+        base = adaptacoes_bncc.assinatura_perfil(_perfil({"tea": {"nivel": 1}}))
+        assert adaptacoes_bncc.assinatura_perfil(_perfil({"tea": {"nivel": 2}})) != base
+        assert adaptacoes_bncc.assinatura_perfil(_perfil({"tea": {"nivel": 1}}, ano="6º ano")) != base
+
+    def test_lista_e_texto_livre(self):
+        assert adaptacoes_bncc.condicoes({"condicoes": ["Dislexia", "TDAH"]}) == ["dislexia", "tdah"]
+        # Ano no texto nao vira nivel
+        assert adaptacoes_bncc.condicoes({"tea": "diagnosticado em 2019"}) == ["tea"]
+
+    def test_descricao_sem_dados_individuais(self):
+        texto = adaptacoes_bncc.descrever_perfil(_perfil({"tea": {"nivel": 1}, "tdah": True}))
+        assert "- TDAH" in texto and "- TEA (nível 1)" in texto
+
+
+class TestArmazenamento:
+    def test_salvar_e_buscar(self, db_session):
+        objetivos = [
+            {"codigo_bncc": "EF05MA01", "titulo": "A", "_reutilizado": True},
+            {"codigo_bncc": "EF05MA02", "titulo": "B", "_fallback": True},
+            {"codigo_bncc": "EF05MA03", "titulo": "C", "_personalizado": True},
+        ]
+        assert adaptacoes_bncc.salvar(db_session, objetivos, "s" * 64, "5_ano|tea", "m") == 1
+        assert adaptacoes_bncc.salvar(db_session, objetivos, "s" * 64, "5_ano|tea", "m") == 0
+
+        encontrados = adaptacoes_bncc.buscar(db_session, ["EF05MA01", "EF05MA02"], "s" * 64, "m")
+        assert encontrados == {"EF05MA01": {"codigo_bncc": "EF05MA01", "titulo": "A"}}
+        assert adaptacoes_bncc.buscar(db_session, ["EF05MA01"], "s" * 64, "outro-modelo") == {}
+        assert db_session.query(AdaptacaoBNCC).one().hit_count == 1
+
+    def test_corrida_com_outro_worker(self, db_session, monkeypatch):
+        adaptacoes_bncc.salvar(db_session, [{"codigo_bncc": "EF05MA01"}], "s" * 64, "p", "m")
+        # Simula a linha gravada por outro worker entre o SELECT e o INSERT
+        monkeypatch.setattr(adaptacoes_bncc, "select", lambda *colunas: select(*colunas).where(false()))
+        gravadas = adaptacoes_bncc.salvar(
+            db_session, [{"codigo_bncc": "EF05MA01"}, {"codigo_bncc": "EF05MA02"}], "s" * 64, "p", "m"
+        )
+        assert gravadas == 1
+        assert db_session.query(AdaptacaoBNCC).count() == 2
+
+
+class TestReusoNoPlanejamento:
+    def test_segundo_aluno_nao_chama_ia(self, cenario, cliente_ia):
+        db, professor, (ana, bia) = cenario
+        cliente = cliente_ia(responder=_responder)
+        primeiro = _gerar(db, professor, ana, cliente)
+
+        assert len(cliente.prompts) == 1
+        # Prompt de geracao so com o perfil canonico
+        assert "Ana" not in cliente.prompts[0] and "- TEA (nível 1)" in cliente.prompts[0]
+        assert db.query(AdaptacaoBNCC).count() == 5
+
+        cliente = cliente_ia(responder=_responder)
+        segundo = _gerar(db, professor, bia, cliente)
+        assert cliente.prompts == []
+        codigos = [o["codigo_bncc"] for o in _objetivos(segundo)]
+        assert codigos == [o["codigo_bncc"] for o in _objetivos(primeiro)]
+        assert all(o["_reutilizado"] for o in _objetivos(segundo))
+        assert {a.hit_count for a in db.query(AdaptacaoBNCC)} == {1}
+
+    def test_so_as_que_faltam(self, cenario, cliente_ia):
+        db, professor, (ana, bia) = cenario
+        _gerar(db, professor, ana, cliente_ia(responder=_responder))
+        db.add(CurriculoNacional(codigo_bncc="EF05MA09", ano_escolar="5º ano", componente="Matemática",
+                                 habilidade_descricao="Nova", trimestre_sugerido=3))
+        db.commit()
+        bncc_catalogo.invalidar_catalogo()
+
+        cliente = cliente_ia(responder=_responder)
+        resultado = _gerar(db, professor, bia, cliente)
+        assert len(cliente.prompts) == 1
+        assert re.findall(r"- \[(\w+)\] T", cliente.prompts[0]) == ["EF05MA09"]
+        assert len(_objetivos(resultado)) == 6
+
+    def test_personalizacao(self, cenario, cliente_ia):
+        db, professor, (ana, bia) = cenario
+        _gerar(db, professor, ana, cliente_ia(responder=_responder))
+
+        cliente = cliente_ia(responder=_responder)
+        resultado = _gerar(db, professor, bia, cliente, personalizar=True)
+        assert len(cliente.prompts) == 1
+        assert "ALUNO: Bia" in cliente.prompts[0]
+        personalizados = [o for o in _objetivos(resultado) if o.get("_personalizado")]
+        assert len(personalizados) == 1
+        assert personalizados[0]["adaptacoes"] == ["Usar o interesse por dinossauros"]
+        # O armazenamento continua generico
+        assert {tuple(a.objetivo["adaptacoes"]) for a in db.query(AdaptacaoBNCC)} == {("Genérica",)}
+
+    def test_reuso_desligado(self, cenario, cliente_ia, monkeypatch):
+        db, professor, (ana, _) = cenario
+        monkeypatch.setattr(settings, "BNCC_REUSO_ADAPTACOES", False)
+        cliente = cliente_ia(responder=_responder)
+        _gerar(db, professor, ana, cliente)
+        assert "ALUNO: Ana" in cliente.prompts[0]
+        assert db.query(AdaptacaoBNCC).count() == 0
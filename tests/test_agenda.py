@@ -0,0 +1,58 @@
+"""
+Testes da criacao de eventos recorrentes da agenda (app/api/routes/agenda.py), SQLite.
+"""
+import asyncio
+from datetime import date, time
+
+from app.api.routes.agenda import EventoCreate, criar_evento, datas_recorrencia
+from app.core.query_counter import contar_queries
+from app.models.agenda import AgendaProfessor, Recorrencia, StatusEvento
+
+
+def _criar(db, professor, recorrencia=Recorrencia.DIARIO, fim=date(2026, 3, 10)):
+    dados = EventoCreate(titulo="Atendimento", data=date(2026, 3, 1), hora_inicio=time(14, 0),
+                         recorrencia=recorrencia, recorrencia_fim=fim, cor="#000000")
+    return asyncio.run(criar_evento(dados, db=db, current_user=professor))
+
+
+class TestDatasRecorrencia:
+    def test_semanal_inclui_fim(self):
+        assert datas_recorrencia(date(2026, 3, 1), Recorrencia.SEMANAL, date(2026, 3, 15)) == [
+            date(2026, 3, 8), date(2026, 3, 15),
+        ]
+
+    def test_fim_antes_da_primeira(self):
+        assert datas_recorrencia(date(2026, 3, 1), Recorrencia.MENSAL, date(2026, 3, 20)) == []
+
+
+class TestCriarRecorrentes:
+    def test_filhos_em_lote(self, db_session, professor):
+        r = _criar(db_session, professor)
+        assert r["ocorrencias_criadas"] == 9
+
+        pai = db_session.get(AgendaProfessor, r["evento_id"])
+        filhos = (db_session.query(AgendaProfessor)
+                  .filter(AgendaProfessor.evento_pai_id == pai.id)
+                  .order_by(AgendaProfessor.data).all())
+        assert [f.data.day for f in filhos] == list(range(2, 11))
+        f = filhos[0]
+        assert (f.titulo, f.cor, f.recorrencia, f.status) == (
+            "Atendimento", "#000000", Recorrencia.UNICO, StatusEvento.AGENDADO,
+        )
+        # Defaults das colunas continuam valendo no INSERT em lote
+        assert f.lembrete_minutos == 30 and f.created_at is not None
+
+    def test_queries_nao_crescem_com_ocorrencias(self, db_session, professor):
+        contagens = []
+        for fim in (date(2026, 3, 3), date(2027, 3, 1)):
+            with contar_queries() as contador:
+                r = _criar(db_session, professor, fim=fim)
+            contagens.append(contador.total)
+        assert r["ocorrencias_criadas"] == 365
+        assert contagens[0] == contagens[1]
+
+    def test_sem_returning_busca_ids(self, db_session, professor, monkeypatch):
+        monkeypatch.setattr(db_session.get_bind().dialect, "insert_executemany_returning", False)
+        r = _criar(db_session, professor, recorrencia=Recorrencia.SEMANAL, fim=date(2026, 3, 29))
+        assert r["ocorrencias_criadas"] == 4
+        assert db_session.query(AgendaProfessor).count() == 5
@@ -0,0 +1,81 @@
+"""
+Testes da busca textual BNCC (app/services/bncc_busca.py), sem banco.
+"""
+from app.services.bncc_busca import IndiceBuscaBNCC, normalizar, tokenizar
+from app.services.bncc_catalogo import HabilidadeBNCC
+
+
+def _hab(id_, codigo, ano, componente, descricao, objeto=None):
+    return HabilidadeBNCC(
+        id=id_, codigo_bncc=codigo, ano_escolar=ano, componente=componente,
+        campo_experiencia=None, eixo_tematico=None, habilidade_codigo=None,
+        habilidade_descricao=descricao, objeto_conhecimento=objeto,
+        exemplos_atividades=None, prerequisitos=None, dificuldade=None,
+        trimestre_sugerido=None, created_at=None,
+    )
+
+
+HABILIDADES = [
+    _hab(1, "EF05MA03", "5º ano", "Matemática",
+         "Identificar e representar frações equivalentes.", "Frações equivalentes"),
+    _hab(2, "EF05MA04", "5º ano", "Matemática",
+         "Comparar e ordenar números racionais na forma decimal.", "Números decimais"),
+    _hab(3, "EF04MA09", "4º ano", "Matemática",
+         "Reconhecer as frações unitárias mais usuais (1/2, 1/3, 1/4).", "Frações unitárias"),
+    _hab(4, "EF05LP01", "5º ano", "Língua Portuguesa",
+         "Grafar palavras utilizando regras de correspondência fonema-grafema.", "Ortografia"),
+    _hab(5, "EF05MA10", "5º ano", "Matemática",
+         "Concluir que a relação de igualdade existente entre dois membros permanece.", "Propriedades da igualdade"),
+]
+
+
+def _indice():
+    return IndiceBuscaBNCC(HABILIDADES)
+
+
+def _codigos(resultados):
+    return [h.codigo_bncc for h, _ in resultados]
+
+
+class TestNormalizacao:
+    def test_sem_acento_minusculo(self):
+        assert normalizar("Frações EQUIVALENTES!") == "fracoes equivalentes"
+
+    def test_stopwords_e_plural(self):
+        assert tokenizar("frações de números") == ["fracao", "numero"]
+        assert tokenizar("fração") == ["fracao"]
+        # Palavras curtas nao sao "singularizadas"
+        assert tokenizar("mais") == ["mais"]
+
+
+class TestBusca:
+    def test_relevancia_frase(self):
+        resultados = _indice().buscar("frações equivalentes")
+        assert _codigos(resultados)[0] == "EF05MA03"
+        assert "EF04MA09" in _codigos(resultados)
+        scores = [s for _, s in resultados]
+        assert scores == sorted(scores, reverse=True)
+
+    def test_acento_e_singular_indiferentes(self):
+        assert _codigos(_indice().buscar("fracao equivalente"))[0] == "EF05MA03"
+
+    def test_prefixo(self):
+        assert "EF05MA04" in _codigos(_indice().buscar("decim"))
+
+    def test_erro_de_digitacao(self):
+        assert _codigos(_indice().buscar("ortografya"))[:1] == ["EF05LP01"]
+
+    def test_codigo_parcial(self):
+        resultados = _codigos(_indice().buscar("EF05MA1"))
+        assert resultados[0] == "EF05MA10"
+        assert set(_codigos(_indice().buscar("ef05ma"))) == {"EF05MA03", "EF05MA04", "EF05MA10"}
+
+    def test_filtros_e_limite(self):
+        resultados = _indice().buscar("frações", ano_escolar="4º ano")
+        assert _codigos(resultados) == ["EF04MA09"]
+        assert _indice().buscar("frações", componente="Língua Portuguesa") == []
+        assert len(_indice().buscar("frações", limite=1)) == 1
+
+    def test_sem_resultado(self):
+        assert _indice().buscar("astronomia") == []
+        assert _indice().buscar("de a o") == []
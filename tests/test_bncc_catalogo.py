@@ -0,0 +1,197 @@
+"""
+Testes do catalogo BNCC em memoria (app/services/bncc_catalogo.py), SQLite.
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.api.dependencies import get_current_active_user
+from app.api.routes.planejamento_bncc import router as planejamento_router
+from app.database import Base, get_db
+from app.models.curriculo import CurriculoNacional, MapeamentoPrerequisitos
+from app.schemas.curriculo import CurriculoNacionalResponse, MapeamentoPrerequisitosResponse
+from app.services import bncc_catalogo
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'bncc.db'}")
+    Base.metadata.create_all(
+        bind=engine, tables=[CurriculoNacional.__table__, MapeamentoPrerequisitos.__table__]
+    )
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine, monkeypatch):
+    monkeypatch.setattr(bncc_catalogo, "_catalogo", None)
+    monkeypatch.setattr(bncc_catalogo, "_verificado_em", 0.0)
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        CurriculoNacional(codigo_bncc="EF05MA02", ano_escolar="5º ano", componente="Matemática",
+                          habilidade_descricao="Frações", trimestre_sugerido=2,
+                          exemplos_atividades=["a", "b"]),
+        CurriculoNacional(codigo_bncc="EF05MA01", ano_escolar="5º ano", componente="Matemática",
+                          habilidade_descricao="Números", trimestre_sugerido=1),
+        CurriculoNacional(codigo_bncc="EF05LP01", ano_escolar="5º ano", componente="Língua Portuguesa",
+                          habilidade_descricao="Leitura", trimestre_sugerido=None),
+        CurriculoNacional(codigo_bncc="EF04MA01", ano_escolar="4º ano", componente="Matemática",
+                          habilidade_descricao="Contagem", trimestre_sugerido=1),
+        MapeamentoPrerequisitos(habilidade_codigo="EF05MA01", habilidade_titulo="Números",
+                                ano_escolar="5º ano", prerequisito_codigo="EF04MA01",
+                                prerequisito_titulo="Contagem", ano_prerequisito="4º ano",
+                                essencial=True, peso=0.8),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+def _contar_queries(engine):
+    contador = []
+    event.listen(engine, "before_cursor_execute", lambda *a, **k: contador.append(1))
+    return contador
+
+
+class TestLookups:
+    def test_habilidades_por_ano_e_componente_ordenadas(self, db):
+        catalogo = bncc_catalogo.obter_catalogo(db)
+        codigos = [h.codigo_bncc for h in catalogo.habilidades("5º ano", "Matemática")]
+        assert codigos == ["EF05MA01", "EF05MA02"]
+        assert [h.codigo_bncc for h in catalogo.habilidades("5º ano", trimestre=2)] == ["EF05MA02"]
+        # Sem componente: ordena por componente, trimestre NULL primeiro
+        assert [h.codigo_bncc for h in catalogo.habilidades("5º ano")] == [
+            "EF05LP01", "EF05MA01", "EF05MA02",
+        ]
+
+    def test_por_codigo_componentes_e_anos(self, db):
+        catalogo = bncc_catalogo.obter_catalogo(db)
+        assert catalogo.habilidade("EF05MA02").habilidade_descricao == "Frações"
+        assert catalogo.habilidade("NAO_EXISTE") is None
+        assert catalogo.componentes() == ("Língua Portuguesa", "Matemática")
+        assert catalogo.anos() == ("4º ano", "5º ano")
+        assert sorted(catalogo.componentes_do_ano("5º ano"), key=lambda c: c["componente"]) == [
+            {"componente": "Língua Portuguesa", "total_habilidades": 1},
+            {"componente": "Matemática", "total_habilidades": 2},
+        ]
+
+    def test_prerequisitos(self, db):
+        catalogo = bncc_catalogo.obter_catalogo(db)
+        (p,) = catalogo.prerequisitos("EF05MA01")
+        assert p.prerequisito_codigo == "EF04MA01"
+        assert p.peso == pytest.approx(0.8)
+        assert catalogo.prerequisitos("EF04MA01") == ()
+
+    def test_registros_imutaveis_e_compativeis_com_schemas(self, db):
+        catalogo = bncc_catalogo.obter_catalogo(db)
+        h = catalogo.habilidade("EF05MA02")
+        with pytest.raises(AttributeError):
+            h.codigo_bncc = "X"
+        assert h.exemplos_atividades == ("a", "b")
+        resp = CurriculoNacionalResponse.model_validate(h)
+        assert resp.exemplos_atividades == ["a", "b"]
+        MapeamentoPrerequisitosResponse.model_validate(catalogo.prerequisitos("EF05MA01")[0])
+
+
+class TestVersao:
+    def test_sem_mudanca_nao_recarrega_nem_consulta(self, db, engine, monkeypatch):
+        primeiro = bncc_catalogo.obter_catalogo(db)
+        queries = _contar_queries(engine)
+        assert bncc_catalogo.obter_catalogo(db) is primeiro
+        assert queries == []
+
+        # Apos o TTL: so o carimbo e consultado, catalogo e o mesmo objeto
+        monkeypatch.setattr(bncc_catalogo, "_verificado_em", 0.0)
+        assert bncc_catalogo.obter_catalogo(db) is primeiro
+        assert len(queries) == 2
+
+    def test_insercao_troca_catalogo_apos_ttl(self, db, monkeypatch):
+        antigo = bncc_catalogo.obter_catalogo(db)
+        db.add(CurriculoNacional(codigo_bncc="EF05CI01", ano_escolar="5º ano", componente="Ciências"))
+        db.commit()
+        monkeypatch.setattr(bncc_catalogo, "_verificado_em", 0.0)
+        novo = bncc_catalogo.obter_catalogo(db)
+        assert novo is not antigo
+        assert novo.versao != antigo.versao
+        assert novo.habilidade("EF05CI01") is not None
+        # Snapshot antigo continua integro para quem ainda o segura
+        assert antigo.habilidade("EF05CI01") is None
+
+    def test_update_in_place_troca_versao_apos_ttl(self, db, monkeypatch):
+        antigo = bncc_catalogo.obter_catalogo(db)
+        h = db.query(CurriculoNacional).filter_by(codigo_bncc="EF05MA02").one()
+        h.habilidade_descricao = "Frações equivalentes"
+        db.commit()
+        monkeypatch.setattr(bncc_catalogo, "_verificado_em", 0.0)
+        novo = bncc_catalogo.obter_catalogo(db)
+        assert novo.versao != antigo.versao
+        assert novo.habilidade("EF05MA02").habilidade_descricao == "Frações equivalentes"
+
+    def test_versao_derivada_do_conteudo(self, db, monkeypatch):
+        # Outro worker (ou restart) lendo os mesmos dados chega na mesma versao
+        primeiro = bncc_catalogo.obter_catalogo(db)
+        monkeypatch.setattr(bncc_catalogo, "_catalogo", None)
+        assert bncc_catalogo.obter_catalogo(db).versao == primeiro.versao
+
+    def test_invalidar_forca_reconstrucao(self, db):
+        antigo = bncc_catalogo.obter_catalogo(db)
+        bncc_catalogo.invalidar_catalogo()
+        assert bncc_catalogo.obter_catalogo(db) is not antigo
+
+    def test_memo_calcula_uma_vez_por_versao(self, db):
+        catalogo = bncc_catalogo.obter_catalogo(db)
+        chamadas = []
+        construir = lambda: chamadas.append(1) or "valor"
+        assert catalogo.memo("k", construir) == "valor"
+        assert catalogo.memo("k", construir) == "valor"
+        assert len(chamadas) == 1
+
+    def test_memo_e_limitado(self, db, monkeypatch):
+        monkeypatch.setattr(bncc_catalogo, "MAX_MEMO", 2)
+        catalogo = bncc_catalogo.obter_catalogo(db)
+        catalogo.memo("a", lambda: 1)
+        catalogo.memo("b", lambda: 2)
+        catalogo.memo("a", lambda: 1)  # "a" passa a ser o mais recente
+        catalogo.memo("c", lambda: 3)
+        assert list(catalogo._memo) == ["a", "c"]
+
+
+class TestEtagDasRotas:
+    @pytest.fixture
+    def client(self, db):
+        app = FastAPI()
+        app.include_router(planejamento_router)
+        app.dependency_overrides[get_db] = lambda: db
+        app.dependency_overrides[get_current_active_user] = lambda: object()
+        return TestClient(app)
+
+    def test_update_in_place_troca_etag(self, client, db, monkeypatch):
+        url = "/planejamento/bncc/habilidades?ano_escolar=5º ano&componente=Matemática"
+        primeiro = client.get(url)
+        etag = primeiro.headers["etag"]
+        assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+        # Outro worker/script altera so a descricao (COUNT/MAX iguais)
+        h = db.query(CurriculoNacional).filter_by(codigo_bncc="EF05MA02").one()
+        h.habilidade_descricao = "Frações equivalentes"
+        db.commit()
+        monkeypatch.setattr(bncc_catalogo, "_verificado_em", 0.0)
+
+        segundo = client.get(url, headers={"If-None-Match": etag})
+        assert segundo.status_code == 200
+        assert segundo.headers["etag"] != etag
+        descricoes = [i["habilidade_descricao"] for i in segundo.json()["curriculos"]]
+        assert "Frações equivalentes" in descricoes
+
+    def test_filtro_desconhecido_nao_entra_no_memo(self, client, db):
+        catalogo = bncc_catalogo.obter_catalogo(db)
+        client.get("/planejamento/bncc/habilidades?ano_escolar=9º ano&componente=Matemática")
+        client.get("/planejamento/bncc/habilidades?ano_escolar=5º ano&componente=Xadrez")
+        assert list(catalogo._memo) == []
+
+        resposta = client.get("/planejamento/bncc/habilidades?ano_escolar=5º ano&componente=Matemática")
+        assert resposta.json()["total"] == 2
+        assert list(catalogo._memo) == [("habilidades", "5º ano", "Matemática", None)]
@@ -0,0 +1,114 @@
+"""
+Testes do grafo de pre-requisitos BNCC (app/services/bncc_grafo.py).
+
+Monta o catalogo direto a partir de registros (sem banco).
+"""
+from app.services.bncc_catalogo import CatalogoBNCC, HabilidadeBNCC, PrerequisitoBNCC
+from app.services.bncc_grafo import GrafoPrerequisitos, _ordem_ano
+
+
+def _hab(id_, codigo, ano, componente="Matemática", prerequisitos=None):
+    return HabilidadeBNCC(
+        id=id_, codigo_bncc=codigo, ano_escolar=ano, componente=componente,
+        campo_experiencia=None, eixo_tematico=None, habilidade_codigo=None,
+        habilidade_descricao=None, objeto_conhecimento=None, exemplos_atividades=None,
+        prerequisitos=prerequisitos, dificuldade=None, trimestre_sugerido=None,
+        created_at=None,
+    )
+
+
+def _pre(id_, habilidade, prerequisito):
+    return PrerequisitoBNCC(
+        id=id_, habilidade_codigo=habilidade, habilidade_titulo=None, ano_escolar=None,
+        prerequisito_codigo=prerequisito, prerequisito_titulo=None, ano_prerequisito=None,
+        essencial=True, peso=1.0, created_at=None,
+    )
+
+
+def _grafo():
+    #   EF01MA01 <- EF02MA01 <- EF03MA01 <- EF05MA01
+    #                            EF03LP01 <- EF05MA01   (cadeia cruza componente)
+    #   EF04MA01 <- EF05MA01 (via coluna JSON prerequisitos)
+    habilidades = [
+        _hab(1, "EF01MA01", "1º ano"),
+        _hab(2, "EF02MA01", "2º ano"),
+        _hab(3, "EF03MA01", "3º ano"),
+        _hab(4, "EF03LP01", "3º ano", componente="Língua Portuguesa"),
+        _hab(5, "EF04MA01", "4º ano"),
+        _hab(6, "EF05MA01", "5º ano", prerequisitos=("EF04MA01",)),
+    ]
+    arestas = [
+        _pre(1, "EF02MA01", "EF01MA01"),
+        _pre(2, "EF03MA01", "EF02MA01"),
+        _pre(3, "EF05MA01", "EF03MA01"),
+        _pre(4, "EF05MA01", "EF03LP01"),
+        _pre(5, "EF05MA01", "EF03MA01"),  # duplicada
+    ]
+    return GrafoPrerequisitos.de_catalogo(CatalogoBNCC(habilidades, arestas, "v1"))
+
+
+class TestFecho:
+    def test_todos_prerequisitos_em_ordem_de_ensino(self):
+        g = _grafo()
+        assert g.todos_prerequisitos("EF05MA01") == (
+            "EF01MA01", "EF02MA01", "EF03LP01", "EF03MA01", "EF04MA01",
+        )
+        assert g.prerequisitos_diretos("EF05MA01") == ("EF03LP01", "EF03MA01", "EF04MA01")
+        assert g.todos_prerequisitos("EF01MA01") == ()
+
+    def test_e_prerequisito_transitivo(self):
+        g = _grafo()
+        assert g.e_prerequisito("EF01MA01", de="EF05MA01")
+        assert not g.e_prerequisito("EF05MA01", de="EF01MA01")
+
+    def test_dependentes(self):
+        g = _grafo()
+        assert g.dependentes_diretos("EF01MA01") == ("EF02MA01",)
+        assert g.todos_dependentes("EF01MA01") == ("EF02MA01", "EF03MA01", "EF05MA01")
+
+    def test_codigo_desconhecido(self):
+        g = _grafo()
+        assert "XX" not in g
+        assert g.todos_prerequisitos("XX") == ()
+        assert g.profundidade("XX") == 0
+
+
+class TestOrdem:
+    def test_profundidade_e_maior_cadeia(self):
+        g = _grafo()
+        assert g.profundidade("EF01MA01") == 0
+        assert g.profundidade("EF03MA01") == 2
+        assert g.profundidade("EF05MA01") == 3
+
+    def test_ordem_topologica_respeita_arestas(self):
+        g = _grafo()
+        ordem = g.ordem_topologica()
+        for codigo in ordem:
+            for prereq in g.prerequisitos_diretos(codigo):
+                assert ordem.index(prereq) < ordem.index(codigo)
+
+    def test_filtro_por_componente_e_ano(self):
+        g = _grafo()
+        assert g.ordem_topologica("Língua Portuguesa") == ("EF03LP01",)
+        assert g.ordem_topologica("Matemática", "5º ano") == ("EF05MA01",)
+        assert g.ordem_topologica("Matemática")[0] == "EF01MA01"
+
+    def test_ordenar_codigos_avulsos(self):
+        g = _grafo()
+        assert g.ordenar(["EF05MA01", "ZZ", "EF01MA01"]) == ["EF01MA01", "EF05MA01", "ZZ"]
+
+
+class TestCiclos:
+    def test_ciclo_nao_trava_e_vai_para_o_fim(self):
+        g = GrafoPrerequisitos(
+            [("A", "B"), ("B", "A"), ("C", "R")],
+            {"A": ("X", "2º ano"), "B": ("X", "1º ano"), "C": ("X", "1º ano"), "R": ("X", "1º ano")},
+        )
+        assert g.em_ciclo == frozenset({"A", "B"})
+        assert g.ordem_topologica()[-2:] == ("B", "A")
+        assert g.todos_prerequisitos("A") == ("B",)
+
+
+def test_ordem_ano_ensino_medio_depois_do_fundamental():
+    assert _ordem_ano("9º ano") < _ordem_ano("1ª série") < _ordem_ano("3ª série")
+    assert _ordem_ano(None) == 99
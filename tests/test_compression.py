@@ -0,0 +1,216 @@
+"""
+Testes de app/core/compression.py.
+
+Cobre:
+    - gzip/br negociados por Accept-Encoding
+    - threshold de tamanho e allowlist de Content-Type
+    - SSE, WebSocket e respostas ja codificadas passam intactos
+    - streaming comprimido chunk a chunk
+    - PrecompressedStaticFiles servindo o irmao .gz
+"""
+import gzip
+import os
+
+import pytest
+from fastapi import FastAPI, WebSocket
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.core import compression
+from app.core.compression import (
+    CompressionMiddleware,
+    PrecompressedStaticFiles,
+    aceita_encoding,
+    gravar_gz_irmao,
+    remover_gz_irmao,
+)
+
+GRANDE = {"itens": [{"codigo": f"EF05MA{i:02d}", "descricao": "habilidade " * 10} for i in range(50)]}
+
+
+def _make_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+
+    @app.get("/grande")
+    def grande():
+        return GRANDE
+
+    @app.get("/pequeno")
+    def pequeno():
+        return {"ok": True}
+
+    @app.get("/imagem")
+    def imagem():
+        return Response(b"\x89PNG" + b"0" * 5000, media_type="image/png")
+
+    @app.get("/html")
+    def html():
+        return HTMLResponse("<p>material</p>" * 200)
+
+    @app.get("/sse")
+    def sse():
+        def eventos():
+            for i in range(100):
+                yield f"data: evento {i} com bastante texto repetido\n\n"
+        return StreamingResponse(eventos(), media_type="text/event-stream")
+
+    @app.get("/stream")
+    def stream():
+        def partes():
+            for i in range(50):
+                yield f"linha {i} " * 20 + "\n"
+        return StreamingResponse(partes(), media_type="text/plain")
+
+    @app.get("/ja-codificado")
+    def ja_codificado():
+        corpo = gzip.compress(b"x" * 5000)
+        return Response(corpo, media_type="application/json", headers={"Content-Encoding": "gzip"})
+
+    @app.websocket("/ws")
+    async def ws(websocket: WebSocket):
+        await websocket.accept()
+        await websocket.send_text("x" * 5000)
+        await websocket.close()
+
+    return app
+
+
+@pytest.fixture
+def client():
+    return TestClient(_make_app())
+
+
+class TestAceitaEncoding:
+    def test_token_simples_e_lista(self):
+        assert aceita_encoding("gzip, deflate, br", "gzip")
+        assert aceita_encoding("gzip, deflate, br", "br")
+        assert not aceita_encoding("deflate", "gzip")
+
+    def test_q_zero_recusa(self):
+        assert not aceita_encoding("gzip;q=0, br", "gzip")
+        assert aceita_encoding("gzip; q=0.5", "gzip")
+
+    def test_curinga(self):
+        assert aceita_encoding("*", "gzip")
+
+
+class TestCompressionMiddleware:
+    def test_json_grande_sai_em_gzip(self, client, monkeypatch):
+        monkeypatch.setattr(compression, "brotli", None)
+        r = client.get("/grande", headers={"Accept-Encoding": "gzip"})
+        assert r.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in r.headers["vary"]
+        # TestClient (httpx) descomprime sozinho
+        assert r.json() == GRANDE
+        assert int(r.headers["content-length"]) < len(r.content)
+
+    def test_prefere_brotli_quando_disponivel(self, client):
+        pytest.importorskip("brotli")
+        r = client.get("/grande", headers={"Accept-Encoding": "gzip, br"})
+        assert r.headers["content-encoding"] == "br"
+
+    def test_sem_accept_encoding_nao_comprime(self, client):
+        r = client.get("/grande", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in r.headers
+        assert r.json() == GRANDE
+
+    def test_abaixo_do_minimo_nao_comprime(self, client):
+        r = client.get("/pequeno", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in r.headers
+        assert r.json() == {"ok": True}
+
+    def test_tipo_fora_da_allowlist_nao_comprime(self, client):
+        r = client.get("/imagem", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in r.headers
+        assert len(r.content) == 5004
+
+    def test_html_comprime(self, client):
+        r = client.get("/html", headers={"Accept-Encoding": "gzip"})
+        assert r.headers["content-encoding"] in ("gzip", "br")
+        assert r.text == "<p>material</p>" * 200
+
+    def test_sse_passa_intacto(self, client):
+        r = client.get("/sse", headers={"Accept-Encoding": "gzip, br"})
+        assert "content-encoding" not in r.headers
+        assert r.text.startswith("data: evento 0")
+
+    def test_resposta_ja_codificada_nao_e_recomprimida(self, client):
+        r = client.get("/ja-codificado", headers={"Accept-Encoding": "gzip"})
+        assert r.headers["content-encoding"] == "gzip"
+        assert r.content == b"x" * 5000
+
+    def test_streaming_comprimido_sem_content_length(self, client, monkeypatch):
+        monkeypatch.setattr(compression, "brotli", None)
+        r = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+        assert r.headers["content-encoding"] == "gzip"
+        assert "content-length" not in r.headers
+        assert r.text == "".join(f"linha {i} " * 20 + "\n" for i in range(50))
+
+    def test_websocket_passa_direto(self, client):
+        with client.websocket_connect("/ws") as ws:
+            assert ws.receive_text() == "x" * 5000
+
+
+class TestPrecompressedStaticFiles:
+    @pytest.fixture
+    def static_client(self, tmp_path):
+        conteudo = ("<h1>Material</h1>" * 300).encode()
+        (tmp_path / "1.html").write_bytes(conteudo)
+        gravar_gz_irmao(tmp_path / "1.html", conteudo)
+        (tmp_path / "2.html").write_bytes(conteudo)  # sem .gz (arquivo antigo)
+
+        app = FastAPI()
+        app.mount("/m", PrecompressedStaticFiles(directory=str(tmp_path)))
+        return TestClient(app), tmp_path, conteudo
+
+    def test_serve_irmao_gz_com_tipo_original(self, static_client):
+        client, tmp_path, conteudo = static_client
+        r = client.get("/m/1.html", headers={"Accept-Encoding": "gzip"})
+        assert r.status_code == 200
+        assert r.headers["content-encoding"] == "gzip"
+        assert r.headers["content-type"].startswith("text/html")
+        assert int(r.headers["content-length"]) == os.path.getsize(tmp_path / "1.html.gz")
+        assert r.content == conteudo
+
+    def test_cliente_sem_gzip_recebe_original(self, static_client):
+        client, _, conteudo = static_client
+        r = client.get("/m/1.html", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in r.headers
+        assert r.content == conteudo
+        assert "Accept-Encoding" in r.headers["vary"]
+
+    def test_sem_irmao_serve_original(self, static_client):
+        client, _, conteudo = static_client
+        r = client.get("/m/2.html", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in r.headers
+        assert r.content == conteudo
+
+    def test_gz_mais_velho_que_original_e_ignorado(self, static_client):
+        client, tmp_path, _ = static_client
+        gz = tmp_path / "1.html.gz"
+        os.utime(gz, (1, 1))
+        (tmp_path / "1.html").write_bytes(b"<p>novo</p>")
+        r = client.get("/m/1.html", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in r.headers
+        assert r.content == b"<p>novo</p>"
+
+    def test_etag_do_gz_gera_304(self, static_client):
+        client, _, _ = static_client
+        r = client.get("/m/1.html", headers={"Accept-Encoding": "gzip"})
+        r2 = client.get(
+            "/m/1.html",
+            headers={"Accept-Encoding": "gzip", "If-None-Match": r.headers["etag"]},
+        )
+        assert r2.status_code == 304
+
+
+class TestGzIrmao:
+    def test_grava_e_remove(self, tmp_path):
+        alvo = tmp_path / "3.json"
+        gravar_gz_irmao(alvo, b'{"a": 1}')
+        assert gzip.decompress((tmp_path / "3.json.gz").read_bytes()) == b'{"a": 1}'
+        assert not (tmp_path / "3.json.gz.tmp").exists()
+        remover_gz_irmao(alvo)
+        assert not (tmp_path / "3.json.gz").exists()
+        remover_gz_irmao(alvo)  # idempotente
@@ -0,0 +1,126 @@
+"""
+Testes da busca no diario de aprendizagem (app/services/diario_busca.py).
+"""
+import asyncio
+from datetime import date
+
+import pytest
+
+from app.api.routes.diario_aprendizagem import buscar_nos_diarios
+from app.models.diario_aprendizagem import ConteudoExtraido, DiarioAprendizagem
+from app.services import diario_busca
+from app.services.diario_busca import DocumentoDiario, IndiceDiario
+
+
+def _doc(id_, dia, texto, resumo=None, disciplinas=(), etiquetas=""):
+    return DocumentoDiario(
+        id=id_, data_estudo=date(2026, 5, dia), registro_texto=texto, ia_resumo=resumo,
+        disciplinas=list(disciplinas), etiquetas=etiquetas,
+    )
+
+
+DOCS = [
+    _doc(1, 1, "Hoje estudamos frações equivalentes com pizza. Ele entendeu as frações!",
+         resumo="Frações com material concreto", disciplinas=["Matemática"],
+         etiquetas="Matemática frações equivalentes"),
+    _doc(2, 2, "Leitura de um conto e ortografia do R e RR.", disciplinas=["Língua Portuguesa"],
+         etiquetas="Língua Portuguesa ortografia"),
+    _doc(3, 3, "Revisamos a fração meio e números decimais.", disciplinas=["Matemática"]),
+    # So a IA ligou este registro a "fotossintese" (texto nao menciona)
+    _doc(4, 4, "Plantinha no copo com algodão.", resumo="Experimento de germinação",
+         disciplinas=["Ciências"], etiquetas="Ciências fotossíntese germinação"),
+]
+
+
+def _ids(resultados):
+    return [r["id"] for r in resultados]
+
+
+class TestIndice:
+    def test_ranking_acento_e_plural(self):
+        indice = IndiceDiario(DOCS)
+        assert _ids(indice.buscar("fracao"))[:2] == [1, 3]
+        assert _ids(indice.buscar("FRAÇÕES")) == _ids(indice.buscar("fracao"))
+
+    def test_prefixo_enquanto_digita(self):
+        assert _ids(IndiceDiario(DOCS).buscar("ortogr")) == [2]
+
+    def test_todos_os_termos_precisam_casar(self):
+        indice = IndiceDiario(DOCS)
+        assert _ids(indice.buscar("fração decimais")) == [3]
+        assert indice.buscar("fração inexistente") == []
+        assert indice.buscar("de a o") == []
+
+    def test_etiquetas_da_ia(self):
+        (r,) = IndiceDiario(DOCS).buscar("fotossintese")
+        assert r["id"] == 4
+        # Nao esta no texto nem no resumo: trecho do texto, sem destaques
+        assert (r["campo"], r["destaques"]) == ("registro_texto", [])
+
+    def test_filtro_disciplina(self):
+        indice = IndiceDiario(DOCS)
+        assert _ids(indice.buscar("ortografia", disciplina="lingua portuguesa")) == [2]
+        assert indice.buscar("ortografia", disciplina="Matemática") == []
+
+    def test_destaques_no_texto_original(self):
+        (r, *_) = IndiceDiario(DOCS).buscar("fraç")
+        assert r["campo"] == "registro_texto"
+        assert [r["trecho"][a:b] for a, b in r["destaques"]] == ["frações", "frações"]
+
+    def test_trecho_centrado_no_termo(self):
+        texto = "x " * 300 + "germinação do feijão " + "y " * 300
+        (r,) = IndiceDiario([_doc(1, 1, texto)]).buscar("feijao")
+        assert len(r["trecho"]) == diario_busca.TAMANHO_TRECHO
+        assert [r["trecho"][a:b] for a, b in r["destaques"]] == ["feijão"]
+
+
+@pytest.fixture
+def cenario(db_session, professor_aluno):
+    db = db_session
+    professor, aluno = professor_aluno
+    diario = DiarioAprendizagem(student_id=aluno.id, data_estudo=date(2026, 5, 1),
+                                registro_texto="Estudamos a tabuada do 7.",
+                                ia_disciplinas_detectadas=["Matemática"],
+                                ia_topicos_extraidos=[{"disciplina": "Matemática", "topicos": ["multiplicação"]}])
+    db.add(diario)
+    db.commit()
+    diario_busca.invalidar(aluno.id)
+    return db, professor, aluno, diario
+
+
+def _buscar(db, professor, aluno, q, **kwargs):
+    return asyncio.run(buscar_nos_diarios(aluno.id, q=q, disciplina=kwargs.get("disciplina"),
+                                          limit=20, db=db, current_user=professor))
+
+
+class TestRota:
+    def test_busca_e_reindexa_quando_diario_muda(self, cenario):
+        db, professor, aluno, diario = cenario
+        r = _buscar(db, professor, aluno, "multiplicacao")
+        assert (r["total"], r["resultados"][0]["id"]) == (1, diario.id)
+
+        # Conteudo extraido entra no registro de origem
+        db.add(ConteudoExtraido(diario_id=diario.id, student_id=aluno.id, disciplina="Matemática",
+                                topico="Tabuada", conceitos=["produto notável"]))
+        db.commit()
+        assert _buscar(db, professor, aluno, "produto")["total"] == 1
+
+        db.add(DiarioAprendizagem(student_id=aluno.id, data_estudo=date(2026, 5, 2),
+                                  registro_texto="Mais tabuada, agora do 8."))
+        db.commit()
+        assert [x["data"] for x in _buscar(db, professor, aluno, "tabuada")["resultados"]] == [
+            date(2026, 5, 2), date(2026, 5, 1),
+        ]
+
+        db.delete(diario)
+        db.commit()
+        assert _buscar(db, professor, aluno, "multiplicacao")["total"] == 0
+
+    def test_indice_em_cache_uma_query_por_busca(self, cenario):
+        from app.core.query_counter import contar_queries
+
+        db, professor, aluno, _ = cenario
+        diario_busca.obter_indice_diario(db, aluno.id)
+        with contar_queries() as contador:
+            diario_busca.buscar_diario(db, aluno.id, "tabuada")
+        assert contador.total == 1  # so a versao
@@ -0,0 +1,120 @@
+"""
+Testes das estatisticas/timeline do diario (app/services/diario_estatisticas.py), SQLite.
+"""
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+
+from app.api.routes.diario_aprendizagem import obter_estatisticas, obter_timeline
+from app.models.diario_aprendizagem import (
+    ConteudoExtraido,
+    DiarioAprendizagem,
+    HumorEstudo,
+    NivelCompreensao,
+)
+from app.models.student import Student
+from app.services import diario_estatisticas
+
+
+HOJE = date.today()
+
+
+@pytest.fixture
+def cenario(db_session, professor_aluno):
+    db = db_session
+    professor, aluno = professor_aluno
+    registros = [
+        # (dias atras, humor, nivel, minutos, disciplinas, texto)
+        (1, HumorEstudo.BEM, NivelCompreensao.ENTENDI_BEM, 40, ["Matemática", "Ciências"], "a" * 250),
+        (2, HumorEstudo.BEM, None, None, ["Matemática"], "curto"),
+        (3, None, NivelCompreensao.ENTENDI_BEM, 20, None, "sem IA"),
+        (10, HumorEstudo.DIFICIL, NivelCompreensao.TENHO_DUVIDAS, 30, ["Português", "Matemática"], "x"),
+        (400, HumorEstudo.DIFICIL, None, 99, ["História"], "fora do periodo"),
+    ]
+    for dias, humor, nivel, minutos, disciplinas, texto in registros:
+        db.add(DiarioAprendizagem(
+            student_id=aluno.id, data_estudo=HOJE - timedelta(days=dias), registro_texto=texto,
+            humor=humor, nivel_compreensao=nivel, tempo_estudo_minutos=minutos,
+            ia_disciplinas_detectadas=disciplinas, ia_sentimento_geral="positivo" if dias == 1 else None,
+        ))
+    outro = Student(name="Outro", grade_level="5º ano", created_by_user_id=professor.id)
+    db.add(outro)
+    db.flush()
+    db.add(DiarioAprendizagem(student_id=outro.id, data_estudo=HOJE, registro_texto="z",
+                              ia_disciplinas_detectadas=["Artes"], tempo_estudo_minutos=500))
+    d = db.query(DiarioAprendizagem).first()
+    db.add_all([
+        ConteudoExtraido(diario_id=d.id, student_id=aluno.id, disciplina="Matemática", topico="Frações",
+                         vezes_mencionado=3, nivel_dificuldade_percebido="dificil", prioridade_revisao=8),
+        ConteudoExtraido(diario_id=d.id, student_id=aluno.id, disciplina="Ciências", topico="Células",
+                         vezes_mencionado=5, nivel_dificuldade_percebido="facil", prioridade_revisao=1),
+    ])
+    db.commit()
+    return db, professor, aluno
+
+
+def _esperado_semanas(dias):
+    semanas = {}
+    for n in dias:
+        d = HOJE - timedelta(days=n)
+        chave = f"{d.year}-S{d.isocalendar()[1]:02d}"
+        semanas[chave] = semanas.get(chave, 0) + 1
+    return semanas
+
+
+class TestEstatisticas:
+    def test_contadores(self, cenario):
+        db, professor, aluno = cenario
+        r = asyncio.run(obter_estatisticas(aluno.id, periodo_dias=30, db=db, current_user=professor))
+
+        assert (r.total_registros, r.total_minutos_estudo, r.media_minutos_por_dia) == (4, 90, 22.5)
+        assert r.por_disciplina == {"Matemática": 3, "Ciências": 1, "Português": 1}
+        assert r.por_humor == {"bem": 2, "dificil": 1}
+        assert r.por_nivel_compreensao == {"entendi_bem": 2, "tenho_duvidas": 1}
+        assert r.registros_por_semana == _esperado_semanas([1, 2, 3, 10])
+        assert [t["topico"] for t in r.topicos_mais_estudados] == ["Células", "Frações"]
+        assert r.topicos_com_dificuldade == [{"topico": "Frações", "disciplina": "Matemática", "prioridade": 8}]
+
+    def test_periodo_vazio(self, cenario):
+        db, professor, _ = cenario
+        vazio = Student(name="Vazio", grade_level="5º ano", created_by_user_id=professor.id)
+        db.add(vazio)
+        db.commit()
+        r = asyncio.run(obter_estatisticas(vazio.id, periodo_dias=30, db=db, current_user=professor))
+        assert (r.total_registros, r.media_minutos_por_dia, r.por_disciplina) == (0, 0, {})
+
+    def test_fallback_disciplinas_sem_sql_do_dialeto(self, cenario, monkeypatch):
+        db, _, aluno = cenario
+        inicio = HOJE - timedelta(days=30)
+        via_sql = diario_estatisticas.contar_disciplinas(db, aluno.id, inicio)
+        monkeypatch.setattr(diario_estatisticas, "_SQL_DISCIPLINAS", {})
+        assert diario_estatisticas.contar_disciplinas(db, aluno.id, inicio) == via_sql
+
+    def test_queries_nao_crescem_com_periodo(self, cenario, sem_n_mais_1):
+        db, professor, aluno = cenario
+        offset = [20]
+
+        def popular(n):
+            for _ in range(n):
+                offset[0] += 1
+                db.add(DiarioAprendizagem(student_id=aluno.id, data_estudo=HOJE - timedelta(days=offset[0]),
+                                          registro_texto="r", ia_disciplinas_detectadas=["Geografia"],
+                                          humor=HumorEstudo.MUITO_BEM))
+
+        sem_n_mais_1(popular, lambda: asyncio.run(
+            obter_estatisticas(aluno.id, periodo_dias=365, db=db, current_user=professor)))
+
+
+class TestTimeline:
+    def test_itens(self, cenario):
+        db, professor, aluno = cenario
+        r = asyncio.run(obter_timeline(aluno.id, dias=30, db=db, current_user=professor))
+        assert r.total_itens == 4
+        primeiro = r.itens[0]
+        assert primeiro.data == HOJE - timedelta(days=1)
+        assert primeiro.descricao == "a" * 200 + "..."
+        assert (primeiro.humor, primeiro.destaque) == ("bem", True)
+        assert primeiro.disciplinas == ["Matemática", "Ciências"]
+        assert r.itens[1].descricao == "curto"
+        assert r.itens[1].titulo == f"Estudo - {HOJE - timedelta(days=2)}"
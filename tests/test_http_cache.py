@@ -0,0 +1,109 @@
+"""
+Testes de app/core/http_cache.py (ETag / 304 / Cache-Control).
+"""
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.core.http_cache import (
+    CACHE_CATALOGO,
+    CACHE_PUBLICO,
+    gerar_etag,
+    nao_modificado,
+    resposta_304,
+    resposta_condicional,
+)
+
+MODIFICADO_EM = datetime(2026, 3, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+
+def _make_app(contador):
+    app = FastAPI()
+
+    @app.get("/corpo")
+    def corpo(request: Request):
+        return resposta_condicional(request, {"planos": [1, 2, 3]}, CACHE_PUBLICO)
+
+    @app.get("/versao")
+    def versao(request: Request):
+        etag = gerar_etag("catalogo", "v1")
+        if nao_modificado(request, etag, MODIFICADO_EM):
+            return resposta_304(etag, CACHE_CATALOGO, MODIFICADO_EM)
+        contador.append(1)  # "consulta ao banco"
+        return resposta_condicional(
+            request, ["5º ano"], CACHE_CATALOGO, etag=etag, last_modified=MODIFICADO_EM
+        )
+
+    return app
+
+
+class TestGerarEtag:
+    def test_deterministico_e_fraco(self):
+        assert gerar_etag("a", 1) == gerar_etag("a", 1)
+        assert gerar_etag("a", 1).startswith('W/"')
+
+    def test_partes_diferentes_geram_etags_diferentes(self):
+        assert gerar_etag("a", 1) != gerar_etag("a", 2)
+        # Separador evita colisao por concatenacao
+        assert gerar_etag("ab", "c") != gerar_etag("a", "bc")
+
+
+class TestRespostaCondicional:
+    def test_primeira_resposta_traz_validadores(self):
+        client = TestClient(_make_app([]))
+        r = client.get("/corpo")
+        assert r.status_code == 200
+        assert r.json() == {"planos": [1, 2, 3]}
+        assert r.headers["etag"].startswith('W/"')
+        assert r.headers["cache-control"] == CACHE_PUBLICO
+
+    def test_if_none_match_igual_devolve_304_sem_corpo(self):
+        client = TestClient(_make_app([]))
+        etag = client.get("/corpo").headers["etag"]
+        r = client.get("/corpo", headers={"If-None-Match": etag})
+        assert r.status_code == 304
+        assert r.content == b""
+        assert r.headers["etag"] == etag
+
+    def test_comparacao_fraca_e_lista(self):
+        client = TestClient(_make_app([]))
+        etag = client.get("/corpo").headers["etag"]
+        forte = etag[2:]
+        r = client.get("/corpo", headers={"If-None-Match": f'"outro", {forte}'})
+        assert r.status_code == 304
+
+    def test_etag_diferente_devolve_200(self):
+        client = TestClient(_make_app([]))
+        r = client.get("/corpo", headers={"If-None-Match": 'W/"velho"'})
+        assert r.status_code == 200
+
+
+class TestEtagDeVersao:
+    def test_304_nao_executa_consulta(self):
+        contador = []
+        client = TestClient(_make_app(contador))
+        r = client.get("/versao")
+        assert r.status_code == 200
+        assert r.headers["last-modified"] == format_datetime(MODIFICADO_EM, usegmt=True)
+
+        r = client.get("/versao", headers={"If-None-Match": r.headers["etag"]})
+        assert r.status_code == 304
+        assert len(contador) == 1
+
+    def test_if_modified_since(self):
+        client = TestClient(_make_app([]))
+        depois = format_datetime(MODIFICADO_EM + timedelta(hours=1), usegmt=True)
+        antes = format_datetime(MODIFICADO_EM - timedelta(hours=1), usegmt=True)
+        assert client.get("/versao", headers={"If-Modified-Since": depois}).status_code == 304
+        assert client.get("/versao", headers={"If-Modified-Since": antes}).status_code == 200
+
+    def test_if_none_match_tem_prioridade_sobre_if_modified_since(self):
+        client = TestClient(_make_app([]))
+        depois = format_datetime(MODIFICADO_EM + timedelta(hours=1), usegmt=True)
+        r = client.get(
+            "/versao",
+            headers={"If-None-Match": 'W/"velho"', "If-Modified-Since": depois},
+        )
+        assert r.status_code == 200
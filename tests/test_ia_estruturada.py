@@ -0,0 +1,154 @@
+"""
+Testes da geracao estruturada e do parser JSON tolerante (app/services/ia_estruturada.py).
+"""
+import asyncio
+from types import SimpleNamespace
+from typing import List, Optional
+
+import pytest
+from pydantic import BaseModel, Field
+
+from app.services import ia_estruturada
+from app.services.ia_estruturada import (
+    RespostaIAInvalida,
+    RespostaTruncada,
+    extrair_json,
+    gerar_estruturado,
+    gerar_estruturado_async,
+)
+
+
+class QuestaoTeste(BaseModel):
+    enunciado: str = Field(min_length=1)
+    resposta: Optional[str] = None
+
+
+class QuestoesTeste(BaseModel):
+    """Registra as questoes."""
+    questoes: List[QuestaoTeste] = Field(min_length=1)
+
+
+@pytest.fixture(autouse=True)
+def estatisticas_limpas():
+    ia_estruturada.resetar_estatisticas()
+    yield
+    ia_estruturada.resetar_estatisticas()
+
+
+def _ferramenta(dados, nome="registrar"):
+    return SimpleNamespace(type="tool_use", name=nome, id=f"tu_{id(dados)}", input=dados)
+
+
+def _gerar(cliente, **kwargs):
+    return gerar_estruturado(cliente, QuestoesTeste, "prompt", model="m", max_tokens=100,
+                             nome="registrar", **kwargs)
+
+
+class TestExtrairJson:
+    def test_cerca_e_texto_em_volta(self):
+        texto = 'Aqui esta:\n```json\n{"a": [1, 2]}\n```\nEspero ter ajudado.'
+        assert extrair_json(texto) == {"a": [1, 2]}
+
+    def test_virgula_sobrando(self):
+        assert extrair_json('{"a": [1, 2,], "b": "x, ]",}') == {"a": [1, 2], "b": "x, ]"}
+
+    def test_truncado_mantem_elementos_completos(self):
+        texto = '[{"enunciado": "Q1"}, {"enunciado": "Q2"}, {"enunciado": "Q3 com \\"aspas'
+        assert extrair_json(texto) == [{"enunciado": "Q1"}, {"enunciado": "Q2"}]
+
+    def test_truncado_aninhado(self):
+        texto = '{"questoes": [{"enunciado": "Q1", "alternativas": ["a", "b"]}, {"enunc'
+        assert extrair_json(texto) == {"questoes": [{"enunciado": "Q1", "alternativas": ["a", "b"]}]}
+
+    def test_colchete_no_texto_antes_do_json(self):
+        assert extrair_json('Veja [nota] abaixo: {"ok": true}') == {"ok": True}
+
+    def test_sem_json(self):
+        with pytest.raises(RespostaIAInvalida):
+            extrair_json("Nao consegui gerar.")
+
+
+class TestGerarEstruturado:
+    def test_tool_use(self, cliente_ia):
+        cliente = cliente_ia(_ferramenta({"questoes": [{"enunciado": "Q1"}]}))
+        resultado = _gerar(cliente, temperature=0.5)
+
+        assert resultado.questoes[0].enunciado == "Q1"
+        chamada = cliente.chamadas[0]
+        assert chamada["tool_choice"] == {"type": "tool", "name": "registrar"}
+        ferramenta = chamada["tools"][0]
+        assert ferramenta["description"] == "Registra as questoes."
+        assert ferramenta["input_schema"] == QuestoesTeste.model_json_schema()
+        assert chamada["temperature"] == 0.5
+        assert "system" not in chamada
+        assert ia_estruturada.estatisticas()["registrar"] == {
+            "chamadas": 1, "reparos": 0, "falhas": 0, "truncadas": 0,
+            "tokens": 150, "tokens_desperdicados": 0,
+        }
+
+    def test_reparo_devolve_erros_ao_modelo(self, cliente_ia):
+        invalido = _ferramenta({"questoes": [{"enunciado": ""}]})
+        cliente = cliente_ia(invalido, _ferramenta({"questoes": [{"enunciado": "Q1"}]}))
+        resultado = _gerar(cliente)
+
+        assert resultado.questoes[0].enunciado == "Q1"
+        mensagens = cliente.chamadas[1]["messages"]
+        assert [m["role"] for m in mensagens] == ["user", "assistant", "user"]
+        retorno = mensagens[2]["content"][0]
+        assert (retorno["type"], retorno["tool_use_id"], retorno["is_error"]) == (
+            "tool_result", invalido.id, True,
+        )
+        assert "questoes.0.enunciado" in retorno["content"]
+        assert ia_estruturada.estatisticas()["registrar"] == {
+            "chamadas": 1, "reparos": 1, "falhas": 0, "truncadas": 0,
+            "tokens": 300, "tokens_desperdicados": 150,
+        }
+
+    def test_texto_com_lista_solta(self, cliente_ia):
+        cliente = cliente_ia('```json\n[{"enunciado": "Q1", "resposta": "A"},]\n```')
+        resultado = _gerar(cliente)
+        assert resultado.questoes[0].resposta == "A"
+
+    def test_falha_apos_reparos(self, cliente_ia):
+        cliente = cliente_ia("sem json", '{"questoes": []}')
+        with pytest.raises(RespostaIAInvalida):
+            _gerar(cliente)
+
+        assert len(cliente.chamadas) == 2
+        assert cliente.chamadas[1]["messages"][1] == {"role": "assistant", "content": "sem json"}
+        estatisticas = ia_estruturada.estatisticas()["registrar"]
+        assert (estatisticas["falhas"], estatisticas["tokens_desperdicados"]) == (1, 300)
+
+    def test_sem_reparo(self, cliente_ia):
+        cliente = cliente_ia("sem json")
+        with pytest.raises(RespostaIAInvalida):
+            _gerar(cliente, reparos=0)
+        assert len(cliente.chamadas) == 1
+
+    def test_truncada_sem_reparo(self, cliente_ia):
+        # Mesmo validando, o pedaco recebido estaria incompleto
+        cliente = cliente_ia(_ferramenta({"questoes": [{"enunciado": "Q1"}]}), stop_reason="max_tokens")
+        with pytest.raises(RespostaTruncada):
+            _gerar(cliente)
+
+        assert len(cliente.chamadas) == 1
+        estatisticas = ia_estruturada.estatisticas()["registrar"]
+        assert (estatisticas["falhas"], estatisticas["truncadas"], estatisticas["tokens_desperdicados"]) == (
+            1, 1, 150,
+        )
+
+    def test_erro_da_api_sobe(self):
+        class ClienteComErro:
+            messages = SimpleNamespace(create=lambda **kwargs: (_ for _ in ()).throw(ConnectionError()))
+
+        with pytest.raises(ConnectionError):
+            _gerar(ClienteComErro())
+        assert ia_estruturada.estatisticas() == {}
+
+    def test_nome_padrao_e_async(self, cliente_ia):
+        cliente = cliente_ia(_ferramenta({"questoes": [{"enunciado": "Q1"}]}, nome="questoes_teste"))
+        resultado = asyncio.run(gerar_estruturado_async(
+            cliente, QuestoesTeste, "prompt", model="m", max_tokens=100,
+        ))
+        assert resultado.questoes[0].enunciado == "Q1"
+        assert cliente.chamadas[0]["tool_choice"]["name"] == "questoes_teste"
@@ -0,0 +1,276 @@
+"""
+Testes do metering de uso mensal (backend de banco, SQLite).
+
+NAO testa o backend Redis - isso requer container vivo (ver comentario em
+test_rate_limit_dispatcher.py). A mescla da reconciliacao usa um Redis
+falso em memoria com a mesma interface do _RedisBackend.
+"""
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core import metering
+from app.core.tenant import TenantContext, check_limite_provas, consumir_limite_mensal
+from app.database import Base
+from app.models.assinatura import Assinatura, StatusAssinatura
+from app.models.user import UserRole
+from app.models.uso_mensal import UsoMensal
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'metering.db'}",
+        connect_args={"check_same_thread": False, "timeout": 30},
+    )
+    Base.metadata.create_all(bind=engine, tables=[UsoMensal.__table__, Assinatura.__table__])
+    yield sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    engine.dispose()
+
+
+@pytest.fixture
+def backend(session_factory, monkeypatch):
+    """Dispatcher usando apenas o backend de banco apontado para o SQLite do teste."""
+    db_backend = metering._DatabaseBackend(session_factory)
+    monkeypatch.setattr(metering, "_db_backend", db_backend)
+    monkeypatch.setattr(metering, "_redis_backend", None)
+    monkeypatch.setattr(metering, "_initialized", True)
+    return db_backend
+
+
+class TestConsumir:
+    def test_consome_ate_o_limite(self, backend):
+        for _ in range(3):
+            assert metering.consumir(1, "provas", limite=3)
+        assert not metering.consumir(1, "provas", limite=3)
+        assert metering.uso_atual(1, "provas") == 3
+
+    def test_quantidade_maior_que_saldo_nao_consome_parcial(self, backend):
+        assert metering.consumir(1, "materiais", limite=5, quantidade=4)
+        assert not metering.consumir(1, "materiais", limite=5, quantidade=2)
+        assert metering.uso_atual(1, "materiais") == 4
+
+    def test_escolas_e_recursos_independentes(self, backend):
+        assert metering.consumir(1, "peis", limite=1)
+        assert not metering.consumir(1, "peis", limite=1)
+        assert metering.consumir(2, "peis", limite=1)
+        assert metering.consumir(1, "provas", limite=1)
+
+    def test_recurso_desconhecido_levanta(self, backend):
+        with pytest.raises(ValueError):
+            metering.consumir(1, "nao_existe", limite=10)
+
+    def test_estorno_devolve_saldo_sem_ficar_negativo(self, backend):
+        metering.consumir(1, "provas", limite=2)
+        metering.consumir(1, "provas", limite=2)
+        metering.estornar(1, "provas")
+        assert metering.uso_atual(1, "provas") == 1
+        metering.estornar(1, "provas", quantidade=5)
+        assert metering.uso_atual(1, "provas") == 0
+
+    def test_concorrencia_nao_ultrapassa_limite(self, backend):
+        """Regression: check + incremento separados deixavam passar acima do limite."""
+        aceitos = []
+        lock = threading.Lock()
+
+        def worker():
+            for _ in range(5):
+                if metering.consumir(7, "provas", limite=20):
+                    with lock:
+                        aceitos.append(1)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(aceitos) == 20
+        assert metering.uso_atual(7, "provas") == 20
+
+
+class TestDependenciasDeLimite:
+    def _tenant(self, limite):
+        plano = SimpleNamespace(limite_provas_mes=limite)
+        assinatura = SimpleNamespace(status=StatusAssinatura.ATIVA.value, plano=plano)
+        return TenantContext(escola=SimpleNamespace(id=1), assinatura=assinatura)
+
+    def test_check_nao_consome(self, backend):
+        tenant = self._tenant(limite=1)
+        assert check_limite_provas(tenant) is tenant
+        assert check_limite_provas(tenant) is tenant
+        assert metering.uso_atual(1, "provas") == 0
+
+    def test_check_bloqueia_sem_saldo_e_estorno_libera(self, backend):
+        tenant = self._tenant(limite=1)
+        assert tenant.consumir_limite("provas")
+        with pytest.raises(HTTPException) as erro:
+            check_limite_provas(tenant)
+        assert erro.value.status_code == 403
+
+        tenant.estornar_limite("provas")
+        assert check_limite_provas(tenant) is tenant
+
+    def test_consumir_limite_mensal_consome_e_bloqueia(self, backend):
+        tenant = self._tenant(limite=1)
+        assert consumir_limite_mensal(tenant, "provas") is True
+        with pytest.raises(HTTPException) as erro:
+            consumir_limite_mensal(tenant, "provas")
+        assert erro.value.status_code == 403
+        assert metering.uso_atual(1, "provas") == 1
+
+    def test_consumir_limite_mensal_ignora_sem_plano_e_super_admin(self, backend):
+        sem_plano = TenantContext(escola=SimpleNamespace(id=1))
+        assert consumir_limite_mensal(sem_plano, "provas") is False
+
+        tenant = self._tenant(limite=0)
+        tenant.user = SimpleNamespace(role=UserRole.SUPER_ADMIN)
+        assert consumir_limite_mensal(tenant, "provas") is False
+        assert metering.uso_atual(1, "provas") == 0
+
+
+class TestReconciliacao:
+    def _criar_assinatura(self, session_factory, escola_id, **uso):
+        db = session_factory()
+        db.add(Assinatura(escola_id=escola_id, plano_id=1, valor_mensal=100.0, **uso))
+        db.commit()
+        db.close()
+
+    def _ler_assinatura(self, session_factory, escola_id):
+        db = session_factory()
+        try:
+            return db.query(Assinatura).filter(Assinatura.escola_id == escola_id).one()
+        finally:
+            db.close()
+
+    def test_espelha_contadores_e_zera_quem_nao_usou(self, backend, session_factory):
+        self._criar_assinatura(session_factory, 1)
+        self._criar_assinatura(session_factory, 2, provas_mes_atual=40, materiais_mes_atual=3)
+
+        metering.consumir(1, "provas", limite=10)
+        metering.consumir(1, "provas", limite=10)
+        metering.consumir(1, "peis", limite=10)
+
+        atualizadas = metering.reconciliar_uso(session_factory=session_factory)
+        assert atualizadas == 2
+
+        a1 = self._ler_assinatura(session_factory, 1)
+        assert a1.provas_mes_atual == 2
+        assert a1.peis_mes_atual == 1
+        assert a1.materiais_mes_atual == 0
+
+        # Escola 2 nao usou nada neste mes -> reset mensal
+        a2 = self._ler_assinatura(session_factory, 2)
+        assert a2.provas_mes_atual == 0
+        assert a2.materiais_mes_atual == 0
+
+    def test_nao_reescreve_assinatura_sem_mudanca(self, backend, session_factory):
+        self._criar_assinatura(session_factory, 1)
+        metering.consumir(1, "provas", limite=10)
+        assert metering.reconciliar_uso(session_factory=session_factory) == 1
+        assert metering.reconciliar_uso(session_factory=session_factory) == 0
+
+
+class _RedisFalso:
+    """Contadores em memoria com a interface usada pela reconciliacao."""
+
+    def __init__(self, valores=None):
+        self.valores = dict(valores or {})
+
+    def is_offline(self):
+        return False
+
+    def snapshot(self, periodo):
+        return dict(self.valores)
+
+    def ajustar(self, escola_id, recurso, periodo, delta):
+        chave = (escola_id, recurso)
+        if chave in self.valores:
+            self.valores[chave] = max(self.valores[chave] + delta, 0)
+
+
+class TestMesclaComRedis:
+    def _linha(self, session_factory, escola_id, recurso):
+        db = session_factory()
+        try:
+            return db.query(UsoMensal).filter(
+                UsoMensal.escola_id == escola_id, UsoMensal.recurso == recurso
+            ).one()
+        finally:
+            db.close()
+
+    def test_consumo_no_fallback_nao_e_apagado_pelo_snapshot(self, backend, session_factory, monkeypatch):
+        """Regression: gravar o snapshot do Redis por cima do banco perdia o consumo da queda."""
+        redis = _RedisFalso({(1, "provas"): 5})
+        monkeypatch.setattr(metering, "_redis_backend", redis)
+        metering.reconciliar_uso(session_factory=session_factory)
+        assert self._linha(session_factory, 1, "provas").usado == 5
+
+        # Redis fora: 3 provas consumidas no banco
+        periodo = metering.periodo_atual()
+        for _ in range(3):
+            assert backend.consumir(1, "provas", periodo, limite=100, quantidade=1)
+        # Enquanto isso, outro worker ainda falando com o Redis consumiu 2
+        redis.valores[(1, "provas")] += 2
+
+        metering.reconciliar_uso(session_factory=session_factory)
+        assert redis.valores[(1, "provas")] == 10
+        linha = self._linha(session_factory, 1, "provas")
+        assert (linha.usado, linha.sincronizado) == (10, 10)
+
+        # Segunda rodada nao soma de novo
+        metering.reconciliar_uso(session_factory=session_factory)
+        assert redis.valores[(1, "provas")] == 10
+        assert self._linha(session_factory, 1, "provas").usado == 10
+
+    def test_chave_perdida_no_redis_mantem_o_banco(self, backend, session_factory, monkeypatch):
+        periodo = metering.periodo_atual()
+        backend.consumir(1, "peis", periodo, limite=10, quantidade=4)
+        monkeypatch.setattr(metering, "_redis_backend", _RedisFalso())
+
+        metering.reconciliar_uso(session_factory=session_factory)
+        linha = self._linha(session_factory, 1, "peis")
+        assert (linha.usado, linha.sincronizado) == (4, 4)
+
+    def test_semear_marca_sincronizado(self, backend, session_factory):
+        periodo = metering.periodo_atual()
+        backend.consumir(1, "provas", periodo, limite=10, quantidade=3)
+        assert backend.semear(1, "provas", periodo) == 3
+        assert self._linha(session_factory, 1, "provas").sincronizado == 3
+
+
+class TestLoopReconciliacao:
+    def test_fora_do_mysql_todo_processo_e_lider(self, session_factory):
+        engine = session_factory.kw["bind"]
+        assert metering._LiderReconciliacao(engine).sou_lider()
+
+    def test_so_o_lider_reconcilia_e_libera_ao_cancelar(self, monkeypatch):
+        chamadas = []
+        monkeypatch.setattr(metering, "reconciliar_uso", lambda: chamadas.append(1) or 0)
+
+        class _NaoLider:
+            liberado = False
+
+            def sou_lider(self):
+                return False
+
+            def liberar(self):
+                self.liberado = True
+
+        lider = _NaoLider()
+
+        async def rodar():
+            tarefa = asyncio.create_task(metering.loop_reconciliacao(0, lider=lider))
+            await asyncio.sleep(0.05)
+            tarefa.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await tarefa
+
+        asyncio.run(rodar())
+        assert chamadas == []
+        assert lider.liberado
@@ -0,0 +1,136 @@
+"""
+Testes de N+1 das listagens (fixture sem_n_mais_1 em tests/conftest.py)
+e do contador de queries (app/core/query_counter.py).
+"""
+import asyncio
+from datetime import date, datetime, timedelta
+from itertools import count
+
+import pytest
+from sqlalchemy import text
+
+from app.api.routes.analytics import compare_students_performance
+from app.api.routes.conteudos_aluno import conteudos_recentes_aluno
+from app.api.routes.student_provas import listar_minhas_provas
+from app.core.query_counter import contar_queries
+from app.models.performance import PerformanceAnalysis
+from app.models.prova import Prova, ProvaAluno, StatusProvaAluno
+from app.models.registro_diario import AulaRegistrada, RegistroDiario
+from app.models.student import Student
+
+
+def _aluno(db, professor, nome="Aluno"):
+    aluno = Student(name=nome, grade_level="5º ano", created_by_user_id=professor.id)
+    db.add(aluno)
+    db.flush()
+    return aluno
+
+
+class TestContador:
+    def test_conta_so_dentro_do_bloco(self, db_session):
+        db_session.execute(text("SELECT 1"))
+        with contar_queries() as contador:
+            db_session.execute(text("SELECT 1"))
+            db_session.execute(text("SELECT 2"))
+        db_session.execute(text("SELECT 3"))
+        assert contador.total == 2
+        assert contador.statements == ["SELECT 1", "SELECT 2"]
+
+    def test_aninhado_conta_no_interno(self, db_session):
+        with contar_queries() as externo:
+            with contar_queries() as interno:
+                db_session.execute(text("SELECT 1"))
+            db_session.execute(text("SELECT 2"))
+        assert (externo.total, interno.total) == (1, 1)
+
+    def test_detector_falha_com_n_mais_1(self, db_session, professor, sem_n_mais_1):
+        def popular(n):
+            for _ in range(n):
+                _aluno(db_session, professor)
+
+        def uma_query_por_aluno():
+            for aluno in db_session.query(Student).all():
+                db_session.execute(text("SELECT 1"))
+
+        with pytest.raises(AssertionError, match="N\\+1"):
+            sem_n_mais_1(popular, uma_query_por_aluno)
+
+
+class TestListagens:
+    def test_minhas_provas(self, db_session, professor, sem_n_mais_1):
+        aluno = _aluno(db_session, professor)
+        seq = count()
+
+        def popular(n):
+            for _ in range(n):
+                prova = Prova(titulo=f"P{next(seq)}", conteudo_prompt="x", materia="Mat",
+                              criado_por_id=professor.id)
+                db_session.add(prova)
+                db_session.flush()
+                db_session.add(ProvaAluno(prova_id=prova.id, aluno_id=aluno.id,
+                                          status=StatusProvaAluno.PENDENTE))
+
+        sem_n_mais_1(popular, lambda: listar_minhas_provas(current_student=aluno, db=db_session))
+        resultado = listar_minhas_provas(current_student=aluno, db=db_session)
+        assert len(resultado) == 6
+        assert {r["titulo"] for r in resultado} == {f"P{i}" for i in range(6)}
+        assert resultado[0]["status"] == "pendente"
+
+    def test_compare_students(self, db_session, professor, sem_n_mais_1):
+        ids = []
+
+        def popular(n):
+            for _ in range(n):
+                aluno = _aluno(db_session, professor, nome=f"Aluno {len(ids)}")
+                ids.append(aluno.id)
+                for score, quando in ((50.0, datetime(2026, 1, 1)), (80.0, datetime(2026, 2, 1))):
+                    db_session.add(PerformanceAnalysis(
+                        student_id=aluno.id, application_id=1, overall_score=score,
+                        by_difficulty_level={}, by_skill={}, weak_points=[], strong_points=[],
+                        analyzed_at=quando,
+                    ))
+
+        def executar():
+            compare_students_performance(
+                student_ids=",".join(map(str, ids)), current_user=professor, db=db_session
+            )
+
+        sem_n_mais_1(popular, executar)
+
+        # Ordem dos ids preservada, so a analise mais recente, aluno alheio ignorado
+        alheio = Student(name="Alheio", grade_level="5º ano")
+        db_session.add(alheio)
+        db_session.commit()
+        pedido = [ids[2], alheio.id, ids[0]]
+        r = compare_students_performance(
+            student_ids=",".join(map(str, pedido)), current_user=professor, db=db_session
+        )
+        assert [c["student_id"] for c in r["comparisons"]] == [ids[2], ids[0]]
+        assert {c["overall_score"] for c in r["comparisons"]} == {80.0}
+
+    def test_conteudos_recentes(self, db_session, professor, sem_n_mais_1):
+        aluno = _aluno(db_session, professor)
+        seq = count()
+
+        def popular(n):
+            for _ in range(n):
+                i = next(seq)
+                registro = RegistroDiario(professor_id=professor.id, student_id=aluno.id,
+                                          data_aula=date.today() - timedelta(days=i))
+                registro.aulas.append(AulaRegistrada(
+                    disciplina="Matemática" if i % 2 else "Português", conteudo=f"C{i}",
+                    tem_atividade_avaliativa=True,
+                ))
+                db_session.add(registro)
+
+        def executar():
+            return asyncio.run(conteudos_recentes_aluno(
+                aluno.id, dias=30, disciplina=None, db=db_session, current_user=professor
+            ))
+
+        sem_n_mais_1(popular, executar)
+        r = executar()
+        assert r["total_aulas"] == 6
+        por_disciplina = {d["disciplina"]: d for d in r["por_disciplina"]}
+        assert por_disciplina["Português"]["ultima_aula"] == date.today().isoformat()
+        assert por_disciplina["Matemática"]["total_aulas"] == 3
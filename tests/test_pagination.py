@@ -1,7 +1,19 @@
 """
 Testes do helper de paginacao.
 """
-from app.core.pagination import PaginationParams, build_page
+from datetime import date, datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.pagination import (
+    CursorPaginationParams,
+    PaginationParams,
+    build_page,
+    decode_cursor,
+    encode_cursor,
+    keyset_response,
+)
 
 
 class TestPaginationParams:
@@ -51,3 +63,92 @@ class TestBuildPage:
         p = PaginationParams(page=1, size=10)
         result = build_page(items=[], total=30, pagination=p)
         assert result["meta"]["total_pages"] == 3
+
+
+
+class TestCursor:
+    def test_ida_e_volta(self):
+        valores = [datetime(2026, 5, 1, 10, 30, 15, 123), date(2026, 5, 1), 42, "x", None]
+        assert decode_cursor(encode_cursor(valores), 5) == valores
+
+    @pytest.mark.parametrize("cursor", ["%%%", "bmFvLWpzb24", encode_cursor([1])])
+    def test_cursor_invalido_400(self, cursor):
+        with pytest.raises(HTTPException) as exc:
+            decode_cursor(cursor, 2)
+        assert exc.value.status_code == 400
+
+
+@pytest.fixture
+def tasks(db_session):
+    """25 tasks, varias com o mesmo created_at (desempate pelo id)."""
+    from app.models.background_task import BackgroundTask
+
+    base = datetime(2026, 5, 1)
+    db_session.add_all([
+        BackgroundTask(task_id=f"t{i}", task_type="a" if i % 3 else "b",
+                       created_at=base + timedelta(minutes=i // 4))
+        for i in range(25)
+    ])
+    db_session.commit()
+    return db_session
+
+
+def _todas_as_paginas(query, keys, size, **kwargs):
+    paginas = []
+    cursor = None
+    while True:
+        pagina = keyset_response(query, CursorPaginationParams(size=size, cursor=cursor), keys, **kwargs)
+        paginas.append(pagina)
+        cursor = pagina["meta"]["next_cursor"]
+        if cursor is None:
+            return paginas
+
+
+class TestKeyset:
+    def test_percorre_tudo_sem_repetir_na_ordem(self, tasks):
+        from app.models.background_task import BackgroundTask as T
+
+        query = tasks.query(T)
+        esperado = [t.id for t in query.order_by(T.created_at.desc(), T.id.desc())]
+        paginas = _todas_as_paginas(query, [T.created_at.desc(), T.id.desc()], size=7,
+                                    serializer=lambda t: t.id)
+
+        assert [i for p in paginas for i in p["items"]] == esperado
+        assert [len(p["items"]) for p in paginas] == [7, 7, 7, 4]
+        assert paginas[0]["meta"]["has_prev"] is False and paginas[0]["meta"]["page"] == 1
+        assert paginas[1]["meta"]["has_prev"] is True and paginas[1]["meta"]["page"] is None
+        assert paginas[-1]["meta"]["has_next"] is False
+        # Sem estimate_total: nada de COUNT
+        assert paginas[0]["meta"]["total"] is None
+
+    def test_direcoes_mistas_e_filtro(self, tasks):
+        from app.models.background_task import BackgroundTask as T
+
+        query = tasks.query(T).filter(T.task_type == "a")
+        esperado = [t.id for t in query.order_by(T.created_at.desc(), T.id.asc())]
+        paginas = _todas_as_paginas(query, [T.created_at.desc(), T.id.asc()], size=5,
+                                    serializer=lambda t: t.id)
+        assert [i for p in paginas for i in p["items"]] == esperado
+
+    def test_envelope_compativel_com_build_page(self, tasks):
+        from app.models.background_task import BackgroundTask as T
+
+        pagina = keyset_response(tasks.query(T), CursorPaginationParams(size=10),
+                                 [T.created_at.desc(), T.id.desc()], estimate_total=True)
+        antigo = build_page(items=[], total=25, pagination=PaginationParams(size=10))
+        assert set(antigo["meta"]) <= set(pagina["meta"])
+        # SQLite: estimativa cai no count exato
+        assert (pagina["meta"]["total"], pagina["meta"]["total_pages"]) == (25, 3)
+
+    def test_pagina_profunda_nao_le_linhas_anteriores(self, tasks):
+        from app.core.query_counter import contar_queries
+        from app.models.background_task import BackgroundTask as T
+
+        keys = [T.created_at.desc(), T.id.desc()]
+        cursor = keyset_response(tasks.query(T), CursorPaginationParams(size=20), keys)["meta"]["next_cursor"]
+        with contar_queries() as contador:
+            keyset_response(tasks.query(T), CursorPaginationParams(size=20, cursor=cursor), keys)
+        (sql,) = contador.statements
+        # Range a partir do cursor (indice), sem COUNT
+        assert "(background_tasks.created_at, background_tasks.id) < (?, ?)" in sql
+        assert "count(" not in sql.lower()
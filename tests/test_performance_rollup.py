@@ -0,0 +1,262 @@
+"""
+Testes do rollup de desempenho (app/services/performance_rollup.py), SQLite.
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from unittest.mock import MagicMock
+from fastapi import BackgroundTasks
+
+from app.api.routes.provas import finalizar_prova
+from app.api.routes.professor_analytics import comparar_alunos, resumo_desempenho_aluno
+from app.api.routes.student_provas import finalizar
+from app.models.application import Application, ApplicationStatus, StudentAnswer
+from app.models.performance_rollup import StudentPerformanceRollup
+from app.models.prova import Prova, ProvaAluno, QuestaoGerada, RespostaAluno, StatusProvaAluno, TipoQuestao
+from app.models.question import DifficultyLevel, Question, QuestionSet
+from app.models.student import Student
+from app.schemas.prova import FinalizarProvaRequest, RespostaAlunoCreate
+from app.models.user import User
+from app.services import performance_rollup
+from app.services.prova_ai_service import prova_ai_service
+
+
+@pytest.fixture
+def cenario(db_session, professor_aluno):
+    return (db_session, *professor_aluno)
+
+
+def _prova(db, professor, aluno, acertos, tags=(("fracoes",), ("fracoes", "decimais"), ()),
+           status=StatusProvaAluno.CORRIGIDA, nota=None, quando=None, materia="Matemática"):
+    prova = Prova(titulo="P", conteudo_prompt="x", materia=materia, criado_por_id=professor.id,
+                  pontuacao_total=float(len(tags)))
+    db.add(prova)
+    db.flush()
+    questoes = [
+        QuestaoGerada(prova_id=prova.id, numero=i + 1, enunciado="?", tipo=TipoQuestao.MULTIPLA_ESCOLHA,
+                      tags=list(t), pontuacao=1.0)
+        for i, t in enumerate(tags)
+    ]
+    db.add_all(questoes)
+    db.flush()
+    pa = ProvaAluno(prova_id=prova.id, aluno_id=aluno.id, status=status,
+                    nota_final=nota, aprovado=None if nota is None else nota >= 6,
+                    data_conclusao=quando, data_inicio=datetime.now(timezone.utc))
+    db.add(pa)
+    db.flush()
+    respostas = [
+        RespostaAluno(prova_aluno_id=pa.id, questao_id=q.id, esta_correta=i < acertos,
+                      pontuacao_obtida=1.0 if i < acertos else 0.0)
+        for i, q in enumerate(questoes)
+    ]
+    db.add_all(respostas)
+    db.flush()
+    return prova, pa, respostas
+
+
+def _aplicacao(db, professor, aluno, corretas):
+    qs = QuestionSet(user_id=professor.id, title="Q", subject="Ciências", grade_level="5º ano",
+                     raw_content="x", config={})
+    db.add(qs)
+    db.flush()
+    app = Application(question_set_id=qs.id, student_id=aluno.id, applied_by_user_id=professor.id,
+                      applied_date=datetime(2026, 3, 1), status=ApplicationStatus.COMPLETED,
+                      completed_at=datetime(2026, 3, 2))
+    db.add(app)
+    db.flush()
+    for i, correta in enumerate(corretas):
+        q = Question(question_set_id=qs.id, difficulty_level=DifficultyLevel.BASIC, question_text="?",
+                     option_a="a", option_b="b", option_c="c", option_d="d", correct_answer="a",
+                     skill="celulas", order_number=i)
+        db.add(q)
+        db.flush()
+        db.add(StudentAnswer(application_id=app.id, question_id=q.id, student_id=aluno.id,
+                             selected_answer="a" if correta else "b", is_correct=correta))
+    db.flush()
+    return app
+
+
+def _linhas(db):
+    return {
+        (linha.fonte, linha.materia, linha.habilidade): linha
+        for linha in db.query(StudentPerformanceRollup).all()
+    }
+
+
+class TestRegistro:
+    def test_prova_soma_totais_e_habilidades(self, cenario):
+        db, professor, aluno = cenario
+        prova, pa, respostas = _prova(db, professor, aluno, acertos=2, nota=8.0,
+                                      quando=datetime(2026, 5, 1, 10, tzinfo=timezone.utc))
+        performance_rollup.registrar_prova(db, pa, prova, respostas)
+        prova2, pa2, respostas2 = _prova(db, professor, aluno, acertos=0, nota=4.0,
+                                         quando=datetime(2026, 5, 2))
+        performance_rollup.registrar_prova(db, pa2, prova2, respostas2)
+        db.commit()
+
+        linhas = _linhas(db)
+        total = linhas[("prova", "Matemática", "")]
+        assert (total.avaliacoes, total.avaliacoes_com_nota, total.soma_notas) == (2, 2, 12.0)
+        assert (total.nota_maxima, total.nota_minima) == (8.0, 4.0)
+        assert (total.aprovacoes, total.reprovacoes) == (1, 1)
+        assert (total.questoes_total, total.questoes_corretas) == (6, 2)
+        assert total.ultima_avaliacao_em == datetime(2026, 5, 2)
+        assert total.media == 6.0
+
+        fracoes = linhas[("prova", "Matemática", "fracoes")]
+        assert (fracoes.avaliacoes, fracoes.questoes_total, fracoes.questoes_corretas) == (2, 4, 2)
+        decimais = linhas[("prova", "Matemática", "decimais")]
+        assert (decimais.questoes_total, decimais.questoes_corretas) == (2, 1)
+        assert len(linhas) == 3
+
+    def test_aplicacao(self, cenario):
+        db, professor, aluno = cenario
+        app = _aplicacao(db, professor, aluno, [True, True, False, True])
+        performance_rollup.registrar_aplicacao(db, app)
+        db.commit()
+        linhas = _linhas(db)
+        total = linhas[("aplicacao", "Ciências", "")]
+        assert total.soma_notas == 7.5
+        assert (total.aprovacoes, total.reprovacoes) == (0, 0)
+        assert linhas[("aplicacao", "Ciências", "celulas")].percentual_acerto == 75.0
+
+    def test_prova_sem_aprovacao_definida_conta_reprovacao(self, cenario):
+        db, professor, aluno = cenario
+        prova, pa, respostas = _prova(db, professor, aluno, acertos=1)
+        assert pa.aprovado is None
+        performance_rollup.registrar_prova(db, pa, prova, respostas)
+        db.commit()
+        total = _linhas(db)[("prova", "Matemática", "")]
+        assert (total.aprovacoes, total.reprovacoes) == (0, 1)
+
+    def test_refinalizar_prova_corrigida_recalcula(self, cenario, monkeypatch):
+        db, professor, aluno = cenario
+        prova, pa, respostas = _prova(db, professor, aluno, acertos=3, nota=10.0,
+                                      tags=(("fracoes",), ("fracoes",), ()))
+        for questao in prova.questoes:
+            questao.resposta_correta = "a"
+        pa.data_inicio = None  # SQLite devolve naive; a rota subtrai de aware
+        performance_rollup.registrar_prova(db, pa, prova, respostas)
+        db.commit()
+
+        async def sem_ia(**kwargs):
+            raise RuntimeError("sem IA no teste")
+
+        monkeypatch.setattr(prova_ai_service, "analisar_desempenho", sem_ia)
+        request = FinalizarProvaRequest(prova_aluno_id=pa.id, respostas=[
+            RespostaAlunoCreate(questao_id=q.id, resposta_aluno="b") for q in prova.questoes
+        ])
+        r = asyncio.run(finalizar_prova(request, MagicMock(), db=db, current_user=professor))
+        assert r.nota_final == 0
+
+        total = _linhas(db)[("prova", "Matemática", "")]
+        assert total.avaliacoes == 1
+        assert (total.nota_maxima, total.nota_minima, total.soma_notas) == (0.0, 0.0, 0.0)
+        assert (total.aprovacoes, total.reprovacoes) == (0, 1)
+        assert (total.questoes_total, total.questoes_corretas) == (3, 0)
+        assert _linhas(db)[("prova", "Matemática", "fracoes")].questoes_total == 2
+        assert db.query(RespostaAluno).filter(RespostaAluno.prova_aluno_id == pa.id).count() == 3
+
+    def test_prova_sem_professor_e_ignorada(self, cenario):
+        db, professor, aluno = cenario
+        prova, pa, respostas = _prova(db, professor, aluno, acertos=1, nota=5.0)
+        prova.criado_por_id = None
+        db.flush()
+        performance_rollup.registrar_prova(db, pa, prova, respostas)
+        db.commit()
+        assert db.query(StudentPerformanceRollup).count() == 0
+
+        # Backfill tambem pula, sem quebrar o lote dos outros registros
+        _aplicacao(db, professor, aluno, [True])
+        db.commit()
+        assert performance_rollup.reconstruir(db) == 1
+        assert set(_linhas(db)) == {("aplicacao", "Ciências", ""), ("aplicacao", "Ciências", "celulas")}
+
+    def test_rollback_do_chamador_desfaz_rollup(self, cenario):
+        db, professor, aluno = cenario
+        prova, pa, respostas = _prova(db, professor, aluno, acertos=1, nota=5.0)
+        performance_rollup.registrar_prova(db, pa, prova, respostas)
+        db.rollback()
+        assert db.query(StudentPerformanceRollup).count() == 0
+
+
+class TestBackfill:
+    def test_reconstruir_igual_ao_incremental(self, cenario):
+        db, professor, aluno = cenario
+        prova, pa, respostas = _prova(db, professor, aluno, acertos=2, nota=8.0, quando=datetime(2026, 5, 1))
+        performance_rollup.registrar_prova(db, pa, prova, respostas)
+        app = _aplicacao(db, professor, aluno, [True, False])
+        performance_rollup.registrar_aplicacao(db, app)
+        # Pendente nao entra
+        _prova(db, professor, aluno, acertos=0, status=StatusProvaAluno.PENDENTE)
+        db.commit()
+
+        def estado():
+            return {
+                chave: (l.avaliacoes, l.soma_notas, l.nota_maxima, l.aprovacoes,
+                        l.questoes_total, l.questoes_corretas, l.ultima_avaliacao_em)
+                for chave, l in _linhas(db).items()
+            }
+
+        incremental = estado()
+        # Rollup divergente (linha velha) e corrigido pelo backfill
+        db.query(StudentPerformanceRollup).update({"avaliacoes": 99})
+        db.commit()
+        assert performance_rollup.reconstruir(db) == 2
+        assert estado() == incremental
+
+        assert performance_rollup.reconstruir(db, [aluno.id]) == 2
+        assert estado() == incremental
+
+
+class TestLeitura:
+    def test_finalizar_alimenta_rollup_e_telas(self, cenario):
+        db, professor, aluno = cenario
+        prova, pa, _ = _prova(db, professor, aluno, acertos=2, status=StatusProvaAluno.EM_ANDAMENTO)
+        db.commit()
+
+        r = asyncio.run(finalizar(pa.id, BackgroundTasks(), MagicMock(), current_student=aluno, db=db))
+        assert r["acertos"] == 2
+
+        resumo = resumo_desempenho_aluno(aluno.id, current_user=professor, db=db)
+        assert resumo["geral"]["avaliacoes"] == 1
+        assert resumo["geral"]["media"] == pytest.approx(round(2 / 3 * 10, 2))
+        assert resumo["por_materia"][0]["materia"] == "Matemática"
+        assert {h["habilidade"]: h["dominio"] for h in resumo["por_habilidade"]} == {
+            "fracoes": "excellent", "decimais": "excellent",
+        }
+
+        comparacao = comparar_alunos(str(aluno.id), current_user=professor, db=db)
+        (c,) = comparacao["comparacoes"]
+        assert (c["total_provas"], c["reprovacoes"]) == (1, 0)
+        assert c["nota_maxima"] == c["nota_minima"] == c["media_geral"]
+
+    def test_comparar_ignora_aluno_sem_provas_e_alheio(self, cenario, sem_n_mais_1):
+        db, professor, aluno = cenario
+        outro = User(name="Outro", email="o@x.com", hashed_password="x")
+        db.add(outro)
+        db.flush()
+        alheio = Student(name="Alheio", grade_level="5º ano", created_by_user_id=outro.id)
+        sem_provas = Student(name="Sem", grade_level="5º ano", created_by_user_id=professor.id)
+        db.add_all([alheio, sem_provas])
+        db.flush()
+        prova, pa, respostas = _prova(db, professor, aluno, acertos=1, nota=7.0)
+        performance_rollup.registrar_prova(db, pa, prova, respostas)
+        db.commit()
+        r = comparar_alunos(f"{alheio.id},{sem_provas.id},{aluno.id}", current_user=professor, db=db)
+        assert [c["aluno_id"] for c in r["comparacoes"]] == [aluno.id]
+
+        ids = [aluno.id]
+
+        def popular(n):
+            for _ in range(n):
+                novo = Student(name="N", grade_level="5º ano", created_by_user_id=professor.id)
+                db.add(novo)
+                db.flush()
+                ids.append(novo.id)
+                p, pa_, resp = _prova(db, professor, novo, acertos=1, nota=5.0,
+                                      quando=datetime(2026, 5, 1) + timedelta(days=n))
+                performance_rollup.registrar_prova(db, pa_, p, resp)
+
+        sem_n_mais_1(popular, lambda: comparar_alunos(",".join(map(str, ids)), current_user=professor, db=db))
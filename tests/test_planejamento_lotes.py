@@ -0,0 +1,101 @@
+"""
+Testes dos lotes de habilidades do planejamento BNCC completo
+(app/services/planejamento_bncc_completo_service.py): empacotamento por
+orcamento de tokens e divisao do lote truncado.
+"""
+import asyncio
+import re
+
+from app.services import planejamento_bncc_completo_service as servico
+from app.services.planejamento_bncc_completo_service import (
+    PlanejamentoBNNCCompletoService,
+    _empacotar_lotes,
+    _estimar_tokens,
+    _linha_habilidade,
+)
+
+
+PERFIL = "ALUNO: Ana - 5º ano\n\nDIAGNÓSTICOS:\n{\"TDAH\": \"leve\"}"
+
+
+def _habilidades(n, tamanho_descricao=60):
+    return [
+        {"codigo": f"EF05MA{i:02d}", "trimestre": 1 + i % 3, "descricao": "d" * tamanho_descricao}
+        for i in range(n)
+    ]
+
+
+def _codigos(prompt):
+    return re.findall(r"- \[(\w+)\] T", prompt)
+
+
+def _truncando(limite):
+    """Trunca (stop_reason=max_tokens) prompts com mais de `limite` habilidades."""
+    def responder(prompt, **kwargs):
+        objetivos = [{"codigo_bncc": c, "titulo": f"Objetivo {c}"} for c in _codigos(prompt)]
+        if len(objetivos) > limite:
+            return {"objetivos": objetivos[:1]}, "max_tokens"
+        return {"objetivos": objetivos}
+    return responder
+
+
+def _lotes(cliente):
+    return [len(_codigos(p)) for p in cliente.prompts]
+
+
+def _processar(db, cliente, habilidades):
+    service = PlanejamentoBNNCCompletoService(db)
+    service.client = cliente
+    return asyncio.run(service._processar_lote_habilidades(PERFIL, "Matemática", habilidades, "2026", 1))
+
+
+class TestEmpacotarLotes:
+    def test_respeita_orcamentos_e_ordem(self):
+        habilidades = _habilidades(40, tamanho_descricao=180)
+        lotes = _empacotar_lotes(habilidades, PERFIL)
+
+        assert [h for lote in lotes for h in lote] == habilidades
+        extra_perfil = min(_estimar_tokens(PERFIL) // 10, 100)
+        for lote in lotes:
+            saida = sum(
+                servico.TOKENS_SAIDA_POR_OBJETIVO + _estimar_tokens(h["descricao"][:180]) + extra_perfil
+                for h in lote
+            )
+            entrada = sum(_estimar_tokens(_linha_habilidade(h)) for h in lote)
+            assert saida <= servico.LOTE_ORCAMENTO_SAIDA
+            assert entrada <= servico.LOTE_ORCAMENTO_ENTRADA
+
+    def test_habilidades_curtas_usam_menos_lotes(self):
+        curtas = _empacotar_lotes(_habilidades(60, tamanho_descricao=20), PERFIL)
+        longas = _empacotar_lotes(_habilidades(60, tamanho_descricao=180), PERFIL)
+        assert len(curtas) < len(longas)
+
+    def test_limite_de_habilidades(self, monkeypatch):
+        monkeypatch.setattr(servico, "TOKENS_SAIDA_POR_OBJETIVO", 1)
+        lotes = _empacotar_lotes(_habilidades(70, tamanho_descricao=1), PERFIL)
+        assert [len(lote) for lote in lotes] == [30, 30, 10]
+
+    def test_habilidade_maior_que_o_orcamento_fica_sozinha(self, monkeypatch):
+        monkeypatch.setattr(servico, "LOTE_ORCAMENTO_SAIDA", 10)
+        assert [len(lote) for lote in _empacotar_lotes(_habilidades(3), PERFIL)] == [1, 1, 1]
+
+    def test_vazio(self):
+        assert _empacotar_lotes([], PERFIL) == []
+
+
+class TestLoteTruncado:
+    def test_divide_ate_caber(self, db_session, cliente_ia):
+        habilidades = _habilidades(10)
+        cliente = cliente_ia(responder=_truncando(3))
+        resultado = _processar(db_session, cliente, habilidades)
+
+        assert _lotes(cliente) == [10, 5, 2, 3, 5, 2, 3]
+        assert [o["codigo_bncc"] for o in resultado["objetivos"]] == [h["codigo"] for h in habilidades]
+        assert not any(o.get("_fallback") for o in resultado["objetivos"])
+
+    def test_habilidade_sozinha_truncada_usa_fallback(self, db_session, cliente_ia):
+        cliente = cliente_ia(responder=_truncando(0))
+        resultado = _processar(db_session, cliente, _habilidades(2))
+
+        assert _lotes(cliente) == [2, 1, 1]
+        assert [o["_fallback"] for o in resultado["objetivos"]] == [True, True]
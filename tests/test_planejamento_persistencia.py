@@ -0,0 +1,295 @@
+"""
+Testes da gravacao em lote do planejamento (objetivos do PEI) e do
+calendario de atividades (app/services/calendario_atividades_service.py), SQLite.
+"""
+import asyncio
+import json
+from datetime import date
+
+import pytest
+
+from app.core import anthropic_client
+from app.core.config import settings
+from app.core.query_counter import contar_queries
+from app.models.atividade_pei import AtividadePEI, SequenciaObjetivo, TipoAtividade
+from app.models.curriculo import CurriculoNacional
+from app.models.material import Material, MaterialAluno
+from app.models.pei import PEI, PEIObjetivo
+from app.models.prova import Prova, ProvaAluno, QuestaoGerada
+from app.services import bncc_catalogo
+from app.services.calendario_atividades_service import CalendarioAtividadesService
+from app.services.planejamento_bncc_completo_service import PlanejamentoBNNCCompletoService
+from app.services.planejamento_bncc_service import PlanejamentoBNNCService
+
+
+@pytest.fixture
+def cenario(db_session, professor_aluno, monkeypatch):
+    monkeypatch.setattr(bncc_catalogo, "_catalogo", None)
+    monkeypatch.setattr(bncc_catalogo, "_verificado_em", 0.0)
+    db = db_session
+    db.add(CurriculoNacional(codigo_bncc="EF05MA02", ano_escolar="5º ano", componente="Matemática",
+                             habilidade_descricao="Frações", trimestre_sugerido=2))
+    db.commit()
+    return (db, *professor_aluno)
+
+
+def _objetivos(n):
+    return [
+        {"codigo_bncc": "EF05MA02" if i == 0 else f"XX{i}", "titulo": f"Objetivo {i}",
+         "trimestre": 1 + i % 4, "criterios_avaliacao": ["acertar 4 de 5"]}
+        for i in range(n)
+    ]
+
+
+class TestSalvarPlanejamento:
+    def test_completo_em_lote(self, cenario):
+        db, professor, aluno = cenario
+        planejamento = {"componentes": {"Matemática": {"objetivos": _objetivos(3)}}}
+        pei = PlanejamentoBNNCCompletoService(db).salvar_planejamento_completo(
+            aluno.id, planejamento, professor.id, "2026")
+
+        objetivos = db.query(PEIObjetivo).filter(PEIObjetivo.pei_id == pei.id).order_by(PEIObjetivo.id).all()
+        assert [o.titulo for o in objetivos] == ["Objetivo 0", "Objetivo 1", "Objetivo 2"]
+        curriculo = db.query(CurriculoNacional).one()
+        assert [o.curriculo_nacional_id for o in objetivos] == [curriculo.id, None, None]
+        assert (objetivos[1].area, objetivos[1].prazo, objetivos[1].criterio_medicao) == (
+            "matemática", date(2026, 7, 15), "acertar 4 de 5",
+        )
+
+    @pytest.mark.parametrize("salvar", [
+        lambda db, aluno, prof, objs: PlanejamentoBNNCService(db).salvar_planejamento_como_pei(
+            aluno.id, {"objetivos": objs}, prof.id, "2026"),
+        lambda db, aluno, prof, objs: PlanejamentoBNNCCompletoService(db).salvar_planejamento_completo(
+            aluno.id, {"componentes": {"Matemática": {"objetivos": objs}}}, prof.id, "2026"),
+    ])
+    def test_queries_nao_crescem_com_objetivos(self, cenario, salvar):
+        db, professor, aluno = cenario
+        salvar(db, aluno, professor, _objetivos(1))  # aquece o catalogo
+        contagens = []
+        for n in (1, 40):
+            with contar_queries() as contador:
+                salvar(db, aluno, professor, _objetivos(n))
+            contagens.append(contador.total)
+        assert contagens[0] == contagens[1]
+        assert db.query(PEIObjetivo).count() == 42
+
+
+PROVA = {"titulo": "Prova", "questoes": [
+    {"numero": i, "enunciado": f"Q{i}", "resposta_correta": "B",
+     "alternativas": [{"letra": "A", "texto": "1"}, {"letra": "B", "texto": "2"}]}
+    for i in (1, 2, 3)
+]}
+
+
+def _material(titulo):
+    return {"titulo": titulo, "secoes": [{"titulo": "S1", "conteudo": "texto"}]}
+
+
+def _responder(combinado=None):
+    """
+    Respostas em texto (```json) por prompt. `combinado` e a resposta ao
+    prompt dos 3 artefatos (default: os 3 validos).
+    """
+    if combinado is None:
+        combinado = json.dumps({
+            "material_introducao": _material("Material gerado"),
+            "material_aprofundamento": _material("Material gerado"),
+            "prova": PROVA,
+        })
+
+    def responder(prompt, **kwargs):
+        if "material_introducao" in prompt:
+            texto = combinado
+        elif "Crie uma prova" in prompt:
+            texto = json.dumps(PROVA)
+        else:
+            texto = json.dumps(_material("Material gerado"))
+        return "```json\n" + texto + "\n```"
+
+    return responder
+
+
+def _pei_com_objetivos(db, professor, aluno, n):
+    pei = PEI(student_id=aluno.id, created_by=professor.id, ano_letivo="2026")
+    db.add(pei)
+    db.flush()
+    db.add_all([PEIObjetivo(pei_id=pei.id, area="matematica", titulo=f"Obj {i}", trimestre=1 + i % 2)
+                for i in range(n)])
+    db.commit()
+    return pei
+
+
+def _gerar(db, professor, pei, cliente, geracao_combinada=True, **kwargs):
+    service = CalendarioAtividadesService(db, geracao_combinada=geracao_combinada)
+    service.client = cliente
+    return asyncio.run(service.gerar_calendario_completo(pei.id, professor.id, **kwargs))
+
+
+class _TaskManagerFalso:
+    def __init__(self):
+        self.progresso = []
+
+    def update_task(self, task_id, progress=None, message=None):
+        self.progresso.append((progress, message))
+
+
+class TestCalendario:
+    def test_grava_materiais_provas_e_atividades(self, cenario, cliente_ia):
+        db, professor, aluno = cenario
+        pei = _pei_com_objetivos(db, professor, aluno, 2)
+        r = _gerar(db, professor, pei, cliente_ia(responder=_responder()))
+
+        assert (r["atividades_geradas"], r["materiais_gerados"], r["provas_geradas"]) == (12, 4, 2)
+        assert db.query(Material).count() == db.query(MaterialAluno).count() == 4
+        assert db.query(Prova).count() == db.query(ProvaAluno).count() == 2
+        assert db.query(QuestaoGerada).count() == 6
+        assert db.query(SequenciaObjetivo).count() == 2
+
+        objetivo = pei.objetivos[0]
+        atividades = (db.query(AtividadePEI).filter(AtividadePEI.objetivo_id == objetivo.id)
+                      .order_by(AtividadePEI.ordem_sequencial).all())
+        assert [a.tipo for a in atividades] == [
+            TipoAtividade.MATERIAL, TipoAtividade.EXERCICIO, TipoAtividade.MATERIAL,
+            TipoAtividade.EXERCICIO, TipoAtividade.REVISAO, TipoAtividade.PROVA,
+        ]
+        material = db.get(Material, atividades[0].material_id)
+        assert material.titulo == "Material gerado"
+        assert db.get(MaterialAluno, atividades[0].material_aluno_id).material_id == material.id
+        prova_aluno = db.get(ProvaAluno, atividades[5].prova_aluno_id)
+        assert prova_aluno.prova_id == atividades[5].prova_id
+        assert r["calendario"][0] == {"data": atividades[0].data_programada.isoformat(),
+                                      "tipo": "material", "titulo": "📚 Material gerado"}
+
+    def test_sem_ia_so_exercicios_e_revisao(self, cenario):
+        db, professor, aluno = cenario
+        pei = _pei_com_objetivos(db, professor, aluno, 1)
+        r = _gerar(db, professor, pei, None)
+        assert (r["atividades_geradas"], r["materiais_gerados"], r["provas_geradas"]) == (3, 0, 0)
+        assert db.query(AtividadePEI).count() == 3
+
+    def test_so_materiais_e_provas_crescem_com_objetivos(self, cenario, cliente_ia):
+        db, professor, aluno = cenario
+        contagens = []
+        for n in (1, 6):
+            pei = _pei_com_objetivos(db, professor, aluno, n)
+            with contar_queries() as contador:
+                _gerar(db, professor, pei, cliente_ia(responder=_responder()))
+            contagens.append(contador.total)
+        # Material/Prova precisam do id e nao tem chave natural: um INSERT
+        # por linha (2 materiais + 1 prova por objetivo). O resto e em lote.
+        assert contagens[1] - contagens[0] == 5 * 3
+
+
+class TestGeracaoParalela:
+    def test_objetivos_em_paralelo_sob_o_limite(self, cenario, cliente_ia, monkeypatch):
+        monkeypatch.setattr(settings, "AI_MAX_CONCORRENCIA", 3)
+        db, professor, aluno = cenario
+        pei = _pei_com_objetivos(db, professor, aluno, 4)
+        cliente = cliente_ia(responder=_responder(), espera=0.05)
+        r = _gerar(db, professor, pei, cliente, geracao_combinada=False)
+
+        assert len(cliente.chamadas) == 12
+        assert cliente.max_simultaneas == 3
+        assert r["atividades_geradas"] == 24
+        # Datas planejadas antes da IA: mesma agenda do processamento em serie
+        assert [a["data"] for a in r["calendario"] if a["tipo"] == "material"][::2] == [
+            "2026-02-01", "2026-03-15", "2026-05-01", "2026-06-05",
+        ]
+
+    def test_progresso_por_objetivo(self, cenario, cliente_ia):
+        db, professor, aluno = cenario
+        pei = _pei_com_objetivos(db, professor, aluno, 3)
+        tarefas = _TaskManagerFalso()
+        _gerar(db, professor, pei, cliente_ia(responder=_responder()), task_id="t1", task_manager=tarefas)
+
+        progressos = [p for p, _ in tarefas.progresso]
+        assert progressos == sorted(progressos)
+        assert progressos[0] == 5 and progressos[-1] == 92
+        assert "3 de 3 objetivos" in tarefas.progresso[-2][1]
+
+
+class TestGeracaoCombinada:
+    def test_uma_chamada_por_objetivo(self, cenario, cliente_ia):
+        db, professor, aluno = cenario
+        pei = _pei_com_objetivos(db, professor, aluno, 3)
+        cliente = cliente_ia(responder=_responder())
+        r = _gerar(db, professor, pei, cliente)
+
+        assert len(cliente.chamadas) == 3
+        assert (r["atividades_geradas"], r["materiais_gerados"], r["provas_geradas"]) == (18, 6, 3)
+        assert db.query(QuestaoGerada).count() == 9
+
+    def test_artefato_invalido_vai_para_chamada_individual(self, cenario, cliente_ia):
+        db, professor, aluno = cenario
+        pei = _pei_com_objetivos(db, professor, aluno, 2)
+        cliente = cliente_ia(responder=_responder(combinado=json.dumps({
+            "material_introducao": _material("Intro combinada"),
+            "material_aprofundamento": {"titulo": "Sem secoes"},
+            "prova": {"titulo": "Prova", "questoes": [{"enunciado": ""}]},
+        })))
+        r = _gerar(db, professor, pei, cliente)
+
+        # 1 combinada + aprofundamento + prova, por objetivo
+        assert len(cliente.chamadas) == 6
+        assert sum("Crie uma prova" in p for p in cliente.prompts) == 2
+        assert (r["materiais_gerados"], r["provas_geradas"]) == (4, 2)
+        titulos = sorted(m.titulo for m in db.query(Material))
+        assert titulos == ["Intro combinada", "Intro combinada", "Material gerado", "Material gerado"]
+
+    def test_alternativas_em_texto_vao_para_chamada_individual(self, cenario, cliente_ia):
+        db, professor, aluno = cenario
+        pei = _pei_com_objetivos(db, professor, aluno, 1)
+        questoes = [{"enunciado": "1 + 1?", "alternativas": ["1", "2"], "resposta_correta": "B"}]
+        cliente = cliente_ia(responder=_responder(combinado=json.dumps({
+            "material_introducao": _material("Intro"),
+            "material_aprofundamento": _material("Aprofundamento"),
+            "prova": {"titulo": "Prova", "questoes": questoes},
+        })))
+        r = _gerar(db, professor, pei, cliente)
+
+        assert len(cliente.chamadas) == 2
+        assert sum("Crie uma prova" in p for p in cliente.prompts) == 1
+        assert (r["materiais_gerados"], r["provas_geradas"]) == (2, 1)
+
+    def test_falha_ao_montar_parte_combinada_usa_chamada_individual(self, cenario, cliente_ia, monkeypatch):
+        db, professor, aluno = cenario
+        pei = _pei_com_objetivos(db, professor, aluno, 1)
+        montar = CalendarioAtividadesService._montar_prova
+        chamadas = []
+
+        def montar_falha_uma_vez(self, *args):
+            chamadas.append(1)
+            if len(chamadas) == 1:
+                raise AttributeError("'str' object has no attribute 'get'")
+            return montar(self, *args)
+
+        monkeypatch.setattr(CalendarioAtividadesService, "_montar_prova", montar_falha_uma_vez)
+        cliente = cliente_ia(responder=_responder())
+        r = _gerar(db, professor, pei, cliente)
+
+        assert len(cliente.chamadas) == 2
+        assert (r["materiais_gerados"], r["provas_geradas"]) == (2, 1)
+
+    def test_json_quebrado_gera_tudo_individualmente(self, cenario, cliente_ia):
+        db, professor, aluno = cenario
+        pei = _pei_com_objetivos(db, professor, aluno, 1)
+        cliente = cliente_ia(responder=_responder(combinado='{"material_introducao": {"titulo": "cort'))
+        r = _gerar(db, professor, pei, cliente)
+        assert len(cliente.chamadas) == 4
+        assert r["atividades_geradas"] == 6
+
+
+class TestChamarIa:
+    def test_limite_de_chamadas_simultaneas(self, cliente_ia, monkeypatch):
+        monkeypatch.setattr(settings, "AI_MAX_CONCORRENCIA", 2)
+        cliente = cliente_ia(responder=_responder(), espera=0.02)
+
+        async def varias():
+            return await asyncio.gather(*(
+                anthropic_client.chamar_ia(cliente.create, model="m", max_tokens=1,
+                                           messages=[{"content": "x"}])
+                for _ in range(6)
+            ))
+
+        assert len(asyncio.run(varias())) == 6
+        assert cliente.max_simultaneas == 2
@@ -0,0 +1,137 @@
+"""
+Testes das queries de /professor/analytics (SQLite em memoria).
+"""
+from datetime import datetime, timedelta
+
+from app.api.routes.professor_analytics import dashboard_professor, listar_alunos_com_rendimento
+from app.core.pagination import PaginationParams
+from app.core.query_counter import contar_queries
+from app.models.prova import Prova, ProvaAluno, StatusProvaAluno
+from app.models.student import Student
+from app.models.user import User
+
+
+def _popular(db):
+    professor = User(name="Prof", email="prof@x.com", hashed_password="x")
+    outro = User(name="Outro", email="outro@x.com", hashed_password="x")
+    db.add_all([professor, outro])
+    db.flush()
+
+    alunos = [
+        Student(name=f"Aluno {i}", grade_level="5º ano", created_by_user_id=professor.id)
+        for i in range(3)
+    ]
+    db.add_all(alunos)
+    prova = Prova(titulo="P1", conteudo_prompt="x", materia="Mat", criado_por_id=professor.id)
+    prova_outro = Prova(titulo="P2", conteudo_prompt="x", materia="Mat", criado_por_id=outro.id)
+    db.add_all([prova, prova_outro])
+    db.flush()
+
+    agora = datetime(2026, 5, 1, 10, 0)
+    db.add_all([
+        ProvaAluno(prova_id=prova.id, aluno_id=alunos[0].id, status=StatusProvaAluno.CORRIGIDA,
+                   nota_final=8.0, aprovado=True, data_conclusao=agora),
+        ProvaAluno(prova_id=prova.id, aluno_id=alunos[1].id, status=StatusProvaAluno.CONCLUIDA,
+                   nota_final=4.0, aprovado=False, data_conclusao=agora + timedelta(hours=1)),
+        ProvaAluno(prova_id=prova.id, aluno_id=alunos[2].id, status=StatusProvaAluno.EM_ANDAMENTO),
+        ProvaAluno(prova_id=prova.id, aluno_id=alunos[2].id, status=StatusProvaAluno.PENDENTE),
+        # Prova de outro professor nao entra nas contas
+        ProvaAluno(prova_id=prova_outro.id, aluno_id=alunos[0].id, status=StatusProvaAluno.CORRIGIDA,
+                   nota_final=10.0, aprovado=True, data_conclusao=agora),
+    ])
+    db.commit()
+    return professor, outro
+
+
+class TestDashboardProfessor:
+    def test_contadores(self, db_session):
+        professor, _ = _popular(db_session)
+        r = dashboard_professor(current_user=professor, db=db_session)
+        assert r["total_provas_criadas"] == 1
+        assert r["total_alunos"] == 3
+        assert r["total_provas_atribuidas"] == 4
+        assert r["provas_concluidas"] == 2
+        assert r["provas_em_andamento"] == 1
+        assert r["provas_pendentes"] == 1
+        assert r["media_geral_notas"] == 6.0
+        assert r["taxa_aprovacao"] == 50.0
+        assert [p["aluno_nome"] for p in r["provas_recentes"]] == ["Aluno 1", "Aluno 0"]
+
+    def test_professor_sem_provas(self, db_session):
+        _, outro = _popular(db_session)
+        novo = User(name="Novo", email="novo@x.com", hashed_password="x")
+        db_session.add(novo)
+        db_session.commit()
+        r = dashboard_professor(current_user=novo, db=db_session)
+        assert r["total_provas_atribuidas"] == 0
+        assert r["provas_concluidas"] == 0
+        assert r["media_geral_notas"] == 0
+        assert r["taxa_aprovacao"] == 0
+
+    def test_duas_queries_contadores_e_recentes(self, db_session):
+        professor, _ = _popular(db_session)
+        professor.id  # recarrega o usuario expirado pelo commit fora da contagem
+        with contar_queries() as queries:
+            dashboard_professor(current_user=professor, db=db_session)
+        assert queries.total == 2
+
+
+class TestListaAlunos:
+    def test_rendimento_por_aluno(self, db_session):
+        professor, _ = _popular(db_session)
+        r = listar_alunos_com_rendimento(PaginationParams(), current_user=professor, db=db_session)
+        assert r["meta"]["total"] == 3
+        a0, a1, a2 = r["items"]
+        assert [a["aluno_nome"] for a in r["items"]] == ["Aluno 0", "Aluno 1", "Aluno 2"]
+        # Prova do outro professor (nota 10) fica fora
+        assert (a0["total_provas"], a0["provas_concluidas"], a0["media_geral"]) == (1, 1, 8.0)
+        assert a0["ultima_prova"]["prova_titulo"] == "P1"
+        assert a0["ultima_prova"]["nota"] == 8.0
+        assert a1["ultima_prova"]["data"] == "2026-05-01T11:00:00"
+        assert (a2["total_provas"], a2["provas_pendentes"], a2["provas_em_andamento"]) == (2, 1, 1)
+        assert a2["media_geral"] == 0
+        assert a2["ultima_prova"] is None
+
+    def test_ultima_prova_e_a_mais_recente(self, db_session):
+        professor, _ = _popular(db_session)
+        aluno = db_session.query(Student).filter(Student.name == "Aluno 0").one()
+        nova = Prova(titulo="P3", conteudo_prompt="x", materia="Mat", criado_por_id=professor.id)
+        db_session.add(nova)
+        db_session.flush()
+        db_session.add(ProvaAluno(prova_id=nova.id, aluno_id=aluno.id, status=StatusProvaAluno.CONCLUIDA,
+                                  nota_final=6.0, data_conclusao=datetime(2026, 6, 1)))
+        db_session.commit()
+        r = listar_alunos_com_rendimento(PaginationParams(), current_user=professor, db=db_session)
+        a0 = r["items"][0]
+        assert a0["ultima_prova"]["prova_titulo"] == "P3"
+        assert a0["media_geral"] == 7.0
+
+    def test_paginacao(self, db_session):
+        professor, _ = _popular(db_session)
+        r = listar_alunos_com_rendimento(PaginationParams(page=2, size=2), current_user=professor, db=db_session)
+        assert [a["aluno_nome"] for a in r["items"]] == ["Aluno 2"]
+        assert r["meta"]["total"] == 3
+        vazia = listar_alunos_com_rendimento(PaginationParams(page=5, size=2), current_user=professor, db=db_session)
+        assert vazia["items"] == []
+        assert vazia["meta"]["total"] == 3
+
+    def test_uma_query_independente_do_numero_de_alunos(self, db_session, sem_n_mais_1):
+        professor, _ = _popular(db_session)
+        prova = db_session.query(Prova).filter(Prova.criado_por_id == professor.id).first()
+        novos = []
+
+        def popular(n):
+            for _ in range(n):
+                aluno = Student(name=f"Novo {len(novos)}", grade_level="5º ano",
+                                created_by_user_id=professor.id)
+                db_session.add(aluno)
+                db_session.flush()
+                novos.append(aluno)
+                db_session.add(ProvaAluno(prova_id=prova.id, aluno_id=aluno.id, status=StatusProvaAluno.CORRIGIDA,
+                                          nota_final=7.0, data_conclusao=datetime(2026, 5, 2)))
+
+        def executar():
+            listar_alunos_com_rendimento(PaginationParams(size=50), current_user=professor, db=db_session)
+
+        # +1 do recarregamento de current_user (expirado pelo commit), igual em todos os volumes
+        assert sem_n_mais_1(popular, executar, tamanhos=(2, 25)) == [2, 2]
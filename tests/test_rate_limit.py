@@ -76,3 +76,122 @@ class TestCheckRateLimit:
         
         assert exc_info.value.status_code == 429
         assert "Retry-After" in exc_info.value.headers
+
+
+class TestGCRA:
+    def test_estado_e_uma_entrada_por_chave(self):
+        """GCRA guarda so o TAT - 20 requests nao viram 20 entradas."""
+        store = _RateLimitStore()
+        for _ in range(20):
+            store.check("1.1.1.1", "ep", max_requests=20, window_seconds=3600)
+        assert len(store._buckets) == 1
+        assert isinstance(store._buckets[("1.1.1.1", "ep")], float)
+
+    def test_reabastece_proporcionalmente_ao_tempo(self, monkeypatch):
+        """Apos window/max segundos, libera exatamente mais 1 request."""
+        from app.core import rate_limit
+        agora = [1000.0]
+        monkeypatch.setattr(rate_limit.time, "time", lambda: agora[0])
+
+        store = _RateLimitStore()
+        for _ in range(4):
+            assert store.check("1.1.1.1", "ep", max_requests=4, window_seconds=60)
+        assert not store.check("1.1.1.1", "ep", max_requests=4, window_seconds=60)
+
+        agora[0] += 15  # 60/4 = 15s por request
+        assert store.check("1.1.1.1", "ep", max_requests=4, window_seconds=60)
+        assert not store.check("1.1.1.1", "ep", max_requests=4, window_seconds=60)
+
+    def test_cleanup_remove_so_chaves_ociosas(self, monkeypatch):
+        from app.core import rate_limit
+        agora = [1000.0]
+        monkeypatch.setattr(rate_limit.time, "time", lambda: agora[0])
+
+        store = _RateLimitStore()
+        store.check("1.1.1.1", "curto", max_requests=10, window_seconds=10)  # TAT = now + 1s
+        store.check("2.2.2.2", "longo", max_requests=1, window_seconds=3600)  # TAT = now + 1h
+
+        agora[0] += 5
+        assert store.cleanup() == 1
+        assert list(store._buckets) == [("2.2.2.2", "longo")]
+
+
+def _fake_user(user_id: int, escola_id: int = None):
+    user = MagicMock()
+    user.id = user_id
+    user.escola_id = escola_id
+    return user
+
+
+class TestDimensoesIdentidade:
+    def setup_method(self):
+        from app.core import rate_limit
+        rate_limit._redis_backend = None
+        rate_limit._memory_backend = rate_limit._MemoryBackend()
+
+    def test_usuarios_atras_do_mesmo_nat_nao_dividem_limite(self):
+        req = _fake_request(ip="10.0.0.1")
+        for user_id in (1, 2, 3):
+            for _ in range(2):
+                check_rate_limit(req, "gerar", 2, 3600, user=_fake_user(user_id))
+
+    def test_usuario_trocando_de_ip_continua_limitado(self):
+        user = _fake_user(9)
+        check_rate_limit(_fake_request(ip="1.0.0.1"), "gerar", 2, 3600, user=user)
+        check_rate_limit(_fake_request(ip="1.0.0.2"), "gerar", 2, 3600, user=user)
+        with pytest.raises(HTTPException) as exc_info:
+            check_rate_limit(_fake_request(ip="1.0.0.3"), "gerar", 2, 3600, user=user)
+        assert exc_info.value.status_code == 429
+
+    def test_limite_por_escola_agrega_usuarios(self):
+        req = _fake_request(ip="10.0.0.2")
+        check_rate_limit(req, "gerar", 5, 3600, user=_fake_user(1, escola_id=50), max_per_escola=2)
+        check_rate_limit(req, "gerar", 5, 3600, user=_fake_user(2, escola_id=50), max_per_escola=2)
+        with pytest.raises(HTTPException):
+            check_rate_limit(req, "gerar", 5, 3600, user=_fake_user(3, escola_id=50), max_per_escola=2)
+        # Outra escola nao e afetada
+        check_rate_limit(req, "gerar", 5, 3600, user=_fake_user(4, escola_id=51), max_per_escola=2)
+
+    def test_orcamento_de_tokens_da_escola(self, monkeypatch):
+        from app.core.config import settings
+        monkeypatch.setattr(settings, "RATE_LIMIT_AI_TOKENS_ESCOLA_HORA", 10_000)
+        req = _fake_request(ip="10.0.0.3")
+        check_rate_limit(req, "laudo", 100, 3600, user=_fake_user(1, escola_id=60), ai_tokens=6000)
+        with pytest.raises(HTTPException) as exc_info:
+            check_rate_limit(req, "pei", 100, 3600, user=_fake_user(2, escola_id=60), ai_tokens=6000)
+        assert "IA" in exc_info.value.detail
+
+    def test_tudo_ou_nada_quando_uma_dimensao_estoura(self):
+        """Se o limite da escola estoura, o do usuario nao pode ser consumido."""
+        from app.core import rate_limit
+        req = _fake_request(ip="10.0.0.4")
+        user = _fake_user(1, escola_id=70)
+        check_rate_limit(req, "gerar", 2, 3600, user=_fake_user(2, escola_id=70), max_per_escola=1)
+        with pytest.raises(HTTPException):
+            check_rate_limit(req, "gerar", 2, 3600, user=user, max_per_escola=1)
+        assert ("user:1", "gerar") not in rate_limit._memory_backend._buckets
+
+
+class TestOrcamentoEmEfeitoColateral:
+    """Rotas que salvam primeiro e so depois chamam IA pulam a IA sem orcamento."""
+
+    def setup_method(self):
+        from app.core import rate_limit
+        rate_limit._redis_backend = None
+        rate_limit._memory_backend = rate_limit._MemoryBackend()
+
+    def test_diario_salvo_sem_analise_quando_orcamento_acaba(self, monkeypatch):
+        from fastapi import BackgroundTasks
+        from app.api.routes import diario_aprendizagem
+        from app.core.config import settings
+        monkeypatch.setattr(settings, "RATE_LIMIT_AI_TOKENS_ESCOLA_HORA", 6_000)
+        req = _fake_request(ip="10.0.0.5")
+        user = _fake_user(1, escola_id=80)
+
+        tarefas = BackgroundTasks()
+        diario_aprendizagem._agendar_analise(req, tarefas, user, diario_id=1, student_id=1)
+        assert len(tarefas.tasks) == 1
+
+        tarefas = BackgroundTasks()
+        diario_aprendizagem._agendar_analise(req, tarefas, user, diario_id=2, student_id=1)
+        assert tarefas.tasks == []
@@ -0,0 +1,110 @@
+"""
+Testes do RequestTrackingMiddleware (ASGI puro).
+
+Cobre:
+    - X-Request-ID gerado quando o cliente nao manda
+    - X-Request-ID do cliente e propagado (rastreio ponta-a-ponta)
+    - request.state.request_id disponivel nas rotas
+    - Respostas em streaming e WebSocket passam pelo middleware sem quebrar
+    - Statements SQL da rota (sync, no threadpool) contados no log
+"""
+from fastapi import FastAPI, Request, WebSocket
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from app.core import request_tracking
+from app.core.request_tracking import RequestTrackingMiddleware
+from app.core.security_headers import SecurityHeadersMiddleware
+
+
+def _make_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(RequestTrackingMiddleware)
+    app.add_middleware(SecurityHeadersMiddleware, is_production=False)
+
+    @app.get("/api/v1/coisa")
+    def rota(request: Request):
+        return {"request_id": request.state.request_id}
+
+    @app.get("/api/v1/stream")
+    def rota_stream():
+        def gerar():
+            for i in range(3):
+                yield f"parte-{i};"
+        return StreamingResponse(gerar(), media_type="text/plain")
+
+    @app.get("/api/v1/erro")
+    def rota_erro():
+        raise RuntimeError("boom")
+
+    engine = create_engine("sqlite://")
+
+    @app.get("/api/v1/queries/{n}")
+    def rota_queries(n: int):
+        with engine.connect() as conn:
+            for _ in range(n):
+                conn.execute(text("SELECT 1"))
+        return {}
+
+    @app.websocket("/ws")
+    async def ws(websocket: WebSocket):
+        await websocket.accept()
+        await websocket.send_text("ola")
+        await websocket.close()
+
+    return app
+
+
+class TestRequestId:
+    def test_gera_request_id_quando_ausente(self):
+        r = TestClient(_make_app()).get("/api/v1/coisa")
+        assert r.status_code == 200
+        assert len(r.headers["X-Request-ID"]) == 8
+        assert r.json()["request_id"] == r.headers["X-Request-ID"]
+
+    def test_propaga_request_id_do_cliente(self):
+        r = TestClient(_make_app()).get("/api/v1/coisa", headers={"X-Request-ID": "abc-123"})
+        assert r.headers["X-Request-ID"] == "abc-123"
+        assert r.json()["request_id"] == "abc-123"
+
+
+class TestPassthrough:
+    def test_streaming_recebe_headers_e_corpo_completo(self):
+        r = TestClient(_make_app()).get("/api/v1/stream")
+        assert r.text == "parte-0;parte-1;parte-2;"
+        assert "X-Request-ID" in r.headers
+        assert r.headers["X-Content-Type-Options"] == "nosniff"
+
+    def test_websocket_nao_e_afetado(self):
+        with TestClient(_make_app()).websocket_connect("/ws") as ws:
+            assert ws.receive_text() == "ola"
+
+    def test_excecao_propaga(self):
+        client = TestClient(_make_app(), raise_server_exceptions=False)
+        r = client.get("/api/v1/erro")
+        assert r.status_code == 500
+
+
+class TestContagemQueries:
+    def _logs(self, monkeypatch):
+        registros = []
+
+        def capturar(nivel):
+            return lambda msg, extra=None, **kw: registros.append((nivel, extra))
+
+        monkeypatch.setattr(request_tracking.logger, "debug", capturar("debug"))
+        monkeypatch.setattr(request_tracking.logger, "warning", capturar("warning"))
+        return registros
+
+    def test_queries_da_rota_sync_vao_no_log(self, monkeypatch):
+        registros = self._logs(monkeypatch)
+        TestClient(_make_app()).get("/api/v1/queries/3")
+        (nivel, extra), = registros
+        assert nivel == "debug"
+        assert extra["queries"] == 3
+
+    def test_muitas_queries_viram_warning(self, monkeypatch):
+        registros = self._logs(monkeypatch)
+        TestClient(_make_app()).get(f"/api/v1/queries/{request_tracking.QUERIES_ALERTA + 1}")
+        assert registros[0][0] == "warning"
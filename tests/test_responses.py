@@ -0,0 +1,60 @@
+"""
+Testes da FastJSONResponse (orjson com fallback stdlib).
+
+A saida precisa ser a mesma que o caminho padrao do FastAPI
+(jsonable_encoder + json) produziria para os tipos usados nos models.
+"""
+import json
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from enum import Enum
+from uuid import UUID
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+
+from app.core import responses
+from app.core.responses import FastJSONResponse
+
+
+class _Status(str, Enum):
+    ATIVA = "ativa"
+
+
+_PAYLOAD = {
+    "criado": datetime(2026, 3, 1, 10, 30, 15, 123456, tzinfo=timezone.utc),
+    "ingenuo": datetime(2026, 3, 1, 10, 30),
+    "dia": date(2026, 3, 1),
+    "valor": Decimal("199.90"),
+    "inteiro": Decimal("10"),
+    "status": _Status.ATIVA,
+    "uuid": UUID("12345678-1234-5678-1234-567812345678"),
+    "por_trimestre": {1: ["a"], 2: []},
+    "texto": "Frações equivalentes – ção",
+    "nada": None,
+}
+
+
+def _via_fastapi(payload):
+    return json.loads(json.dumps(jsonable_encoder(payload)))
+
+
+class TestSerializacao:
+    def test_mesma_saida_que_jsonable_encoder(self):
+        assert json.loads(responses.dumps(_PAYLOAD)) == _via_fastapi(_PAYLOAD)
+
+    def test_fallback_stdlib_mesma_saida(self):
+        """Sem orjson instalado, o fallback (json + _default) precisa produzir o mesmo JSON."""
+        saida = json.dumps(
+            _PAYLOAD, default=responses._default, ensure_ascii=False, separators=(",", ":")
+        )
+        assert json.loads(saida) == _via_fastapi(_PAYLOAD)
+
+    def test_tipo_desconhecido_levanta_type_error(self):
+        with pytest.raises(TypeError):
+            responses.dumps({"x": object()})
+
+    def test_response_renderiza_utf8(self):
+        r = FastJSONResponse({"nome": "João"})
+        assert r.media_type == "application/json"
+        assert json.loads(r.body.decode("utf-8")) == {"nome": "João"}